@@ -15,6 +15,18 @@ class MySQLRDSConfig:
     CONNECT_TIMEOUT = int(os.getenv('MYSQL_RDS_CONNECT_TIMEOUT', '15'))
     READ_TIMEOUT = int(os.getenv('MYSQL_RDS_READ_TIMEOUT', '30'))
 
+    # Connection pool (one pymysql connection per concurrent borrower)
+    POOL_SIZE = int(os.getenv('MYSQL_RDS_POOL_SIZE', '10'))
+    POOL_TIMEOUT = float(os.getenv('MYSQL_RDS_POOL_TIMEOUT', '10'))
+    POOL_MAX_IDLE = int(os.getenv('MYSQL_RDS_POOL_MAX_IDLE', '300'))
+    POOL_MAX_LIFETIME = int(os.getenv('MYSQL_RDS_POOL_MAX_LIFETIME', '3600'))
+    POOL_PING_INTERVAL = int(os.getenv('MYSQL_RDS_POOL_PING_INTERVAL', '30'))
+
+    # Read-through cache TTLs in seconds (0 disables caching for that group)
+    ORG_CACHE_TTL = int(os.getenv('MYSQL_RDS_ORG_CACHE_TTL', '3600'))
+    BATCH_CACHE_TTL = int(os.getenv('MYSQL_RDS_BATCH_CACHE_TTL', '300'))
+    COUNT_CACHE_TTL = int(os.getenv('MYSQL_RDS_COUNT_CACHE_TTL', '300'))
+
     @classmethod
     def is_configured(cls) -> bool:
         return bool(cls.HOST and cls.USER and cls.DATABASE)
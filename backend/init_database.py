@@ -66,6 +66,7 @@ def init_database():
             users_collection.create_index([("email", 1)])  # Non-unique index for performance
             users_collection.create_index([("username", 1)], unique=True)
             users_collection.create_index([("role", 1)])
+            users_collection.create_index([("mobile_number", 1)])
             print("✅ Users indexes created")
         except Exception as e:
             print(f"⚠️  Users indexes error: {e}")
@@ -77,6 +78,11 @@ def init_database():
             tests_collection.create_index([("level_id", 1)])
             tests_collection.create_index([("test_type", 1)])
             tests_collection.create_index([("is_active", 1)])
+            tests_collection.create_index([("test_type", 1), ("batch_course_instance_ids", 1), ("module_id", 1)])
+            tests_collection.create_index([("test_type", 1), ("campus_ids", 1), ("module_id", 1)])
+            tests_collection.create_index([("test_type", 1), ("course_ids", 1), ("module_id", 1)])
+            tests_collection.create_index([("test_type", 1), ("batch_ids", 1), ("module_id", 1)])
+            tests_collection.create_index([("test_type", 1), ("assigned_student_ids", 1), ("module_id", 1)])
             print("✅ Tests indexes created")
         except Exception as e:
             print(f"⚠️  Tests indexes error: {e}")
@@ -89,6 +95,7 @@ def init_database():
             test_results_collection.create_index([("module_id", 1)])
             test_results_collection.create_index([("submitted_at", -1)])
             test_results_collection.create_index([("test_type", 1)])
+            test_results_collection.create_index([("student_oid", 1), ("test_type", 1), ("status", 1), ("submitted_at", -1)])
             print("✅ Test results indexes created")
         except Exception as e:
             print(f"⚠️  Test results indexes error: {e}")
@@ -98,9 +105,11 @@ def init_database():
             student_test_attempts_collection = db['student_test_attempts']
             student_test_attempts_collection.create_index([("test_id", 1)])
             student_test_attempts_collection.create_index([("student_id", 1)])
+            student_test_attempts_collection.create_index([("user_id", 1)])
             student_test_attempts_collection.create_index([("module_id", 1)])
             student_test_attempts_collection.create_index([("submitted_at", -1)])
             student_test_attempts_collection.create_index([("test_type", 1)])
+            student_test_attempts_collection.create_index([("student_oid", 1), ("test_type", 1), ("status", 1), ("submitted_at", -1)])
             print("✅ Student test attempts indexes created")
         except Exception as e:
             print(f"⚠️  Student test attempts indexes error: {e}")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Standalone worker for the durable job queue (utils/job_queue.py)
+Runs notification jobs outside the web workers so they scale independently
+
+Run with JOB_QUEUE_EMBEDDED_WORKERS=0 on the web tier:
+    python job_worker.py --concurrency 8
+    python job_worker.py --names notification.email notification.sms
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Importing the modules registers their job handlers
+import utils.batch_processor  # noqa: E402,F401
+import utils.notification_queue  # noqa: E402,F401
+from utils.job_queue import JobWorker, job_queue, registered_handlers  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process jobs of the durable job queue')
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('JOB_WORKER_CONCURRENCY', '4')),
+                        help='jobs run at once (threads)')
+    parser.add_argument('--names', nargs='*', help='only claim these job names (default: every registered handler)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    names = args.names or registered_handlers()
+    print(f"🚀 Job worker starting: {args.concurrency} threads, handlers: {', '.join(names)}")
+
+    worker = JobWorker(job_queue, concurrency=args.concurrency, names=names)
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        print("🛑 Job worker stopping...")
+
+
+if __name__ == '__main__':
+    main()
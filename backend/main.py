@@ -1,9 +1,10 @@
 import os
 import gc
+import hmac
 import psutil
 from flask import Flask, jsonify, request
 from datetime import datetime
-from socketio_instance import socketio
+from socketio_instance import socketio, socketio_connections
 from flask_socketio import join_room
 from config.shared import bcrypt
 from config.constants import JWT_ACCESS_TOKEN_EXPIRES, JWT_REFRESH_TOKEN_EXPIRES
@@ -158,6 +159,7 @@ def create_app():
         """Handle Socket.IO connection with optional authentication"""
         try:
             # For now, allow all connections (can add JWT validation later if needed)
+            socketio_connections.connected()
             print(f"✅ Socket.IO client connected")
             return True
         except Exception as e:
@@ -167,6 +169,7 @@ def create_app():
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle Socket.IO disconnection"""
+        socketio_connections.disconnected()
         print(f"🔌 Socket.IO client disconnected")
     
     @socketio.on('join_room')
@@ -325,6 +328,8 @@ def create_app():
                 if MySQLRDSConfig.is_configured():
                     rds_health = mysql_rds.health_check()
                     rds_health['org_data_source'] = 'rds' if MySQLRDSConfig.use_rds_org_data() else 'mongo'
+                    from services.rds_org_service import rds_org
+                    rds_health['org_cache'] = rds_org.cache_stats()
             except Exception as rds_exc:
                 rds_health = {'status': 'unhealthy', 'message': str(rds_exc)}
             
@@ -356,6 +361,27 @@ def create_app():
                 'connection_health': get_connection_health()
             }), 500
 
+    # OpenMetrics endpoint for Prometheus (all workers merged)
+    @app.route('/metrics')
+    def openmetrics():
+        """Request, Mongo, RDS and queue metrics of every worker in OpenMetrics format"""
+        from flask import Response
+        from utils.openmetrics import CONTENT_TYPE, render_openmetrics
+
+        # Scrapers authenticate with METRICS_TOKEN; only dev mode serves metrics without one
+        token = os.getenv('METRICS_TOKEN')
+        dev_mode = (os.environ.get("FLASK_DEBUG", "False").lower() == "true"
+                    or os.environ.get("DEV_MODE", "False").lower() == "true")
+        if not token and not dev_mode:
+            return jsonify({'success': False, 'message': 'Metrics are disabled: METRICS_TOKEN is not set'}), 403
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'success': False, 'message': 'Invalid metrics token'}), 401
+
+        routes = {}
+        for rule in app.url_map.iter_rules():
+            routes.setdefault(rule.endpoint, rule.rule)
+        return Response(render_openmetrics(routes), content_type=CONTENT_TYPE)
+
     # CORS test endpoint
     @app.route('/cors-test')
     def cors_test():
@@ -549,6 +575,14 @@ def create_app():
     except Exception as e:
         print(f"⚠️ Warning: Async system initialization failed: {e}")
     
+    # Durable job queue: each web worker consumes jobs unless JOB_QUEUE_EMBEDDED_WORKERS=0 (job_worker.py)
+    from utils.job_queue import ensure_embedded_worker
+    app.before_request(ensure_embedded_worker)
+    
+    # Re-submit audio transcriptions whose worker died (expired lease), from every web worker
+    from services.transcription_service import transcription_queue
+    app.before_request(transcription_queue.ensure_reaper)
+    
     # Real analytics system is initialized above with middleware
     
     # TODO: Initialize Push Notification Service (removed for cleanup)
@@ -9,35 +9,32 @@ import sys
 
 def init_real_analytics_middleware(app):
     """Initialize real analytics middleware"""
+    from utils.metrics_aggregation import metrics_aggregator
     from utils.real_analytics import real_analytics
     
     @app.before_request
     def before_request():
-        g.start_time = time.time()
-        g.request_size = 0
+        g.metrics_start = time.perf_counter()
+        # Workers are forked after the app is loaded; publish from each one
+        metrics_aggregator.ensure_publisher()
     
     @app.after_request
     def after_request(response):
         try:
             # Calculate response time
-            response_time = time.time() - g.start_time
+            response_time = time.perf_counter() - g.metrics_start
             
-            # Get request size
-            request_size = g.get('request_size', 0)
+            # Response size without buffering streamed bodies
+            response_size = response.content_length or 0
             
-            # Get response size
-            response_size = len(response.get_data())
-            
-            # Extract endpoint (remove query params)
+            # request.endpoint is the route name; fall back to the path for 404s
             endpoint = request.endpoint or request.path
-            if '?' in endpoint:
-                endpoint = endpoint.split('?')[0]
             
             # Get error message if any
             error_msg = None
             if response.status_code >= 400:
                 try:
-                    response_data = response.get_json()
+                    response_data = response.get_json() if response.is_json and not response.is_streamed else None
                     if response_data and 'error' in response_data:
                         error_msg = response_data['error']
                 except:
@@ -391,6 +391,8 @@ class SubSuperadmin:
                }
            }
        )
+       from utils.principal import invalidate_principal
+       invalidate_principal(user_id)
        return result.modified_count > 0
 
    @staticmethod
@@ -407,6 +409,8 @@ class SubSuperadmin:
                }
            }
        )
+       from utils.principal import invalidate_principal
+       invalidate_principal(user_id)
        return result.modified_count > 0
 
    @staticmethod
@@ -6,9 +6,9 @@ class NotificationPreferences:
     """Model for managing user notification preferences"""
     
     @staticmethod
-    def create_default_preferences(user_id):
-        """Create default notification preferences for a new user"""
-        default_prefs = {
+    def default_preferences(user_id):
+        """Default notification preferences document for a new user"""
+        return {
             'user_id': ObjectId(user_id) if isinstance(user_id, str) else user_id,
             'push_notifications': {
                 'enabled': True,
@@ -71,7 +71,11 @@ class NotificationPreferences:
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
-        
+
+    @staticmethod
+    def create_default_preferences(user_id):
+        """Create default notification preferences for a new user"""
+        default_prefs = NotificationPreferences.default_preferences(user_id)
         result = mongo_db.db.notification_preferences.insert_one(default_prefs)
         return str(result.inserted_id)
 
@@ -74,6 +74,7 @@ class MongoDB:
             self.users.create_index("campus_id")
             self.users.create_index("course_id")
             self.users.create_index("batch_id")
+            self.users.create_index("mobile_number")
             
             # Students collection indexes
             self.students.create_index("user_id", unique=True)
@@ -153,10 +154,14 @@ class MongoDB:
     
     def update_user(self, user_id, update_data):
         """Update user data"""
-        return self.users.update_one(
+        from utils.principal import invalidate_principal
+
+        result = self.users.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": update_data}
         )
+        invalidate_principal(user_id)
+        return result
     
     def insert_student(self, student_data):
         """Insert a new student"""
@@ -245,8 +250,10 @@ class MongoDB:
     
     def insert_test_attempt(self, attempt_data):
         """Insert a new test attempt"""
+        from services.student_identity import stamp_student_oid
+
         try:
-            result = self.student_test_attempts.insert_one(attempt_data)
+            result = self.student_test_attempts.insert_one(stamp_student_oid(attempt_data))
             return str(result.inserted_id)
         except Exception as e:
             raise Exception(f"Error inserting test attempt: {str(e)}")
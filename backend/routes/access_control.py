@@ -6,6 +6,7 @@ from config.constants import ROLES, MODULES
 from datetime import datetime
 import pytz
 import functools
+from utils.principal import cached_user, current_principal, current_role, invalidate_principal
 
 access_control_bp = Blueprint('access_control', __name__)
 
@@ -69,8 +70,14 @@ def require_permission(module=None, action=None):
     def decorator(f):
         @functools.wraps(f)
         def decorated_function(*args, **kwargs):
-            current_user_id = get_jwt_identity()
-            user = mongo_db.find_user_by_id(current_user_id)
+            # Super admin and sub_superadmin have all permissions at backend level;
+            # with a trusted role claim this needs no user lookup at all
+            user_role = (current_role() or '').lower()
+            if user_role in ('superadmin', 'sub_superadmin'):
+                return f(*args, **kwargs)
+
+            principal = current_principal()
+            user = principal.user if principal else None
 
             if not user:
                 return jsonify({
@@ -83,19 +90,8 @@ def require_permission(module=None, action=None):
             print(f"Module required: {module}")
             print(f"Action required: {action}")
 
-            # Super admin and sub_superadmin have all permissions at backend level
-            user_role = user.get('role', '').lower()
-
-            if user_role == 'superadmin':
-                print("Super admin access granted")
-                return f(*args, **kwargs)
-            
-            if user_role == 'sub_superadmin':
-                print("Sub-superadmin access granted (backend allows all, frontend controls UI)")
-                return f(*args, **kwargs)
-
             # Check permissions for other admin roles
-            permissions = user.get('permissions', DEFAULT_PERMISSIONS.get(user.get('role'), {}))
+            permissions = principal.permissions
 
             has_permission = True
 
@@ -125,7 +121,7 @@ def get_available_modules():
     """Get all available modules for access control"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'superadmin':
             return jsonify({
@@ -150,7 +146,7 @@ def get_admin_permissions(admin_id):
     """Get permissions for a specific admin"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = mongo_db.find_user_by_id(current_user_id)
+        current_user = cached_user(current_user_id)
         
         # Check if user is superadmin or has sub superadmin management permission
         if current_user.get('role') != 'superadmin':
@@ -195,7 +191,7 @@ def update_admin_permissions(admin_id):
     """Update permissions for a specific admin"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = mongo_db.find_user_by_id(current_user_id)
+        current_user = cached_user(current_user_id)
         
         # Check if user is superadmin or has sub superadmin management permission
         if current_user.get('role') != 'superadmin':
@@ -244,6 +240,7 @@ def update_admin_permissions(admin_id):
             {'_id': ObjectId(admin_id)},
             {'$set': {'permissions': new_permissions, 'permissions_updated_at': datetime.now(pytz.utc)}}
         )
+        invalidate_principal(admin_id)
         
         return jsonify({
             'success': True,
@@ -262,7 +259,7 @@ def get_all_admins_with_permissions():
     """Get all admins with their permissions"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = mongo_db.find_user_by_id(current_user_id)
+        current_user = cached_user(current_user_id)
         
         # Check if user is superadmin or has sub superadmin management permission
         if current_user.get('role') != 'superadmin':
@@ -310,7 +307,7 @@ def check_permission():
     """Check if current user has permission for a specific module/action"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user:
             return jsonify({
@@ -376,7 +373,7 @@ def reset_admin_permissions(admin_id):
     """Reset admin permissions to default for their role"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = mongo_db.find_user_by_id(current_user_id)
+        current_user = cached_user(current_user_id)
         
         # Check if user is superadmin or has sub superadmin management permission
         if current_user.get('role') != 'superadmin':
@@ -402,6 +399,7 @@ def reset_admin_permissions(admin_id):
             {'_id': ObjectId(admin_id)},
             {'$set': {'permissions': default_permissions, 'permissions_updated_at': datetime.now(pytz.utc)}}
         )
+        invalidate_principal(admin_id)
         
         return jsonify({
             'success': True,
@@ -420,7 +418,7 @@ def debug_user():
     """Debug endpoint to check current user's role and permissions"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user:
             return jsonify({
@@ -8,6 +8,7 @@ from datetime import datetime
 import pytz
 from utils.email_service import send_email, render_template
 from routes.access_control import require_permission
+from utils.principal import invalidate_principal
 
 admin_management_bp = Blueprint('admin_management', __name__)
 
@@ -296,6 +297,7 @@ def delete_admin(admin_id):
                 'success': False,
                 'message': 'Failed to delete admin'
             }), 500
+        invalidate_principal(admin_id)
         
         print(f"✅ Admin deleted successfully: {admin_name}")
         
@@ -5,9 +5,9 @@ Demonstrates parallel processing for authentication endpoints
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
-from config.shared import bcrypt
-import bcrypt as raw_bcrypt
 from mongo import mongo_db
+from utils.principal import cached_user, role_claims
+from services.password_verifier import LoginOverloaded, LoginThrottled, client_ip, password_verifier
 from config.constants import ROLES
 import traceback
 import sys
@@ -35,6 +35,17 @@ def async_login():
         
         username = data['username']
         password = data['password']
+        client = client_ip(request)
+        
+        try:
+            password_verifier.check_identifier(username, client)
+        except LoginThrottled as throttled:
+            response = jsonify({
+                'success': False,
+                'message': 'Too many failed login attempts. Please try again later.'
+            })
+            response.headers['Retry-After'] = str(throttled.retry_after)
+            return response, 429
         
         # Parallel execution of user lookup and validation
         def find_user_by_username():
@@ -48,6 +59,7 @@ def async_login():
         user = results[0] or results[1]
         
         if not user:
+            password_verifier.record_result(username, False, client)
             return jsonify({
                 'success': False,
                 'message': 'Invalid username or password'
@@ -67,7 +79,18 @@ def async_login():
                 'message': 'Login failed: Critical server error - missing user credentials.'
             }), 500
         
-        if not raw_bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+        try:
+            password_ok = password_verifier.verify(password, user['password_hash'])
+        except LoginOverloaded as overloaded:
+            response = jsonify({
+                'success': False,
+                'message': 'Login service is busy. Please try again in a few seconds.'
+            })
+            response.headers['Retry-After'] = str(overloaded.retry_after)
+            return response, 503
+        password_verifier.record_result(username, password_ok, client)
+        
+        if not password_ok:
             return jsonify({
                 'success': False,
                 'message': 'Invalid username or password'
@@ -75,7 +98,7 @@ def async_login():
         
         # Create tokens in parallel
         def create_tokens():
-            access_token = create_access_token(identity=str(user['_id']))
+            access_token = create_access_token(identity=str(user['_id']), additional_claims=role_claims(user))
             refresh_token = create_refresh_token(identity=str(user['_id']))
             return access_token, refresh_token
         
@@ -116,8 +139,8 @@ def async_login():
 
 @async_auth_bp.route('/me', methods=['GET'])
 @jwt_required()
+@cached_response(ttl=60)  # Cache user info for 1 minute, per user
 @async_route(timeout=10.0)
-@cached_response(ttl=60)  # Cache user info for 1 minute
 @performance_monitor(threshold=0.3)
 def async_get_current_user():
     """Async get current user information with caching"""
@@ -177,7 +200,7 @@ def async_refresh():
     """Async refresh access token"""
     try:
         current_user_id = get_jwt_identity()
-        new_access_token = create_access_token(identity=current_user_id)
+        new_access_token = create_access_token(identity=current_user_id, additional_claims=role_claims(cached_user(current_user_id)))
         
         return jsonify({
             'success': True,
@@ -215,7 +238,7 @@ def async_logout():
         }), 500
 
 @async_auth_bp.route('/health', methods=['GET'])
-@cached_response(ttl=30)  # Cache health check for 30 seconds
+@cached_response(ttl=30, per_user=False)  # Cache health check for 30 seconds
 def async_health_check():
     """Async health check endpoint"""
     try:
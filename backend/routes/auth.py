@@ -1,10 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
-from config.shared import bcrypt  # Flask-Bcrypt for password generation
-import bcrypt as raw_bcrypt  # Raw bcrypt for password verification
 from mongo import mongo_db
+from utils.principal import cached_user, role_claims
+from services.password_verifier import LoginOverloaded, LoginThrottled, client_ip, password_verifier
 from config.constants import ROLES
 import traceback
+import hmac
 import sys
 from bson.errors import InvalidId
 
@@ -141,7 +142,6 @@ def login():
         print("🔍 Login attempt started", file=sys.stderr)
         
         data = request.get_json()
-        print(f"📝 Request data: {data}", file=sys.stderr)
         
         if not data or not data.get('username') or not data.get('password'):
             print("❌ Missing username or password", file=sys.stderr)
@@ -152,6 +152,19 @@ def login():
         
         username = data['username']
         password = data['password']
+        client = client_ip(request)
+        
+        # Per-identifier throttling happens before any lookup or bcrypt work
+        try:
+            password_verifier.check_identifier(username, client)
+        except LoginThrottled as throttled:
+            print(f"⛔ Login throttled for: {username}", file=sys.stderr)
+            response = jsonify({
+                'success': False,
+                'message': 'Too many failed login attempts. Please try again later.'
+            })
+            response.headers['Retry-After'] = str(throttled.retry_after)
+            return response, 429
         
         print(f"🔍 Looking up user: {username}", file=sys.stderr)
         
@@ -170,6 +183,7 @@ def login():
         
         if not user:
             print(f"❌ User not found: {username}", file=sys.stderr)
+            password_verifier.record_result(username, False, client)
             return jsonify({
                 'success': False,
                 'message': 'Invalid username or password'
@@ -193,7 +207,7 @@ def login():
             """
             Fetch the RDS student record and (re)set the password_hash to the
             correct RDS-based credential (roll/pin number itself).
-            Returns the new password_hash string, or None if RDS lookup fails.
+            Returns (new password_hash, that password), or (None, None) if RDS lookup fails.
             """
             try:
                 from services.student_mapping_service import (
@@ -202,12 +216,11 @@ def login():
                     link_student_to_rds,
                     generate_student_password,
                 )
-                from config.shared import bcrypt as _bcrypt
 
                 rds_student = find_rds_student(lookup_ident)
                 if not rds_student:
                     print(f"❌ No RDS record found for '{lookup_ident}' — cannot repair credentials.", file=sys.stderr)
-                    return None
+                    return None, None
 
                 pin       = rds_student.get('pin_no') or ''
                 admission = rds_student.get('admission_number') or rds_student.get('roll_number') or ''
@@ -215,7 +228,7 @@ def login():
 
                 # Password = roll/pin number (students log in with their number as password)
                 correct_password = generate_student_password(rds_student.get('name') or '', roll)
-                new_hash = _bcrypt.generate_password_hash(correct_password).decode('utf-8')
+                new_hash = password_verifier.hash_password(correct_password)
 
                 mongo_db.users.update_one(
                     {'_id': user_doc['_id']},
@@ -235,16 +248,16 @@ def login():
                 if mongo_student and not mongo_student.get('rds_student_id'):
                     link_student_to_rds(mongo_student, rds_student, update_profile=True)
 
-                return new_hash
+                return new_hash, correct_password
             except Exception as exc:
                 print(f"⚠️ RDS credential repair failed: {exc}", file=sys.stderr)
-                return None
+                return None, None
 
         # Case 1: no password_hash at all — stub user, must repair from RDS
         if not password_hash:
             print(f"⚠️ User {user.get('_id')} has no password_hash — attempting RDS repair.", file=sys.stderr)
             rds_ident = user.get('username') or username
-            password_hash = _rds_repair_credentials(user, rds_ident)
+            password_hash, _ = _rds_repair_credentials(user, rds_ident)
 
         if not password_hash:
             print(f"❌ CRITICAL: User {user.get('_id')} has no credentials and RDS repair failed.", file=sys.stderr)
@@ -255,9 +268,17 @@ def login():
 
         print(f"🔍 Verifying password for user: {username}", file=sys.stderr)
 
-        # Primary: bcrypt hash check
+        # Primary: bcrypt hash check (on the verifier pool, behind admission control)
         try:
-            hash_ok = raw_bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+            hash_ok = password_verifier.verify(password, password_hash)
+        except LoginOverloaded as overloaded:
+            print(f"⛔ Login queue full, rejecting: {username}", file=sys.stderr)
+            response = jsonify({
+                'success': False,
+                'message': 'Login service is busy. Please try again in a few seconds.'
+            })
+            response.headers['Retry-After'] = str(overloaded.retry_after)
+            return response, 503
         except Exception as pw_exc:
             print(f"⚠️ bcrypt checkpw error for user {username}: {pw_exc}", file=sys.stderr)
             hash_ok = False
@@ -270,13 +291,13 @@ def login():
         if not hash_ok and not mobile_ok and user.get('role') == 'student':
             print(f"⚠️ Password mismatch for RDS student {user.get('_id')} — re-syncing credentials.", file=sys.stderr)
             rds_ident = user.get('username') or username
-            repaired_hash = _rds_repair_credentials(user, rds_ident)
+            repaired_hash, repaired_password = _rds_repair_credentials(user, rds_ident)
             if repaired_hash:
-                try:
-                    hash_ok = raw_bcrypt.checkpw(password.encode('utf-8'), repaired_hash.encode('utf-8'))
-                except Exception:
-                    hash_ok = False
+                # The repaired hash was just made from repaired_password: compare directly
+                hash_ok = hmac.compare_digest(password.encode('utf-8'), repaired_password.encode('utf-8'))
+                password_hash = repaired_hash
 
+        password_verifier.record_result(username, hash_ok or mobile_ok, client)
         if not hash_ok and not mobile_ok:
             print(f"❌ Password verification failed for user: {username}", file=sys.stderr)
             return jsonify({
@@ -286,9 +307,18 @@ def login():
         
         print(f"✅ Password verified for user: {username}", file=sys.stderr)
         
+        if hash_ok:
+            # Upgrade legacy / low-cost hashes in the background
+            user_oid = user['_id']
+            password_verifier.rehash_if_needed(
+                password,
+                password_hash,
+                lambda new_hash: mongo_db.users.update_one({'_id': user_oid}, {'$set': {'password_hash': new_hash}})
+            )
+        
         # Create tokens
         print(f"🔑 Creating tokens for user: {username}", file=sys.stderr)
-        access_token = create_access_token(identity=str(user['_id']))
+        access_token = create_access_token(identity=str(user['_id']), additional_claims=role_claims(user))
         refresh_token = create_refresh_token(identity=str(user['_id']))
         
         # Get additional user info
@@ -422,7 +452,7 @@ def refresh():
     """
     try:
         current_user_id = get_jwt_identity()
-        new_access_token = create_access_token(identity=current_user_id)
+        new_access_token = create_access_token(identity=current_user_id, additional_claims=role_claims(cached_user(current_user_id)))
         
         return jsonify({
             'success': True,
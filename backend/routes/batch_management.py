@@ -11,9 +11,9 @@ from datetime import datetime
 import pytz
 import io
 from utils.email_service import send_email, render_template
-from utils.sms_service import send_student_credentials_sms
-from utils.upload_optimizer import optimize_upload_process, cleanup_if_needed, log_upload_progress
-from utils.resilient_services import create_resilient_services
+from utils.sms_service import send_student_credentials_sms, credentials_message
+from utils.sms_dispatcher import SMSMessage, sms_dispatcher
+from utils.upload_optimizer import optimize_upload_process, log_upload_progress
 from utils.async_processor import performance_monitor
 from utils.notification_queue import queue_student_credentials, queue_batch_notifications, get_notification_stats
 from config.shared import bcrypt
@@ -21,8 +21,12 @@ from socketio_instance import socketio
 from routes.access_control import require_permission
 from services.org_data_source import use_rds, read_only_response, resolve_campus_id, resolve_course_id
 from services.rds_org_service import rds_org, parse_batch_id
+from utils.shared_cache import cached_view, invalidate_on_write
+from utils.principal import invalidate_principal
+from services.student_import import existing_values, import_students
 
 batch_management_bp = Blueprint('batch_management', __name__)
+invalidate_on_write(batch_management_bp, 'org')
 
 def safe_isoformat(date_obj):
     """Safely convert a date object to ISO format string, handling various types."""
@@ -423,6 +427,8 @@ def delete_batch(batch_id):
         
         # Delete student records
         mongo_db.students.delete_many({'batch_id': batch_obj_id})
+        for user_id in user_ids_to_delete:
+            invalidate_principal(user_id)
         
         # Finally, delete the batch
         result = mongo_db.batches.delete_one({'_id': batch_obj_id})
@@ -474,6 +480,7 @@ def get_branches():
 
 @batch_management_bp.route('/campuses', methods=['GET'])
 @jwt_required()
+@cached_view('org', ttl=300, tags=('org',))
 def get_campuses():
     if use_rds():
         data = [{'id': c['id'], 'name': c['name']} for c in rds_org.list_colleges()]
@@ -483,6 +490,7 @@ def get_campuses():
 
 @batch_management_bp.route('/courses', methods=['GET'])
 @jwt_required()
+@cached_view('org', ttl=300, tags=('org',))
 def get_courses():
     campus_ids = request.args.getlist('campus_ids')
     if not campus_ids:
@@ -490,11 +498,10 @@ def get_courses():
     try:
         if use_rds():
             courses_data = []
-            for cid in campus_ids:
-                college_id = resolve_campus_id(cid)
-                if college_id is None:
-                    continue
-                college = rds_org.get_college_by_id(college_id)
+            college_ids = [c for c in (resolve_campus_id(cid) for cid in campus_ids) if c is not None]
+            colleges = rds_org.get_colleges_by_ids(college_ids)
+            for college_id in college_ids:
+                college = colleges.get(college_id)
                 for course in rds_org.list_courses(college_id=college_id):
                     courses_data.append({
                         'id': course['id'],
@@ -625,11 +632,11 @@ def validate_student_upload():
         if missing_fields:
             return jsonify({'success': False, 'message': f"Invalid file structure. Missing columns: {', '.join(missing_fields)}"}), 400
 
-        # Fetch existing data for validation
-        existing_roll_numbers = set(s['roll_number'] for s in mongo_db.students.find({}, {'roll_number': 1}))
+        # Fetch existing data for validation (only the values in this file, indexed $in lookups)
+        existing_roll_numbers = existing_values(mongo_db.students, 'roll_number', [str(row.get('Roll Number', '')).strip() for row in rows])
         # Note: Email duplicates are now allowed, so we don't need to check existing emails
         existing_emails = set()  # Empty set since we allow email duplicates
-        existing_mobile_numbers = set(u.get('mobile_number', '') for u in mongo_db.users.find({'mobile_number': {'$exists': True, '$ne': ''}}, {'mobile_number': 1}))
+        existing_mobile_numbers = existing_values(mongo_db.users, 'mobile_number', [str(row.get('Mobile Number', '')).strip() for row in rows])
         
         # Get campus info for validation
         campus = mongo_db.campuses.find_one({'_id': ObjectId(campus_id)})
@@ -730,7 +737,6 @@ def upload_students_to_batch():
         campus_ids = batch.get('campus_ids', [])
         if not campus_ids:
             return jsonify({'success': False, 'message': 'Batch is missing campus info.'}), 400
-        campus_id = campus_ids[0]  # Assume single campus per batch for now
 
         # Validate course IDs
         valid_course_ids = set(str(cid) for cid in batch.get('course_ids', []))
@@ -738,18 +744,8 @@ def upload_students_to_batch():
             if cid not in valid_course_ids:
                 return jsonify({'success': False, 'message': f'Course ID {cid} is not valid for this batch.'}), 400
 
-        # Fetch existing data for validation
-        existing_roll_numbers = set(s['roll_number'] for s in mongo_db.students.find({}, {'roll_number': 1}))
-        # Note: Email duplicates are now allowed, so we don't need to check existing emails
-        existing_emails = set()  # Empty set since we allow email duplicates
-        existing_mobile_numbers = set(u.get('mobile_number', '') for u in mongo_db.users.find({'mobile_number': {'$exists': True, '$ne': ''}}, {'mobile_number': 1}))
-
-        # Detailed response tracking
-        detailed_results = []
-        errors = []
-        total_students = len(rows)
-        
         # Send initial progress update
+        total_students = len(rows)
         socketio.emit('upload_progress', {
             'user_id': user_id,
             'status': 'started',
@@ -759,29 +755,11 @@ def upload_students_to_batch():
             'message': 'Starting student upload...'
         }, room=str(user_id))
         
-        current_app.logger.info(f"Starting PHASED processing of {len(rows)} rows")
-        
         # Optimize upload process for this batch size
-        optimize_upload_process(len(rows))
+        optimize_upload_process(total_students)
         
-        # Initialize all student results first
-        detailed_results = []
-        for index, row in enumerate(rows):
-            student_result = {
-                'student_name': '',
-                'roll_number': '',
-                'email': '',
-                'mobile_number': '',
-                'database_registered': False,
-                'email_sent': False,
-                'sms_sent': False,
-                'errors': [],
-                'success': False
-            }
-            detailed_results.append(student_result)
-        
-        # PHASE 1: DATABASE REGISTRATION
-        current_app.logger.info("🚀 PHASE 1: Starting database registration...")
+        # PHASE 1: DATABASE REGISTRATION (chunked bulk import)
+        current_app.logger.info(f"🚀 PHASE 1: Registering {total_students} students in database...")
         socketio.emit('upload_progress', {
             'user_id': user_id,
             'status': 'processing',
@@ -790,188 +768,32 @@ def upload_students_to_batch():
             'percentage': 0,
             'message': 'Phase 1: Registering students in database...'
         }, room=str(user_id))
-        
-        for index, row in enumerate(rows):
-            student_result = detailed_results[index]
-            
-            # Log every 10th row for debugging
-            if index % 10 == 0:
-                current_app.logger.info(f"Database Phase - Processing row {index + 1}/{len(rows)}: {row}")
-                # Perform cleanup and log progress
-                cleanup_if_needed(index + 1)
-                log_upload_progress(index + 1, len(rows), "Database Phase - ")
-            
-            try:
-                if is_v2_format:
-                    student_name = str(row.get('Student Name', '')).strip()
-                    roll_number = str(row.get('Roll Number', '')).strip()
-                    email = str(row.get('Email', '')).strip().lower() if row.get('Email') else ''  # Make email optional
-                    mobile_number = str(row.get('Mobile Number', '')).strip()
-                    group_name = str(row.get('Group', '')).strip()
-                    
-                    # Find course by group name (assuming group name matches course name)
-                    # Try exact match first, then case-insensitive match
-                    course = mongo_db.courses.find_one({'name': group_name, '_id': {'$in': [ObjectId(cid) for cid in course_ids]}})
-                    if not course:
-                        # Try case-insensitive match
-                        course = mongo_db.courses.find_one({
-                            'name': {'$regex': f'^{group_name}$', '$options': 'i'}, 
-                            '_id': {'$in': [ObjectId(cid) for cid in course_ids]}
-                        })
-                    
-                    if not course:
-                        # Get available courses for better error message
-                        available_courses = list(mongo_db.courses.find({'_id': {'$in': [ObjectId(cid) for cid in course_ids]}}, {'name': 1}))
-                        available_names = [c['name'] for c in available_courses]
-                        student_result['errors'].append(f"Course/Group '{group_name}' not found in this batch. Available courses: {', '.join(available_names)}")
-                        detailed_results.append(student_result)
-                        continue
-                    course_id = str(course['_id'])
-                else:
-                    student_name = str(row.get('Student Name', '')).strip()
-                    roll_number = str(row.get('Roll Number', '')).strip()
-                    email = str(row.get('Email', '')).strip().lower() if row.get('Email') else ''  # Make email optional
-                    mobile_number = str(row.get('Mobile Number', '')).strip()
-                    course_id = course_ids[0]  # Use first course for v1 format
-
-                # Update student result with basic info
-                student_result.update({
-                    'student_name': student_name,
-                    'roll_number': roll_number,
-                    'email': email,
-                    'mobile_number': mobile_number
-                })
-
-            # Validation
-                validation_errors = []
-                
-                # Check for missing required fields (name and roll number)
-                if not student_name or not roll_number or student_name.strip() == '' or roll_number.strip() == '':
-                    validation_errors.append('Missing required fields.')
-                
-                # Skip processing if missing required fields
-                if validation_errors:
-                    student_result['errors'] = validation_errors
-                    detailed_results.append(student_result)
-                    continue
-                
-                # Check for duplicates only if we have valid data
-                if roll_number in existing_roll_numbers:
-                    validation_errors.append('Roll number already exists.')
-                # Note: Email duplicates are now allowed at database level
-                # We can log a warning but don't treat it as an error
-                if email and email.strip() and email in existing_emails:
-                    current_app.logger.warning(f"⚠️ Email {email} already exists for another user, but allowing duplicate")
-                if mobile_number and mobile_number in existing_mobile_numbers:
-                    validation_errors.append('Mobile number already exists.')
-                
-                if validation_errors:
-                    student_result['errors'] = validation_errors
-                    detailed_results.append(student_result)
-                    continue
 
-                # Database Registration
-                try:
-                    username = roll_number
-                    password = f"{student_name.split()[0][:4].lower()}{roll_number[-4:]}"
-                    password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
-                    
-                    user_doc = {
-                        'username': username,
-                        'email': email if email and email.strip() else None,  # Always include email field
-                        'password_hash': password_hash,
-                        'role': 'student',
-                        'name': student_name,
-                        'mobile_number': mobile_number,
-                        'campus_id': campus_id,
-                        'course_id': ObjectId(course_id),
-                        'batch_id': ObjectId(batch_id),
-                        'is_active': True,
-                        'created_at': datetime.now(pytz.utc),
-                        'mfa_enabled': False
-                    }
-                    
-                    # Insert user first
-                    user_result = mongo_db.users.insert_one(user_doc)
-                    if not user_result.inserted_id:
-                        student_result['errors'].append('Failed to create user account.')
-                        detailed_results.append(student_result)
-                        continue
-                    
-                    user_id_inserted = user_result.inserted_id
-                    
-                    # Create default notification preferences for the new user
-                    try:
-                        from models_notification_preferences import NotificationPreferences
-                        NotificationPreferences.create_default_preferences(user_id_inserted)
-                        current_app.logger.info(f"✅ Created default notification preferences for student: {user_id_inserted}")
-                    except Exception as e:
-                        current_app.logger.warning(f"⚠️ Failed to create default notification preferences for student {user_id_inserted}: {e}")
-                        # Don't fail user creation if notification preferences creation fails
-                    
-                    student_doc = {
-                        'user_id': user_id_inserted,
-                        'name': student_name,
-                        'roll_number': roll_number,
-                        'email': email if email and email.strip() else None,  # Always include email field
-                        'mobile_number': mobile_number,
-                        'campus_id': campus_id,
-                        'course_id': ObjectId(course_id),
-                        'batch_id': ObjectId(batch_id),
-                        'created_at': datetime.now(pytz.utc)
-                    }
-                    
-                    # Insert student profile
-                    student_result_db = mongo_db.students.insert_one(student_doc)
-                    if not student_result_db.inserted_id:
-                        # Rollback user creation if student creation fails
-                        mongo_db.users.delete_one({'_id': user_id_inserted})
-                        student_result['errors'].append('Failed to create student profile.')
-                        detailed_results.append(student_result)
-                        continue
-                    
-                    # Database registration successful
-                    student_result['database_registered'] = True
-                    student_result['username'] = username
-                    student_result['password'] = password
-                    
-                    # Update existing sets to prevent duplicates within the same upload
-                    existing_roll_numbers.add(roll_number)
-                    existing_emails.add(email)
-                    if mobile_number:
-                        existing_mobile_numbers.add(mobile_number)
-                
-                except Exception as e:
-                    student_result['errors'].append(f'Database error: {str(e)}')
-                    current_app.logger.error(f"Database error for student {index + 1}: {e}")
-                    continue
+        def report_progress(processed, total, last_student):
+            log_upload_progress(processed, total, "Database Phase - ")
+            socketio.emit('upload_progress', {
+                'user_id': user_id,
+                'status': 'processing',
+                'total': total,
+                'processed': processed,
+                'percentage': int(processed / total * 100),
+                'message': f'Registered students {processed}/{total}',
+                'current_student': {
+                    'name': last_student['name'],
+                    'email': last_student['email'],
+                    'username': last_student['username'],
+                    'database_registered': True,
+                    'email_sent': False,
+                    'sms_sent': False
+                } if last_student else None
+            }, room=str(user_id))
 
-                # Send progress update for database phase
-                percentage = int(((index + 1) / total_students) * 100)  # Database phase is 100% of upload
-                socketio.emit('upload_progress', {
-                    'user_id': user_id,
-                    'status': 'processing',
-                    'total': total_students,
-                    'processed': index + 1,
-                    'percentage': percentage,
-                    'message': f'Uploading: {student_name} - {"✅" if student_result["database_registered"] else "❌"}',
-                    'current_student': {
-                        'name': student_name,
-                        'email': email,
-                        'username': username if student_result['database_registered'] else '',
-                        'database_registered': student_result['database_registered'],
-                        'email_sent': False,
-                        'sms_sent': False
-                    }
-                }, room=str(user_id))
-                    
-            except Exception as e:
-                student_result['errors'].append(f'Database error: {str(e)}')
-                current_app.logger.error(f"Database error for student {index + 1}: {e}")
-                continue
+        import_result = import_students(rows, batch, course_ids, is_v2_format, progress=report_progress)
+        detailed_results = import_result.detailed_results
+        students_for_notifications = import_result.students_for_notifications
 
         # Database upload completed - now queue notifications in background
-        current_app.logger.info("✅ Database upload phase completed successfully!")
+        current_app.logger.info(f"✅ Database upload phase completed: {import_result.registered}/{total_students} registered")
 
         # PHASE 2: QUEUE NOTIFICATIONS IN BACKGROUND
         current_app.logger.info("🚀 PHASE 2: Queueing notifications in background...")
@@ -984,47 +806,6 @@ def upload_students_to_batch():
             'message': 'Database upload completed! Queueing notifications in background...'
         }, room=str(user_id))
 
-        # Prepare students for notification queueing
-        students_for_notifications = []
-        for index, (row, student_result) in enumerate(zip(rows, detailed_results)):
-            if student_result['database_registered']:
-                # Extract student data for notifications
-                if is_v2_format:
-                    student_name = str(row.get('Student Name', '')).strip()
-                    roll_number = str(row.get('Roll Number', '')).strip()
-                    email = str(row.get('Email', '')).strip().lower() if row.get('Email') else ''
-                    mobile_number = str(row.get('Mobile Number', '')).strip()
-                else:
-                    student_name = str(row.get('Student Name', '')).strip()
-                    roll_number = str(row.get('Roll Number', '')).strip()
-                    email = str(row.get('Email', '')).strip().lower() if row.get('Email') else ''
-                    mobile_number = str(row.get('Mobile Number', '')).strip()
-
-                # Generate username and password (same logic as database registration)
-                username = roll_number
-                password = f"{student_name.split()[0][:4].lower()}{roll_number[-4:]}"
-
-                # Get user_id from the student_result or find it by username
-                user_id_for_student = None
-                try:
-                    # Try to find the user_id by username
-                    user_doc = mongo_db.users.find_one({'username': username})
-                    if user_doc:
-                        user_id_for_student = str(user_doc['_id'])
-                except Exception as e:
-                    current_app.logger.warning(f"Could not find user_id for username {username}: {e}")
-
-                student_data = {
-                    'name': student_name,
-                    'username': username,
-                    'password': password,
-                    'email': email if email and email.strip() else None,
-                    'mobile_number': mobile_number if mobile_number and mobile_number.strip() else None,
-                    'roll_number': roll_number,
-                    'user_id': user_id_for_student  # Add user_id for push notifications
-                }
-                students_for_notifications.append(student_data)
-
         # Create batch job for credentials notifications (same as test creation)
         if students_for_notifications:
             try:
@@ -1494,6 +1275,7 @@ def update_student(student_id):
             'mobile_number': mobile_number
         }
         mongo_db.users.update_one({'_id': student['user_id']}, {'$set': user_update})
+        invalidate_principal(student['user_id'])
 
         return jsonify({'success': True, 'message': 'Student updated successfully'}), 200
     except Exception as e:
@@ -1510,6 +1292,7 @@ def delete_student(student_id):
 
         # Also delete the associated user account
         mongo_db.users.delete_one({'_id': student['user_id']})
+        invalidate_principal(student['user_id'])
 
         return jsonify({'success': True, 'message': 'Student deleted successfully'}), 200
     except Exception as e:
@@ -1532,6 +1315,7 @@ def authorize_student_level(student_id):
             mongo_db.students.update_one({'_id': ObjectId(student_id)}, {'$set': {'authorized_levels': []}})
         # Add the level to authorized_levels
         result = mongo_db.students.update_one({'_id': ObjectId(student_id)}, {'$addToSet': {'authorized_levels': level}})
+        invalidate_principal(student['user_id'])
         student = mongo_db.students.find_one({'_id': ObjectId(student_id)})
         if result.modified_count == 0:
             return jsonify({'success': False, 'message': f"Level '{level}' was already authorized for student.", 'authorized_levels': student.get('authorized_levels', [])}), 200
@@ -1558,6 +1342,7 @@ def lock_student_level(student_id):
 
         # Remove level from authorized_levels
         mongo_db.students.update_one({'_id': student['_id']}, {'$pull': {'authorized_levels': level}})
+        invalidate_principal(student['user_id'])
         student = mongo_db.students.find_one({'_id': student['_id']})
 
         # Emit real-time event to the student
@@ -1662,6 +1447,7 @@ def authorize_student_module(student_id):
             return jsonify({'success': False, 'message': f'Error authorizing module: {str(pm_err)}'}), 500
 
         if success:
+            invalidate_principal(student['user_id'])
             # Emit real-time event to the student using socketio instance
             try:
                 socketio.emit('module_access_changed', {
@@ -1724,6 +1510,7 @@ def lock_student_module(student_id):
             )
         except Exception as e:
             current_app.logger.exception(f"Failed to pull string-authorized_levels: {e}")
+        invalidate_principal(student['user_id'])
 
         student = mongo_db.students.find_one({'_id': student['_id']})
 
@@ -2885,6 +2672,7 @@ def cleanup_failed_students(batch_id):
             if user and not student:
                 # Orphaned user account - delete it
                 mongo_db.users.delete_one({'_id': user['_id']})
+                invalidate_principal(user['_id'])
                 cleanup_results.append({
                     'email': email,
                     'action': 'deleted_orphaned_user',
@@ -2893,6 +2681,7 @@ def cleanup_failed_students(batch_id):
             elif student and not user:
                 # Orphaned student profile - delete it
                 mongo_db.students.delete_one({'_id': student['_id']})
+                invalidate_principal(student.get('user_id'))
                 cleanup_results.append({
                     'email': email,
                     'action': 'deleted_orphaned_student',
@@ -2927,6 +2716,7 @@ def delete_student_management(student_id):
         
         # Delete student profile
         mongo_db.students.delete_one({'user_id': ObjectId(student_id)})
+        invalidate_principal(student_id)
         
         return jsonify({'success': True, 'message': 'Student deleted successfully'}), 200
         
@@ -2991,6 +2781,7 @@ def bulk_delete_students():
                 
                 # Delete student profile
                 student_result = mongo_db.students.delete_one({'user_id': student_id})
+                invalidate_principal(student_id)
                 
                 if user_result.deleted_count > 0 or student_result.deleted_count > 0:
                     deleted_count += 1
@@ -3053,6 +2844,7 @@ def send_student_credentials(student_id):
             {'_id': ObjectId(student_id)},
             {'$set': {'password_hash': password_hash}}
         )
+        invalidate_principal(student_id)
         
         # Send email with credentials
         subject = "Your Study Edge Login Credentials"
@@ -3214,6 +3006,7 @@ def bulk_migrate_students_progress():
                     )
                     
                     if result.modified_count > 0:
+                        invalidate_principal(student.get('user_id'))
                         migrated_count += 1
                         
                         # Log the migration event
@@ -3309,6 +3102,7 @@ def download_student_credentials(student_id):
             {'_id': ObjectId(student_id)},
             {'$set': {'password_hash': password_hash}}
         )
+        invalidate_principal(student_id)
         
         # Create CSV content
         import csv
@@ -3415,6 +3209,7 @@ def download_all_filtered_students_credentials():
                 {'_id': student['_id']},
                 {'$set': {'password_hash': password_hash}}
             )
+            invalidate_principal(student['_id'])
             
             writer.writerow([
                 student.get('name', ''),
@@ -3502,6 +3297,7 @@ def send_batch_emails(batch_id):
                         {'_id': student['user_id']},
                         {'$set': {'password': generated_password}}
                     )
+                    invalidate_principal(student['user_id'])
                     password = generated_password
                 else:
                     password = existing_password
@@ -3629,6 +3425,7 @@ def send_batch_sms(batch_id):
                         {'_id': student['user_id']},
                         {'$set': {'password': generated_password}}
                     )
+                    invalidate_principal(student['user_id'])
                     password = generated_password
                 else:
                     password = existing_password
@@ -3648,71 +3445,54 @@ def send_batch_sms(batch_id):
         if total_students == 0:
             return jsonify({'success': False, 'message': 'No students with mobile numbers found in this batch'}), 400
 
-        # Create resilient services
-        resilient_services = create_resilient_services()
-        
-        # Track results
-        sms_results = []
-        successful_sms = 0
-        failed_sms = 0
-
-        # Send SMS with progress tracking
-        for index, student in enumerate(students_with_mobile):
-            student_name = student['name']
-            mobile_number = student['mobile_number']
-            username = student['username']
-            password = student['password']
-            
-            result = {
-                'student_id': student['student_id'],
-                'name': student_name,
-                'mobile_number': mobile_number,
-                'sms_sent': False,
-                'error': None
-            }
-            
-            try:
-                # Send SMS using resilient service
-                sms_result = resilient_services['sms'].send_sms_resilient(
-                    phone=mobile_number,
-                    student_name=student_name,
-                    username=username,
-                    password=password,
-                    login_url="https://crt.pydahsoft.in/login"
-                )
-                
-                result['sms_sent'] = sms_result.get('success', False)
-                if sms_result.get('success'):
-                    successful_sms += 1
-                    current_app.logger.info(f"✅ SMS sent to {mobile_number}")
-                else:
-                    failed_sms += 1
-                    result['error'] = sms_result.get('error', 'SMS sending failed after retries')
-                    current_app.logger.warning(f"⚠️ SMS failed for {mobile_number}: {result['error']}")
-                    
-            except Exception as e:
-                failed_sms += 1
-                result['error'] = str(e)
-                current_app.logger.error(f"❌ SMS error for {mobile_number}: {e}")
-            
-            sms_results.append(result)
-            
-            # Send progress update
-            percentage = int(((index + 1) / total_students) * 100)
+        # Credentials differ per student: one request each, sent concurrently
+        # through the pooled, rate-limited gateway
+        messages = [
+            SMSMessage(
+                phone=student['mobile_number'],
+                text=credentials_message(student['username'], student['password']),
+                sms_type='student_credentials',
+                reference={'student_id': student['student_id'], 'batch_id': batch_id}
+            )
+            for student in students_with_mobile
+        ]
+        processed = 0
+
+        def emit_progress(index, message, sms_result):
+            nonlocal processed
+            processed += 1
+            student = students_with_mobile[index]
+            if sms_result['success']:
+                current_app.logger.info(f"✅ SMS sent to {message.phone}")
+            else:
+                current_app.logger.warning(f"⚠️ SMS failed for {message.phone}: {sms_result.get('error')}")
             socketio.emit('sms_progress', {
                 'user_id': current_user_id,
                 'status': 'sending_sms',
                 'total': total_students,
-                'processed': index + 1,
-                'percentage': percentage,
-                'message': f'Sending SMS: {student_name} - {"✅" if result["sms_sent"] else "❌"}',
+                'processed': processed,
+                'percentage': int((processed / total_students) * 100),
+                'message': f'Sending SMS: {student["name"]} - {"✅" if sms_result["success"] else "❌"}',
                 'current_student': {
-                    'name': student_name,
-                    'mobile_number': mobile_number,
-                    'sms_sent': result['sms_sent']
+                    'name': student['name'],
+                    'mobile_number': message.phone,
+                    'sms_sent': sms_result['success']
                 }
             }, room=str(current_user_id))
 
+        sms_results = []
+        for student, sms_result in zip(students_with_mobile, sms_dispatcher.send_many(messages, progress=emit_progress)):
+            sms_results.append({
+                'student_id': student['student_id'],
+                'name': student['name'],
+                'mobile_number': student['mobile_number'],
+                'sms_sent': sms_result['success'],
+                'message_id': sms_result.get('messageId'),
+                'error': sms_result.get('error')
+            })
+        successful_sms = sum(1 for result in sms_results if result['sms_sent'])
+        failed_sms = total_students - successful_sms
+
         # Send completion notification
         socketio.emit('sms_progress', {
             'user_id': current_user_id,
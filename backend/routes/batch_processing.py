@@ -17,6 +17,7 @@ from utils.batch_processor import (
     stop_batch_processor
 )
 from utils.hosting_worker_manager import get_worker_health
+from utils.job_queue import embedded_worker_stats, job_queue
 from utils.test_student_selector import get_students_by_batch_course_combination, validate_test_assignment
 from routes.access_control import require_permission
 
@@ -270,3 +271,80 @@ def get_worker_health_status():
             'success': False,
             'message': f'Failed to get worker health: {str(e)}'
         }), 500
+
+@batch_processing_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+@require_permission(module='batch_management')
+def get_job_status(job_id):
+    """Get status of a durable background job (same answer from every worker)"""
+    try:
+        job = job_queue.get_job(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': 'Job not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': job
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error getting job status: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Failed to get job status: {str(e)}'
+        }), 500
+
+@batch_processing_bp.route('/jobs', methods=['GET'])
+@jwt_required()
+@require_permission(module='batch_management')
+def get_jobs_overview():
+    """Job counts per handler and status, with the most recent dead-lettered jobs"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        return jsonify({
+            'success': True,
+            'data': {
+                'counts': job_queue.counts(),
+                'dead': job_queue.dead_jobs(limit),
+                'embedded_worker': embedded_worker_stats()
+            }
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error getting jobs overview: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Failed to get jobs overview: {str(e)}'
+        }), 500
+
+@batch_processing_bp.route('/jobs/<job_id>/retry', methods=['POST'])
+@jwt_required()
+@require_permission(module='batch_management')
+def retry_dead_job(job_id):
+    """Requeue a dead-lettered job with a fresh set of attempts"""
+    try:
+        if not ObjectId.is_valid(job_id):
+            return jsonify({
+                'success': False,
+                'message': 'Invalid job id'
+            }), 400
+        if not job_queue.retry_job(job_id):
+            return jsonify({
+                'success': False,
+                'message': 'Job not found or not dead-lettered'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'message': 'Job requeued'
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error retrying job: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Failed to retry job: {str(e)}'
+        }), 500
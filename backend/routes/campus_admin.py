@@ -8,8 +8,11 @@ from services.org_data_source import (
     use_rds, read_only_response, resolve_user_college_id, resolve_user_course_id, org_meta,
 )
 from services.rds_org_service import rds_org, parse_course_id
+from utils.shared_cache import invalidate_on_write
+from utils.principal import invalidate_principal
 
 campus_admin_bp = Blueprint('campus_admin', __name__)
+invalidate_on_write(campus_admin_bp, 'org')
 
 @campus_admin_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
@@ -468,6 +471,7 @@ def edit_course(course_id):
             update_data['password_hash'] = password_hash
         if course and 'admin_id' in course:
             mongo_db.users.update_one({'_id': course['admin_id']}, {'$set': update_data})
+            invalidate_principal(course['admin_id'])
     return jsonify({'success': True, 'message': 'Course updated'}), 200
 
 @campus_admin_bp.route('/courses/<course_id>', methods=['DELETE'])
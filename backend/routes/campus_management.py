@@ -9,8 +9,10 @@ from config.shared import bcrypt
 from routes.access_control import require_permission
 from services.org_data_source import use_rds, read_only_response, resolve_campus_id
 from services.rds_org_service import rds_org
+from utils.shared_cache import invalidate_on_write
 
 campus_management_bp = Blueprint('campus_management', __name__)
+invalidate_on_write(campus_management_bp, 'org')
 
 @campus_management_bp.route('/', methods=['GET'])
 @jwt_required()
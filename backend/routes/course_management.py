@@ -10,8 +10,10 @@ from routes.access_control import require_permission
 from utils.email_service import send_email, render_template
 from services.org_data_source import use_rds, read_only_response, resolve_campus_id, resolve_course_id
 from services.rds_org_service import rds_org
+from utils.shared_cache import invalidate_on_write
 
 course_management_bp = Blueprint('course_management', __name__)
+invalidate_on_write(course_management_bp, 'org')
 
 @course_management_bp.route('/', methods=['GET'])
 @jwt_required()
@@ -973,11 +973,105 @@ def delete_form_submission(submission_id):
             "message": "Failed to delete form submission"
         }), 500
 
+FORM_EXPORT_STUDENT_COLUMNS = [
+    'Student Roll Number', 'Student Name', 'Student Campus', 'Student Course',
+    'Student Batch', 'Student Mobile', 'Student Email'
+]
+
+FORM_EXPORT_PAGE_SIZE = 500
+
+def _find_form_export_students(submissions):
+    """
+    Resolve the students for one page of submissions: exact roll numbers with a
+    single $in query, then the fuzzy/student_id fallbacks only for misses.
+    """
+    roll_numbers = {s.get('student_roll_number') for s in submissions if s.get('student_roll_number')}
+    by_roll = {}
+    if roll_numbers:
+        for student in mongo_db['students'].find({'roll_number': {'$in': list(roll_numbers)}}):
+            by_roll.setdefault(student.get('roll_number'), student)
+
+    students = []
+    for submission in submissions:
+        student_roll_number = submission.get('student_roll_number')
+        if not student_roll_number:
+            students.append(None)
+            continue
+        student = by_roll.get(student_roll_number)
+        if student is None:
+            try:
+                student = get_student_by_roll_number(student_roll_number)
+                by_roll[student_roll_number] = student
+            except Exception as e:
+                logger.warning(f"Error looking up student by roll number: {str(e)}")
+                # Fallback: try to find by student_id if available
+                student_id = submission.get('student_id')
+                if student_id:
+                    try:
+                        if isinstance(student_id, str):
+                            student_id = ObjectId(student_id)
+                        student = mongo_db['students'].find_one({'_id': student_id})
+                    except Exception as e2:
+                        logger.warning(f"Fallback student lookup also failed: {str(e2)}")
+        students.append(student)
+    return students
+
+def _form_export_row(submission, student, ctx, field_labels):
+    # Order: Roll Number, Name, Campus, Course, Batch, Mobile, Email, then form fields
+    row = {
+        'Student Roll Number': student.get('roll_number', 'Unknown') if student else 'Unknown',
+        'Student Name': student.get('name', 'Unknown') if student else 'Unknown',
+        'Student Campus': ctx.campus_name or 'Unknown',
+        'Student Course': ctx.course_name or 'Unknown',
+        'Student Batch': ctx.batch_name or 'Unknown',
+        'Student Mobile': student.get('mobile_number', 'Unknown') if student else 'Unknown',
+        'Student Email': student.get('email', 'Unknown') if student else 'Unknown'
+    }
+
+    # Process form responses (handle both 'responses' and 'form_responses' formats)
+    responses_data = submission.get('responses', []) or submission.get('form_responses', [])
+    for response in responses_data:
+        field_id = response.get('field_id')
+        value = response.get('value')
+        field_label = field_labels.get(field_id, field_id)
+
+        # Format value based on type
+        if isinstance(value, list):
+            row[field_label] = ', '.join(str(v) for v in value)
+        else:
+            row[field_label] = str(value) if value is not None else ''
+    return row
+
+def iter_form_export_rows(form, query):
+    """Yield export rows for a form's submissions, resolving students a page at a time."""
+    from services.student_enrichment import StudentEnricher
+
+    field_labels = {field['field_id']: field['label'] for field in form.get('fields', [])}
+    enricher = StudentEnricher()
+    cursor = mongo_db[FORM_SUBMISSIONS_COLLECTION].find(query).sort('submitted_at', -1).batch_size(FORM_EXPORT_PAGE_SIZE)
+
+    page = []
+    for submission in cursor:
+        page.append(submission)
+        if len(page) < FORM_EXPORT_PAGE_SIZE:
+            continue
+        students = _find_form_export_students(page)
+        for submission_doc, student, ctx in zip(page, students, enricher.contexts_for_students(students)):
+            yield _form_export_row(submission_doc, student, ctx, field_labels)
+        page = []
+    if page:
+        students = _find_form_export_students(page)
+        for submission_doc, student, ctx in zip(page, students, enricher.contexts_for_students(students)):
+            yield _form_export_row(submission_doc, student, ctx, field_labels)
+
 @form_submissions_bp.route('/admin/export/<form_id>', methods=['GET'])
 @jwt_required()
 @require_superadmin
 def export_form_submissions(form_id):
-    """Export form submissions to Excel/CSV"""
+    """
+    Export form submissions. Returns JSON rows by default; ``?format=csv`` or
+    ``?format=xlsx`` streams the file directly instead.
+    """
     try:
         if not ObjectId.is_valid(form_id):
             return jsonify({
@@ -1001,98 +1095,21 @@ def export_form_submissions(form_id):
             ],
             'status': 'submitted'
         }
-        print(f"🔍 Export query: {query}")
-        
-        submissions = list(mongo_db[FORM_SUBMISSIONS_COLLECTION].find(query).sort('submitted_at', -1))
-        print(f"📊 Found {len(submissions)} submissions for export")
-        
-        # Prepare export data
-        export_data = []
-        for submission in submissions:
-            # Get student details using roll_number (same logic as submission viewer)
-            student_roll_number = submission.get('student_roll_number')
-            student = None
-            student_name = 'Unknown'
-            student_email = 'Unknown'
-            student_roll = 'Unknown'
-            student_mobile = 'Unknown'
-            student_course = 'Unknown'
-            student_batch = 'Unknown'
-            student_campus = 'Unknown'
-            
-            if student_roll_number:
-                try:
-                    student = get_student_by_roll_number(student_roll_number)
-                    student_name = student.get('name', 'Unknown')
-                    student_email = student.get('email', 'Unknown')
-                    student_roll = student.get('roll_number', 'Unknown')
-                    student_mobile = student.get('mobile_number', 'Unknown')
-                    
-                    # Get course details
-                    course = mongo_db['courses'].find_one({'_id': student.get('course_id')})
-                    if course:
-                        student_course = course.get('name', 'Unknown')
-                    
-                    # Get batch details
-                    batch = mongo_db['batches'].find_one({'_id': student.get('batch_id')})
-                    if batch:
-                        student_batch = batch.get('name', 'Unknown')
-                    
-                    # Get campus details
-                    campus = mongo_db['campuses'].find_one({'_id': student.get('campus_id')})
-                    if campus:
-                        student_campus = campus.get('name', 'Unknown')
-                except Exception as e:
-                    print(f"❌ Error looking up student by roll number: {str(e)}")
-                    # Fallback: try to find by student_id if available
-                    student_id = submission.get('student_id')
-                    if student_id:
-                        try:
-                            if isinstance(student_id, str):
-                                student_id = ObjectId(student_id)
-                            student = mongo_db['students'].find_one({'_id': student_id})
-                            if student:
-                                student_name = student.get('name', 'Unknown')
-                                student_email = student.get('email', 'Unknown')
-                                student_roll = student.get('roll_number', 'Unknown')
-                                student_mobile = student.get('mobile_number', 'Unknown')
-                        except Exception as e2:
-                            print(f"❌ Fallback student lookup also failed: {str(e2)}")
-            
-            # Create row data with only essential student information and form fields
-            # Order: Roll Number, Name, Campus, Course, Batch, Mobile, Email, then form fields
-            row = {
-                'Student Roll Number': student_roll,
-                'Student Name': student_name,
-                'Student Campus': student_campus,
-                'Student Course': student_course,
-                'Student Batch': student_batch,
-                'Student Mobile': student_mobile,
-                'Student Email': student_email
-            }
-            
-            # Process form responses (handle both 'responses' and 'form_responses' formats)
-            responses_data = submission.get('responses', []) or submission.get('form_responses', [])
-            
-            # Add form field responses
-            for response in responses_data:
-                field_id = response.get('field_id')
-                value = response.get('value')
-                
-                # Find field label
-                field_label = field_id
-                for field in form['fields']:
-                    if field['field_id'] == field_id:
-                        field_label = field['label']
-                        break
-                
-                # Format value based on type
-                if isinstance(value, list):
-                    row[field_label] = ', '.join(str(v) for v in value)
-                else:
-                    row[field_label] = str(value) if value is not None else ''
-            
-            export_data.append(row)
+
+        export_format = request.args.get('format', 'json').lower()
+        if export_format in ('csv', 'xlsx'):
+            from utils.streaming_export import ExportSheet, csv_response, xlsx_response
+
+            # Fixed columns: the file is written before all submissions have been read
+            header = FORM_EXPORT_STUDENT_COLUMNS + [field['label'] for field in form.get('fields', [])]
+            rows = ([row.get(column, '') for column in header] for row in iter_form_export_rows(form, query))
+            filename = f"form_submissions_{form_id}.{export_format}"
+            if export_format == 'csv':
+                return csv_response(header, rows, filename)
+            return xlsx_response([ExportSheet('Submissions', header, rows, title=form.get('title'))], filename)
+
+        export_data = list(iter_form_export_rows(form, query))
+        logger.info(f"Exported {len(export_data)} submissions for form {form_id}")
         
         return jsonify({
             "success": True,
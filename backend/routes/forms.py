@@ -8,6 +8,7 @@ import re
 from config.database import DatabaseConfig
 from models_forms import Form, FormField, FormSettings, FORMS_COLLECTION, FORM_SUBMISSIONS_COLLECTION, FORM_TEMPLATES, FIELD_VALIDATION_RULES
 from routes.test_management import require_superadmin
+from utils.shared_cache import cached_view
 
 forms_bp = Blueprint('forms', __name__)
 mongo_db = DatabaseConfig.get_database()
@@ -119,6 +120,7 @@ def validate_field_value(field, value):
 @forms_bp.route('/templates', methods=['GET'])
 @jwt_required()
 @require_superadmin
+@cached_view('form_templates', ttl=3600)
 def get_form_templates():
     """Get all available form templates"""
     try:
@@ -138,6 +140,7 @@ def get_form_templates():
 @forms_bp.route('/templates/<template_type>', methods=['GET'])
 @jwt_required()
 @require_superadmin
+@cached_view('form_templates', ttl=3600)
 def get_form_template(template_type):
     """Get specific form template"""
     try:
@@ -6,7 +6,12 @@ Provides real-time performance metrics and system health
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from routes.access_control import require_permission
-from utils.async_processor import async_processor, db_pool, response_cache, get_all_background_tasks
+from utils.async_processor import async_processor, db_pool, get_all_background_tasks
+from utils.background_executor import background_executor
+from utils.metrics_aggregation import metrics_aggregator, register_provider, sum_numeric
+from utils.mongo_profiler import merge_profiles, mongo_profiler
+from utils.request_metrics import MetricsView, merge_timings
+from utils.shared_cache import shared_cache
 import time
 import psutil
 import threading
@@ -16,6 +21,116 @@ from datetime import datetime, timedelta
 logger = logging.getLogger(__name__)
 performance_bp = Blueprint('performance', __name__)
 
+
+def _process_counters():
+    process = psutil.Process()
+    memory = process.memory_info()
+    return {
+        'memory_rss': memory.rss,
+        'memory_vms': memory.vms,
+        'thread_count': threading.active_count(),
+    }
+
+
+def _async_counters():
+    return {
+        'max_workers': async_processor.max_workers,
+        'active_tasks': len(async_processor.running_tasks),
+        'background_tasks': len(get_all_background_tasks()),
+        'background_queue': background_executor.queued(),
+        'task_counter': async_processor.task_counter,
+    }
+
+
+def _db_pool_counters():
+    return {
+        'max_connections': db_pool.max_connections,
+        'active_connections': db_pool.connection_count,
+        'available_connections': db_pool.connections.qsize(),
+    }
+
+
+register_provider('process', _process_counters)
+register_provider('async_system', _async_counters)
+register_provider('database_pool', _db_pool_counters)
+
+
+def _background_task_metrics():
+    """Queue depth, throughput and wait/run latency per task type over every worker"""
+    snapshots = metrics_aggregator.collect('background_tasks')
+    live = [s for s in snapshots if s['live']]
+    types = {}
+    for s in snapshots:
+        for task_type, counters in s['data']['background_tasks'].get('types', {}).items():
+            entry = types.setdefault(task_type, {
+                'queued': 0, 'running': 0, 'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0
+            })
+            for key in ('submitted', 'completed', 'failed', 'rejected'):
+                entry[key] += counters.get(key, 0)
+            # Depth and running are gauges: live workers only
+            if s['live']:
+                entry['queued'] += counters.get('queued', 0)
+                entry['running'] += counters.get('running', 0)
+
+    for key in ('wait', 'run'):
+        merged = merge_timings(s['data']['background_tasks'].get(key, {}) for s in snapshots)
+        for (task_type,), (count, failures, total_time, histogram) in merged.items():
+            types.setdefault(task_type, {})[f'{key}_time'] = {
+                'avg': round(total_time / count, 6) if count else 0.0,
+                'max': round(histogram.max_us / 1_000_000, 6),
+                **histogram.percentiles(),
+            }
+
+    return {
+        'workers': len(live),
+        'queued': sum(s['data']['background_tasks'].get('queued', 0) for s in live),
+        'running': sum(s['data']['background_tasks'].get('running', 0) for s in live),
+        'types': types,
+    }
+
+
+def _cluster_metrics():
+    """Totals over every worker of the deployment, from the published snapshots"""
+    snapshots = metrics_aggregator.collect()
+    live = [s for s in snapshots if s['live']]
+    requests_view = MetricsView(s['data']['requests'] for s in snapshots if 'requests' in s['data'])
+    # Cumulative counters include retired workers; gauges only the live ones
+    cache = sum_numeric([s['data'].get('cache', {}).get('overall') for s in snapshots])
+    lookups = cache.get('hits', 0) + cache.get('redis_hits', 0) + cache.get('misses', 0)
+    now = time.time()
+    last_minute = requests_view.minute_totals(now - 60, now)
+    return {
+        'workers': [
+            {
+                'worker': s['worker'],
+                'pid': s['pid'],
+                'live': s['live'],
+                'started_at': s['started_at'],
+                'updated_at': s['updated_at'],
+                'memory_rss': s['data'].get('process', {}).get('memory_rss'),
+                'active_tasks': s['data'].get('async_system', {}).get('active_tasks'),
+            }
+            for s in snapshots
+        ],
+        'live_workers': len(live),
+        'process': sum_numeric([s['data'].get('process') for s in live]),
+        'async_system': sum_numeric([s['data'].get('async_system') for s in live]),
+        'database_pool': sum_numeric([s['data'].get('database_pool') for s in live]),
+        'login': sum_numeric([s['data'].get('login') for s in live]),
+        'cache': {
+            **cache,
+            'hit_rate': round((cache.get('hits', 0) + cache.get('redis_hits', 0)) / lookups * 100, 2) if lookups else 0.0,
+        },
+        'requests': {
+            'total': sum(bucket[0] for bucket in requests_view.minutes.values()),
+            'errors': sum(bucket[1] for bucket in requests_view.minutes.values()),
+            'last_minute': last_minute,
+            'latency': requests_view.overall.percentiles(),
+            'dropped': requests_view.dropped,
+        },
+        'aggregation': metrics_aggregator.stats(),
+    }
+
 @performance_bp.route('/metrics', methods=['GET'])
 @jwt_required()
 @require_permission(module='performance', action='view_metrics')
@@ -39,25 +154,17 @@ def get_performance_metrics():
         
         # Async system metrics
         background_tasks = get_all_background_tasks()
-        async_metrics = {
-            'max_workers': async_processor.max_workers,
-            'active_tasks': len(async_processor.running_tasks),
-            'background_tasks': len(background_tasks),
-            'task_counter': async_processor.task_counter
-        }
+        async_metrics = _async_counters()
         
         # Database pool metrics
-        db_metrics = {
-            'max_connections': db_pool.max_connections,
-            'active_connections': db_pool.connection_count,
-            'available_connections': db_pool.connections.qsize()
-        }
+        db_metrics = _db_pool_counters()
         
         # Cache metrics
+        cache_stats = shared_cache.stats()
         cache_metrics = {
-            'max_size': response_cache.max_size,
-            'current_size': len(response_cache.cache),
-            'hit_ratio': getattr(response_cache, 'hit_ratio', 0)
+            'max_size': cache_stats['memory']['max_entries'],
+            'current_size': cache_stats['memory']['entries'],
+            'hit_ratio': cache_stats['overall']['hit_rate']
         }
         
         # Thread metrics
@@ -92,6 +199,7 @@ def get_performance_metrics():
             'async_system': async_metrics,
             'database_pool': db_metrics,
             'cache': cache_metrics,
+            'cluster': _cluster_metrics(),
             'concurrency': {
                 'max_concurrent_users': async_processor.max_workers * 5000,
                 'current_load': len(async_processor.running_tasks),
@@ -151,11 +259,12 @@ def get_system_health():
         }
         
         # Check Cache
-        cache_health = 'healthy' if len(response_cache.cache) < response_cache.max_size else 'warning'
+        memory_cache = shared_cache.memory.stats()
+        cache_health = 'healthy' if memory_cache['bytes'] < memory_cache['max_bytes'] * 0.9 else 'warning'
         health_status['checks']['cache'] = {
             'status': cache_health,
-            'value': len(response_cache.cache),
-            'threshold': response_cache.max_size
+            'value': memory_cache['bytes'],
+            'threshold': memory_cache['max_bytes']
         }
         
         # Determine overall health
@@ -187,7 +296,7 @@ def optimize_system():
         
         # Clear cache
         try:
-            response_cache.clear()
+            shared_cache.clear()
             optimizations.append('Cache cleared')
         except Exception as e:
             logger.warning(f"Cache clear failed: {e}")
@@ -224,14 +333,13 @@ def optimize_system():
 @jwt_required()
 @require_permission(module='performance', action='view_cache')
 def get_cache_stats():
-    """Get cache statistics"""
+    """Get shared cache hit rates per namespace and tier utilization (this worker)"""
     try:
-        cache_stats = {
-            'size': len(response_cache.cache),
-            'max_size': response_cache.max_size,
-            'utilization_percent': (len(response_cache.cache) / response_cache.max_size) * 100,
-            'access_times': len(response_cache._access_times)
-        }
+        cache_stats = shared_cache.stats()
+        memory_cache = cache_stats['memory']
+        cache_stats['size'] = memory_cache['entries']
+        cache_stats['max_size'] = memory_cache['max_entries']
+        cache_stats['utilization_percent'] = (memory_cache['bytes'] / memory_cache['max_bytes']) * 100
         
         return jsonify({
             'success': True,
@@ -245,6 +353,26 @@ def get_cache_stats():
             'message': f'Failed to get cache stats: {str(e)}'
         }), 500
 
+@performance_bp.route('/login/stats', methods=['GET'])
+@jwt_required()
+@require_permission(module='performance', action='view_metrics')
+def get_login_stats():
+    """Get login verification pool, admission and queue-time statistics"""
+    try:
+        from services.password_verifier import password_verifier
+
+        return jsonify({
+            'success': True,
+            'data': password_verifier.stats()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting login stats: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Failed to get login stats: {str(e)}'
+        }), 500
+
 @performance_bp.route('/cache/clear', methods=['POST'])
 @jwt_required()
 @require_permission(module='performance', action='manage_cache')
@@ -252,13 +380,21 @@ def clear_cache():
     """Clear cache"""
     try:
         data = request.get_json() or {}
-        pattern = data.get('pattern', None)
+        tags = data.get('tags') or []
+        # 'pattern' is the namespace for older clients
+        namespace = data.get('namespace') or data.get('pattern')
         
-        response_cache.clear(pattern)
+        if tags:
+            removed = shared_cache.invalidate_tags(*tags)
+            message = f'Cache invalidated for tags: {", ".join(tags)}'
+        else:
+            removed = shared_cache.clear(namespace)
+            message = f'Cache cleared{" for namespace: " + namespace if namespace else ""}'
         
         return jsonify({
             'success': True,
-            'message': f'Cache cleared{" with pattern: " + pattern if pattern else ""}'
+            'message': message,
+            'removed': removed
         }), 200
         
     except Exception as e:
@@ -309,7 +445,9 @@ def get_background_tasks():
             'success': True,
             'data': {
                 'background_tasks': len(background_tasks),
-                'tasks': background_tasks
+                'tasks': background_tasks,
+                'executor': background_executor.stats(),
+                'cluster': _background_task_metrics()
             }
         }), 200
         
@@ -319,3 +457,71 @@ def get_background_tasks():
             'success': False,
             'message': f'Failed to get background tasks: {str(e)}'
         }), 500
+
+@performance_bp.route('/mongo/profile', methods=['GET'])
+@jwt_required()
+@require_permission(module='performance', action='view_metrics')
+def get_mongo_profile():
+    """Mongo query shapes of every worker ranked by cost, with slow commands and sampled plans"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        sort_by = request.args.get('sort', 'total_time')
+        if sort_by not in ('total_time', 'count', 'p95', 'p99', 'max_time', 'avg_time'):
+            return jsonify({'success': False, 'message': f'Unsupported sort: {sort_by}'}), 400
+        collection = request.args.get('collection')
+        collscan_only = request.args.get('collscan', 'false').lower() == 'true'
+
+        snapshots = metrics_aggregator.collect('mongo_profile')
+        profile = merge_profiles([s['data']['mongo_profile'] for s in snapshots])
+        shapes = [
+            shape for shape in profile['shapes'].values()
+            if (not collection or shape['collection'] == collection)
+            and (not collscan_only or (shape.get('explain') or {}).get('collscan'))
+        ]
+        shapes.sort(key=lambda shape: shape[sort_by], reverse=True)
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'workers': len(snapshots),
+                'slow_ms': mongo_profiler.slow_seconds * 1000,
+                'shapes': shapes[:limit],
+                'collscans': sum(1 for shape in profile['shapes'].values() if (shape.get('explain') or {}).get('collscan')),
+                'slow_commands': [
+                    entry for entry in profile['slow'] if not collection or entry['collection'] == collection
+                ][:limit]
+            }
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting Mongo profile: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Failed to get Mongo profile: {str(e)}'
+        }), 500
+
+@performance_bp.route('/mongo/profile/explain', methods=['POST'])
+@jwt_required()
+@require_permission(module='performance', action='optimize_system')
+def sample_mongo_explains():
+    """Explain the costliest shapes seen by this worker now instead of waiting for the sampler"""
+    try:
+        options = request.get_json(silent=True) or {}
+        top = min(int(options.get('top', 5)), 50)
+        results = mongo_profiler.sample_explains(top, force=bool(options.get('force', False)))
+        for result in results:
+            result.pop('histogram', None)
+        return jsonify({
+            'success': True,
+            'data': {
+                'explained': results,
+                'collscans': [result['shape_id'] for result in results if (result.get('explain') or {}).get('collscan')]
+            }
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error sampling Mongo explains: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Failed to sample Mongo explains: {str(e)}'
+        }), 500
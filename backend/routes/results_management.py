@@ -5,12 +5,14 @@ from datetime import datetime
 import pytz
 from mongo import mongo_db
 from routes.test_management import require_superadmin
+from utils.shared_cache import invalidates
 
 results_management_bp = Blueprint('results_management', __name__)
 
 @results_management_bp.route('/migrate-existing-tests', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('tests')
 def migrate_existing_tests():
     """Migrate existing online tests to have release fields"""
     try:
@@ -67,6 +69,7 @@ def migrate_existing_tests():
 
 @results_management_bp.route('/release/<test_id>', methods=['POST'])
 @jwt_required()
+@invalidates('tests')
 def release_test_results(test_id):
     """Release test results for students to view"""
     try:
@@ -130,6 +133,7 @@ def release_test_results(test_id):
 
 @results_management_bp.route('/unrelease/<test_id>', methods=['POST'])
 @jwt_required()
+@invalidates('tests')
 def unrelease_test_results(test_id):
     """Unrelease test results (hide from students)"""
     try:
@@ -238,6 +242,7 @@ def get_test_release_status(test_id):
 @results_management_bp.route('/bulk-release', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('tests')
 def bulk_release_test_results():
     """Release multiple test results at once"""
     try:
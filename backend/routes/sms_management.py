@@ -5,6 +5,8 @@ from datetime import datetime
 import logging
 
 from mongo import mongo_db
+from config.constants import ROLES
+from utils.principal import cached_user
 from utils.sms_service import (
     send_student_credentials_sms, 
     send_test_scheduled_sms, 
@@ -12,6 +14,7 @@ from utils.sms_service import (
     check_sms_balance,
     check_sms_configuration
 )
+from utils.sms_dispatcher import DELIVERY_PENDING, delivery_tracker
 from utils.test_reminder_system import (
     send_test_scheduled_notifications,
     send_test_reminder_notifications,
@@ -30,6 +33,19 @@ logger = logging.getLogger(__name__)
 
 sms_bp = Blueprint('sms_management', __name__)
 
+# Delivery records hold students' phone numbers and references
+DELIVERY_ADMIN_ROLES = {ROLES['SUPER_ADMIN'], 'sub_superadmin', ROLES['CAMPUS_ADMIN'], ROLES['COURSE_ADMIN']}
+
+def _delivery_access_denied():
+    """403 response unless the current user has an admin role, else None"""
+    user = cached_user(get_jwt_identity())
+    if not user or user.get('role') not in DELIVERY_ADMIN_ROLES:
+        return jsonify({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }), 403
+    return None
+
 @sms_bp.route('/send-student-credentials', methods=['POST'])
 @jwt_required()
 def send_student_credentials():
@@ -350,3 +366,90 @@ def start_reminder_system_endpoint():
             'message': 'Internal server error',
             'error': str(e)
         }), 500
+
+@sms_bp.route('/delivery/<message_id>', methods=['GET'])
+@jwt_required()
+def get_sms_delivery(message_id):
+    """Delivery state of a sent SMS; pending messages are checked with the gateway"""
+    try:
+        denied = _delivery_access_denied()
+        if denied:
+            return denied
+        
+        records = delivery_tracker.get(message_id)
+        if not records:
+            return jsonify({
+                'success': False,
+                'message': 'SMS not found'
+            }), 404
+        
+        if any(record['status'] == DELIVERY_PENDING for record in records):
+            records = delivery_tracker.refresh_message(message_id)
+        
+        return jsonify({
+            'success': True,
+            'data': records
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting SMS delivery status: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error',
+            'error': str(e)
+        }), 500
+
+@sms_bp.route('/delivery', methods=['GET'])
+@jwt_required()
+def get_sms_delivery_summary():
+    """SMS counts per type and delivery state, plus the most recent messages"""
+    try:
+        denied = _delivery_access_denied()
+        if denied:
+            return denied
+        
+        status = request.args.get('status')
+        limit = min(int(request.args.get('limit', 50)), 500)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'summary': delivery_tracker.summary(),
+                'recent': delivery_tracker.recent(limit=limit, status=status)
+            }
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting SMS delivery summary: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error',
+            'error': str(e)
+        }), 500
+
+@sms_bp.route('/delivery/refresh', methods=['POST'])
+@jwt_required()
+def refresh_sms_delivery():
+    """Check the delivery state of pending SMS with the gateway"""
+    try:
+        denied = _delivery_access_denied()
+        if denied:
+            return denied
+        
+        data = request.get_json(silent=True) or {}
+        limit = min(int(data.get('limit', 200)), 1000)
+        
+        result = delivery_tracker.refresh(limit=limit, min_age_seconds=int(data.get('min_age_seconds', 60)))
+        
+        return jsonify({
+            'success': True,
+            'data': result
+        })
+        
+    except Exception as e:
+        logger.error(f"Error refreshing SMS delivery status: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error',
+            'error': str(e)
+        }), 500
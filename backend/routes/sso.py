@@ -20,6 +20,7 @@ from flask_jwt_extended import create_access_token, create_refresh_token
 import jwt as pyjwt  # PyJWT — already installed as a flask-jwt-extended dependency
 
 from mongo import mongo_db
+from utils.principal import role_claims
 
 sso_bp = Blueprint('sso', __name__)
 
@@ -201,7 +202,7 @@ def sso_exchange():
 
         # ── 5. Issue our own tokens ──────────────────────────────────────────
         user_id_str   = str(user['_id'])
-        access_token  = create_access_token(identity=user_id_str)
+        access_token  = create_access_token(identity=user_id_str, additional_claims=role_claims(user))
         refresh_token = create_refresh_token(identity=user_id_str)
         user_info     = _build_user_info(user)
 
@@ -9,6 +9,12 @@ from datetime import datetime
 import pytz
 from utils.async_processor import async_route, performance_monitor, submit_background_task, cached_async_result
 from utils.date_formatter import format_date_to_ist
+from services.grading_engine import get_answer_key, grade_answers
+from services.shuffle_service import get_shuffle_plan
+from services import progress_rollups
+from services.student_identity import stamp_student_oid, student_oid
+from utils.principal import cached_student, cached_user, invalidate_principal
+from services import test_catalog
 import os
 
 from config.aws_config import (
@@ -338,6 +344,8 @@ def update_student_profile():
                 {'$set': student_update_data}
             )
         
+        invalidate_principal(current_user_id)
+        
         return jsonify({'success': True, 'message': 'Profile updated successfully'}), 200
 
     except Exception as e:
@@ -384,7 +392,7 @@ def dashboard():
     """Student dashboard"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'student':
             return jsonify({
@@ -427,7 +435,7 @@ def get_student_tests():
     """Get tests available for the logged-in student based on their batch-course instance"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.users.find_one({'_id': ObjectId(current_user_id)})
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'student':
             return jsonify({'success': False, 'message': 'Access denied'}), 403
@@ -437,12 +445,8 @@ def get_student_tests():
         category = request.args.get('category')
         subcategory = request.args.get('subcategory')
         
-        # Debug: Log the requested module
-        current_app.logger.info(f"STUDENT TESTS REQUEST: Module={module}, Category={category}, Subcategory={subcategory}")
-        current_app.logger.info(f"STUDENT TESTS REQUEST: Current user ID={current_user_id}")
-
         # Get student's record (may or may not have batch_course_instance_id yet)
-        student = mongo_db.students.find_one({'user_id': ObjectId(current_user_id)})
+        student = cached_student(current_user_id)
         # If no student profile, return empty list gracefully
         if not student:
             current_app.logger.warning(f"Student profile not found for user {current_user_id}")
@@ -450,253 +454,28 @@ def get_student_tests():
             
         instance_id = student.get('batch_course_instance_id')
         
-        # Debug student assignment information
-        current_app.logger.info(f"Student {current_user_id} assignment info:")
-        current_app.logger.info(f"  - Campus ID: {student.get('campus_id')}")
-        current_app.logger.info(f"  - Course ID: {student.get('course_id')}")
-        current_app.logger.info(f"  - Batch ID: {student.get('batch_id')}")
-        current_app.logger.info(f"  - Instance ID: {instance_id}")
-        
-        # Build base query filter
-        # Prefer explicit practice tests and handle different active flags
-        active_clause = {
-            '$or': [
-                { 'status': 'active' },
-                { 'is_active': True },
-                { 'status': { '$exists': False }, 'is_active': { '$exists': False } }
-            ]
-        }
-        query_filter = {
-            '$and': [
-                { 'test_type': 'practice' },
-                active_clause
-            ]
-        }
-        
-        # Add module filter if provided
-        if module:
-            query_filter['$and'].append({ 'module_id': module })
-            
-        # Add category filter if provided
-        if category:
-            query_filter['$and'].append({ 'test_category': category })
-            
-        # Add subcategory filter if provided
-        if subcategory:
-            query_filter['$and'].append({ 'subcategory': subcategory })
-
-        # Audience filter: match by instance OR student's campus/course/batch OR explicit assignment
-        # For practice tests, be more lenient with access control
-        audience_or = []
-        
-        # Always include tests with no specific audience restrictions (global practice tests)
-        audience_or.append({ 
-            '$and': [
-                { 'campus_ids': { '$exists': False } },
-                { 'course_ids': { '$exists': False } },
-                { 'batch_ids': { '$exists': False } },
-                { 'assigned_student_ids': { '$exists': False } },
-                { 'batch_course_instance_ids': { '$exists': False } }
-            ]
-        })
-        
-        if instance_id:
-            audience_or.append({ 'batch_course_instance_ids': { '$in': [instance_id] } })
-        if student:
-            campus_id = student.get('campus_id')
-            course_id = student.get('course_id')
-            batch_id = student.get('batch_id')
-            if campus_id:
-                audience_or.append({ 'campus_ids': { '$in': [campus_id] } })
-            if course_id:
-                audience_or.append({ 'course_ids': { '$in': [course_id] } })
-            if batch_id:
-                audience_or.append({ 'batch_ids': { '$in': [batch_id] } })
-            # Some tests may use explicit assigned_student_ids with either student _id or user _id
-            if student.get('_id'):
-                audience_or.append({ 'assigned_student_ids': { '$in': [student['_id']] } })
-            audience_or.append({ 'assigned_student_ids': { '$in': [ObjectId(current_user_id)] } })
-
-        # For practice tests, use OR logic to be more inclusive
-        if audience_or:
-            query_filter['$and'].append({ '$or': audience_or })
-            current_app.logger.info(f"Applied audience filters: {len(audience_or)} conditions")
-        else:
-            # No audience context available (e.g., student not assigned yet and no campus/course/batch)
-            # Return empty list instead of 404
-            current_app.logger.warning("No audience filters available - returning empty list")
-            return jsonify({'success': True, 'data': []}), 200
-            
-        # Debug the final query filter
-        current_app.logger.info(f"Final query filter: {query_filter}")
-
-        # Get tests according to filters
-        tests = list(mongo_db.tests.find(query_filter))
-        
-        # Debug: Show what tests were found with audience filters
-        current_app.logger.info(f"Tests found with audience filters: {len(tests)}")
-        if tests:
-            for t in tests:
-                current_app.logger.info(f"  Found test: {t.get('name')} - Module: {t.get('module_id')} - Type: {t.get('test_type')}")
-        
-        # Special case: For LISTENING module, fetch tests independently to avoid mixing with other modules
+        # Listening tests are not audience-restricted; every other module resolves
+        # the shared per-audience catalog plus this student's explicit assignments
         if module == 'LISTENING':
-            current_app.logger.info("LISTENING MODULE: Fetching tests independently...")
-            
-            # Get level parameter for listening module
             level = request.args.get('level', 'beginner').lower()
-            current_app.logger.info(f"LISTENING MODULE: Requested level: {level}")
-            
-            # For listening module, use a direct approach without audience filters to ensure access
-            # First try to find tests with the specific level
-            listening_query = {
-                'test_type': 'practice',
-                'module_id': 'LISTENING',
-                '$or': [
-                    { 'status': 'active' },
-                    { 'is_active': True },
-                    { 'status': { '$exists': False }, 'is_active': { '$exists': False } }
-                ]
-            }
-            
-            # Add level filter if level is specified
-            if level and level != 'beginner':  # 'beginner' is default, so don't filter for it
-                listening_query['level'] = level
-            
-            # Get listening tests for the specific level
-            listening_tests = list(mongo_db.tests.find(listening_query))
-            current_app.logger.info(f"Found {len(listening_tests)} listening tests for level '{level}'")
-            
-            # If no tests found for specific level, try to find any listening tests
-            if not listening_tests:
-                current_app.logger.info(f"No tests found for level '{level}', trying broader search...")
-                broader_query = {
-                    'test_type': 'practice',
-                    'module_id': 'LISTENING',
-                    '$or': [
-                        { 'status': 'active' },
-                        { 'is_active': True },
-                        { 'status': { '$exists': False }, 'is_active': { '$exists': False } }
-                    ]
-                }
-                listening_tests = list(mongo_db.tests.find(broader_query))
-                current_app.logger.info(f"Found {len(listening_tests)} listening tests with broader search")
-                
-                # If still no tests, try to find tests without level specification
-                if not listening_tests:
-                    current_app.logger.info("No tests found with broader search, trying without level filter...")
-                    no_level_query = {
-                        'test_type': 'practice',
-                        'module_id': 'LISTENING',
-                        '$or': [
-                            { 'status': 'active' },
-                            { 'is_active': True },
-                            { 'status': { '$exists': False }, 'is_active': { '$exists': False } }
-                        ]
-                    }
-                    listening_tests = list(mongo_db.tests.find(no_level_query))
-                    current_app.logger.info(f"Found {len(listening_tests)} listening tests without level filter")
-            
-            # Replace the tests list with only listening tests
-            tests = listening_tests
-            
-            # Log details of found tests
-            for t in listening_tests:
-                current_app.logger.info(f"  Listening test: {t.get('name')} - Level: {t.get('level', 'unknown')} - Status: {t.get('status', 'unknown')} - Active: {t.get('is_active', 'unknown')} - Questions: {len(t.get('questions', []))}")
-            
-            current_app.logger.info(f"LISTENING MODULE: Using {len(tests)} tests for level '{level}'")
-        
-        # For other modules, ensure they only get their specific tests
-        elif module and module != 'LISTENING':
-            current_app.logger.info(f"{module} MODULE: Filtering tests for specific module...")
-            # Filter tests to only include the requested module
-            module_tests = [t for t in tests if t.get('module_id') == module]
-            tests = module_tests
-            current_app.logger.info(f"{module} MODULE: Using {len(tests)} tests for this module")
-        
-        # Debug: Log test counts by module
-        if module:
-            current_app.logger.info(f"Final test list for {module} module: {len(tests)} tests")
-            for t in tests:
-                current_app.logger.info(f"  Final test: {t.get('name')} - Module: {t.get('module_id')} - Questions: {len(t.get('questions', []))}")
-            
-            # Additional debugging for listening module access
-            if module == 'LISTENING' and len(tests) == 0:
-                current_app.logger.warning("LISTENING MODULE: No tests found - checking database directly...")
-                # Check if there are any listening tests at all
-                all_listening_tests = list(mongo_db.tests.find({
-                    'module_id': 'LISTENING',
-                    'test_type': 'practice'
-                }))
-                current_app.logger.info(f"Database has {len(all_listening_tests)} total listening practice tests")
-                for t in all_listening_tests:
-                    current_app.logger.info(f"  Available test: {t.get('name')} - Status: {t.get('status', 'unknown')} - Active: {t.get('is_active', 'unknown')}")
+            tests = test_catalog.listening_tests(level)
+        else:
+            tests = test_catalog.visible_practice_tests(student, current_user_id, module, category, subcategory)
         
-        # Debug: Show final tests before processing
-        current_app.logger.info(f"Processing {len(tests)} tests for final output")
-        for t in tests:
-            current_app.logger.info(f"  Processing test: {t.get('name')} - Module: {t.get('module_id')} - Type: {t.get('test_type')}")
+        summaries = test_catalog.student_attempt_summaries(
+            current_user_id, [t['_id'] for t in tests], instance_id
+        )
+        # Get total number of tests for this module/subcategory
+        total_tests = 1  # Default to 1 for individual tests
+        if module and subcategory:
+            try:
+                total_tests = test_catalog.practice_test_count(module, subcategory)
+            except Exception as e:
+                current_app.logger.warning(f"Error counting total tests for {module}/{subcategory}: {e}")
         
         test_list = []
         for test in tests:
-            # Check if student has already attempted this test
-            existing_attempt = mongo_db.student_test_attempts.find_one({
-                'test_id': test['_id'],
-                'student_id': ObjectId(current_user_id),
-                # instance may be missing; include it only if present to avoid over-filtering
-                **({ 'batch_course_instance_id': instance_id } if instance_id else {})
-            })
-            
-            # Get completion count and highest score for this test
-            highest_score = 0
-            completed_count = 0
-            # Try both possible collections for historical results
-            try:
-                attempts_primary = list(mongo_db.test_results.find({
-                    'test_id': test['_id'],
-                    'student_id': ObjectId(current_user_id)
-                }))
-            except Exception:
-                attempts_primary = []
-            try:
-                attempts_alt = list(mongo_db.student_test_attempts.find({
-                    'test_id': test['_id'],
-                    'student_id': ObjectId(current_user_id)
-                }))
-            except Exception:
-                attempts_alt = []
-            all_attempts = (attempts_primary or []) + (attempts_alt or [])
-            current_app.logger.info(f"Test {test['_id']}: Found {len(attempts_primary)} attempts in test_results, {len(attempts_alt)} attempts in student_test_attempts")
-            if all_attempts:
-                # Count all attempts (not just completed ones)
-                completed_count = len(all_attempts)
-                
-                # Find highest score from all attempts
-                for attempt in all_attempts:
-                    score = attempt.get('score_percentage', 0)
-                    if score == 0:
-                        avg_score = attempt.get('average_score', 0)
-                        if avg_score > 0:
-                            score = avg_score * 100  # Convert from 0-1 to 0-100 scale
-                    if score > highest_score:
-                        highest_score = score
-                current_app.logger.info(f"Test {test['_id']}: Calculated highest_score = {highest_score}, completed_count = {completed_count}")
-            else:
-                current_app.logger.info(f"Test {test['_id']}: No attempts found")
-            
-            # Get total number of tests for this module/subcategory
-            total_tests = 1  # Default to 1 for individual tests
-            if module and subcategory:
-                try:
-                    total_tests = mongo_db.tests.count_documents({
-                        'module_id': module,
-                        'subcategory': subcategory,
-                        'test_type': 'practice'
-                    })
-                except Exception as e:
-                    current_app.logger.warning(f"Error counting total tests for {module}/{subcategory}: {e}")
-                    total_tests = 1
-            
+            summary = summaries[test['_id']]
             test_list.append({
                 '_id': str(test['_id']),
                 'name': test['name'],
@@ -706,21 +485,20 @@ def get_student_tests():
                 'instructions': test.get('instructions', ''),
                 'start_date': safe_isoformat(test.get('start_date')),
                 'end_date': safe_isoformat(test.get('end_date')),
-                'has_attempted': existing_attempt is not None,
-                'attempt_id': str(existing_attempt['_id']) if existing_attempt else None,
-                'highest_score': highest_score,
-                'completed_count': completed_count,
+                'has_attempted': summary['attempt_id'] is not None,
+                'attempt_id': str(summary['attempt_id']) if summary['attempt_id'] else None,
+                'highest_score': summary['highest_score'],
+                'completed_count': summary['completed_count'],
                 'total_tests': total_tests
             })
         
         # Convert any remaining ObjectId fields to strings for JSON serialization
         convert_objectids_to_strings(test_list)
         
-        # Final debug: Show what tests are being returned
-        current_app.logger.info(f"Final test list contains {len(test_list)} tests")
-        if test_list:
-            for t in test_list:
-                current_app.logger.info(f"  Returning test: {t.get('name')} - ID: {t.get('_id')}")
+        current_app.logger.debug(
+            f"Student tests for {current_user_id}: module={module} category={category} "
+            f"subcategory={subcategory} -> {len(test_list)} tests"
+        )
         
         return jsonify({'success': True, 'data': test_list}), 200
     except Exception as e:
@@ -733,13 +511,13 @@ def start_test(test_id):
     """Start a test for the student"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.users.find_one({'_id': ObjectId(current_user_id)})
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'student':
             return jsonify({'success': False, 'message': 'Access denied'}), 403
         
         # Get student profile
-        student = mongo_db.students.find_one({'user_id': ObjectId(current_user_id)})
+        student = cached_student(current_user_id)
         if not student:
             return jsonify({'success': False, 'message': 'Student profile not found'}), 404
         
@@ -855,7 +633,7 @@ def start_test(test_id):
             attempt_doc['batch_course_instance_id'] = student.get('batch_course_instance_id')
         
         current_app.logger.info(f"Creating test attempt with document: {attempt_doc}")
-        attempt_id = mongo_db.student_test_attempts.insert_one(attempt_doc).inserted_id
+        attempt_id = mongo_db.student_test_attempts.insert_one(stamp_student_oid(attempt_doc, current_user_id)).inserted_id
         current_app.logger.info(f"Successfully created attempt with ID: {attempt_id}")
         
         return jsonify({
@@ -881,7 +659,7 @@ def submit_test(test_id):
     """Submit test answers and calculate score"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.users.find_one({'_id': ObjectId(current_user_id)})
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'student':
             return jsonify({'success': False, 'message': 'Access denied'}), 403
@@ -895,7 +673,7 @@ def submit_test(test_id):
             return jsonify({'success': False, 'message': 'Attempt ID is required'}), 400
         
         # Get student profile
-        student = mongo_db.students.find_one({'user_id': ObjectId(current_user_id)})
+        student = cached_student(current_user_id)
         if not student:
             return jsonify({'success': False, 'message': 'Student profile not found'}), 404
         
@@ -932,111 +710,14 @@ def submit_test(test_id):
         if attempt['status'] == 'completed':
             return jsonify({'success': False, 'message': 'Test already submitted'}), 409
         
-        # Calculate score properly
-        score = 0
-        total_questions = len(test.get('questions', []))
-        correct_answers = 0
-        detailed_results = []
-        
-        current_app.logger.info(f"Calculating score for {total_questions} questions")
-        current_app.logger.info(f"Student answers: {answers}")
-        
-        # Process each question and calculate score
-        total_max_score = 0  # For technical tests with variable scoring
-        for i, question in enumerate(test.get('questions', [])):
-            question_id = str(question.get('_id', i))
-            student_answer = answers.get(question_id, '')
-            question_type = question.get('question_type', 'mcq')  # Get question type
-            
-            # Debug logging for compiler questions
-            if question_type in ['compiler', 'technical']:
-                current_app.logger.info(f"Question {i} (type: {question_type}): question_id={question_id}, found_answer={bool(student_answer)}, answer_keys_in_request={list(answers.keys())[:5]}")
-            
-            # Handle different question types
-            if question_type in ['compiler', 'technical'] and isinstance(student_answer, dict):
-                # Compiler/Technical question with pre-calculated results
-                if student_answer.get('results'):
-                    # Use pre-calculated scores from frontend
-                    result_data = student_answer['results']
-                    question_score = result_data.get('total_score', 0)
-                    question_max_score = result_data.get('max_score', 1)
-                    question_percentage = (question_score / question_max_score * 100) if question_max_score > 0 else 0
-                    
-                    total_max_score += question_max_score
-                    score += question_score
-                    
-                    if question_percentage == 100:
-                        correct_answers += 1
-                    
-                    # Get question title/text for compiler questions
-                    question_text = question.get('questionTitle') or question.get('question', '')
-                    
-                    detailed_results.append({
-                        'question_index': i,
-                        'question_id': question_id,
-                        'question': question_text,
-                        'question_type': 'compiler',
-                        'student_answer': student_answer.get('code', ''),
-                        'language': student_answer.get('language', ''),
-                        'is_correct': question_percentage == 100,
-                        'score': question_score,
-                        'max_score': question_max_score,
-                        'percentage': question_percentage,
-                        'test_results': result_data.get('test_results', [])
-                    })
-                else:
-                    # No results provided, count as wrong
-                    question_text = question.get('questionTitle') or question.get('question', '')
-                    detailed_results.append({
-                        'question_index': i,
-                        'question_id': question_id,
-                        'question': question_text,
-                        'question_type': 'compiler',
-                        'student_answer': student_answer.get('code', '') if isinstance(student_answer, dict) else '',
-                        'language': student_answer.get('language', '') if isinstance(student_answer, dict) else '',
-                        'is_correct': False,
-                        'score': 0,
-                        'max_score': 0,
-                        'percentage': 0
-                    })
-                    
-            else:
-                # MCQ question - traditional scoring
-                correct_answer_letter = question.get('answer', '')  # A, B, C, or D
-                correct_answer_text = ''
-                
-                # Map answer letter to actual option text 
-                if correct_answer_letter == 'A':
-                    correct_answer_text = question.get('optionA', '')
-                elif correct_answer_letter == 'B':
-                    correct_answer_text = question.get('optionB', '')
-                elif correct_answer_letter == 'C':
-                    correct_answer_text = question.get('optionC', '')
-                elif correct_answer_letter == 'D':
-                    correct_answer_text = question.get('optionD', '')
-                
-                # Check if student answer matches correct answer text
-                is_correct = student_answer == correct_answer_text
-                
-                if is_correct:
-                    correct_answers += 1
-                    score += 1
-                
-                total_max_score += 1
-                
-                current_app.logger.info(f"Question {i}: student='{student_answer}', correct='{correct_answer_text}', is_correct={is_correct}")
-                
-                detailed_results.append({
-                    'question_index': i,
-                    'question_id': question_id,
-                    'question': question.get('question', ''),
-                    'question_type': 'mcq',
-                    'student_answer': student_answer,
-                    'correct_answer_letter': correct_answer_letter,
-                    'correct_answer_text': correct_answer_text,
-                    'is_correct': is_correct,
-                    'score': 1 if is_correct else 0
-                })
+        # Grade against the test's compiled answer key (shared across submissions)
+        answer_key = get_answer_key(test)
+        total_questions = len(answer_key.entries)
+        graded = grade_answers(answer_key, answers if isinstance(answers, dict) else {})
+        score = graded['score']
+        total_max_score = graded['total_max_score']
+        correct_answers = graded['correct_answers']
+        detailed_results = graded['detailed_results']
         
         # Calculate percentage based on actual scoring system
         if total_max_score > 0:
@@ -1087,6 +768,7 @@ def submit_test(test_id):
             {'_id': ObjectId(attempt_id)},
             {'$set': update_data}
         )
+        progress_rollups.record_attempt(ObjectId(attempt_id), test)
         
         # Save to test_results collection with proper format
         try:
@@ -1125,23 +807,9 @@ def submit_test(test_id):
                     correct_answer_letter = result.get('correct_answer_letter', '')
                     
                     # Find which option letter corresponds to the student's text answer
-                    question_obj = None
-                    for q in test.get('questions', []):
-                        if str(q.get('_id', '')) == question_id:
-                            question_obj = q
-                            break
-                    
-                    if question_obj:
-                        student_answer_text = result.get('student_answer', '')
-                        # Map student answer text back to option letter
-                        if student_answer_text == question_obj.get('optionA', ''):
-                            student_answer_letter = 'A'
-                        elif student_answer_text == question_obj.get('optionB', ''):
-                            student_answer_letter = 'B'
-                        elif student_answer_text == question_obj.get('optionC', ''):
-                            student_answer_letter = 'C'
-                        elif student_answer_text == question_obj.get('optionD', ''):
-                            student_answer_letter = 'D'
+                    key_entry = answer_key.get(question_id)
+                    if key_entry:
+                        student_answer_letter = key_entry.letter_for(result.get('student_answer', ''))
                     
                     results_for_test_results.append({
                         'question_id': question_id,
@@ -1185,7 +853,7 @@ def submit_test(test_id):
                 test_result_doc['max_score'] = {'$numberDouble': str(float(total_max_score))}
             
             # Insert into test_results collection
-            mongo_db.test_results.insert_one(test_result_doc)
+            mongo_db.test_results.insert_one(stamp_student_oid(test_result_doc, current_user_id))
             current_app.logger.info(f"Successfully saved test result to test_results collection for test {test_id}")
             
         except Exception as e:
@@ -1224,63 +892,10 @@ def get_grammar_progress():
              return jsonify({'success': True, 'data': []}), 200
 
         ordered_categories = list(GRAMMAR_CATEGORIES.keys())
-        scores_by_subcategory = {}
-        
+
         try:
-            # Get results from both collections
-            all_results = []
-            
-            # Check test_results collection
-            db = get_db()
-            if db is not None and 'test_results' in db.list_collection_names():
-                test_results = list(db.test_results.find({
-                    'student_id': ObjectId(current_user_id),
-                    'module_id': 'GRAMMAR'
-                }))
-                all_results.extend(test_results)
-                current_app.logger.info(f"Found {len(test_results)} grammar results in test_results collection")
-            
-            # Check student_test_attempts collection
-            if db is not None and 'student_test_attempts' in db.list_collection_names():
-                attempt_results = list(mongo_db.student_test_attempts.find({
-                    'student_id': current_user_id,
-                    'test_type': 'practice'
-                }))
-                
-                # Filter for grammar tests
-                for attempt in attempt_results:
-                    test = mongo_db.tests.find_one({'_id': attempt.get('test_id')})
-                    if test and test.get('module_id') == 'GRAMMAR':
-                        # Convert attempt to match test_results format
-                        attempt_result = {
-                            'subcategory': test.get('subcategory'),
-                            'average_score': attempt.get('average_score', 0) or attempt.get('score_percentage', 0)
-                        }
-                        all_results.append(attempt_result)
-                
-                current_app.logger.info(f"Found {len(attempt_results)} total attempts, filtered for grammar")
-
-            for result in all_results:
-                if not isinstance(result, dict):
-                    logging.warning(f"Skipping non-dict item in test results for user {current_user_id}: {result}")
-                    continue
-
-                try:
-                    subcategory = result.get('subcategory')
-                    score_val = result.get('average_score')
-
-                    if subcategory and subcategory in GRAMMAR_CATEGORIES:
-                        score = float(score_val)
-                        # Convert from 0-1 scale to 0-100 scale for consistency
-                        if score <= 1.0:
-                            score = score * 100
-                        
-                        current_max_score = scores_by_subcategory.get(subcategory, -1.0)
-                        if score > current_max_score:
-                            scores_by_subcategory[subcategory] = score
-                except (ValueError, TypeError, AttributeError) as e:
-                    logging.warning(f"Skipping malformed test result for user {current_user_id}. Error: {e}. Result: {result}")
-                    continue
+            rollup = progress_rollups.get_rollup(current_user_id)
+            scores_by_subcategory = progress_rollups.best_subcategory_scores(rollup, 'GRAMMAR')
         except Exception as db_error:
              current_app.logger.error(f"Database error fetching grammar progress for user {current_user_id}: {db_error}", exc_info=True)
              # Return empty progress instead of error
@@ -1314,13 +929,13 @@ def get_student_random_test_assignment(test_id):
     """Get student's specific test assignment with randomized questions"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.users.find_one({'_id': ObjectId(current_user_id)})
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'student':
             return jsonify({'success': False, 'message': 'Access denied'}), 403
         
         # Get student's batch-course instance
-        student = mongo_db.students.find_one({'user_id': ObjectId(current_user_id)})
+        student = cached_student(current_user_id)
         if not student or not student.get('batch_course_instance_id'):
             return jsonify({'success': False, 'message': 'Student not assigned to any batch-course instance'}), 404
         
@@ -1407,7 +1022,7 @@ def submit_random_test(test_id):
     """Submit test with randomized questions and calculate score"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.users.find_one({'_id': ObjectId(current_user_id)})
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'student':
             return jsonify({'success': False, 'message': 'Access denied'}), 403
@@ -1567,7 +1182,7 @@ def submit_random_test(test_id):
             }
             
             # Insert into test_results collection
-            mongo_db.test_results.insert_one(test_result_doc)
+            mongo_db.test_results.insert_one(stamp_student_oid(test_result_doc, current_user_id))
             current_app.logger.info(f"Successfully saved random test result to test_results collection for test {test_id}")
             
         except Exception as e:
@@ -1596,13 +1211,13 @@ def get_online_exams():
     """Get available online exams for a student."""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.users.find_one({'_id': ObjectId(current_user_id)})
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'student':
             return jsonify({'success': False, 'message': 'Access denied'}), 403
 
         # Get student's record to access batch information
-        student = mongo_db.students.find_one({'user_id': ObjectId(current_user_id)})
+        student = cached_student(current_user_id)
         if not student:
             current_app.logger.warning(f"Student profile not found for user {current_user_id}")
             return jsonify({'success': True, 'data': []}), 200
@@ -1682,7 +1297,7 @@ def get_single_test(test_id):
     """Get full details for a single test for a student to take. Supports both MongoDB _id and custom test_id."""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.users.find_one({'_id': ObjectId(current_user_id)})
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'student':
             return jsonify({'success': False, 'message': 'Access denied'}), 403
@@ -1726,46 +1341,18 @@ def get_single_test(test_id):
         convert_objectids_to_strings(test)
 
         # --- PROCESS QUESTIONS ---
-        import random
         if 'questions' in test and isinstance(test['questions'], list):
-            # Use consistent shuffling for all modules (same as practice tests)
-            test_id_str = str(test['_id'])
-            random.seed(hash(test_id_str) % 1000000)  # Use test ID as seed for consistent order
-            random.shuffle(test['questions'])
-            random.seed()  # Reset seed to prevent affecting other operations
-            current_app.logger.info(f"Questions shuffled with consistent seed for test: {test_id_str}")
-            
-            # Log the shuffled order for debugging
-            for idx, q in enumerate(test['questions']):
-                current_app.logger.info(f"Shuffled question {idx + 1}: {q.get('question_id', q.get('_id'))} - {q.get('question', q.get('sentence', ''))[:50]}...")
+            # Per-student deterministic order; submit_practice_test replays the same plan
+            plan = get_shuffle_plan(test['_id'], current_user_id, test['questions'])
 
             processed_questions = []
-            shuffled_questions = []  # Store shuffled questions for validation
             public_origin = _request_public_origin()
 
-            for idx, q in enumerate(test['questions']):
+            for idx, original_idx, q in plan.iter_questions(test['questions']):
                 current_app.logger.info(f"Processing question {idx + 1}: {q.get('question_type', 'unknown')}")
                 
                 if q.get('question_type') == 'mcq':
-                    # Build options dict from optionA...optionD
-                    options = {}
-                    answer_letter = q.get('answer')  # e.g. "C"
-
-                    for opt_key in ['A', 'B', 'C', 'D']:
-                        opt_field = f"option{opt_key}"
-                        if q.get(opt_field) is not None:
-                            options[opt_key] = q[opt_field]
-
-                    # Shuffle options
-                    items = list(options.items())
-                    random.shuffle(items)
-
-                    new_options = {}
-                    answer_map = {}
-                    for new_idx, (old_key, value) in enumerate(items):
-                        new_key = chr(ord('A') + new_idx)
-                        new_options[new_key] = value
-                        answer_map[old_key] = new_key
+                    new_options, _ = plan.mcq_options(q, original_idx)
 
                     # Build clean question dict for frontend
                     clean_q = {
@@ -1774,18 +1361,9 @@ def get_single_test(test_id):
                         "question_type": q.get('question_type'),
                         "instructions": q.get('instructions', ''),
                         "options": new_options,
-                        # keep correct_answer internally for validation, but don't expose to student
-                        "correct_answer": answer_map.get(answer_letter)
                     }
 
                     processed_questions.append(clean_q)
-                    
-                    # Store shuffled question data for validation
-                    shuffled_q = q.copy()
-                    shuffled_q['shuffled_options'] = new_options
-                    shuffled_q['answer_mapping'] = answer_map
-                    shuffled_q['shuffled_answer'] = answer_map.get(answer_letter)
-                    shuffled_questions.append(shuffled_q)
 
                 elif q.get('question_type') in ['compiler', 'technical', 'compiler_integrated']:
                     # Handle compiler/technical questions with test cases
@@ -1800,11 +1378,6 @@ def get_single_test(test_id):
                         "test_cases": q.get('test_cases', q.get('testCases', []))
                     }
                     processed_questions.append(clean_q)
-                    
-                    # Store shuffled question data for validation
-                    shuffled_q = q.copy()
-                    shuffled_questions.append(shuffled_q)
-                    current_app.logger.info(f"Processed compiler question: {clean_q['question'][:50]}...")
 
                 elif q.get('question_type') in ['sentence', 'listening', 'speaking']:
                     # Handle listening/speaking questions with proper audio support
@@ -1937,11 +1510,6 @@ def get_single_test(test_id):
                             current_app.logger.warning(f"Audio missing for {q.get('question_type')} question - using text fallback")
                     
                     processed_questions.append(clean_q)
-                    current_app.logger.info(f"Processed {q.get('question_type')} question: {clean_q['question'][:50]}...")
-                    
-                    # Store shuffled question data for validation (non-MCQ)
-                    shuffled_q = q.copy()
-                    shuffled_questions.append(shuffled_q)
 
                 else:
                     # Non-MCQ questions
@@ -1952,19 +1520,9 @@ def get_single_test(test_id):
                         "instructions": q.get('instructions', '')
                     }
                     processed_questions.append(clean_q)
-                    
-                    # Store shuffled question data for validation (non-MCQ)
-                    shuffled_q = q.copy()
-                    shuffled_questions.append(shuffled_q)
 
             test['questions'] = processed_questions
-            test['shuffled_questions'] = shuffled_questions  # Store shuffled questions for validation
             current_app.logger.info(f"Successfully processed {len(processed_questions)} questions")
-
-            # Remove correct_answer before sending response
-            for q in test['questions']:
-                if 'correct_answer' in q:
-                    del q['correct_answer']
         else:
             current_app.logger.warning(f"No questions found in test {test_id} or questions is not a list")
             test['questions'] = []
@@ -1982,21 +1540,17 @@ def get_test_history():
     """Get student's test history with detailed results from student_test_attempts"""
     try:
         current_user_id = get_jwt_identity()
+        user_oid = student_oid(current_user_id)
         
         # Get all attempts from student_test_attempts collection
         all_attempts = []
         
         try:
-            if hasattr(mongo_db, 'student_test_attempts'):
+            if hasattr(mongo_db, 'student_test_attempts') and user_oid is not None:
                 pipeline = [
                     {
                         '$match': {
-                            '$or': [
-                                {'student_id': ObjectId(current_user_id)},
-                                {'student_id': current_user_id},
-                                {'user_id': ObjectId(current_user_id)},
-                                {'user_id': current_user_id}
-                            ],
+                            'student_oid': user_oid,
                             'status': 'completed'  # Only get completed attempts
                         }
                     },
@@ -2364,9 +1918,9 @@ def get_grammar_detailed_results():
     try:
         current_user_id = get_jwt_identity()
         
-        # Convert to ObjectId safely
+        # Reject malformed user ids
         try:
-            user_object_id = safe_object_id_conversion(current_user_id)
+            safe_object_id_conversion(current_user_id)
         except ValueError as e:
             return jsonify({'success': False, 'message': str(e)}), 400
         
@@ -2494,9 +2048,9 @@ def get_vocabulary_detailed_results():
     try:
         current_user_id = get_jwt_identity()
         
-        # Convert to ObjectId safely
+        # Reject malformed user ids
         try:
-            user_object_id = safe_object_id_conversion(current_user_id)
+            safe_object_id_conversion(current_user_id)
         except ValueError as e:
             return jsonify({'success': False, 'message': str(e)}), 400
         
@@ -2624,136 +2178,48 @@ def get_progress_summary():
     try:
         current_user_id = get_jwt_identity()
         
-        # Convert to ObjectId safely
+        # Reject malformed user ids
         try:
-            user_object_id = safe_object_id_conversion(current_user_id)
+            safe_object_id_conversion(current_user_id)
         except ValueError as e:
             return jsonify({'success': False, 'message': str(e)}), 400
         
-        # Get progress from student_test_attempts collection (primary source)
-        total_results = 0
-        module_stats = []
-        
         try:
-            db = get_db()
-            if db is not None and 'student_test_attempts' in db.list_collection_names():
-                # Count total practice attempts
-                total_results = db.student_test_attempts.count_documents({
-                    'student_id': current_user_id,
-                    'test_type': 'practice'
-                })
-                
-                # Aggregate module statistics
-                pipeline = [
-                    {
-                        '$match': {
-                            'student_id': current_user_id,
-                            'test_type': 'practice'
-                        }
-                    },
-                    {
-                        '$lookup': {
-                            'from': 'tests',
-                            'localField': 'test_id',
-                            'foreignField': '_id',
-                            'as': 'test_details'
-                        }
-                    },
-                    {'$unwind': '$test_details'},
-                    {
-                        '$group': {
-                            '_id': '$test_details.module_id',
-                            'module_name': { '$first': '$test_details.module_id' },
-                            'total_attempts': { '$sum': 1 },
-                            'highest_score': { 
-                                '$max': {
-                                    '$cond': [
-                                        {'$gt': ['$score_percentage', 0]},
-                                        '$score_percentage',
-                                        {'$multiply': ['$average_score', 100]}
-                                    ]
-                                }
-                            },
-                            'average_score': { 
-                                '$avg': {
-                                    '$cond': [
-                                        {'$gt': ['$score_percentage', 0]},
-                                        '$score_percentage',
-                                        {'$multiply': ['$average_score', 100]}
-                                    ]
-                                }
-                            },
-                            'total_questions': { '$sum': '$total_questions' },
-                            'total_correct': { '$sum': '$correct_answers' },
-                            'last_attempt': { '$max': '$submitted_at' }
-                        }
-                    },
-                    {
-                        '$sort': { 'module_name': 1 }
-                    }
-                ]
-                
-                module_stats = list(db.student_test_attempts.aggregate(pipeline))
-                current_app.logger.info(f"Found {len(module_stats)} modules in student_test_attempts collection")
-            else:
-                current_app.logger.warning("student_test_attempts collection not found")
+            rollup = progress_rollups.get_rollup(current_user_id)
         except Exception as e:
-            current_app.logger.error(f"Error aggregating from student_test_attempts: {e}")
+            current_app.logger.error(f"Error reading progress rollup: {e}")
             return jsonify({'success': False, 'message': 'Failed to fetch progress data'}), 500
-        
-        # Process module statistics
-        for stat in module_stats:
-            from config.constants import MODULES
-            stat['module_display_name'] = MODULES.get(stat['module_name'], 'Unknown')
-            stat['accuracy'] = (stat['total_correct'] / stat['total_questions'] * 100) if stat['total_questions'] > 0 else 0
-            stat['last_attempt'] = safe_isoformat(stat['last_attempt']) if stat['last_attempt'] else None
-            stat['progress_percentage'] = min(100, stat['highest_score'] or 0)
-            # Convert ObjectId in _id to string if present
-            if isinstance(stat.get('_id'), ObjectId):
-                stat['_id'] = str(stat['_id'])
-        
-        # Get recent activity from student_test_attempts collection only
-        recent_activity = []
-        
-        try:
-            if db is not None and 'student_test_attempts' in db.list_collection_names():
-                recent_activity = list(db.student_test_attempts.find({
-                    'student_id': current_user_id,
-                    'test_type': 'practice'
-                }).sort('submitted_at', -1).limit(10))
-                
-                # Process recent activity
-                processed_activities = []
-                for activity in recent_activity:
-                    try:
-                        if not isinstance(activity, dict):
-                            continue
-                            
-                        processed_activity = {
-                            '_id': str(activity.get('_id', '')),
-                            'submitted_at': safe_isoformat(activity.get('submitted_at')),
-                            'average_score': activity.get('score_percentage', 0) or (activity.get('average_score', 0) * 100),
-                            'test_name': activity.get('test_name', 'Unknown Test')
-                        }
-                        
-                        # Convert any ObjectId fields to string
-                        for k, v in processed_activity.items():
-                            if isinstance(v, ObjectId):
-                                processed_activity[k] = str(v)
-                        
-                        processed_activities.append(processed_activity)
-                    except Exception as e:
-                        current_app.logger.warning(f"Error processing activity item: {e}")
-                        continue
-                
-                recent_activity = processed_activities
-                current_app.logger.info(f"Found {len(recent_activity)} recent activities")
-            else:
-                current_app.logger.warning("student_test_attempts collection not found for recent activity")
-        except Exception as e:
-            current_app.logger.error(f"Error fetching recent activity: {e}")
-            recent_activity = []
-        
+
+        total_results = progress_rollups.total_attempts(rollup, ['practice'])
+
+        module_stats = []
+        for module_id, stats in sorted(progress_rollups.module_stats(rollup, 'practice').items()):
+            highest_score = stats.get('best_score', 0)
+            total_questions = stats.get('total_questions', 0)
+            module_stats.append({
+                '_id': module_id,
+                'module_name': module_id,
+                'module_display_name': MODULES.get(module_id, 'Unknown'),
+                'total_attempts': stats.get('attempts', 0),
+                'highest_score': highest_score,
+                'average_score': progress_rollups.average(stats),
+                'total_questions': total_questions,
+                'total_correct': stats.get('correct_answers', 0),
+                'accuracy': (stats.get('correct_answers', 0) / total_questions * 100) if total_questions > 0 else 0,
+                'last_attempt': safe_isoformat(stats.get('last_attempt')),
+                'progress_percentage': min(100, highest_score or 0)
+            })
+
+        recent_activity = [
+            {
+                '_id': activity.get('attempt_id'),
+                'submitted_at': safe_isoformat(activity.get('submitted_at')),
+                'average_score': activity.get('score', 0),
+                'test_name': activity.get('test_name', 'Unknown Test')
+            }
+            for activity in progress_rollups.recent_activity(rollup, 'practice')
+        ]
+
         summary = {
             'total_practice_tests': total_results,
             'modules': module_stats,
@@ -2779,128 +2245,47 @@ def get_practice_tests_summary():
     try:
         current_user_id = get_jwt_identity()
         
-        # Convert to ObjectId safely
+        # Reject malformed user ids
         try:
-            user_object_id = safe_object_id_conversion(current_user_id)
+            safe_object_id_conversion(current_user_id)
         except ValueError as e:
             return jsonify({'success': False, 'message': str(e)}), 400
         
         # Get practice tests grouped by module type
         practice_tests = {}
-        
+
         try:
-            db = get_db()
-            if db is not None and 'student_test_attempts' in db.list_collection_names():
-                pipeline = [
-                    {
-                        '$match': {
-                            '$or': [
-                                {'student_id': current_user_id},
-                                {'student_id': user_object_id},
-                                {'user_id': current_user_id},
-                                {'user_id': user_object_id}
-                            ],
-                            'test_type': 'practice'
-                        }
-                    },
-                    {
-                        '$lookup': {
-                            'from': 'tests',
-                            'localField': 'test_id',
-                            'foreignField': '_id',
-                            'as': 'test_details'
-                        }
-                    },
-                    {'$unwind': '$test_details'},
-                    {
-                        '$group': {
-                            '_id': {
-                                'test_id': '$test_id',
-                                'test_name': '$test_details.name',
-                                'module_id': '$test_details.module_id',
-                                'subcategory': '$test_details.subcategory',
-                                'level_id': '$test_details.level_id'
-                            },
-                            'total_attempts': { '$sum': 1 },
-                            'highest_score': { 
-                                '$max': {
-                                    '$cond': [
-                                        {'$gt': ['$score_percentage', 0]},
-                                        '$score_percentage',
-                                        {'$multiply': ['$average_score', 100]}
-                                    ]
-                                }
-                            },
-                            'average_score': { 
-                                '$avg': {
-                                    '$cond': [
-                                        {'$gt': ['$score_percentage', 0]},
-                                        '$score_percentage',
-                                        {'$multiply': ['$average_score', 100]}
-                                    ]
-                                }
-                            },
-                            'last_attempt': { '$max': '$submitted_at' },
-                            'attempts': {
-                                '$push': {
-                                    'attempt_id': '$_id',
-                                    'score': {
-                                        '$cond': [
-                                            {'$gt': ['$score_percentage', 0]},
-                                            '$score_percentage',
-                                            {'$multiply': ['$average_score', 100]}
-                                        ]
-                                    },
-                                    'submitted_at': '$submitted_at',
-                                    'time_taken': '$time_taken',
-                                    'correct_answers': '$correct_answers',
-                                    'total_questions': '$total_questions'
-                                }
-                            }
-                        }
-                    },
-                    {
-                        '$sort': { 'last_attempt': -1 }
-                    }
-                ]
-                
-                results = list(db.student_test_attempts.aggregate(pipeline))
-                current_app.logger.info(f"Found {len(results)} practice tests with attempts")
-                
-                # Group by module type
-                for result in results:
-                    module_id = result['_id']['module_id']
-                    if module_id not in practice_tests:
-                        practice_tests[module_id] = []
-                    
-                    # Process the result
-                    test_data = {
-                        'test_id': str(result['_id']['test_id']),
-                        'test_name': result['_id']['test_name'],
-                        'module_id': module_id,
-                        'subcategory': result['_id'].get('subcategory'),
-                        'level_id': result['_id'].get('level_id'),
-                        'total_attempts': result['total_attempts'],
-                        'highest_score': result['highest_score'],
-                        'average_score': result['average_score'],
-                        'last_attempt': safe_isoformat(result['last_attempt']),
-                        'attempts': result['attempts']
-                    }
-                    
-                    # Convert attempt IDs to strings
-                    for attempt in test_data['attempts']:
-                        attempt['attempt_id'] = str(attempt['attempt_id'])
-                        attempt['submitted_at'] = safe_isoformat(attempt['submitted_at'])
-                    
-                    practice_tests[module_id].append(test_data)
-                
-                current_app.logger.info(f"Grouped practice tests: {list(practice_tests.keys())}")
-            else:
-                current_app.logger.warning("student_test_attempts collection not found")
+            rollup = progress_rollups.get_rollup(current_user_id)
         except Exception as e:
             current_app.logger.error(f"Error fetching practice tests summary: {e}")
             return jsonify({'success': False, 'message': 'Failed to fetch practice tests summary'}), 500
-        
+
+        for test in progress_rollups.tests_for(rollup, 'practice'):
+            module_id = test.get('module_id')
+            practice_tests.setdefault(module_id, []).append({
+                'test_id': test.get('test_id'),
+                'test_name': test.get('test_name'),
+                'module_id': module_id,
+                'subcategory': test.get('subcategory'),
+                'level_id': test.get('level_id'),
+                'total_attempts': test.get('attempts', 0),
+                'highest_score': test.get('best_score', 0),
+                'average_score': progress_rollups.average(test),
+                'last_attempt': safe_isoformat(test.get('last_attempt')),
+                # Latest attempts only; /practice-test-attempts/<test_id> lists them all
+                'attempts': [
+                    {
+                        'attempt_id': attempt.get('attempt_id'),
+                        'score': attempt.get('score', 0),
+                        'submitted_at': safe_isoformat(attempt.get('submitted_at')),
+                        'time_taken': attempt.get('time_taken'),
+                        'correct_answers': attempt.get('correct_answers'),
+                        'total_questions': attempt.get('total_questions')
+                    }
+                    for attempt in test.get('recent_attempts', [])
+                ]
+            })
+
         return jsonify({
             'success': True,
             'data': practice_tests
@@ -2929,14 +2314,9 @@ def get_practice_test_attempts(test_id):
             if db is not None and 'student_test_attempts' in db.list_collection_names():
                 # Get all attempts for this test by this student
                 attempts = list(db.student_test_attempts.find({
-                    '$or': [
-                        {'student_id': current_user_id},
-                        {'student_id': user_object_id},
-                        {'user_id': current_user_id},
-                        {'user_id': user_object_id}
-                    ],
-                    'test_id': test_object_id,
-                    'test_type': 'practice'
+                    'student_oid': user_object_id,
+                    'test_type': 'practice',
+                    'test_id': test_object_id
                 }).sort('submitted_at', -1))
                 
                 # Get test details
@@ -3009,12 +2389,7 @@ def get_practice_attempt_details(attempt_id):
                 # Get the attempt
                 attempt = db.student_test_attempts.find_one({
                     '_id': attempt_object_id,
-                    '$or': [
-                        {'student_id': current_user_id},
-                        {'student_id': user_object_id},
-                        {'user_id': current_user_id},
-                        {'user_id': user_object_id}
-                    ],
+                    'student_oid': user_object_id,
                     'test_type': 'practice'
                 })
                 
@@ -3210,6 +2585,8 @@ def assign_student_to_instance():
         {'$set': {'batch_course_instance_id': ObjectId(batch_course_instance_id)}}
     )
     if result.modified_count == 1:
+        student = mongo_db.students.find_one({'_id': ObjectId(student_id)}, {'user_id': 1})
+        invalidate_principal(student.get('user_id') if student else None)
         return jsonify({'success': True, 'message': 'Student assigned to batch-course instance'}), 200
     else:
         return jsonify({'success': False, 'message': 'Student not found or not updated'}), 404 
@@ -3220,12 +2597,12 @@ def get_completed_exams():
     """Get list of completed exam IDs for the student (Mongo _id and custom test_id strings)."""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.users.find_one({'_id': ObjectId(current_user_id)})
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'student':
             return jsonify({'success': False, 'message': 'Access denied'}), 403
 
-        student = mongo_db.students.find_one({'user_id': ObjectId(current_user_id)})
+        student = cached_student(current_user_id)
         if not student:
             student = mongo_db.students.find_one({'_id': ObjectId(current_user_id)})
         if not student:
@@ -3287,6 +2664,7 @@ def get_unlocked_modules():
     try:
         from config.constants import MODULES, LEVELS
         current_user_id = get_jwt_identity()
+        # Read fresh: unlocks written by another worker must show up immediately
         student = mongo_db.students.find_one({'user_id': ObjectId(current_user_id)})
         
         if not student:
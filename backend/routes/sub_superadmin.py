@@ -10,6 +10,7 @@ from datetime import datetime
 from mongo import mongo_db
 from models import SubSuperadmin, SubRole
 from routes.access_control import require_permission
+from utils.principal import invalidate_principal
 
 sub_superadmin_bp = Blueprint('sub_superadmin', __name__)
 
@@ -574,6 +575,8 @@ def update_sub_superadmin(user_id):
             {'$set': update_data}
         )
         
+        invalidate_principal(user_id)
+        
         if result.modified_count > 0 or result.matched_count > 0:
             current_app.logger.info(f"Sub-superadmin updated: {user_id} by {current_user_id}")
             return jsonify({
@@ -759,6 +762,8 @@ def update_user_permissions(user_id):
             }
         )
         
+        invalidate_principal(user_id)
+        
         if result.modified_count > 0 or result.matched_count > 0:
             current_app.logger.info(f"Permissions updated for user {user_id} by {current_user_id}")
             return jsonify({
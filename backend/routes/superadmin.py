@@ -5,6 +5,7 @@ import bcrypt
 import csv
 import io
 import json
+import os
 import pandas as pd
 from mongo import mongo_db
 from config.aws_config import get_s3_client_safe, S3_BUCKET_NAME
@@ -13,6 +14,15 @@ from utils.question_bank_text import normalize_question_bank_text, bank_text_key
 from datetime import datetime, timedelta
 from routes.test_management import require_superadmin
 from models import Test
+from services.student_enrichment import StudentEnricher
+from services.export_jobs import export_builder, start_export_job, get_export_job, serialize_job
+from services.progress_rollups import record_attempt
+from services.student_identity import student_oid
+from utils.principal import cached_user, invalidate_principal
+from utils.shared_cache import invalidates
+from utils.streaming_export import (
+    CSV_MIMETYPE, XLSX_MIMETYPE, ExportSheet, csv_response, iter_csv, iter_file, write_xlsx, xlsx_response
+)
 
 superadmin_bp = Blueprint('superadmin', __name__)
 
@@ -55,7 +65,7 @@ def dashboard():
     """Super admin dashboard overview"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         # Debug logging
         current_app.logger.info(f"Dashboard access attempt - User ID: {current_user_id}")
@@ -165,7 +175,7 @@ def debug_roles():
     """Debug endpoint to check user roles"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         # Get all unique roles in the database
         all_roles = mongo_db.users.distinct('role')
@@ -196,7 +206,7 @@ def create_user():
     """Create a new user"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -263,7 +273,7 @@ def get_users():
     """Get all users"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -303,11 +313,12 @@ def get_users():
 
 @superadmin_bp.route('/tests', methods=['POST'])
 @jwt_required()
+@invalidates('tests')
 def create_test():
     """Create a new test"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'superadmin':
             return jsonify({
@@ -357,7 +368,7 @@ def get_tests():
     """Get all tests with pagination"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'superadmin':
             return jsonify({
@@ -429,7 +440,7 @@ def create_online_exam():
     """Create a new online exam"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') != 'superadmin':
             return jsonify({
@@ -480,7 +491,7 @@ def get_student_practice_results():
     """Get detailed practice results for all students"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -753,7 +764,7 @@ def get_student_online_results():
     """Get detailed online exam results for all students"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -1024,7 +1035,7 @@ def get_grammar_analytics():
     """Get detailed grammar practice analytics"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -1099,7 +1110,7 @@ def get_vocabulary_analytics():
     """Get detailed vocabulary practice analytics"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -1174,7 +1185,7 @@ def get_practice_overview():
     """Get overview of all practice module usage"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -1328,7 +1339,7 @@ def get_student_modules():
     """Get all available practice modules for a student (by email or roll number, admin roles only)."""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         allowed_roles = ['super_admin', 'campus_admin', 'course_admin']
         if not user or user.get('role') not in allowed_roles:
             return jsonify({'success': False, 'message': 'Access denied. Admin privileges required.'}), 403
@@ -1363,7 +1374,7 @@ def get_student_modules():
 def upload_module_to_batch_course(batch_id, course_id):
     # Only admin roles
     current_user_id = get_jwt_identity()
-    user = mongo_db.find_user_by_id(current_user_id)
+    user = cached_user(current_user_id)
     if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
         return jsonify({'success': False, 'message': 'Access denied. Admin privileges required.'}), 403
     # Find or create batch_course_instance
@@ -1381,7 +1392,7 @@ def upload_module_to_batch_course(batch_id, course_id):
 def get_module_results_by_instance(instance_id):
     # Only admin roles
     current_user_id = get_jwt_identity()
-    user = mongo_db.find_user_by_id(current_user_id)
+    user = cached_user(current_user_id)
     if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
         return jsonify({'success': False, 'message': 'Access denied. Admin privileges required.'}), 403
     # Fetch results for this batch_course_instance_id
@@ -1404,11 +1415,12 @@ def get_or_create_batch_course_instance():
 @superadmin_bp.route('/writing-upload', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def writing_upload():
     """Upload writing paragraphs with validation"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -1562,11 +1574,12 @@ def writing_upload():
 
 @superadmin_bp.route('/sentence-upload', methods=['POST'])
 @jwt_required()
+@invalidates('question_bank')
 def sentence_upload():
     """Upload sentences for listening and speaking modules with audio support"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -1819,7 +1832,7 @@ def get_student_attempts(student_id, test_id):
     """Get detailed attempts for a specific student and test"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user:
             return jsonify({
@@ -1847,34 +1860,28 @@ def get_student_attempts(student_id, test_id):
                 'message': 'Student not found'
             }), 404
         
-        # Get both student _id and user_id for flexible matching
-        student_doc_id = student['_id']
-        student_user_id = student.get('user_id')
+        # Attempts are keyed by the student's user id (student_oid); a profile
+        # without a usable user_id falls back to the legacy students._id key
+        student_user_id = student_oid(student.get('user_id'))
+        if student_user_id is not None:
+            identity_filter = {'student_oid': student_user_id}
+        else:
+            identity_filter = {'student_id': {'$in': [student['_id'], str(student['_id'])]}}
         
         # Find attempts using the same logic as test-attempts endpoint
         attempt = mongo_db.student_test_attempts.find_one({
-            'test_id': test_object_id,
+            **identity_filter,
             'test_type': 'online',
             'status': 'completed',
-            '$or': [
-                {'student_id': student_doc_id},
-                {'student_id': student_user_id},
-                {'user_id': student_doc_id},
-                {'user_id': student_user_id}
-            ]
+            'test_id': test_object_id
             })
         
         if not attempt:
             # Try without status filter (for attempts that weren't properly marked as completed)
             attempt = mongo_db.student_test_attempts.find_one({
-                'test_id': test_object_id,
+                **identity_filter,
                 'test_type': 'online',
-                '$or': [
-                    {'student_id': student_doc_id},
-                    {'student_id': student_user_id},
-                    {'user_id': student_doc_id},
-                    {'user_id': student_user_id}
-                ]
+                'test_id': test_object_id
             })
         
         # If we found an attempt but it doesn't have status='completed', 
@@ -1888,6 +1895,7 @@ def get_student_attempts(student_id, test_id):
                     {'$set': {'status': 'completed'}}
                 )
                 attempt['status'] = 'completed'
+                record_attempt(attempt)
                 current_app.logger.info(f"Updated attempt {attempt['_id']} status to 'completed'")
         
         current_app.logger.info(f"Looking for student attempt: student_id={student_id}, test_id={test_id}")
@@ -2017,13 +2025,185 @@ def get_student_attempts(student_id, test_id):
             'error': str(e)
         }), 500
 
+TEST_ATTEMPT_EXPORT_HEADERS = [
+    'Student Name', 'Student Email', 'Roll Number', 'Mobile Number',
+    'Campus', 'Course', 'Batch', 'Test Name',
+    'Total Questions', 'Correct Answers', 'Total Score (%)',
+    'Duration (seconds)', 'Time Taken (ms)', 'Submitted At', 'Status'
+]
+
+TEST_ATTEMPT_EXPORT_COLUMN_WIDTHS = {
+    'A': 20,  # Student Name
+    'B': 25,  # Student Email
+    'C': 15,  # Roll Number
+    'D': 15,  # Mobile Number
+    'E': 20,  # Campus
+    'F': 20,  # Course
+    'G': 15,  # Batch
+    'H': 25,  # Test Name
+    'I': 15,  # Total Questions
+    'J': 15,  # Correct Answers
+    'K': 15,  # Total Score
+    'L': 15,  # Duration
+    'M': 15,  # Time Taken
+    'N': 20,  # Submitted At
+    'O': 12   # Status
+}
+
+def _mongo_number(value, *keys):
+    """Unwrap extended-JSON numbers ({'numberInt': ...}) stored by older imports."""
+    if isinstance(value, dict):
+        for key in keys:
+            if key in value:
+                return value[key]
+        return 0
+    return value
+
+def _iter_test_attempt_export_rows(test, counter=None):
+    """
+    Yield one export row per online attempt of ``test``, read from a cursor and
+    enriched a page at a time. ``counter['rows']`` tracks rows yielded so far.
+    """
+    cursor = mongo_db.student_test_attempts.find(
+        {'test_id': test['_id'], 'test_type': 'online'},
+        {'detailed_results': 0, 'answers': 0, 'results': 0}
+    ).batch_size(500)
+    test_name = str(test.get('name', 'Unknown Test'))
+
+    # Students and their campus/course/batch names are resolved in bulk, not per row
+    for attempt, ctx in StudentEnricher().iter_enriched(cursor):
+        student = ctx.student
+        if not student:
+            continue
+
+        total_questions = _mongo_number(attempt.get('total_questions', 0), 'numberInt', 'numberDouble')
+        correct_answers = _mongo_number(attempt.get('correct_answers', 0), 'numberInt', 'numberDouble')
+        total_questions = int(total_questions) if total_questions else 0
+        correct_answers = int(correct_answers) if correct_answers else 0
+
+        score = 0
+        if total_questions > 0:
+            score = (correct_answers / total_questions) * 100
+
+        submitted_at = attempt.get('submitted_at', attempt.get('created_at'))
+        if submitted_at:
+            if isinstance(submitted_at, dict):
+                # Handle MongoDB date objects
+                submitted_at = safe_isoformat(submitted_at.get('$date', submitted_at))
+            else:
+                submitted_at = safe_isoformat(submitted_at)
+        else:
+            submitted_at = ''
+
+        duration_seconds = _mongo_number(attempt.get('duration_seconds', 0), 'numberDouble', 'numberInt')
+        time_taken_ms = _mongo_number(attempt.get('time_taken_ms', 0), 'numberDouble', 'numberInt')
+
+        if counter is not None:
+            counter['rows'] += 1
+        yield [
+            str(student.get('name', 'Unknown')),
+            str(student.get('email', '')),
+            str(student.get('roll_number', '')),
+            str(student.get('mobile_number', '')),
+            str(ctx.campus_name or 'Unknown Campus'),
+            str(ctx.course_name or 'Unknown Course'),
+            str(ctx.batch_name or 'Unknown Batch'),
+            test_name,
+            total_questions,
+            correct_answers,
+            round(score, 2),
+            round(float(duration_seconds), 2) if duration_seconds else 0,
+            int(time_taken_ms) if time_taken_ms else 0,
+            submitted_at,
+            str(attempt.get('status', 'unknown'))
+        ]
+
+def _test_attempt_export_sheet(test):
+    """Write-only worksheet spec for the styled test attempts workbook."""
+    counter = {'rows': 0}
+    test_name = test.get('name', 'Unknown Test')
+    return ExportSheet(
+        name='Test Attempts',
+        header=TEST_ATTEMPT_EXPORT_HEADERS,
+        rows=_iter_test_attempt_export_rows(test, counter),
+        title=f"Test Results: {test_name}",
+        column_widths=TEST_ATTEMPT_EXPORT_COLUMN_WIDTHS,
+        footer=lambda: [
+            ['Summary:'],
+            [f"Total Students: {counter['rows']}"],
+            [f"Test Name: {test_name}"],
+        ],
+    )
+
+def _load_test_for_attempt_export(test_id):
+    """Return (test, error_response) for the attempt export endpoints."""
+    if not ObjectId.is_valid(test_id):
+        return None, (jsonify({'success': False, 'message': 'Invalid test ID'}), 400)
+
+    if not mongo_db.student_test_attempts.find_one(
+        {'test_id': ObjectId(test_id), 'test_type': 'online'}, {'_id': 1}
+    ):
+        return None, (jsonify({
+            'success': False,
+            'message': 'No attempts found for this test'
+        }), 404)
+
+    test = mongo_db.tests.find_one({'_id': ObjectId(test_id)}, {'name': 1})
+    if not test:
+        return None, (jsonify({
+            'success': False,
+            'message': 'Test not found'
+        }), 404)
+    return test, None
+
+@export_builder('test_attempts')
+def _test_attempt_export_writer(params):
+    """Writer of a background test attempts export (``params``: test_id, format)."""
+    test = mongo_db.tests.find_one({'_id': ObjectId(params['test_id'])}, {'name': 1})
+    if not test:
+        raise ValueError('Test not found')
+
+    if params.get('format') == 'csv':
+        def writer(fileobj, report):
+            counter = {'rows': 0}
+            rows = _iter_test_attempt_export_rows(test, counter)
+            for chunk in iter_csv(TEST_ATTEMPT_EXPORT_HEADERS, rows):
+                fileobj.write(chunk.encode('utf-8'))
+                report(counter['rows'])
+            return counter['rows']
+    else:
+        def writer(fileobj, report):
+            return write_xlsx([_test_attempt_export_sheet(test)], fileobj, on_row=report)
+    return writer
+
+def _start_test_attempt_export_job(user_id, test, export_format):
+    """Run a test attempts export in the background; the client downloads it from /export-jobs."""
+    test_id = str(test['_id'])
+    total = mongo_db.student_test_attempts.count_documents({'test_id': test['_id'], 'test_type': 'online'})
+    params = {'test_id': test_id, 'format': export_format}
+
+    if export_format == 'csv':
+        filename, mimetype = f'test_attempts_{test_id}.csv', CSV_MIMETYPE
+    else:
+        filename, mimetype = f'test_attempts_{test_id}.xlsx', XLSX_MIMETYPE
+
+    job = start_export_job(
+        user_id, 'test_attempts', filename, mimetype, _test_attempt_export_writer(params),
+        total=total, params=params
+    )
+    return jsonify({
+        'success': True,
+        'message': 'Export started',
+        'data': serialize_job(job)
+    }), 202
+
 @superadmin_bp.route('/export-test-attempts/<test_id>', methods=['GET'])
 @jwt_required()
 def export_test_attempts(test_id):
-    """Export test attempts for a specific test as Excel"""
+    """Export test attempts for a specific test as Excel (``?background=true`` runs it as a job)"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user:
             return jsonify({
@@ -2031,228 +2211,15 @@ def export_test_attempts(test_id):
                 'message': 'Access denied. Authentication required.'
             }), 401
         
-        # Get all attempts for this test
-        attempts = list(mongo_db.student_test_attempts.find({
-            'test_id': ObjectId(test_id),
-            'test_type': 'online'
-        }))
-        
-        if not attempts:
-            return jsonify({
-                'success': False,
-                'message': 'No attempts found for this test'
-            }), 404
-        
-        # Get test details
-        test = mongo_db.tests.find_one({'_id': ObjectId(test_id)})
-        if not test:
-            return jsonify({
-                'success': False,
-                'message': 'Test not found'
-            }), 404
-        
-        # Process attempts and get student details
-        excel_data = []
-        for attempt in attempts:
-            student_id = str(attempt['student_id'])
-            
-            # Get student details
-            student = mongo_db.students.find_one({'user_id': ObjectId(student_id)})
-            if not student:
-                continue
-            
-            # Get campus, course, and batch details
-            campus = mongo_db.campuses.find_one({'_id': student.get('campus_id')}) if student.get('campus_id') else None
-            course = mongo_db.courses.find_one({'_id': student.get('course_id')}) if student.get('course_id') else None
-            batch = mongo_db.batches.find_one({'_id': student.get('batch_id')}) if student.get('batch_id') else None
-            
-            # Calculate score - ensure we get clean numeric values
-            total_questions = attempt.get('total_questions', 0)
-            correct_answers = attempt.get('correct_answers', 0)
-            
-            # Handle MongoDB number types
-            if isinstance(total_questions, dict):
-                total_questions = total_questions.get('numberInt', total_questions.get('numberDouble', 0))
-            if isinstance(correct_answers, dict):
-                correct_answers = correct_answers.get('numberInt', correct_answers.get('numberDouble', 0))
-            
-            # Convert to integers
-            total_questions = int(total_questions) if total_questions else 0
-            correct_answers = int(correct_answers) if correct_answers else 0
-            
-            # Calculate score percentage
-            score = 0
-            if total_questions > 0:
-                score = (correct_answers / total_questions) * 100
-            
-            # Format dates
-            submitted_at = attempt.get('submitted_at', attempt.get('created_at'))
-            if submitted_at:
-                if isinstance(submitted_at, dict):
-                    # Handle MongoDB date objects
-                    submitted_at = safe_isoformat(submitted_at.get('$date', submitted_at))
-                else:
-                    submitted_at = safe_isoformat(submitted_at)
-            else:
-                submitted_at = ''
-            
-            # Get clean numeric values for duration
-            duration_seconds = attempt.get('duration_seconds', 0)
-            time_taken_ms = attempt.get('time_taken_ms', 0)
-            
-            if isinstance(duration_seconds, dict):
-                duration_seconds = duration_seconds.get('numberDouble', duration_seconds.get('numberInt', 0))
-            if isinstance(time_taken_ms, dict):
-                time_taken_ms = time_taken_ms.get('numberDouble', time_taken_ms.get('numberInt', 0))
-            
-            excel_data.append({
-                'Student Name': str(student.get('name', 'Unknown')),
-                'Student Email': str(student.get('email', '')),
-                'Roll Number': str(student.get('roll_number', '')),
-                'Mobile Number': str(student.get('mobile_number', '')),
-                'Campus': str(campus.get('name', 'Unknown Campus')) if campus else 'Unknown Campus',
-                'Course': str(course.get('name', 'Unknown Course')) if course else 'Unknown Course',
-                'Batch': str(batch.get('name', 'Unknown Batch')) if batch else 'Unknown Batch',
-                'Test Name': str(test.get('name', 'Unknown Test')),
-                'Total Questions': total_questions,
-                'Correct Answers': correct_answers,
-                'Total Score': round(score, 2),
-                'Duration (seconds)': round(float(duration_seconds), 2) if duration_seconds else 0,
-                'Time Taken (ms)': int(time_taken_ms) if time_taken_ms else 0,
-                'Submitted At': submitted_at,
-                'Status': str(attempt.get('status', 'unknown'))
-            })
-        
-        # Create Excel file using openpyxl with enhanced styling
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-        from openpyxl.utils import get_column_letter
-        from io import BytesIO
-        
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Test Attempts"
-        
-        # Define styles
-        header_font = Font(bold=True, color="FFFFFF", size=12)
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_alignment = Alignment(horizontal='center', vertical='center')
-        
-        title_font = Font(bold=True, size=16, color="2F4F4F")
-        title_alignment = Alignment(horizontal='center', vertical='center')
-        
-        data_font = Font(size=11)
-        data_alignment = Alignment(horizontal='left', vertical='center')
-        
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Add test name as title (row 1)
-        test_name = test.get('name', 'Unknown Test')
-        ws.merge_cells('A1:P1')
-        title_cell = ws.cell(row=1, column=1, value=f"Test Results: {test_name}")
-        title_cell.font = title_font
-        title_cell.alignment = title_alignment
-        ws.row_dimensions[1].height = 30
-        
-        # Add empty row for spacing
-        ws.row_dimensions[2].height = 10
-        
-        # Add headers (row 3)
-        headers = [
-            'Student Name', 'Student Email', 'Roll Number', 'Mobile Number',
-            'Campus', 'Course', 'Batch', 'Test Name',
-            'Total Questions', 'Correct Answers', 'Total Score (%)',
-            'Duration (seconds)', 'Time Taken (ms)', 'Submitted At', 'Status'
-        ]
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=3, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-        
-        # Add data starting from row 4
-        for row_idx, data in enumerate(excel_data, 4):
-            row_data = [
-                data['Student Name'],
-                data['Student Email'],
-                data['Roll Number'],
-                data['Mobile Number'],
-                data['Campus'],
-                data['Course'],
-                data['Batch'],
-                data['Test Name'],
-                data['Total Questions'],
-                data['Correct Answers'],
-                data['Total Score'],
-                data['Duration (seconds)'],
-                data['Time Taken (ms)'],
-                data['Submitted At'],
-                data['Status']
-            ]
-            
-            for col, value in enumerate(row_data, 1):
-                cell = ws.cell(row=row_idx, column=col, value=value)
-                cell.font = data_font
-                cell.alignment = data_alignment
-                cell.border = border
-                
-                # Add alternating row colors
-                if row_idx % 2 == 0:
-                    cell.fill = PatternFill(start_color="F8F9FA", end_color="F8F9FA", fill_type="solid")
-        
-        # Set column widths for better display
-        column_widths = {
-            'A': 20,  # Student Name
-            'B': 25,  # Student Email
-            'C': 15,  # Roll Number
-            'D': 15,  # Mobile Number
-            'E': 20,  # Campus
-            'F': 20,  # Course
-            'G': 15,  # Batch
-            'H': 25,  # Test Name
-            'I': 15,  # Total Questions
-            'J': 15,  # Correct Answers
-            'K': 15,  # Total Score
-            'L': 15,  # Duration
-            'M': 15,  # Time Taken
-            'N': 20,  # Submitted At
-            'O': 12   # Status
-        }
-        
-        for col_letter, width in column_widths.items():
-            ws.column_dimensions[col_letter].width = width
-        
-        # Set row heights
-        for row in range(4, len(excel_data) + 4):
-            ws.row_dimensions[row].height = 25
-        
-        # Add summary information at the bottom
-        summary_row = len(excel_data) + 6
-        ws.cell(row=summary_row, column=1, value="Summary:").font = Font(bold=True, size=12)
-        ws.cell(row=summary_row + 1, column=1, value=f"Total Students: {len(excel_data)}")
-        ws.cell(row=summary_row + 2, column=1, value=f"Test Name: {test_name}")
-        
-        # Save to BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        # Return Excel file
-        from flask import Response
-        return Response(
-            output.getvalue(),
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers={
-                'Content-Disposition': f'attachment; filename=test_attempts_{test_id}.xlsx'
-            }
-        )
+        test, error = _load_test_for_attempt_export(test_id)
+        if error:
+            return error
+
+        if request.args.get('background', 'false').lower() == 'true':
+            return _start_test_attempt_export_job(current_user_id, test, 'xlsx')
+
+        # Write-only workbook spooled to a temp file; rows are never all in memory
+        return xlsx_response([_test_attempt_export_sheet(test)], f'test_attempts_{test_id}.xlsx')
         
     except Exception as e:
         current_app.logger.error(f"Error in export_test_attempts: {str(e)}")
@@ -2265,10 +2232,10 @@ def export_test_attempts(test_id):
 @superadmin_bp.route('/export-test-attempts-csv/<test_id>', methods=['GET'])
 @jwt_required()
 def export_test_attempts_csv(test_id):
-    """Export test attempts for a specific test as CSV"""
+    """Export test attempts for a specific test as CSV (``?background=true`` runs it as a job)"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user:
             return jsonify({
@@ -2276,133 +2243,90 @@ def export_test_attempts_csv(test_id):
                 'message': 'Access denied. Authentication required.'
             }), 401
         
-        # Get all attempts for this test
-        attempts = list(mongo_db.student_test_attempts.find({
-            'test_id': ObjectId(test_id),
-            'test_type': 'online'
-        }))
+        test, error = _load_test_for_attempt_export(test_id)
+        if error:
+            return error
+
+        if request.args.get('background', 'false').lower() == 'true':
+            return _start_test_attempt_export_job(current_user_id, test, 'csv')
+
+        # Rows are streamed straight from the attempts cursor
+        return csv_response(
+            TEST_ATTEMPT_EXPORT_HEADERS,
+            _iter_test_attempt_export_rows(test),
+            f'test_attempts_{test_id}.csv'
+        )
         
-        if not attempts:
+    except Exception as e:
+        current_app.logger.error(f"Error in export_test_attempts_csv: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to export test attempts as CSV',
+            'error': str(e)
+        }), 500
+
+@superadmin_bp.route('/export-jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_export_job_status(job_id):
+    """Status of a background export started by the current user"""
+    try:
+        job = get_export_job(job_id, get_jwt_identity())
+        if not job:
             return jsonify({
                 'success': False,
-                'message': 'No attempts found for this test'
+                'message': 'Export job not found'
             }), 404
-        
-        # Get test details
-        test = mongo_db.tests.find_one({'_id': ObjectId(test_id)})
-        if not test:
+        return jsonify({
+            'success': True,
+            'data': serialize_job(job)
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error fetching export job {job_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch export job',
+            'error': str(e)
+        }), 500
+
+@superadmin_bp.route('/export-jobs/<job_id>/download', methods=['GET'])
+@jwt_required()
+def download_export_job(job_id):
+    """Download the artifact of a completed background export"""
+    try:
+        job = get_export_job(job_id, get_jwt_identity())
+        if not job:
             return jsonify({
                 'success': False,
-                'message': 'Test not found'
+                'message': 'Export job not found'
             }), 404
-        
-        # Process attempts and get student details
-        csv_data = []
-        for attempt in attempts:
-            student_id = str(attempt['student_id'])
-            
-            # Get student details
-            student = mongo_db.students.find_one({'user_id': ObjectId(student_id)})
-            if not student:
-                continue
-            
-            # Get campus, course, and batch details
-            campus = mongo_db.campuses.find_one({'_id': student.get('campus_id')}) if student.get('campus_id') else None
-            course = mongo_db.courses.find_one({'_id': student.get('course_id')}) if student.get('course_id') else None
-            batch = mongo_db.batches.find_one({'_id': student.get('batch_id')}) if student.get('batch_id') else None
-            
-            # Calculate score - ensure we get clean numeric values
-            total_questions = attempt.get('total_questions', 0)
-            correct_answers = attempt.get('correct_answers', 0)
-            
-            # Handle MongoDB number types
-            if isinstance(total_questions, dict):
-                total_questions = total_questions.get('numberInt', total_questions.get('numberDouble', 0))
-            if isinstance(correct_answers, dict):
-                correct_answers = correct_answers.get('numberInt', correct_answers.get('numberDouble', 0))
-            
-            # Convert to integers
-            total_questions = int(total_questions) if total_questions else 0
-            correct_answers = int(correct_answers) if correct_answers else 0
-            
-            # Calculate score percentage
-            score = 0
-            if total_questions > 0:
-                score = (correct_answers / total_questions) * 100
-            
-            # Format dates
-            submitted_at = attempt.get('submitted_at', attempt.get('created_at'))
-            if submitted_at:
-                if isinstance(submitted_at, dict):
-                    submitted_at = safe_isoformat(submitted_at.get('$date', submitted_at))
-                else:
-                    submitted_at = safe_isoformat(submitted_at)
-            else:
-                submitted_at = ''
-            
-            # Get clean numeric values for duration
-            duration_seconds = attempt.get('duration_seconds', 0)
-            time_taken_ms = attempt.get('time_taken_ms', 0)
-            
-            if isinstance(duration_seconds, dict):
-                duration_seconds = duration_seconds.get('numberDouble', duration_seconds.get('numberInt', 0))
-            if isinstance(time_taken_ms, dict):
-                time_taken_ms = time_taken_ms.get('numberDouble', time_taken_ms.get('numberInt', 0))
-            
-            csv_data.append({
-                'Student Name': str(student.get('name', 'Unknown')),
-                'Student Email': str(student.get('email', '')),
-                'Roll Number': str(student.get('roll_number', '')),
-                'Mobile Number': str(student.get('mobile_number', '')),
-                'Campus': str(campus.get('name', 'Unknown Campus')) if campus else 'Unknown Campus',
-                'Course': str(course.get('name', 'Unknown Course')) if course else 'Unknown Course',
-                'Batch': str(batch.get('name', 'Unknown Batch')) if batch else 'Unknown Batch',
-                'Test Name': str(test.get('name', 'Unknown Test')),
-                'Total Questions': total_questions,
-                'Correct Answers': correct_answers,
-                'Total Score (%)': round(score, 2),
-                'Duration (seconds)': round(float(duration_seconds), 2) if duration_seconds else 0,
-                'Time Taken (ms)': int(time_taken_ms) if time_taken_ms else 0,
-                'Submitted At': submitted_at,
-                'Status': str(attempt.get('status', 'unknown'))
-            })
-        
-        # Create CSV file
-        import csv
-        from io import StringIO
-        
-        output = StringIO()
-        writer = csv.DictWriter(output, fieldnames=[
-            'Student Name', 'Student Email', 'Roll Number', 'Mobile Number',
-            'Campus', 'Course', 'Batch', 'Test Name',
-            'Total Questions', 'Correct Answers', 'Total Score (%)',
-            'Duration (seconds)', 'Time Taken (ms)', 'Submitted At', 'Status'
-        ])
-        
-        # Write header
-        writer.writeheader()
-        
-        # Write data
-        for row in csv_data:
-            writer.writerow(row)
-        
-        output.seek(0)
-        
-        # Return CSV file
+        if job.get('status') != 'completed':
+            return jsonify({
+                'success': False,
+                'message': f"Export is not ready (status: {job.get('status')})"
+            }), 409
+
+        path = job.get('path')
+        if not path or not os.path.exists(path):
+            return jsonify({
+                'success': False,
+                'message': 'Export file has expired'
+            }), 410
+
         from flask import Response
         return Response(
-            output.getvalue(),
-            mimetype='text/csv',
+            iter_file(open(path, 'rb')),
+            mimetype=job.get('mimetype', 'application/octet-stream'),
             headers={
-                'Content-Disposition': f'attachment; filename=test_attempts_{test_id}.csv'
-            }
+                'Content-Disposition': f"attachment; filename={job['filename']}",
+                'Content-Length': str(os.path.getsize(path))
+            },
+            direct_passthrough=True
         )
-        
     except Exception as e:
-        current_app.logger.error(f"Error in export_test_attempts_csv: {str(e)}")
+        current_app.logger.error(f"Error downloading export job {job_id}: {str(e)}")
         return jsonify({
             'success': False,
-            'message': 'Failed to export test attempts as CSV',
+            'message': 'Failed to download export',
             'error': str(e)
         }), 500
 
@@ -2412,7 +2336,7 @@ def get_online_tests_overview():
     """Get overview of all online tests with statistics using optimized aggregation"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -2488,21 +2412,8 @@ def get_online_tests_overview():
                 {
                     '$lookup': {
                         'from': 'students',
-                        'let': {'attempt_student_id': '$student_id', 'attempt_user_id': '$user_id'},
-                        'pipeline': [
-                            {
-                                '$match': {
-                                    '$expr': {
-                                        '$or': [
-                                            {'$eq': ['$_id', '$$attempt_student_id']},
-                                            {'$eq': ['$user_id', '$$attempt_student_id']},
-                                            {'$eq': ['$_id', '$$attempt_user_id']},
-                                            {'$eq': ['$user_id', '$$attempt_user_id']}
-                                        ]
-                                    }
-                                }
-                            }
-                        ],
+                        'localField': 'student_oid',
+                        'foreignField': 'user_id',
                         'as': 'student_info'
                     }
                 },
@@ -2527,8 +2438,8 @@ def get_online_tests_overview():
             # After lookup and unwind, we have student_info, so use student_info._id
             unique_students_field = '$student_info._id'
         else:
-            # Use student_id from attempts
-            unique_students_field = '$student_id'
+            # Use the canonical student key from attempts
+            unique_students_field = '$student_oid'
         
         pipeline.extend([
             {
@@ -2860,7 +2771,7 @@ def get_test_attempts(test_id):
     """Get all student attempts for a specific test including unattempted students"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -2988,21 +2899,16 @@ def get_test_attempts(test_id):
             {
                 '$lookup': {
                     'from': 'student_test_attempts',
-                    'let': {'student_id': '$_id', 'user_id': '$user_id'},
+                    'let': {'user_id': '$user_id'},
                     'pipeline': [
                         {
                             '$match': {
                                 '$expr': {
                                     '$and': [
-                                        {'$eq': ['$test_id', test_object_id]},
+                                        {'$eq': ['$student_oid', '$$user_id']},
                                         {'$eq': ['$test_type', 'online']},
                                         {'$eq': ['$status', 'completed']},
-                                        {
-                                            '$or': [
-                                                {'$eq': ['$student_id', '$$student_id']},
-                                                {'$eq': ['$student_id', '$$user_id']}
-                                            ]
-                                        }
+                                        {'$eq': ['$test_id', test_object_id]}
                                     ]
                                 }
                             }
@@ -3131,7 +3037,7 @@ def export_test_attempts_complete(test_id):
     """Export complete test data including both attempted and unattempted students"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -3232,21 +3138,16 @@ def export_test_attempts_complete(test_id):
             {
                 '$lookup': {
                     'from': 'student_test_attempts',
-                    'let': {'student_id': '$_id', 'user_id': '$user_id'},
+                    'let': {'user_id': '$user_id'},
                     'pipeline': [
                         {
                             '$match': {
                                 '$expr': {
                                     '$and': [
-                                        {'$eq': ['$test_id', test_object_id]},
+                                        {'$eq': ['$student_oid', '$$user_id']},
                                         {'$eq': ['$test_type', 'online']},
                                         {'$eq': ['$status', 'completed']},
-                                        {
-                                            '$or': [
-                                                {'$eq': ['$student_id', '$$student_id']},
-                                                {'$eq': ['$student_id', '$$user_id']}
-                                            ]
-                                        }
+                                        {'$eq': ['$test_id', test_object_id]}
                                     ]
                                 }
                             }
@@ -3381,13 +3282,245 @@ def export_test_attempts_complete(test_id):
             'error': str(e)
         }), 500
 
+def _results_export(filters):
+    """
+    Query of /export-results for ``filters`` (its query args) and the row
+    sources of both formats: (match_conditions, headers, result_rows,
+    excel_sheets, summary). Shared by the download and the background
+    export job; ``summary`` fills in as the rows are produced.
+    """
+    module_filter = filters.get('module')
+    test_type_filter = filters.get('test_type', 'online')  # Default to online tests
+    campus_filter = filters.get('campus')
+    course_filter = filters.get('course')
+    batch_filter = filters.get('batch')
+    date_range = filters.get('dateRange', 'all')
+    score_range = filters.get('scoreRange', 'all')
+
+    # Build match conditions
+    match_conditions = {}
+    if module_filter:
+        match_conditions['module_id'] = module_filter
+    if test_type_filter:
+        match_conditions['test_type'] = test_type_filter
+
+    # Date range filter
+    if date_range != 'all':
+        now = datetime.utcnow()
+        if date_range == 'today':
+            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        elif date_range == 'week':
+            start_date = now - timedelta(days=7)
+        elif date_range == 'month':
+            start_date = now - timedelta(days=30)
+        else:
+            start_date = None
+
+        if start_date:
+            match_conditions['submitted_at'] = {'$gte': start_date}
+
+    # Score range filter
+    if score_range != 'all':
+        if score_range == 'excellent':
+            match_conditions['average_score'] = {'$gte': 90}
+        elif score_range == 'good':
+            match_conditions['average_score'] = {'$gte': 70, '$lt': 90}
+        elif score_range == 'average':
+            match_conditions['average_score'] = {'$gte': 50, '$lt': 70}
+        elif score_range == 'poor':
+            match_conditions['average_score'] = {'$lt': 50}
+
+    pipeline = [
+        {'$match': match_conditions},
+        {
+            '$lookup': {
+                'from': 'users',
+                'localField': 'student_id',
+                'foreignField': '_id',
+                'as': 'student_details'
+            }
+        },
+        {'$unwind': '$student_details'},
+        {
+            '$lookup': {
+                'from': 'tests',
+                'localField': 'test_id',
+                'foreignField': '_id',
+                'as': 'test_details'
+            }
+        },
+        {'$unwind': '$test_details'},
+        {
+            '$lookup': {
+                'from': 'students',
+                'localField': 'student_id',
+                'foreignField': 'user_id',
+                'as': 'student_profile'
+            }
+        },
+        {'$unwind': '$student_profile'},
+        {
+            '$lookup': {
+                'from': 'campuses',
+                'localField': 'student_profile.campus_id',
+                'foreignField': '_id',
+                'as': 'campus_details'
+            }
+        },
+        {'$unwind': '$campus_details'},
+        {
+            '$lookup': {
+                'from': 'courses',
+                'localField': 'student_profile.course_id',
+                'foreignField': '_id',
+                'as': 'course_details'
+            }
+        },
+        {'$unwind': '$course_details'},
+        {
+            '$lookup': {
+                'from': 'batches',
+                'localField': 'student_profile.batch_id',
+                'foreignField': '_id',
+                'as': 'batch_details'
+            }
+        },
+        {'$unwind': '$batch_details'},
+        {
+            '$project': {
+                'student_name': '$student_details.name',
+                'student_email': '$student_details.email',
+                'campus_name': '$campus_details.name',
+                'course_name': '$course_details.name',
+                'batch_name': '$batch_details.name',
+                'test_name': '$test_details.name',
+                'module_name': '$test_details.module_id',
+                'test_type': '$test_type',
+                'average_score': '$average_score',
+                'total_questions': '$total_questions',
+                'correct_answers': '$correct_answers',
+                'submitted_at': '$submitted_at',
+                'duration': '$duration',
+                'time_taken': '$time_taken',
+                'student_id': '$student_id'
+            }
+        },
+        {'$sort': {'submitted_at': -1}}
+    ]
+
+    # Apply additional filters
+    if campus_filter:
+        pipeline.insert(0, {'$match': {'campus_name': campus_filter}})
+    if course_filter:
+        pipeline.insert(0, {'$match': {'course_name': course_filter}})
+    if batch_filter:
+        pipeline.insert(0, {'$match': {'batch_name': batch_filter}})
+
+    headers = [
+        'Student Name',
+        'Student Email',
+        'Campus',
+        'Course',
+        'Batch',
+        'Test Name',
+        'Module',
+        'Test Type',
+        'Score (%)',
+        'Total Questions',
+        'Correct Answers',
+        'Submitted At'
+    ]
+    # Filled in while rows stream past, for the Excel summary sheet
+    summary = {'rows': 0, 'students': set(), 'score_total': 0.0, 'passed': 0}
+
+    def result_rows():
+        cursor = mongo_db.db.test_results.aggregate(pipeline, allowDiskUse=True, batchSize=500)
+        for result in cursor:
+            # Extract actual values from MongoDB structures
+            score = result.get('average_score', 0)
+            if isinstance(score, dict) and 'numberDouble' in score:
+                score = float(score['numberDouble'])
+            elif isinstance(score, dict) and 'numberInt' in score:
+                score = float(score['numberInt'])
+
+            total_questions = result.get('total_questions', 0)
+            if isinstance(total_questions, dict) and 'numberInt' in total_questions:
+                total_questions = int(total_questions['numberInt'])
+
+            correct_answers = result.get('correct_answers', 0)
+            if isinstance(correct_answers, dict) and 'numberInt' in correct_answers:
+                correct_answers = int(correct_answers['numberInt'])
+
+            # Format submitted_at as proper datetime
+            submitted_at = result.get('submitted_at', '')
+            if isinstance(submitted_at, dict) and 'date' in submitted_at:
+                # Convert MongoDB date to readable format
+                timestamp = int(submitted_at['date']['numberLong']) / 1000
+                submitted_at = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+            else:
+                submitted_at = safe_isoformat(submitted_at) if submitted_at else ''
+
+            numeric_score = score if isinstance(score, (int, float)) else 0
+            summary['rows'] += 1
+            summary['students'].add(result.get('student_id'))
+            summary['score_total'] += numeric_score
+            if numeric_score >= 60:
+                summary['passed'] += 1
+
+            yield [
+                result.get('student_name', ''),
+                result.get('student_email', ''),
+                result.get('campus_name', ''),
+                result.get('course_name', ''),
+                result.get('batch_name', ''),
+                result.get('test_name', ''),
+                result.get('module_name', ''),
+                result.get('test_type', ''),
+                score,
+                total_questions,
+                correct_answers,
+                submitted_at
+            ]
+
+    def summary_rows():
+        total = summary['rows']
+        return [
+            ['Total Tests', total],
+            ['Total Students', len(summary['students'])],
+            ['Average Score', summary['score_total'] / total if total else 0],
+            ['Pass Rate', summary['passed'] / total * 100 if total else 0],
+        ]
+
+    def excel_sheets():
+        return [
+            ExportSheet('Test Results', headers, result_rows()),
+            ExportSheet('Summary', ['Metric', 'Value'], summary_rows),
+        ]
+
+    return match_conditions, headers, result_rows, excel_sheets, summary
+
+@export_builder('results')
+def _results_export_writer(params):
+    """Writer of a background results export (``params``: format, filters)."""
+    _, headers, result_rows, excel_sheets, summary = _results_export(params.get('filters') or {})
+    if params.get('format') == 'excel':
+        def writer(fileobj, report):
+            return write_xlsx(excel_sheets(), fileobj, on_row=report)
+    else:
+        def writer(fileobj, report):
+            for chunk in iter_csv(headers, result_rows()):
+                fileobj.write(chunk.encode('utf-8'))
+                report(summary['rows'])
+            return summary['rows']
+    return writer
+
 @superadmin_bp.route('/export-results', methods=['GET'])
 @jwt_required()
 def export_results():
-    """Export test results as CSV"""
+    """Export test results as a streamed CSV or Excel file (``?background=true`` runs it as a job)"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -3396,291 +3529,34 @@ def export_results():
             }), 403
         
         # Get query parameters
-        module_filter = request.args.get('module')
-        test_type_filter = request.args.get('test_type', 'online')  # Default to online tests
-        campus_filter = request.args.get('campus')
-        course_filter = request.args.get('course')
-        batch_filter = request.args.get('batch')
-        date_range = request.args.get('dateRange', 'all')
-        score_range = request.args.get('scoreRange', 'all')
         export_format = request.args.get('format', 'csv')  # 'csv' or 'excel'
-        
-        # Build match conditions
-        match_conditions = {}
-        if module_filter:
-            match_conditions['module_id'] = module_filter
-        if test_type_filter:
-            match_conditions['test_type'] = test_type_filter
-        
-        # Date range filter
-        if date_range != 'all':
-            now = datetime.utcnow()
-            if date_range == 'today':
-                start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            elif date_range == 'week':
-                start_date = now - timedelta(days=7)
-            elif date_range == 'month':
-                start_date = now - timedelta(days=30)
-            else:
-                start_date = None
-            
-            if start_date:
-                match_conditions['submitted_at'] = {'$gte': start_date}
-        
-        # Score range filter
-        if score_range != 'all':
-            if score_range == 'excellent':
-                match_conditions['average_score'] = {'$gte': 90}
-            elif score_range == 'good':
-                match_conditions['average_score'] = {'$gte': 70, '$lt': 90}
-            elif score_range == 'average':
-                match_conditions['average_score'] = {'$gte': 50, '$lt': 70}
-            elif score_range == 'poor':
-                match_conditions['average_score'] = {'$lt': 50}
-        
-        pipeline = [
-            {'$match': match_conditions},
-            {
-                '$lookup': {
-                    'from': 'users',
-                    'localField': 'student_id',
-                    'foreignField': '_id',
-                    'as': 'student_details'
-                }
-            },
-            {'$unwind': '$student_details'},
-            {
-                '$lookup': {
-                    'from': 'tests',
-                    'localField': 'test_id',
-                    'foreignField': '_id',
-                    'as': 'test_details'
-                }
-            },
-            {'$unwind': '$test_details'},
-            {
-                '$lookup': {
-                    'from': 'students',
-                    'localField': 'student_id',
-                    'foreignField': 'user_id',
-                    'as': 'student_profile'
-                }
-            },
-            {'$unwind': '$student_profile'},
-            {
-                '$lookup': {
-                    'from': 'campuses',
-                    'localField': 'student_profile.campus_id',
-                    'foreignField': '_id',
-                    'as': 'campus_details'
-                }
-            },
-            {'$unwind': '$campus_details'},
-            {
-                '$lookup': {
-                    'from': 'courses',
-                    'localField': 'student_profile.course_id',
-                    'foreignField': '_id',
-                    'as': 'course_details'
-                }
-            },
-            {'$unwind': '$course_details'},
-            {
-                '$lookup': {
-                    'from': 'batches',
-                    'localField': 'student_profile.batch_id',
-                    'foreignField': '_id',
-                    'as': 'batch_details'
-                }
-            },
-            {'$unwind': '$batch_details'},
-            {
-                '$project': {
-                    'student_name': '$student_details.name',
-                    'student_email': '$student_details.email',
-                    'campus_name': '$campus_details.name',
-                    'course_name': '$course_details.name',
-                    'batch_name': '$batch_details.name',
-                    'test_name': '$test_details.name',
-                    'module_name': '$test_details.module_id',
-                    'test_type': '$test_type',
-                    'average_score': '$average_score',
-                    'total_questions': '$total_questions',
-                    'correct_answers': '$correct_answers',
-                    'submitted_at': '$submitted_at',
-                    'duration': '$duration',
-                    'time_taken': '$time_taken'
-                }
-            },
-            {'$sort': {'submitted_at': -1}}
-        ]
-        
-        # Apply additional filters
-        if campus_filter:
-            pipeline.insert(0, {'$match': {'campus_name': campus_filter}})
-        if course_filter:
-            pipeline.insert(0, {'$match': {'course_name': course_filter}})
-        if batch_filter:
-            pipeline.insert(0, {'$match': {'batch_name': batch_filter}})
-        
-        results = list(mongo_db.db.test_results.aggregate(pipeline))
-        
+        match_conditions, headers, result_rows, excel_sheets, _ = _results_export(request.args)
+
+        date_tag = datetime.now().strftime("%Y%m%d")
         if export_format == 'excel':
-            # Export as Excel
-            try:
-                import pandas as pd
-                from io import BytesIO
-                
-                # Prepare data for Excel
-                excel_data = []
-                for result in results:
-                    # Extract actual values from MongoDB structures
-                    score = result.get('average_score', 0)
-                    if isinstance(score, dict) and 'numberDouble' in score:
-                        score = float(score['numberDouble'])
-                    elif isinstance(score, dict) and 'numberInt' in score:
-                        score = float(score['numberInt'])
-                    
-                    total_questions = result.get('total_questions', 0)
-                    if isinstance(total_questions, dict) and 'numberInt' in total_questions:
-                        total_questions = int(total_questions['numberInt'])
-                    
-                    correct_answers = result.get('correct_answers', 0)
-                    if isinstance(correct_answers, dict) and 'numberInt' in correct_answers:
-                        correct_answers = int(correct_answers['numberInt'])
-                    
-                    # Format submitted_at as proper datetime
-                    submitted_at = result.get('submitted_at', '')
-                    if isinstance(submitted_at, dict) and 'date' in submitted_at:
-                        # Convert MongoDB date to readable format
-                        timestamp = int(submitted_at['date']['numberLong']) / 1000
-                        submitted_at = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-                    else:
-                        submitted_at = safe_isoformat(submitted_at) if submitted_at else ''
-                    
-                    excel_data.append({
-                        'Student Name': result.get('student_name', ''),
-                        'Student Email': result.get('student_email', ''),
-                        'Campus': result.get('campus_name', ''),
-                        'Course': result.get('course_name', ''),
-                        'Batch': result.get('batch_name', ''),
-                        'Test Name': result.get('test_name', ''),
-                        'Module': result.get('module_name', ''),
-                        'Test Type': result.get('test_type', ''),
-                        'Score (%)': score,
-                        'Total Questions': total_questions,
-                        'Correct Answers': correct_answers,
-                        'Submitted At': submitted_at
-                    })
-                
-                # Create Excel file
-                df = pd.DataFrame(excel_data)
-                output = BytesIO()
-                
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    # Main results sheet
-                    df.to_excel(writer, sheet_name='Test Results', index=False)
-                    
-                    # Summary sheet
-                    summary_data = {
-                        'Metric': ['Total Tests', 'Total Students', 'Average Score', 'Pass Rate'],
-                        'Value': [
-                            len(results),
-                            len(set(r.get('student_id') for r in results)),
-                            sum(r.get('average_score', 0) for r in results) / len(results) if results else 0,
-                            len([r for r in results if r.get('average_score', 0) >= 60]) / len(results) * 100 if results else 0
-                        ]
-                    }
-                    pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
-                
-                output.seek(0)
-                
-                from flask import Response
-                return Response(
-                    output.getvalue(),
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    headers={'Content-Disposition': f'attachment; filename=online-test-results-{datetime.now().strftime("%Y%m%d")}.xlsx'}
-                )
-                
-            except ImportError:
-                # Fallback to CSV if pandas is not available
-                current_app.logger.warning("pandas not available, falling back to CSV export")
-                export_format = 'csv'
-        
-        if export_format == 'csv':
-            # Export as CSV
-            import csv
-            import io
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Write header
-            writer.writerow([
-                'Student Name',
-                'Student Email',
-                'Campus',
-                'Course',
-                'Batch',
-                'Test Name',
-                'Module',
-                'Test Type',
-                'Score (%)',
-                'Total Questions',
-                'Correct Answers',
-                'Submitted At'
-            ])
-            
-            # Write data
-            for result in results:
-                # Extract actual values from MongoDB structures
-                score = result.get('average_score', 0)
-                if isinstance(score, dict) and 'numberDouble' in score:
-                    score = float(score['numberDouble'])
-                elif isinstance(score, dict) and 'numberInt' in score:
-                    score = float(score['numberInt'])
-                
-                total_questions = result.get('total_questions', 0)
-                if isinstance(total_questions, dict) and 'numberInt' in total_questions:
-                    total_questions = int(total_questions['numberInt'])
-                
-                correct_answers = result.get('correct_answers', 0)
-                if isinstance(correct_answers, dict) and 'numberInt' in correct_answers:
-                    correct_answers = int(correct_answers['numberInt'])
-                
-                # Format submitted_at as proper datetime
-                submitted_at = result.get('submitted_at', '')
-                if isinstance(submitted_at, dict) and 'date' in submitted_at:
-                    # Convert MongoDB date to readable format
-                    timestamp = int(submitted_at['date']['numberLong']) / 1000
-                    submitted_at = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-                else:
-                    submitted_at = safe_isoformat(submitted_at) if submitted_at else ''
-                
-                writer.writerow([
-                    result.get('student_name', ''),
-                    result.get('student_email', ''),
-                    result.get('campus_name', ''),
-                    result.get('course_name', ''),
-                    result.get('batch_name', ''),
-                    result.get('test_name', ''),
-                    result.get('module_name', ''),
-                    result.get('test_type', ''),
-                    score,
-                    total_questions,
-                    correct_answers,
-                    submitted_at
-                ])
-            
-            output.seek(0)
-            csv_content = output.getvalue()
-            
-            from flask import Response
-            return Response(
-                csv_content,
-                mimetype='text/csv',
-                headers={'Content-Disposition': f'attachment; filename=online-test-results-{datetime.now().strftime("%Y%m%d")}.csv'}
+            filename, mimetype = f'online-test-results-{date_tag}.xlsx', XLSX_MIMETYPE
+        else:
+            filename, mimetype = f'online-test-results-{date_tag}.csv', CSV_MIMETYPE
+
+        if request.args.get('background', 'false').lower() == 'true':
+            params = {'format': export_format, 'filters': dict(request.args)}
+            job = start_export_job(
+                current_user_id, 'results', filename, mimetype, _results_export_writer(params),
+                total=mongo_db.db.test_results.count_documents(match_conditions),
+                params=params
             )
+            return jsonify({
+                'success': True,
+                'message': 'Export started',
+                'data': serialize_job(job)
+            }), 202
+
+        if export_format == 'excel':
+            # Write-only workbook spooled to a temp file instead of a DataFrame in memory
+            return xlsx_response(excel_sheets(), filename)
+
+        # CSV is streamed row by row from the aggregation cursor
+        return csv_response(headers, result_rows(), filename)
         
     except Exception as e:
         current_app.logger.error(f"Error exporting results: {str(e)}")
@@ -3695,7 +3571,7 @@ def export_results():
 def migrate_batch_course_instances():
     # Only super admin
     current_user_id = get_jwt_identity()
-    user = mongo_db.find_user_by_id(current_user_id)
+    user = cached_user(current_user_id)
     if not user or user.get('role') != 'superadmin':
         return jsonify({'success': False, 'message': 'Access denied. Super admin privileges required.'}), 403
     # Migrate students
@@ -3708,6 +3584,7 @@ def migrate_batch_course_instances():
             instance_id = mongo_db.find_or_create_batch_course_instance(batch_id, course_id)
             mongo_db.students.update_one({'_id': s['_id']}, {'$set': {'batch_course_instance_id': instance_id}})
             updated_students += 1
+    invalidate_principal()
     # Migrate modules
     modules = list(mongo_db.modules.find())
     updated_modules = 0
@@ -3736,7 +3613,7 @@ def debug_test_results():
     """Debug endpoint to check test results data"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -3819,7 +3696,7 @@ def get_test_results_simple():
     """Simple endpoint to get test results without complex aggregation"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -3896,7 +3773,7 @@ def debug_collections():
     """Debug endpoint to check what collections exist and what data they contain"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -3972,7 +3849,7 @@ def verify_database():
     """Comprehensive database verification endpoint"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -4104,7 +3981,7 @@ def get_database_status():
     """Get comprehensive database status and connection information"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -4249,7 +4126,7 @@ def test_database_connection():
     """Simple test endpoint to verify database connection and show sample data"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -4333,7 +4210,7 @@ def debug_database_connection():
     """Debug endpoint to show exact database connection details"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -4417,7 +4294,7 @@ def force_connect_suma_madam():
     """Force connection to suma_madam database and test collections"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -4503,7 +4380,7 @@ def get_all_test_results():
     """Get all test results from all collections with detailed information"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -4877,6 +4754,12 @@ def get_all_test_results():
         except Exception as e:
             current_app.logger.warning(f"Error getting results from student_test_assignments: {e}")
         
+        # Rows whose aggregation $lookup found no user are enriched in one batch below
+        missing_contexts = StudentEnricher(include_users=True, match_student_id=False).resolve(
+            r['student_id'] for r in all_results
+            if r.get('student_name') == 'Unknown Student' and r.get('student_id')
+        )
+        
         # Remove duplicates and process results
         seen = set()
         unique_results = []
@@ -4907,39 +4790,18 @@ def get_all_test_results():
                 
                 convert_objectids_recursive(result)
                 
-                # If student details are missing, try direct lookup
-                if result.get('student_name') == 'Unknown Student' and result.get('student_id'):
-                    try:
-                        # Direct lookup for user details
-                        user_details = mongo_db.users.find_one({'_id': ObjectId(result['student_id'])})
-                        if user_details:
-                            result['student_name'] = user_details.get('name', 'Unknown Student')
-                            result['student_email'] = user_details.get('email', 'unknown@example.com')
-                            
-                            # Direct lookup for student profile
-                            student_profile = mongo_db.students.find_one({'user_id': ObjectId(result['student_id'])})
-                            if student_profile:
-                                # Direct lookup for campus
-                                if student_profile.get('campus_id'):
-                                    campus = mongo_db.campuses.find_one({'_id': student_profile['campus_id']})
-                                    if campus:
-                                        result['campus_name'] = campus.get('name', 'Unknown Campus')
-                                
-                                # Direct lookup for course
-                                if student_profile.get('course_id'):
-                                    course = mongo_db.courses.find_one({'_id': student_profile['course_id']})
-                                    if course:
-                                        result['course_name'] = course.get('name', 'Unknown Course')
-                                
-                                # Direct lookup for batch
-                                if student_profile.get('batch_id'):
-                                    batch = mongo_db.batches.find_one({'_id': student_profile['batch_id']})
-                                    if batch:
-                                        result['batch_name'] = batch.get('name', 'Unknown Batch')
-                                
-                                current_app.logger.info(f"Enhanced result for student {result['student_id']}: {result['student_name']}, {result['campus_name']}, {result['course_name']}, {result['batch_name']}")
-                    except Exception as e:
-                        current_app.logger.error(f"Error enhancing result for student {result.get('student_id')}: {str(e)}")
+                # If student details are missing, fill them from the batched lookup
+                ctx = missing_contexts.get(result['student_id'])
+                if result.get('student_name') == 'Unknown Student' and ctx and ctx.user:
+                    result['student_name'] = ctx.user.get('name', 'Unknown Student')
+                    result['student_email'] = ctx.user.get('email', 'unknown@example.com')
+                    if ctx.student:
+                        if ctx.campus_name:
+                            result['campus_name'] = ctx.campus_name
+                        if ctx.course_name:
+                            result['course_name'] = ctx.course_name
+                        if ctx.batch_name:
+                            result['batch_name'] = ctx.batch_name
                 
                 result['module_name'] = MODULES.get(result.get('module_name', ''), result.get('module_name', 'Unknown'))
                 if result.get('submitted_at'):
@@ -4993,7 +4855,7 @@ def get_test_result_details(result_id):
     """Get detailed test result with transcripts and audio URLs"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -5130,7 +4992,7 @@ def get_filter_options():
     """Get filter options for results page"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -5223,7 +5085,7 @@ def get_all_practice_results():
     """Get all practice test results from both collections for super admin"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -5310,7 +5172,7 @@ def get_student_progress(student_id):
     """Get detailed progress for a specific student"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({
@@ -5426,7 +5288,7 @@ def get_practice_tests_by_module():
     """Get practice tests grouped by module for progress tracking"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({'success': False, 'message': 'Access denied'}), 403
@@ -5473,7 +5335,7 @@ def get_test_assigned_students(test_id):
     """Get attempted and unattempted students for a specific test"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({'success': False, 'message': 'Access denied'}), 403
@@ -5602,7 +5464,7 @@ def get_student_test_progress(student_id, test_id):
     """Get student's progress for a specific test"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({'success': False, 'message': 'Access denied'}), 403
@@ -5638,14 +5500,9 @@ def get_student_test_progress(student_id, test_id):
         
         # Get student's attempts for this test
         attempts = list(mongo_db.student_test_attempts.find({
-            '$or': [
-                {'student_id': student_id},
-                {'student_id': ObjectId(student_id)},
-                {'user_id': student_id},
-                {'user_id': ObjectId(student_id)}
-            ],
-            'test_id': ObjectId(test_id),
-            'test_type': 'practice'
+            'student_oid': ObjectId(student_id),
+            'test_type': 'practice',
+            'test_id': ObjectId(test_id)
         }).sort('submitted_at', 1))
         
         # Process attempts
@@ -5712,7 +5569,7 @@ def get_superadmin_practice_attempt_details(attempt_id):
     """Get detailed results for a specific practice test attempt (Superadmin access)"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo_db.find_user_by_id(current_user_id)
+        user = cached_user(current_user_id)
         
         if not user or user.get('role') not in ALLOWED_ADMIN_ROLES:
             return jsonify({'success': False, 'message': 'Access denied'}), 403
@@ -5824,6 +5681,9 @@ def sync_rds_students():
             provision_missing=provision_missing,
             update_profile=update_profile,
         )
+        # Org data may have changed in the master database since it was cached
+        from services.rds_org_service import rds_org
+        stats['cache_entries_invalidated'] = rds_org.invalidate_cache()
 
         return jsonify({
             'success': True,
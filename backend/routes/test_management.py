@@ -4,6 +4,7 @@ from bson import ObjectId
 import csv
 import io
 import os
+import tempfile
 import uuid
 from datetime import datetime, timezone
 import boto3
@@ -37,6 +38,14 @@ from mongo import mongo_db
 from config.constants import ROLES, MODULES, LEVELS, TEST_TYPES, GRAMMAR_CATEGORIES, CRT_CATEGORIES, QUESTION_TYPES, TEST_CATEGORIES, MODULE_CATEGORIES
 from config.aws_config import s3_client, S3_BUCKET_NAME, get_s3_client_safe, presigned_url_for_audio
 from utils.audio_generator import generate_audio_from_text, calculate_similarity_score, transcribe_audio
+from utils.transcript_scoring import score_transcripts
+from services.transcription_service import (
+    STATUS_ABANDONED, TRANSCRIPTION_ASYNC, TranscriptionTask, expired_lease_query, lease_until, transcription_queue,
+)
+from services.progress_rollups import record_attempt
+from services.student_identity import stamp_student_oid
+from services.grading_engine import get_answer_key, invalidate_answer_key
+from services.shuffle_service import get_shuffle_plan, rng_for, shuffle_options
 import functools
 import string
 import random
@@ -50,6 +59,7 @@ import pytz
 from routes.access_control import require_permission
 from models import Test
 from utils.question_bank_text import normalize_question_bank_text, bank_text_key_from_doc
+from utils.shared_cache import cached_view, invalidates
 
 def safe_isoformat(date_obj):
     """Safely convert a date object to ISO format string, handling various types."""
@@ -698,6 +708,7 @@ def get_all_tests():
 
 @test_management_bp.route('/tests/<test_id>', methods=['DELETE'])
 @jwt_required()
+@invalidates('tests')
 def delete_test(test_id):
     """Delete a test and its associated S3 audio files (if any)."""
     try:
@@ -761,6 +772,7 @@ def delete_test(test_id):
 
         # Delete the test from the database
         mongo_db.tests.delete_one({'_id': ObjectId(test_id)})
+        invalidate_answer_key(test_id)
 
         return jsonify({'success': True, 'message': 'Test deleted successfully'}), 200
     except Exception as e:
@@ -770,6 +782,7 @@ def delete_test(test_id):
 
 @test_management_bp.route('/tests/<test_id>/end-time', methods=['PUT'])
 @jwt_required()
+@invalidates('tests')
 def update_test_end_time(test_id):
     """Update the endDateTime for an existing online test."""
     try:
@@ -1204,6 +1217,7 @@ def remind_students():
 @test_management_bp.route('/module-question-bank/upload', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def upload_module_questions():
     try:
         data = request.get_json()
@@ -1903,6 +1917,7 @@ def check_audio_generation_availability():
 @test_management_bp.route('/generate-audio', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def generate_audio_for_question():
     """Generate audio for a specific question"""
     try:
@@ -2137,9 +2152,9 @@ def get_random_questions_for_online_test():
                 'message': f'Not enough questions available. Need {total_questions_needed}, but only {len(all_questions)} found.'
             }), 400
         
-        # Shuffle all questions and select the required number
-        import random
-        random.shuffle(all_questions)
+        # Shuffle all questions and select the required number (private RNG, global state untouched)
+        rng = rng_for()
+        rng.shuffle(all_questions)
         selected_questions = all_questions[:total_questions_needed]
         
         # Group questions for each student
@@ -2174,18 +2189,7 @@ def get_random_questions_for_online_test():
                     # Remove empty options
                     options = {k: v for k, v in options.items() if v.strip()}
                     
-                    # Shuffle options
-                    option_items = list(options.items())
-                    random.shuffle(option_items)
-                    
-                    # Create new options dict with shuffled order
-                    shuffled_options = {}
-                    answer_mapping = {}
-                    
-                    for idx, (old_key, value) in enumerate(option_items):
-                        new_key = chr(ord('A') + idx)
-                        shuffled_options[new_key] = value
-                        answer_mapping[old_key] = new_key
+                    shuffled_options, answer_mapping = shuffle_options(options, rng)
                     
                     processed_question['options'] = shuffled_options
                     processed_question['correct_answer'] = answer_mapping.get(question.get('answer', 'A'), 'A')
@@ -2249,6 +2253,7 @@ def get_random_questions_for_online_test():
 @test_management_bp.route('/create-online-test-with-random-questions', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('tests')
 def create_online_test_with_random_questions():
     """Create an online test with random questions assigned to each student"""
     try:
@@ -2451,58 +2456,7 @@ def submit_practice_test():
                 'message': 'Test not found'
             }), 404
         
-        # Use consistent shuffling based on test_id (same as online tests)
-        import random
-        if 'questions' in test and isinstance(test['questions'], list):
-            # Use test_id as seed for consistent shuffling (same as online tests)
-            test_id_str = str(test_id)
-            random.seed(hash(test_id_str) % 1000000)
-            
-            # Shuffle questions (same as online tests)
-            random.shuffle(test['questions'])
-            
-            # Process questions with shuffling (same as online tests)
-            shuffled_questions = []
-            
-            for idx, q in enumerate(test['questions']):
-                if q.get('question_type') == 'mcq':
-                    # Build options dict from optionA...optionD
-                    options = {}
-                    answer_letter = q.get('answer')  # e.g. "C"
-
-                    for opt_key in ['A', 'B', 'C', 'D']:
-                        opt_field = f"option{opt_key}"
-                        if q.get(opt_field) is not None:
-                            options[opt_key] = q[opt_field]
-
-                    # Shuffle options
-                    items = list(options.items())
-                    random.shuffle(items)
-
-                    new_options = {}
-                    answer_map = {}
-                    for new_idx, (old_key, value) in enumerate(items):
-                        new_key = chr(ord('A') + new_idx)
-                        new_options[new_key] = value
-                        answer_map[old_key] = new_key
-
-                    # Store shuffled question data for validation
-                    shuffled_q = q.copy()
-                    shuffled_q['shuffled_options'] = new_options
-                    shuffled_q['answer_mapping'] = answer_map
-                    shuffled_q['shuffled_answer'] = answer_map.get(answer_letter)
-                    shuffled_questions.append(shuffled_q)
-                else:
-                    # Non-MCQ questions
-                    shuffled_q = q.copy()
-                    shuffled_questions.append(shuffled_q)
-            
-            # Reset random seed
-            random.seed()
-            
-            # Store shuffled questions for validation
-            test['shuffled_questions'] = shuffled_questions
-            current_app.logger.info(f"Applied consistent shuffling to {len(shuffled_questions)} questions for practice test validation")
+        answer_key = get_answer_key(test)
         
         # Check if student has access to this test
         current_app.logger.info(f"Looking for student profile with user_id: {current_user_id}")
@@ -2556,67 +2510,37 @@ def submit_practice_test():
         
         current_app.logger.info(f"Access granted for student {current_user_id} to test {test_id}")
         
-        # Process questions and calculate results - using same logic as online tests
-        # Get shuffled questions if available, otherwise use original questions
-        shuffled_questions = test.get('shuffled_questions', [])
-        if not shuffled_questions:
-            # If no shuffled questions, use original questions but apply same validation logic
-            shuffled_questions = test.get('questions', [])
-            current_app.logger.info(f"No shuffled questions found, using original questions")
-        
-        current_app.logger.info(f"Processing {len(shuffled_questions)} questions for test {test_id}")
-        current_app.logger.info(f"Using shuffled questions: {len(shuffled_questions) > 0}")
-        
-        # Use same validation approach as online tests
-        current_app.logger.info(f"Processing questions with standardized matching logic")
+        # Replay the per-student order the questions were shown in (see /student/test/<id>);
+        # answers arrive as answer_<display index>
+        questions = test.get('questions') or []
+        plan = get_shuffle_plan(test['_id'], current_user_id, questions)
+        current_app.logger.info(f"Processing {len(questions)} questions for test {test_id}")
         
         results = []
         total_score = 0
         correct_answers = 0
-        total_marks = len(shuffled_questions)
+        pending_audio = []
+        total_marks = len(questions)
         
-        for i, question in enumerate(shuffled_questions):
-            current_app.logger.info(f"Processing question {i}: type={question.get('question_type')}")
-            current_app.logger.info(f"Question {i} data: {question}")
-            
+        for i, original_idx, question in plan.iter_questions(questions):
             if question.get('question_type') == 'mcq':
                 # Handle MCQ question - use answer index format (answer_0, answer_1, etc.)
-                answer_key = f'answer_{i}'
-                current_app.logger.info(f"MCQ question {i}: looking for answer key '{answer_key}' in data")
+                answer_field = f'answer_{i}'
+                current_app.logger.info(f"MCQ question {i}: looking for answer key '{answer_field}' in data")
                 
-                if answer_key in data:
-                    student_answer_text = data[answer_key]
+                if answer_field in data:
+                    student_answer_text = data[answer_field]
                     
-                    # Use same logic as online tests - check for shuffled data first
-                    if 'shuffled_answer' in question and 'shuffled_options' in question:
-                        # Use shuffled answer mapping (same as online tests)
-                        correct_answer_letter = question.get('shuffled_answer', '')
-                        shuffled_options = question.get('shuffled_options', {})
-                        correct_answer_text = shuffled_options.get(correct_answer_letter, '')
-                        current_app.logger.info(f"Using shuffled answer mapping: {correct_answer_letter} -> {correct_answer_text}")
-                    else:
-                        # Fall back to original answer mapping (same as online tests)
-                        correct_answer_letter = question.get('answer', '')  # A, B, C, or D
-                        correct_answer_text = ''
-                        
-                        # Map answer letter to actual option text (same as online tests)
-                        if correct_answer_letter == 'A':
-                            correct_answer_text = question.get('optionA', '')
-                        elif correct_answer_letter == 'B':
-                            correct_answer_text = question.get('optionB', '')
-                        elif correct_answer_letter == 'C':
-                            correct_answer_text = question.get('optionC', '')
-                        elif correct_answer_letter == 'D':
-                            correct_answer_text = question.get('optionD', '')
-                        current_app.logger.info(f"Using original answer mapping: {correct_answer_letter} -> {correct_answer_text}")
+                    # Correct option text is the same whatever order the options were shown in;
+                    # only the displayed letter depends on the shuffle
+                    key_entry = answer_key.entry_for(question, original_idx)
+                    shown_options, answer_map = plan.mcq_options(question, original_idx)
+                    correct_answer_letter = answer_map.get(question.get('answer', ''), '')
+                    correct_answer_text = key_entry.correct_text
                     
-                    # Check if student answer matches correct answer text (same as online tests)
-                    is_correct = student_answer_text == correct_answer_text
+                    is_correct = key_entry.is_correct(student_answer_text)
                     score = 1 if is_correct else 0
                     
-                    current_app.logger.info(f"MCQ question {i}: student_answer='{student_answer_text}', correct_answer_text='{correct_answer_text}', is_correct={is_correct}")
-                    current_app.logger.info(f"Question {i} structure: correct_answer='{correct_answer_letter}', original_answer='{question.get('answer', '')}', options={question.get('optionA', '')[:20]}...")
-                    
                     if is_correct:
                         correct_answers += 1
                     total_score += score
@@ -2634,57 +2558,39 @@ def submit_practice_test():
                         'score': score
                     }
                     
-                    # Add options for display
-                    if 'shuffled_options' in question:
-                        result_data['options'] = question['shuffled_options']
-                    else:
-                        # Fallback to original options
-                        result_data['options'] = {
-                            'A': question.get('optionA', ''),
-                            'B': question.get('optionB', ''),
-                            'C': question.get('optionC', ''),
-                            'D': question.get('optionD', '')
-                        }
+                    # Options in the order the student saw them
+                    result_data['options'] = shown_options
                     
                     results.append(result_data)
                 else:
-                    current_app.logger.warning(f"MCQ question {i}: answer key '{answer_key}' not found in data. Available keys: {list(data.keys())}")
+                    current_app.logger.warning(f"MCQ question {i}: answer key '{answer_field}' not found in data. Available keys: {list(data.keys())}")
                     # Add empty result for missing answer
+                    shown_options, answer_map = plan.mcq_options(question, original_idx)
                     empty_result = {
                         'question_index': i,
                         'question_id': str(question.get('_id', i)),
                         'question': question['question'],
                         'question_type': 'mcq',
                         'student_answer': '',
-                        'correct_answer_letter': question.get('answer', ''),
+                        'correct_answer_letter': answer_map.get(question.get('answer', ''), ''),
                         'correct_answer_text': '',
                         'is_correct': False,
-                        'score': 0
+                        'score': 0,
+                        # Options in the order the student saw them
+                        'options': shown_options,
                     }
                     
-                    # Add options for display
-                    if 'shuffled_options' in question:
-                        empty_result['options'] = question['shuffled_options']
-                    else:
-                        # Fallback to original options
-                        empty_result['options'] = {
-                            'A': question.get('optionA', ''),
-                            'B': question.get('optionB', ''),
-                            'C': question.get('optionC', ''),
-                            'D': question.get('optionD', '')
-                        }
-                    
                     results.append(empty_result)
             elif question.get('question_type') in ['compiler', 'technical']:
                 # Handle compiler/technical question
-                answer_key = f'answer_{i}'
-                current_app.logger.info(f"Compiler question {i}: looking for answer key '{answer_key}' in data")
+                answer_field = f'answer_{i}'
+                current_app.logger.info(f"Compiler question {i}: looking for answer key '{answer_field}' in data")
                 
-                if answer_key in data:
+                if answer_field in data:
                     import json
                     try:
                         # Parse the code submission
-                        answer_data = json.loads(data[answer_key]) if isinstance(data[answer_key], str) else data[answer_key]
+                        answer_data = json.loads(data[answer_field]) if isinstance(data[answer_field], str) else data[answer_field]
                         student_code = answer_data.get('code', '')
                         student_language = answer_data.get('language', question.get('language', 'python'))
                         
@@ -2737,7 +2643,7 @@ def submit_practice_test():
                             'score': 0
                         })
                 else:
-                    current_app.logger.warning(f"Compiler question {i}: answer key '{answer_key}' not found")
+                    current_app.logger.warning(f"Compiler question {i}: answer key '{answer_field}' not found")
                     # Add empty result
                     results.append({
                         'question_index': i,
@@ -2805,8 +2711,13 @@ def submit_practice_test():
                 student_audio_url = f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/{student_audio_key}"
                 
                 # Download for transcription
-                temp_audio_path = f"temp_student_{question_identifier}_{uuid.uuid4()}.{file_extension}"
-                current_s3_client.download_file(S3_BUCKET_NAME, student_audio_key, temp_audio_path)
+                fd, temp_audio_path = tempfile.mkstemp(prefix='student_audio_', suffix=f'.{file_extension}')
+                os.close(fd)
+                try:
+                    current_s3_client.download_file(S3_BUCKET_NAME, student_audio_key, temp_audio_path)
+                except Exception:
+                    os.remove(temp_audio_path)
+                    raise
                 
                 # Transcribe student audio
                 try:
@@ -2858,14 +2769,31 @@ def submit_practice_test():
                 # Get the original text to compare against
                 original_text = question.get('question') or question.get('sentence', '')
                 
-                # Calculate similarity score
-                try:
-                    similarity_score = calculate_similarity_score(original_text, student_text)
-                    # Convert percentage to decimal (0-1 scale)
-                    similarity_score = similarity_score / 100.0
-                except Exception as e:
-                    current_app.logger.error(f"Error calculating similarity for question {i}: {e}")
-                    similarity_score = 0.0
+                # Scored together with the attempt's other audio answers after the loop
+                result = {
+                    'question_index': i,
+                    'question': question['question'],
+                    'question_type': 'audio',
+                    'student_audio_url': student_audio_url,
+                    'student_text': student_text,
+                    'original_text': original_text
+                }
+                results.append(result)
+                pending_audio.append((result, question))
+        
+        # Score every audio answer of the attempt in one batch
+        if pending_audio:
+            try:
+                transcript_scores = score_transcripts(
+                    (result['original_text'], result['student_text']) for result, _ in pending_audio
+                )
+            except Exception as e:
+                current_app.logger.error(f"Error calculating transcript similarity: {e}")
+                transcript_scores = [None] * len(pending_audio)
+            
+            for (result, question), transcript_score in zip(pending_audio, transcript_scores):
+                # Convert percentage to decimal (0-1 scale)
+                similarity_score = transcript_score.score / 100.0 if transcript_score else 0.0
                 
                 # Determine if answer is correct based on module type
                 is_correct = False
@@ -2876,32 +2804,26 @@ def submit_practice_test():
                     threshold = question.get('transcript_validation', {}).get('tolerance', 0.8)
                     is_correct = similarity_score >= threshold
                     score = similarity_score
-                    current_app.logger.info(f"Listening question {i}: original='{original_text[:50]}...', student='{student_text[:50]}...', similarity={similarity_score:.3f}, threshold={threshold}, is_correct={is_correct}")
                 elif test.get('module_id') == 'SPEAKING':
                     # For speaking, similar logic but with different threshold
                     threshold = question.get('transcript_validation', {}).get('tolerance', 0.7)
                     is_correct = similarity_score >= threshold
                     score = similarity_score
-                    current_app.logger.info(f"Speaking question {i}: original='{original_text[:50]}...', student='{student_text[:50]}...', similarity={similarity_score:.3f}, threshold={threshold}, is_correct={is_correct}")
                 
                 if is_correct:
                     correct_answers += 1
                 total_score += score
                 
-                results.append({
-                    'question_index': i,
-                    'question': question['question'],
-                    'question_type': 'audio',
-                    'student_audio_url': student_audio_url,
-                    'student_text': student_text,
-                    'original_text': original_text,
+                result.update({
                     'similarity_score': similarity_score,
+                    'word_error_rate': transcript_score.wer if transcript_score else 1.0,
                     'is_correct': is_correct,
                     'score': score
                 })
+            current_app.logger.info(f"Scored {len(pending_audio)} audio answers, module={test.get('module_id')}")
         
         # Calculate score and percentage - same logic as online tests
-        total_questions = len(shuffled_questions)
+        total_questions = len(questions)
         percentage = (total_score / total_questions) * 100 if total_questions > 0 else 0
         current_app.logger.info(f"Test results: total_score={total_score}, total_questions={total_questions}, percentage={percentage:.2f}%, correct_answers={correct_answers}")
         
@@ -2938,8 +2860,9 @@ def submit_practice_test():
         current_app.logger.info(f"Saving test attempt: {attempt_doc}")
         
         # Save to student_test_attempts collection
-        mongo_db.student_test_attempts.insert_one(attempt_doc)
+        mongo_db.student_test_attempts.insert_one(stamp_student_oid(attempt_doc, current_user_id))
         current_app.logger.info("Test attempt saved to student_test_attempts collection")
+        record_attempt(attempt_doc, test)
         
         # Also save to test_results collection for compatibility with existing endpoints
         test_result_doc = {
@@ -2961,7 +2884,7 @@ def submit_practice_test():
         }
         
         try:
-            mongo_db.test_results.insert_one(test_result_doc)
+            mongo_db.test_results.insert_one(stamp_student_oid(test_result_doc, current_user_id))
             current_app.logger.info("Test result also saved to test_results collection")
         except Exception as e:
             current_app.logger.warning(f"Could not save to test_results collection: {e}")
@@ -3070,7 +2993,7 @@ def submit_technical_test():
         }
         
         # Insert result
-        result_id = mongo_db.test_results.insert_one(result_doc).inserted_id
+        result_id = mongo_db.test_results.insert_one(stamp_student_oid(result_doc, get_jwt_identity())).inserted_id
         
         # Update test usage statistics
         for question_index, answer in answers.items():
@@ -3708,6 +3631,7 @@ def update_crt_topic(topic_id):
 @test_management_bp.route('/crt-topics/<topic_id>', methods=['DELETE'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def delete_crt_topic(topic_id):
     """Delete a CRT topic and cascade delete all associated questions"""
     try:
@@ -3868,6 +3792,7 @@ def separate_crt_modules():
 @test_management_bp.route('/crt-topics/<topic_id>/questions', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def add_questions_to_topic(topic_id):
     """Add questions to a specific CRT topic"""
     try:
@@ -4585,6 +4510,7 @@ def get_file_questions(file_id):
 @test_management_bp.route('/uploaded-files/<file_id>/questions', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def add_question_to_file(file_id):
     """Add a single question to an uploaded file"""
     try:
@@ -4667,6 +4593,7 @@ def get_questions():
 @test_management_bp.route('/questions/add', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def add_question():
     """Add a single question to the question bank"""
     try:
@@ -4712,6 +4639,7 @@ def add_question():
 @test_management_bp.route('/questions/<question_id>', methods=['PUT'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def update_question(question_id):
     """Update a question in the question bank"""
     try:
@@ -4787,6 +4715,7 @@ def _normalize_embedded_question_id(qid):
 @test_management_bp.route('/questions/<question_id>', methods=['DELETE'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank', 'tests')
 def delete_question(question_id):
     """Delete a question from the question bank.
 
@@ -4878,8 +4807,9 @@ def delete_question(question_id):
                 if changed:
                     mongo_db.tests.update_one(
                         {'_id': test['_id']},
-                        {'$set': {'questions': new_questions}},
+                        {'$set': {'questions': new_questions, 'updated_at': datetime.now(timezone.utc)}},
                     )
+                    invalidate_answer_key(test['_id'])
                     migrated_tests += 1
 
             ref_tests = mongo_db.tests.count_documents(
@@ -4949,6 +4879,7 @@ def delete_question(question_id):
 @test_management_bp.route('/questions/bulk', methods=['DELETE'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def bulk_delete_questions():
     """Bulk delete question bank items"""
     try:
@@ -5064,6 +4995,7 @@ def get_technical_questions():
 @test_management_bp.route('/upload-questions', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def upload_questions():
     """Upload MCQ questions from file"""
     try:
@@ -5433,6 +5365,7 @@ def upload_questions():
 @test_management_bp.route('/upload-sentences', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def upload_sentences():
     """Upload sentence questions for listening/speaking modules"""
     try:
@@ -5586,6 +5519,7 @@ def upload_sentences():
 @test_management_bp.route('/upload-paragraphs', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def upload_paragraphs():
     """Upload paragraph questions for writing module"""
     try:
@@ -5689,6 +5623,7 @@ def upload_paragraphs():
 @test_management_bp.route('/upload-technical-questions', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank')
 def upload_technical_questions():
     """Upload technical questions (MCQ + Compiler)"""
     try:
@@ -5945,6 +5880,7 @@ def upload_technical_questions():
 @test_management_bp.route('/modules', methods=['GET'])
 @jwt_required()
 @require_superadmin
+@cached_view('question_counts', ttl=60, tags=('question_bank',))
 def get_modules():
     """Get available modules with question counts"""
     try:
@@ -5988,6 +5924,7 @@ def get_modules():
 @test_management_bp.route('/levels', methods=['GET'])
 @jwt_required()
 @require_superadmin
+@cached_view('question_counts', ttl=60, tags=('question_bank',))
 def get_levels():
     """Get levels for a specific module"""
     try:
@@ -6411,6 +6348,7 @@ def test_email_service():
 @test_management_bp.route('/fix-audio-urls', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('tests')
 def fix_corrupted_audio_urls():
     """Fix corrupted audio URLs in the database"""
     try:
@@ -6535,11 +6473,18 @@ def submit_online_listening_test():
         
         current_app.logger.info(f"Found student profile: {student.get('name')}")
         
-        # Check for existing completed attempts to prevent duplicates
+        # Check for existing completed attempts to prevent duplicates; an attempt whose
+        # transcription lease expired counts as not submitted and is abandoned
+        now = datetime.now(timezone.utc)
+        mongo_db.student_test_attempts.update_many(
+            {'test_id': test_object_id, 'student_id': student['_id'], 'status': 'processing',
+             **expired_lease_query(now)},
+            {'$set': {'status': STATUS_ABANDONED, 'transcription_status': STATUS_ABANDONED}}
+        )
         existing_attempt = mongo_db.student_test_attempts.find_one({
             'test_id': test_object_id,
             'student_id': student['_id'],
-            'status': 'completed'
+            'status': {'$in': ['completed', 'processing']}
         })
         
         if existing_attempt:
@@ -6553,6 +6498,11 @@ def submit_online_listening_test():
         results = []
         total_score = 0
         total_marks = 0
+        pending_audio = []
+        
+        # Async mode: store the recordings, respond now and let the transcription queue score them
+        async_transcription = str(data.get('async_transcription', TRANSCRIPTION_ASYNC)).lower() == 'true'
+        transcription_tasks = []
         
         for i, question in enumerate(test.get('questions', [])):
             current_app.logger.info(f"Processing question {i+1}: {question.get('question_type')}")
@@ -6641,9 +6591,44 @@ def submit_online_listening_test():
                 # Create full S3 URL for frontend access
                 student_audio_url = f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/{student_audio_key}"
                 
+                if async_transcription:
+                    correct_answer = (
+                        (question.get('sentence') or '').strip()
+                        or (question.get('original_text') or '').strip()
+                        or (question.get('correct_answer') or '').strip()
+                        or (question.get('question') or '').strip()
+                    )
+                    total_marks += 1
+                    results.append({
+                        'question_index': i,
+                        'question_id': str(question.get('_id') or question.get('question_id') or ''),
+                        'question': question.get('question'),
+                        'question_type': 'audio',
+                        'student_answer': '',
+                        'student_text': '',
+                        'original_text': correct_answer,
+                        'correct_answer': correct_answer,
+                        'is_correct': False,
+                        'score': 0,
+                        'student_audio_url': student_audio_url,
+                        'student_audio_key': student_audio_key,
+                        'transcription_status': 'pending'
+                    })
+                    transcription_tasks.append(TranscriptionTask(
+                        result_index=len(results) - 1,
+                        reference_text=correct_answer,
+                        audio_key=student_audio_key
+                    ))
+                    continue
+                
                 # Download for transcription
-                temp_audio_path = f"temp_student_{question_identifier}_{uuid.uuid4()}.{file_extension}"
-                current_s3_client.download_file(S3_BUCKET_NAME, student_audio_key, temp_audio_path)
+                fd, temp_audio_path = tempfile.mkstemp(prefix='student_audio_', suffix=f'.{file_extension}')
+                os.close(fd)
+                try:
+                    current_s3_client.download_file(S3_BUCKET_NAME, student_audio_key, temp_audio_path)
+                except Exception:
+                    os.remove(temp_audio_path)
+                    raise
                 
                 # Transcribe student audio
                 try:
@@ -6684,27 +6669,10 @@ def submit_online_listening_test():
                     or (question.get('question') or '').strip()
                 )
 
-                # Calculate similarity score (0–100 scale)
-                try:
-                    current_app.logger.info(f"Calculating similarity for question {i}:")
-                    current_app.logger.info(f"  Student text: '{student_text}'")
-                    current_app.logger.info(f"  Reference text: '{correct_answer}'")
-
-                    similarity_score = calculate_similarity_score(correct_answer, student_text)
-                    is_correct = similarity_score >= 70
-                    score = 1 if is_correct else 0
-
-                    current_app.logger.info(f"  Similarity score: {similarity_score}%, is_correct: {is_correct}")
-                except Exception as e:
-                    current_app.logger.error(f"Error calculating similarity for question {i}: {e}")
-                    similarity_score = 0.0
-                    is_correct = False
-                    score = 0
-
-                total_score += score
                 total_marks += 1
 
-                results.append({
+                # Similarity is computed for all audio answers at once after the loop
+                result = {
                     'question_index': i,
                     'question_id': str(question.get('_id') or question.get('question_id') or ''),
                     'question': question.get('question'),
@@ -6713,11 +6681,35 @@ def submit_online_listening_test():
                     'student_text': student_text,
                     'original_text': correct_answer,
                     'correct_answer': correct_answer,
+                    'student_audio_url': student_audio_url
+                }
+                results.append(result)
+                pending_audio.append(result)
+        
+        # Score every audio answer of the attempt in one batch (0–100 scale)
+        if pending_audio:
+            try:
+                transcript_scores = score_transcripts(
+                    (result['correct_answer'], result['student_text']) for result in pending_audio
+                )
+            except Exception as e:
+                current_app.logger.error(f"Error calculating transcript similarity: {e}")
+                transcript_scores = [None] * len(pending_audio)
+            
+            for result, transcript_score in zip(pending_audio, transcript_scores):
+                similarity_score = transcript_score.score if transcript_score else 0.0
+                is_correct = similarity_score >= 70
+                score = 1 if is_correct else 0
+                total_score += score
+                result.update({
                     'is_correct': is_correct,
                     'score': score,
                     'similarity_score': similarity_score,
-                    'student_audio_url': student_audio_url
+                    'word_error_rate': transcript_score.wer if transcript_score else 1.0
                 })
+                current_app.logger.info(
+                    f"Question {result['question_index']}: similarity={similarity_score}%, is_correct={is_correct}"
+                )
         
         # Calculate final score - for listening modules, use average of similarity scores
         if test.get('module_id') == 'LISTENING':
@@ -6765,13 +6757,35 @@ def submit_online_listening_test():
             'answers': {f'question_{i}': result['student_answer'] for i, result in enumerate(results)},
             'detailed_results': results
         }
+        if transcription_tasks:
+            # Totals are recomputed when the transcription queue finishes
+            result_doc['status'] = 'processing'
+            result_doc['transcription_status'] = 'pending'
+            result_doc['transcription_lease_until'] = lease_until(current_time)
         
         current_app.logger.info(f"Saving online listening test result: {result_doc}")
         
         # Save to student_test_attempts collection
-        mongo_db.student_test_attempts.insert_one(result_doc)
+        insert_result = mongo_db.student_test_attempts.insert_one(stamp_student_oid(result_doc, current_user_id))
         current_app.logger.info("Online listening test result saved to student_test_attempts collection")
         
+        if transcription_tasks:
+            transcription_queue.submit_attempt(insert_result.inserted_id, current_user_id, transcription_tasks)
+            current_app.logger.info(f"Queued {len(transcription_tasks)} audio answers for transcription")
+            return jsonify({
+                'success': True,
+                'message': 'Online listening test submitted. Your answers are being evaluated.',
+                'data': {
+                    'test_id': str(test_custom_id),
+                    'attempt_id': str(insert_result.inserted_id),
+                    'transcription_status': 'pending',
+                    'total_questions': len(test.get('questions', [])),
+                    'results': results
+                }
+            }), 202
+        
+        record_attempt(result_doc, test)
+        
         return jsonify({
             'success': True,
             'message': 'Online listening test submitted successfully',
@@ -14,12 +14,14 @@ from services.org_data_source import (
 )
 from utils.audio_generator import generate_audio_from_text
 from utils.question_bank_text import normalize_question_bank_text, bank_text_key_from_doc
+from utils.shared_cache import invalidates
 
 audio_test_bp = Blueprint('audio_test_management', __name__)
 
 @audio_test_bp.route('/create', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank', 'tests')
 def create_audio_test():
     """Create audio test for Listening and Speaking modules"""
     try:
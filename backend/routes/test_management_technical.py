@@ -11,12 +11,14 @@ from services.org_data_source import (
     derive_rds_course_ids_from_batches,
 )
 from services.compiler_service import compiler_service
+from utils.shared_cache import invalidates
 
 technical_test_bp = Blueprint('technical_test_management', __name__)
 
 @technical_test_bp.route('/create', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank', 'tests')
 def create_technical_test():
     """Create technical test for CRT Technical module"""
     try:
@@ -5,6 +5,7 @@ from datetime import datetime
 import pytz
 from mongo import mongo_db
 from routes.test_management import require_superadmin, generate_unique_test_id, convert_objectids
+from utils.shared_cache import invalidates
 from services.org_data_source import (
     use_rds,
     normalize_test_org_ids,
@@ -16,6 +17,7 @@ writing_test_bp = Blueprint('writing_test_management', __name__)
 @writing_test_bp.route('/create', methods=['POST'])
 @jwt_required()
 @require_superadmin
+@invalidates('question_bank', 'tests')
 def create_writing_test():
     """Create writing test for Writing module"""
     try:
@@ -0,0 +1,37 @@
+"""
+Build student_progress_rollups from the existing attempt history.
+Run: python backend/scripts/backfill_progress_rollups.py [--student USER_ID]
+
+Safe to re-run: every rollup is recomputed from scratch. Run it off-peak,
+since a submission that lands while its student is being rebuilt can be
+overwritten by the rebuilt document.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import progress_rollups  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--student', help='Rebuild a single student (user id)')
+    args = parser.parse_args()
+
+    if args.student:
+        doc = progress_rollups.rebuild_student(args.student)
+        print(f"Rebuilt rollup for {args.student}: {progress_rollups.total_attempts(doc)} attempts")
+        return
+
+    def report(done):
+        if done % 500 == 0:
+            print(f"  {done} students rebuilt")
+
+    total = progress_rollups.backfill(on_progress=report)
+    print(f"Backfill complete: {total} student rollups rebuilt")
+
+
+if __name__ == '__main__':
+    main()
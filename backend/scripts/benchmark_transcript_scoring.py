@@ -0,0 +1,92 @@
+"""
+Micro-benchmark: legacy difflib similarity vs utils.transcript_scoring.
+Run: python backend/scripts/benchmark_transcript_scoring.py [--repeat N]
+
+The legacy scorer is the pre-transcript_scoring ``calculate_similarity``
+(SequenceMatcher over characters + word-set overlap) without its prints.
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.transcript_scoring import _levenshtein_dp, levenshtein, score_transcript, score_transcripts  # noqa: E402
+
+WORDS = (
+    'the students read a passage aloud while the examiner listened carefully to every word '
+    'pronunciation fluency and accuracy are measured against the reference text before a final '
+    'score is calculated for each question in the speaking and listening modules'
+).split()
+
+
+def legacy_similarity(original_text, student_audio_text):
+    if not original_text or not student_audio_text:
+        return 0.0
+    original_lower = original_text.lower().strip()
+    student_lower = student_audio_text.lower().strip()
+    similarity = SequenceMatcher(None, original_lower, student_lower).ratio()
+    original_words = set(original_lower.split())
+    student_words = set(student_lower.split())
+    if not original_words:
+        return 0.0
+    word_accuracy = len(original_words.intersection(student_words)) / len(original_words)
+    return round(((similarity * 0.7) + (word_accuracy * 0.3)) * 100, 2)
+
+
+def make_pair(rng, n_words, error_rate=0.15):
+    reference = [rng.choice(WORDS) for _ in range(n_words)]
+    transcript = []
+    for word in reference:
+        roll = rng.random()
+        if roll < error_rate / 3:
+            continue                                # deletion
+        if roll < 2 * error_rate / 3:
+            transcript.append(rng.choice(WORDS))    # substitution
+        elif roll < error_rate:
+            transcript.extend([word, rng.choice(WORDS)])  # insertion
+        else:
+            transcript.append(word)
+    return ' '.join(reference).capitalize() + '.', ' '.join(transcript)
+
+
+def bench(label, func, repeat):
+    seconds = min(timeit.repeat(func, number=1, repeat=repeat))
+    print(f'  {label:<28} {seconds * 1000:9.2f} ms')
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+
+    # Sanity check: the bit-parallel distance must match the plain DP
+    for _ in range(200):
+        reference, transcript = make_pair(rng, rng.randint(1, 40))
+        assert levenshtein(reference, transcript) == _levenshtein_dp(reference, transcript)
+
+    for name, n_words in (('sentence', 12), ('paragraph', 120), ('long paragraph', 400)):
+        reference, transcript = make_pair(rng, n_words)
+        print(f'\n{name} ({n_words} words, {len(reference)} chars)')
+        legacy = bench('legacy difflib', lambda: legacy_similarity(reference, transcript), args.repeat)
+        bench('two-row DP (chars only)', lambda: _levenshtein_dp(reference.lower(), transcript), args.repeat)
+        new = bench('transcript_scoring', lambda: score_transcript(reference, transcript), args.repeat)
+        print(f'  speed-up                     {legacy / new:9.1f}x')
+        print(f'  scores: legacy={legacy_similarity(reference, transcript)} '
+              f'new={score_transcript(reference, transcript).score}')
+
+    pairs = [make_pair(rng, rng.randint(10, 150)) for _ in range(20)]
+    print('\nattempt of 20 questions')
+    legacy = bench('legacy difflib (loop)', lambda: [legacy_similarity(r, t) for r, t in pairs], args.repeat)
+    new = bench('score_transcripts (batch)', lambda: score_transcripts(pairs), args.repeat)
+    print(f'  speed-up                     {legacy / new:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+Migration script: write the canonical student_oid onto attempts and results.
+Run: python backend/scripts/migrate_student_oid.py [--batch-size N]
+
+Creates the (student_oid, test_type, status, submitted_at) index on
+student_test_attempts and test_results, then backfills student_oid on every
+document that lacks it. Safe to re-run; run it before deploying read paths
+that match on student_oid.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import student_identity  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-size', type=int, default=student_identity.MIGRATION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    def report(name, updated, unresolved):
+        print(f"  {name}: {updated} updated, {unresolved} unresolved")
+
+    results = student_identity.migrate(batch_size=args.batch_size, on_batch=report)
+    for name, stats in results.items():
+        print(f"{name}: {stats['updated']} documents updated, {stats['unresolved']} without a resolvable student")
+    print('Migration complete')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Local stand-in for the BulkSMS HTTP API, for load tests of utils.sms_dispatcher.
+Run: python backend/scripts/mock_sms_gateway.py [--port 8025] [--latency-ms 80] [--drive 3000]
+
+Answers the send (apismsv2.aspx / apibulkv2.aspx), balance and delivery
+status endpoints like the gateway does: one ``MessageId-<n>`` line per
+number of a (comma-separated) submission, a delivery report that turns
+from ``Pending`` to ``DELIVRD`` after ``--deliver-after`` seconds. Requests
+above ``--rate-limit`` per second, numbers listed in ``--reject`` and a
+random ``--fail-rate`` share are answered with an error text. Connections
+are kept alive, so ``GET /stats`` shows whether clients reuse them.
+
+Point the backend at it with:
+
+    BULKSMS_ENGLISH_API_URL=http://127.0.0.1:8025/api/apismsv2.aspx
+    BULKSMS_UNICODE_API_URL=http://127.0.0.1:8025/api/apibulkv2.aspx
+    BULKSMS_BALANCE_API_URL=http://127.0.0.1:8025/api/apicheckbalancev2.aspx
+    BULKSMS_DELIVERY_API_URL=http://127.0.0.1:8025/api/apiDeliveryStatusv2.aspx
+
+``--drive N`` sets these itself, sends N credential SMS (distinct texts)
+and N test notices (one text) through ``sms_dispatcher`` and prints the
+time taken and the gateway counters (delivery tracking is disabled).
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class GatewayState:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.message_ids = itertools.count(100000)
+        self.submitted = {}  # message id -> submit time
+        self.recent = deque()  # request times, for --rate-limit
+        self.counters = {'connections': 0, 'requests': 0, 'submissions': 0, 'numbers': 0,
+                         'multi_number_submissions': 0, 'rejected': 0, 'rate_limited': 0, 'delivery_checks': 0}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.counters[key] += amount
+
+    def over_rate(self) -> bool:
+        if not self.args.rate_limit:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 1:
+                self.recent.popleft()
+            if len(self.recent) >= self.args.rate_limit:
+                self.counters['rate_limited'] += 1
+                return True
+            self.recent.append(now)
+            return False
+
+    def submit(self, numbers):
+        with self.lock:
+            ids = [next(self.message_ids) for _ in numbers]
+            now = time.time()
+            for message_id in ids:
+                self.submitted[str(message_id)] = now
+            self.counters['submissions'] += 1
+            self.counters['numbers'] += len(numbers)
+            if len(numbers) > 1:
+                self.counters['multi_number_submissions'] += 1
+        return ids
+
+    def delivery(self, message_id) -> str:
+        with self.lock:
+            self.counters['delivery_checks'] += 1
+            submitted = self.submitted.get(message_id)
+        if submitted is None:
+            return 'Invalid MessageId'
+        return 'DELIVRD' if time.time() - submitted >= self.args.deliver_after else 'Pending'
+
+
+def make_handler(state: GatewayState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            state.count('connections')
+
+        def log_message(self, format, *args):
+            if state.args.verbose:
+                super().log_message(format, *args)
+
+        def _reply(self, text, status=200, content_type='text/plain'):
+            body = text.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _params(self):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                body = self.rfile.read(length).decode()
+                params.update({key: values[-1] for key, values in parse_qs(body).items()})
+            return url.path.rsplit('/', 1)[-1].lower(), params
+
+        def _handle(self):
+            state.count('requests')
+            endpoint, params = self._params()
+            if endpoint == 'stats':
+                with state.lock:
+                    return self._reply(json.dumps(state.counters), content_type='application/json')
+            if state.args.latency_ms:
+                time.sleep(random.uniform(0.5, 1.5) * state.args.latency_ms / 1000)
+            if endpoint == 'apicheckbalancev2.aspx':
+                return self._reply('Balance: 100000')
+            if endpoint == 'apideliverystatusv2.aspx':
+                return self._reply(state.delivery(params.get('messageid', '')))
+            if endpoint not in ('apismsv2.aspx', 'apibulkv2.aspx'):
+                return self._reply('Not found', status=404)
+
+            numbers = [number for number in params.get('number', '').split(',') if number]
+            if state.over_rate():
+                return self._reply('Error: Rate limit exceeded')
+            if not params.get('apikey') or not numbers or not params.get('message'):
+                state.count('rejected')
+                return self._reply('Error: Invalid parameters')
+            if any(number in state.args.reject for number in numbers) or random.random() < state.args.fail_rate:
+                state.count('rejected')
+                return self._reply('Error: Invalid mobile number')
+            return self._reply('\n'.join(f'MessageId-{message_id}' for message_id in state.submit(numbers)))
+
+        do_GET = _handle
+        do_POST = _handle
+
+    return Handler
+
+
+def drive(base_url: str, count: int):
+    api = f'{base_url}/api'
+    os.environ.update({
+        'BULKSMS_ENGLISH_API_URL': f'{api}/apismsv2.aspx',
+        'BULKSMS_UNICODE_API_URL': f'{api}/apibulkv2.aspx',
+        'BULKSMS_BALANCE_API_URL': f'{api}/apicheckbalancev2.aspx',
+        'BULKSMS_DELIVERY_API_URL': f'{api}/apiDeliveryStatusv2.aspx',
+        'SMS_TRACKING_ENABLED': 'false',
+    })
+    from utils.sms_dispatcher import SMSMessage, sms_dispatcher  # noqa: E402
+    from utils.sms_service import credentials_message, sms_gateway, test_scheduled_message  # noqa: E402
+
+    phones = [f'9{index:09d}' for index in range(count)]
+    runs = [
+        ('credentials', [SMSMessage(phone, credentials_message(f'roll{index}', f'pass{index}'), 'student_credentials')
+                         for index, phone in enumerate(phones)]),
+        ('test_scheduled', [SMSMessage(phone, test_scheduled_message('Mock Test', '17 Oct 2026, 10:00 AM', 'T1'),
+                                       'test_scheduled') for phone in phones]),
+    ]
+    for name, messages in runs:
+        started = time.perf_counter()
+        results = sms_dispatcher.send_many(messages)
+        elapsed = time.perf_counter() - started
+        sent = sum(1 for result in results if result['success'])
+        print(f'{name}: {sent}/{len(messages)} sent in {elapsed:.2f}s ({len(messages) / elapsed:.0f} msg/s)')
+    snapshot = sms_gateway.snapshot()
+    print(f"client: {snapshot['requests']} requests, {snapshot['rate_limited_seconds']}s waiting for the rate limiter")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock BulkSMS gateway')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency-ms', type=float, default=80, help='mean response latency')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of submissions answered with an error')
+    parser.add_argument('--reject', nargs='*', default=[], help='numbers the gateway refuses')
+    parser.add_argument('--rate-limit', type=int, default=0, help='requests per second before answering errors')
+    parser.add_argument('--deliver-after', type=float, default=5, help='seconds until a message reports DELIVRD')
+    parser.add_argument('--drive', type=int, default=0, help='send this many SMS through sms_dispatcher, then exit')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    state = GatewayState(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    server.daemon_threads = True
+    base_url = f'http://{args.host}:{server.server_address[1]}'
+
+    if args.drive:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        drive(base_url, args.drive)
+        print(f'gateway: {json.dumps(state.counters)}')
+        server.shutdown()
+        return
+
+    print(f'📱 Mock SMS gateway on {base_url}/api (stats: {base_url}/stats)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f'\ngateway: {json.dumps(state.counters)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Replay a recorded Mongo workload through utils.mongo_profiler, offline.
+Run: python backend/scripts/profile_mongo_fixture.py [fixture.json] [--json]
+
+No server is needed: commands are fed to ``MongoCommandProfiler.observe``
+and explains are answered by a fixture planner that picks an IXSCAN when
+the filter (or the first ``$match``) uses the leading field of a declared
+index and a COLLSCAN otherwise, unless the fixture carries a canned
+explain document for the collection. Without a fixture a small built-in
+workload modelled on the superadmin / test_management listings is used.
+
+Fixture format:
+
+    {
+      "indexes": {"students": [["user_id"], ["batch_id", "course_id"]]},
+      "explains": {"tests": {...explain output...}},
+      "commands": [
+        {"database": "versant", "command": "find", "duration_ms": 140, "repeat": 20,
+         "body": {"find": "students", "filter": {"campus_id": "x"}}}
+      ]
+    }
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Explains are sampled explicitly below, not by the background sampler
+os.environ.setdefault('MONGO_PROFILER_EXPLAIN_INTERVAL', '0')
+
+from utils.mongo_profiler import MongoCommandProfiler, merge_profiles  # noqa: E402
+from utils.request_metrics import TimingRecorder  # noqa: E402
+
+DEFAULT_FIXTURE = {
+    'indexes': {
+        'users': [['username'], ['email'], ['role'], ['campus_id']],
+        'students': [['user_id'], ['roll_number'], ['batch_id'], ['campus_id']],
+        'tests': [['test_type', 'campus_ids', 'module_id']],
+        'student_test_attempts': [['student_id', 'test_id']],
+    },
+    'explains': {},
+    'commands': [
+        {'database': 'versant', 'command': 'find', 'duration_ms': 4, 'repeat': 400,
+         'body': {'find': 'users', 'filter': {'username': 'student1'}}},
+        {'database': 'versant', 'command': 'find', 'duration_ms': 180, 'repeat': 40,
+         'body': {'find': 'students', 'filter': {'course_id': 'c1', 'batch_id': {'$in': ['b1', 'b2']}}}},
+        {'database': 'versant', 'command': 'find', 'duration_ms': 260, 'repeat': 25,
+         'body': {'find': 'student_test_attempts', 'filter': {'test_id': 't1'}, 'sort': {'submitted_at': -1}}},
+        {'database': 'versant', 'command': 'aggregate', 'duration_ms': 900, 'repeat': 6,
+         'body': {'aggregate': 'test_results', 'pipeline': [
+             {'$match': {'module_id': 'GRAMMAR', 'submitted_at': {'$gte': '2024-01-01'}}},
+             {'$lookup': {'from': 'users', 'localField': 'student_id', 'foreignField': '_id', 'as': 'student'}},
+             {'$group': {'_id': '$student_id', 'avg': {'$avg': '$score_percentage'}}},
+         ]}},
+        {'database': 'versant', 'command': 'count', 'duration_ms': 35, 'repeat': 60,
+         'body': {'count': 'tests', 'query': {'test_type': 'practice', 'campus_ids': 'x', 'module_id': 'LISTENING'}}},
+        {'database': 'versant', 'command': 'update', 'duration_ms': 120, 'repeat': 12,
+         'body': {'update': 'students', 'updates': [{'q': {'email': 'a@b.c'}, 'u': {'$set': {'name': 'x'}}}]}},
+    ],
+}
+
+
+class FixturePlanner:
+    """Answers explain commands from canned output or the declared indexes."""
+
+    def __init__(self, indexes, explains):
+        self.indexes = indexes
+        self.explains = explains
+
+    def __call__(self, database, command):
+        collection = command.get('find') or command.get('aggregate')
+        if collection in self.explains:
+            return self.explains[collection]
+        if 'pipeline' in command:
+            first = command['pipeline'][0] if command['pipeline'] else {}
+            fields = first.get('$match', {}) if isinstance(first, dict) else {}
+        else:
+            fields = command.get('filter') or {}
+        for index in self.indexes.get(collection, []):
+            if index and index[0] in fields:
+                name = '_'.join(f'{field}_1' for field in index)
+                plan = {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': name}}
+                break
+        else:
+            plan = {'stage': 'COLLSCAN'}
+        return {'queryPlanner': {'namespace': f'{database}.{collection}', 'winningPlan': plan}}
+
+
+def replay(fixture):
+    profiler = MongoCommandProfiler(
+        TimingRecorder(),
+        explain_runner=FixturePlanner(fixture.get('indexes', {}), fixture.get('explains', {})),
+        enabled=True,
+    )
+    for entry in fixture['commands']:
+        for _ in range(entry.get('repeat', 1)):
+            profiler.observe(entry['database'], entry['command'], entry['body'],
+                             entry['duration_ms'] / 1000.0, entry.get('failed', False))
+    profiler.sample_explains(top=len(fixture['commands']))
+    return merge_profiles([profiler.snapshot()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('fixture', nargs='?', help='JSON fixture (built-in workload when omitted)')
+    parser.add_argument('--json', action='store_true', help='print the merged profile as JSON')
+    args = parser.parse_args()
+
+    fixture = DEFAULT_FIXTURE
+    if args.fixture:
+        with open(args.fixture) as handle:
+            fixture = json.load(handle)
+
+    profile = replay(fixture)
+    shapes = sorted(profile['shapes'].values(), key=lambda shape: shape['total_time'], reverse=True)
+    if args.json:
+        print(json.dumps({'shapes': shapes, 'slow': profile['slow']}, indent=2, default=str))
+        return
+
+    print(f'{"total s":>9} {"calls":>6} {"p95 ms":>8}  plan      command')
+    for shape in shapes:
+        explain = shape.get('explain') or {}
+        plan = 'COLLSCAN' if explain.get('collscan') else ','.join(explain.get('indexes', [])) or '-'
+        print(f'{shape["total_time"]:9.2f} {shape["count"]:6d} {shape["p95"] * 1000:8.1f}  {plan:<9} '
+              f'{shape["command"]} {shape["collection"]} {shape["shape"]}')
+    print(f'\n{len(profile["slow"])} slow commands captured, '
+          f'{sum(1 for s in shapes if (s.get("explain") or {}).get("collscan"))} shapes scan whole collections')
+
+
+if __name__ == '__main__':
+    main()
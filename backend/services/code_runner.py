@@ -0,0 +1,731 @@
+"""
+Pluggable code-runner backends for technical tests.
+
+``CompilerService`` validates input, caches results and fans test cases out;
+the runner behind it does the actual execution:
+
+* ``OneCompilerRunner`` - the OneCompiler RapidAPI client (pooled keep-alive
+  session plus a process-wide rate limiter sized to the quota).
+* ``LocalSandboxRunner`` - Python/C/C++/Java in a bubblewrap (``bwrap``)
+  jail: a private root holding only the toolchains (read-only) and the run's
+  working directory, fresh user/pid/network/ipc namespaces (no network, no
+  view of other processes), an unprivileged uid, rlimits, a wall-clock
+  timeout and capped output. Compilers run in the same jail with their own
+  limits. Compiled artifacts are cached per code hash and mounted read-only;
+  Python runs are served from a warm pool of interpreters. Without bwrap or
+  user namespaces the local runner refuses to run.
+
+``CODE_RUNNER_BACKEND`` selects ``onecompiler`` (default), ``local``, or
+``auto`` (local for the languages it can run on this host, OneCompiler for
+the rest). Every backend returns the ``compile_and_run`` result shape:
+``success``, ``stdout``, ``stderr``, ``exit_code``, ``execution_time`` (ms),
+``memory_used``.
+"""
+from __future__ import annotations
+
+import glob
+import hashlib
+import logging
+import os
+import queue
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CODE_RUNNER_BACKEND = os.getenv('CODE_RUNNER_BACKEND', 'onecompiler').lower()
+
+# RapidAPI requests per second allowed for this process (burst = one second's worth)
+COMPILER_RATE_LIMIT_PER_SECOND = float(os.getenv('COMPILER_RATE_LIMIT_PER_SECOND', '5'))
+# Seconds a request may wait for a rate-limit token before failing
+COMPILER_RATE_LIMIT_WAIT = float(os.getenv('COMPILER_RATE_LIMIT_WAIT', '30'))
+COMPILER_REQUEST_TIMEOUT = 30
+ONECOMPILER_POOL_SIZE = int(os.getenv('COMPILER_MAX_WORKERS', '16'))
+
+LOCAL_RUNNER_DIR = os.getenv('LOCAL_RUNNER_DIR', os.path.join(tempfile.gettempdir(), 'versant_runner'))
+# Concurrent local executions (defaults to the number of cores)
+LOCAL_RUNNER_MAX_CONCURRENCY = int(os.getenv('LOCAL_RUNNER_MAX_CONCURRENCY', str(os.cpu_count() or 2)))
+LOCAL_RUNNER_TIMEOUT = float(os.getenv('LOCAL_RUNNER_TIMEOUT', '5'))
+LOCAL_RUNNER_COMPILE_TIMEOUT = float(os.getenv('LOCAL_RUNNER_COMPILE_TIMEOUT', '30'))
+LOCAL_RUNNER_CPU_SECONDS = int(os.getenv('LOCAL_RUNNER_CPU_SECONDS', '5'))
+LOCAL_RUNNER_MEMORY_MB = int(os.getenv('LOCAL_RUNNER_MEMORY_MB', '256'))
+# Largest stdout/stderr a program may write; larger output kills it (SIGXFSZ)
+LOCAL_RUNNER_OUTPUT_BYTES = int(os.getenv('LOCAL_RUNNER_OUTPUT_BYTES', str(1024 * 1024)))
+LOCAL_RUNNER_WARM_PYTHON = int(os.getenv('LOCAL_RUNNER_WARM_PYTHON', '4'))
+LOCAL_RUNNER_MAX_ARTIFACTS = int(os.getenv('LOCAL_RUNNER_MAX_ARTIFACTS', '2000'))
+LOCAL_RUNNER_COMPILE_CPU_SECONDS = int(os.getenv('LOCAL_RUNNER_COMPILE_CPU_SECONDS', '20'))
+LOCAL_RUNNER_COMPILE_MEMORY_MB = int(os.getenv('LOCAL_RUNNER_COMPILE_MEMORY_MB', '1024'))
+LOCAL_RUNNER_COMPILE_OUTPUT_BYTES = int(os.getenv('LOCAL_RUNNER_COMPILE_OUTPUT_BYTES', str(32 * 1024 * 1024)))
+LOCAL_RUNNER_BWRAP = os.getenv('LOCAL_RUNNER_BWRAP') or shutil.which('bwrap')
+# Host uid/gid the jail runs as when the app itself runs as root
+LOCAL_RUNNER_UID = int(os.getenv('LOCAL_RUNNER_UID', '65534'))
+LOCAL_RUNNER_GID = int(os.getenv('LOCAL_RUNNER_GID', str(LOCAL_RUNNER_UID)))
+# Host paths mounted read-only in the jail (toolchains and their libraries)
+LOCAL_RUNNER_JAIL_PATHS = [
+    path for path in os.getenv(
+        'LOCAL_RUNNER_JAIL_PATHS',
+        '/usr,/bin,/sbin,/lib,/lib32,/lib64,/etc/alternatives,/etc/ld.so.cache,/etc/ld.so.conf,/etc/ld.so.conf.d'
+    ).split(',') if path
+]
+
+# Where the run's directory and the compiled program appear inside the jail
+JAIL_WORKDIR = '/sandbox'
+JAIL_PROGRAM_DIR = '/program'
+
+EXTENSIONS = {'python': 'py', 'c': 'c', 'cpp': 'cpp', 'java': 'java'}
+
+
+class RateLimiter:
+    """Thread-safe token bucket shared by every outgoing request of a backend."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = max(rate, 0.001)
+        self.capacity = burst if burst is not None else max(self.rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                sleep_for = (1 - self._tokens) / self.rate
+            if now + sleep_for > deadline:
+                return False
+            self.waited += sleep_for
+            time.sleep(sleep_for)
+
+
+class CodeRunner:
+    """Interface implemented by every execution backend."""
+
+    name = 'base'
+
+    def supports(self, language: str) -> bool:
+        raise NotImplementedError
+
+    def run(self, language: str, code: str, stdin: str = '') -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name}
+
+
+class OneCompilerRunner(CodeRunner):
+    """OneCompiler API via RapidAPI over a shared keep-alive session."""
+
+    name = 'onecompiler'
+
+    def __init__(self):
+        self.api_key = os.getenv('RAPIDAPI_KEY', 'f744734571mshb636ee6aecb15e3p16c0e7jsnd142c0e341e6')
+        self.api_host = os.getenv('RAPIDAPI_HOST', 'onecompiler-apis.p.rapidapi.com')
+        self.api_url = 'https://onecompiler-apis.p.rapidapi.com/api/v1/run'
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._rate_limiter = RateLimiter(COMPILER_RATE_LIMIT_PER_SECOND)
+
+    def supports(self, language: str) -> bool:
+        return language in EXTENSIONS
+
+    def _get_session(self):
+        """Keep-alive session shared by all worker threads (created on first use)."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=ONECOMPILER_POOL_SIZE))
+                    session.headers.update({
+                        'x-rapidapi-key': self.api_key,
+                        'x-rapidapi-host': self.api_host,
+                        'Content-Type': 'application/json'
+                    })
+                    self._session = session
+        return self._session
+
+    def run(self, language: str, code: str, stdin: str = '') -> Dict[str, Any]:
+        import requests
+
+        if not self._rate_limiter.acquire(COMPILER_RATE_LIMIT_WAIT):
+            return {
+                'success': False,
+                'error': 'Compiler is busy. Please try again in a moment.'
+            }
+
+        payload = {
+            'language': language,
+            'stdin': stdin,
+            'files': [
+                {
+                    'name': f'main.{EXTENSIONS[language]}',
+                    'content': code
+                }
+            ]
+        }
+        try:
+            response = self._get_session().post(self.api_url, json=payload, timeout=COMPILER_REQUEST_TIMEOUT)
+        except requests.exceptions.Timeout:
+            return {
+                'success': False,
+                'error': 'Execution timeout. Code took too long to run.'
+            }
+        except requests.exceptions.RequestException as e:
+            return {
+                'success': False,
+                'error': f'Network error: {str(e)}'
+            }
+
+        if response.status_code != 200:
+            return {
+                'success': False,
+                'error': f'API Error: {response.status_code}',
+                'details': response.text
+            }
+        result = response.json()
+        return {
+            'success': True,
+            'stdout': result.get('stdout', ''),
+            'stderr': result.get('stderr', ''),
+            'exit_code': result.get('exitCode', 0),
+            'execution_time': result.get('executionTime', 0),
+            'memory_used': result.get('memory', 0)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'rate_limit_per_second': self._rate_limiter.rate,
+            'rate_limit_wait_seconds': round(self._rate_limiter.waited, 3),
+        }
+
+
+# Started by warm Python workers: waits for "go", then runs main.py from its cwd.
+# The line is read from the raw fd so none of the program's stdin is consumed.
+_PYTHON_BOOTSTRAP = (
+    "import os, runpy, sys\n"
+    "raw = sys.stdin.buffer.raw\n"
+    "line = b''\n"
+    "while not line.endswith(b'\\n'):\n"
+    "    c = raw.read(1)\n"
+    "    if not c:\n"
+    "        sys.exit(0)\n"
+    "    line += c\n"
+    "sys.argv = ['main.py']\n"
+    "sys.path.insert(0, os.getcwd())\n"
+    "runpy.run_path('main.py', run_name='__main__')\n"
+)
+
+
+def _drops_privileges() -> bool:
+    return os.geteuid() == 0
+
+
+def _limit_resources(cpu_seconds: int, memory_mb: Optional[int], output_bytes: int, open_files: int = 64):
+    """preexec_fn for jailed children: rlimits, no core dumps, then the unprivileged uid when root."""
+    import resource
+
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    if memory_mb:
+        memory = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (output_bytes, output_bytes))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (open_files, open_files))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if _drops_privileges():
+        os.setgroups([])
+        os.setgid(LOCAL_RUNNER_GID)
+        os.setuid(LOCAL_RUNNER_UID)
+
+
+def _give_to_jail(path: str):
+    """Let the jail uid write ``path`` (a directory the runner just created)."""
+    if _drops_privileges():
+        os.chown(path, LOCAL_RUNNER_UID, LOCAL_RUNNER_GID)
+
+
+def _seal(path: str):
+    """Make a compiled artifact owned by the runner and read-only for everyone else."""
+    for directory, _, files in os.walk(path):
+        entries = [(directory, True)] + [(os.path.join(directory, name), False) for name in files]
+        for entry, is_dir in entries:
+            if _drops_privileges():
+                os.chown(entry, 0, 0)
+            executable = is_dir or os.stat(entry).st_mode & 0o111
+            os.chmod(entry, 0o755 if executable else 0o644)
+
+
+class _Sandbox:
+    """A working directory (the jail's /sandbox) plus output files kept outside the jail."""
+
+    def __init__(self, root: str):
+        self.path = tempfile.mkdtemp(prefix='run_', dir=root)
+        # Traversable (not listable) so the jail uid reaches work/; the output files stay private
+        os.chmod(self.path, 0o711)
+        self.work = os.path.join(self.path, 'work')
+        os.mkdir(self.work)
+        _give_to_jail(self.work)
+        self.stdout = self._private_file('stdout')
+        self.stderr = self._private_file('stderr')
+
+    def _private_file(self, name: str):
+        return os.fdopen(os.open(os.path.join(self.path, name), os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600), 'w+b')
+
+    def read_output(self) -> Tuple[str, str]:
+        outputs = []
+        for handle in (self.stdout, self.stderr):
+            handle.flush()
+            handle.seek(0)
+            outputs.append(handle.read(LOCAL_RUNNER_OUTPUT_BYTES).decode('utf-8', errors='replace'))
+        return outputs[0], outputs[1]
+
+    def cleanup(self):
+        for handle in (self.stdout, self.stderr):
+            try:
+                handle.close()
+            except OSError:
+                pass
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class _WarmProcess:
+    def __init__(self, sandbox: _Sandbox, process: subprocess.Popen):
+        self.sandbox = sandbox
+        self.process = process
+
+
+class LocalSandboxRunner(CodeRunner):
+    """Runs submissions in resource-limited bubblewrap jails."""
+
+    name = 'local'
+
+    def __init__(self):
+        self.root = LOCAL_RUNNER_DIR
+        self.artifact_root = os.path.join(self.root, 'artifacts')
+        self.work_root = os.path.join(self.root, 'work')
+        for path in (self.root, self.artifact_root, self.work_root):
+            os.makedirs(path, exist_ok=True)
+            # The jail uid only needs to reach the directories bound into a jail
+            os.chmod(path, 0o711)
+
+        python = sys.executable or shutil.which('python3')
+        self.toolchain = {
+            # The real interpreter, not a virtualenv shim: the jail has no site-packages
+            'python': os.path.realpath(python) if python else None,
+            'c': shutil.which('gcc'),
+            'cpp': shutil.which('g++'),
+            'javac': shutil.which('javac'),
+            'java': shutil.which('java'),
+        }
+        self.jail_binds = self._jail_binds()
+        self._slots = threading.BoundedSemaphore(max(1, LOCAL_RUNNER_MAX_CONCURRENCY))
+        self._compile_locks: Dict[str, threading.Lock] = {}
+        self._compile_locks_guard = threading.Lock()
+        self._warm: 'queue.Queue[_WarmProcess]' = queue.Queue()
+        self._warm_lock = threading.Lock()
+        self._counters = {'runs': 0, 'timeouts': 0, 'compiles': 0, 'artifact_hits': 0, 'warm_hits': 0}
+        self._counters_lock = threading.Lock()
+        self.languages = self._probe_languages()
+
+    def _count(self, name: str):
+        with self._counters_lock:
+            self._counters[name] += 1
+
+    # -- jail ------------------------------------------------------------
+
+    def _jail_binds(self) -> List[str]:
+        paths = list(LOCAL_RUNNER_JAIL_PATHS) + glob.glob('/etc/java*')
+        python = self.toolchain['python']
+        if python and not python.startswith('/usr/'):
+            # e.g. a pyenv build: mount only its prefix (stdlib), never the app tree
+            paths.append(os.path.realpath(sys.base_prefix))
+        binds = []
+        for path in sorted(set(paths)):
+            if os.path.exists(path):
+                binds += ['--ro-bind', path, path]
+        return binds
+
+    def _jail(self, argv: Sequence[str], workdir: str, program_dir: Optional[str] = None) -> List[str]:
+        """bwrap command running ``argv`` with ``workdir`` as its only writable directory."""
+        command = [
+            LOCAL_RUNNER_BWRAP, '--unshare-all', '--unshare-user', '--uid', '65534', '--gid', '65534',
+            '--die-with-parent', '--new-session', '--hostname', 'sandbox',
+            *self.jail_binds,
+            '--proc', '/proc', '--dev', '/dev', '--tmpfs', '/tmp',
+            '--bind', workdir, JAIL_WORKDIR, '--chdir', JAIL_WORKDIR,
+            '--clearenv', '--setenv', 'PATH', '/usr/bin:/bin', '--setenv', 'LANG', 'C.UTF-8',
+            '--setenv', 'HOME', JAIL_WORKDIR, '--setenv', 'PYTHONIOENCODING', 'utf-8',
+        ]
+        if program_dir:
+            command += ['--ro-bind', program_dir, JAIL_PROGRAM_DIR]
+        return command + ['--'] + list(argv)
+
+    def _jailed_run(self, argv: Sequence[str], workdir: str, timeout: float) -> subprocess.CompletedProcess:
+        """Run a short jailed command with the compile limits (probes and compilers)."""
+        # The JVM reserves far more address space than it uses; javac's heap is capped with -J-Xmx
+        memory_mb = None if argv[0] == self.toolchain['javac'] else LOCAL_RUNNER_COMPILE_MEMORY_MB
+        return subprocess.run(
+            self._jail(argv, workdir),
+            capture_output=True,
+            timeout=timeout,
+            env={'PATH': '/usr/bin:/bin', 'LANG': 'C.UTF-8'},
+            preexec_fn=lambda: _limit_resources(
+                LOCAL_RUNNER_COMPILE_CPU_SECONDS, memory_mb, LOCAL_RUNNER_COMPILE_OUTPUT_BYTES, open_files=256
+            ),
+            start_new_session=True,
+            close_fds=True,
+        )
+
+    def _probe_languages(self) -> List[str]:
+        """Languages whose toolchain starts inside the jail on this host (none without bwrap)."""
+        if not LOCAL_RUNNER_BWRAP:
+            return []
+        probes = {
+            'python': [self.toolchain['python'], '-I', '-S', '-c', 'pass'],
+            'c': [self.toolchain['c'], '--version'],
+            'cpp': [self.toolchain['cpp'], '--version'],
+            'java': [self.toolchain['javac'], '-version'] if self.toolchain['java'] else [None],
+        }
+        workdir = tempfile.mkdtemp(prefix='probe_', dir=self.work_root)
+        _give_to_jail(workdir)
+        languages = []
+        try:
+            for language, argv in probes.items():
+                if not argv[0]:
+                    continue
+                try:
+                    if self._jailed_run(argv, workdir, timeout=30).returncode == 0:
+                        languages.append(language)
+                except (OSError, subprocess.SubprocessError) as exc:
+                    logger.warning('Jail probe for %s failed: %s', language, exc)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        return languages
+
+    @property
+    def available(self) -> bool:
+        return bool(self.languages)
+
+    def supports(self, language: str) -> bool:
+        return language in self.languages
+
+    # -- processes -------------------------------------------------------
+
+    def _spawn(self, argv: Sequence[str], sandbox: _Sandbox, memory_limit: bool = True,
+               program_dir: Optional[str] = None) -> subprocess.Popen:
+        return subprocess.Popen(
+            self._jail(argv, sandbox.work, program_dir),
+            stdin=subprocess.PIPE,
+            stdout=sandbox.stdout,
+            stderr=sandbox.stderr,
+            env={'PATH': '/usr/bin:/bin', 'LANG': 'C.UTF-8'},
+            preexec_fn=lambda: _limit_resources(
+                LOCAL_RUNNER_CPU_SECONDS, LOCAL_RUNNER_MEMORY_MB if memory_limit else None, LOCAL_RUNNER_OUTPUT_BYTES
+            ),
+            start_new_session=True,
+            close_fds=True,
+        )
+
+    @staticmethod
+    def _kill(process: subprocess.Popen):
+        # Killing bwrap takes the jail's pid namespace (and every process in it) down with it
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        process.wait()
+
+    def _wait(self, process: subprocess.Popen, sandbox: _Sandbox, stdin: str, started: float) -> Dict[str, Any]:
+        self._count('runs')
+        try:
+            process.communicate(input=(stdin or '').encode('utf-8'), timeout=LOCAL_RUNNER_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self._kill(process)
+            self._count('timeouts')
+            stdout, stderr = sandbox.read_output()
+            return {
+                'success': True,
+                'stdout': stdout,
+                'stderr': (stderr + '\n' if stderr else '') + f'Time limit exceeded ({LOCAL_RUNNER_TIMEOUT:g}s)',
+                'exit_code': -signal.SIGKILL,
+                'execution_time': int((time.monotonic() - started) * 1000),
+                'memory_used': 0,
+            }
+        stdout, stderr = sandbox.read_output()
+        exit_code = process.returncode
+        # bwrap reports a signalled child as 128 + signal
+        if exit_code in (-signal.SIGXCPU, 128 + signal.SIGXCPU):
+            stderr += '\nCPU time limit exceeded'
+        elif exit_code in (-signal.SIGXFSZ, 128 + signal.SIGXFSZ):
+            stderr += '\nOutput limit exceeded'
+        return {
+            'success': True,
+            'stdout': stdout,
+            'stderr': stderr,
+            'exit_code': exit_code,
+            'execution_time': int((time.monotonic() - started) * 1000),
+            'memory_used': 0,
+        }
+
+    # -- warm python pool ------------------------------------------------
+
+    def _start_warm_python(self) -> Optional[_WarmProcess]:
+        sandbox = _Sandbox(self.work_root)
+        try:
+            process = self._spawn([self.toolchain['python'], '-I', '-S', '-c', _PYTHON_BOOTSTRAP], sandbox)
+        except OSError as exc:
+            sandbox.cleanup()
+            logger.warning('Could not start warm Python worker: %s', exc)
+            return None
+        return _WarmProcess(sandbox, process)
+
+    def _refill_warm_pool(self):
+        with self._warm_lock:
+            while self._warm.qsize() < LOCAL_RUNNER_WARM_PYTHON:
+                warm = self._start_warm_python()
+                if warm is None:
+                    return
+                self._warm.put(warm)
+
+    def _take_warm_python(self) -> Optional[_WarmProcess]:
+        while True:
+            try:
+                warm = self._warm.get_nowait()
+            except queue.Empty:
+                return None
+            if warm.process.poll() is None:
+                return warm
+            warm.sandbox.cleanup()
+
+    def _run_python(self, code: str, stdin: str) -> Dict[str, Any]:
+        warm = self._take_warm_python() if LOCAL_RUNNER_WARM_PYTHON > 0 else None
+        if warm is not None:
+            self._count('warm_hits')
+        else:
+            warm = self._start_warm_python()
+            if warm is None:
+                return {'success': False, 'error': 'Could not start the Python runtime'}
+        if LOCAL_RUNNER_WARM_PYTHON > 0:
+            threading.Thread(target=self._refill_warm_pool, daemon=True).start()
+
+        try:
+            with open(os.path.join(warm.sandbox.work, 'main.py'), 'w', encoding='utf-8') as handle:
+                handle.write(code)
+            started = time.monotonic()
+            warm.process.stdin.write(b'go\n')
+            warm.process.stdin.flush()
+            return self._wait(warm.process, warm.sandbox, stdin, started)
+        finally:
+            if warm.process.poll() is None:
+                self._kill(warm.process)
+            warm.sandbox.cleanup()
+
+    # -- compiled languages ----------------------------------------------
+
+    def _compile_lock(self, key: str) -> threading.Lock:
+        with self._compile_locks_guard:
+            lock = self._compile_locks.get(key)
+            if lock is None:
+                lock = self._compile_locks[key] = threading.Lock()
+            return lock
+
+    @staticmethod
+    def _java_class_name(code: str) -> str:
+        match = re.search(r'public\s+(?:final\s+)?class\s+(\w+)', code)
+        return match.group(1) if match else 'Main'
+
+    def _compile_command(self, language: str, source: str, out_dir: str) -> List[str]:
+        if language == 'c':
+            return [self.toolchain['c'], '-O2', '-std=c11', '-o', os.path.join(out_dir, 'main'), source, '-lm']
+        if language == 'cpp':
+            return [self.toolchain['cpp'], '-O2', '-std=c++17', '-o', os.path.join(out_dir, 'main'), source]
+        return [self.toolchain['javac'], f'-J-Xmx{LOCAL_RUNNER_COMPILE_MEMORY_MB}m', '-d', out_dir, source]
+
+    def _artifact(self, language: str, code: str) -> Tuple[str, Optional[str]]:
+        """
+        Directory holding the compiled program for ``code`` (compiled once per
+        code hash) and the compiler's error output if compilation failed.
+        """
+        digest = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        artifact_dir = os.path.join(self.artifact_root, language, digest)
+        marker = os.path.join(artifact_dir, '.status')
+        with self._compile_lock(f'{language}:{digest}'):
+            if os.path.exists(marker):
+                self._count('artifact_hits')
+                os.utime(artifact_dir)
+            else:
+                self._compile(language, code, artifact_dir, marker)
+        with open(marker, encoding='utf-8') as handle:
+            status = handle.read()
+        if status.startswith('ok'):
+            return artifact_dir, None
+        return artifact_dir, status[len('error\n'):]
+
+    def _compile(self, language: str, code: str, artifact_dir: str, marker: str):
+        self._count('compiles')
+        build_dir = tempfile.mkdtemp(prefix='build_', dir=self.work_root)
+        try:
+            _give_to_jail(build_dir)
+            name = self._java_class_name(code) if language == 'java' else 'main'
+            source_name = f'{name}.{EXTENSIONS[language]}'
+            with open(os.path.join(build_dir, source_name), 'w', encoding='utf-8') as handle:
+                handle.write(code)
+            out_dir = os.path.join(build_dir, 'out')
+            os.makedirs(out_dir)
+            _give_to_jail(out_dir)
+            try:
+                # The compiler sees the build directory as the jail's working directory
+                result = self._jailed_run(
+                    self._compile_command(language, source_name, 'out'), build_dir, LOCAL_RUNNER_COMPILE_TIMEOUT
+                )
+                error = None
+                if result.returncode != 0:
+                    # Report paths relative to the build directory, as students wrote them
+                    error = result.stderr[:LOCAL_RUNNER_OUTPUT_BYTES].decode('utf-8', errors='replace')
+                    error = error.replace(JAIL_WORKDIR + '/', '') or 'Compilation failed'
+            except subprocess.TimeoutExpired:
+                error = 'Compilation timed out'
+            if language == 'java':
+                with open(os.path.join(out_dir, '.main_class'), 'w', encoding='utf-8') as handle:
+                    handle.write(name)
+            with open(os.path.join(out_dir, '.status'), 'w', encoding='utf-8') as handle:
+                handle.write('ok' if error is None else f'error\n{error}')
+            # Runs mount the artifact read-only; nothing the jail uid owns is reused
+            _seal(out_dir)
+            os.makedirs(os.path.dirname(artifact_dir), exist_ok=True)
+            os.chmod(os.path.dirname(artifact_dir), 0o711)
+            if os.path.exists(artifact_dir):
+                shutil.rmtree(artifact_dir, ignore_errors=True)
+            os.replace(out_dir, artifact_dir)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+        self._prune_artifacts()
+
+    def _prune_artifacts(self):
+        """Keep at most LOCAL_RUNNER_MAX_ARTIFACTS compiled programs, dropping the least recently used."""
+        entries = []
+        for language in os.listdir(self.artifact_root):
+            language_dir = os.path.join(self.artifact_root, language)
+            for digest in os.listdir(language_dir):
+                path = os.path.join(language_dir, digest)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        if len(entries) <= LOCAL_RUNNER_MAX_ARTIFACTS:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - LOCAL_RUNNER_MAX_ARTIFACTS]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _run_compiled(self, language: str, code: str, stdin: str) -> Dict[str, Any]:
+        artifact_dir, compile_error = self._artifact(language, code)
+        if compile_error is not None:
+            return {
+                'success': True,
+                'stdout': '',
+                'stderr': compile_error,
+                'exit_code': 1,
+                'execution_time': 0,
+                'memory_used': 0,
+            }
+
+        sandbox = _Sandbox(self.work_root)
+        try:
+            if language == 'java':
+                with open(os.path.join(artifact_dir, '.main_class'), encoding='utf-8') as handle:
+                    main_class = handle.read().strip()
+                # The JVM reserves far more address space than it uses, so the
+                # heap is capped with -Xmx instead of RLIMIT_AS
+                argv = [
+                    self.toolchain['java'], f'-Xmx{LOCAL_RUNNER_MEMORY_MB}m', '-Xss64m',
+                    '-XX:TieredStopAtLevel=1', '-XX:+UseSerialGC', '-Xshare:auto',
+                    '-cp', JAIL_PROGRAM_DIR, main_class,
+                ]
+                memory_limit = False
+            else:
+                argv = [f'{JAIL_PROGRAM_DIR}/main']
+                memory_limit = True
+            started = time.monotonic()
+            process = self._spawn(argv, sandbox, memory_limit=memory_limit, program_dir=artifact_dir)
+            return self._wait(process, sandbox, stdin, started)
+        finally:
+            sandbox.cleanup()
+
+    def run(self, language: str, code: str, stdin: str = '') -> Dict[str, Any]:
+        if not self.supports(language):
+            return {'success': False, 'error': f'Local runner cannot execute {language} on this host'}
+        with self._slots:
+            try:
+                if language == 'python':
+                    return self._run_python(code, stdin)
+                return self._run_compiled(language, code, stdin)
+            except Exception as e:
+                logger.error('Local runner failed for %s: %s', language, e, exc_info=True)
+                return {'success': False, 'error': f'Execution failed: {str(e)}'}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {
+            'backend': self.name,
+            'jail': 'bwrap' if self.available else None,
+            'jail_uid': LOCAL_RUNNER_UID if _drops_privileges() else os.geteuid(),
+            'languages': list(self.languages),
+            'warm_python_workers': self._warm.qsize(),
+            **counters,
+        }
+
+
+class AutoRunner(CodeRunner):
+    """Local execution where this host supports the language, OneCompiler otherwise."""
+
+    name = 'auto'
+
+    def __init__(self, local: LocalSandboxRunner, remote: OneCompilerRunner):
+        self.local = local
+        self.remote = remote
+
+    def supports(self, language: str) -> bool:
+        return self.local.supports(language) or self.remote.supports(language)
+
+    def run(self, language: str, code: str, stdin: str = '') -> Dict[str, Any]:
+        runner = self.local if self.local.supports(language) else self.remote
+        return runner.run(language, code, stdin)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'local': self.local.stats(), 'remote': self.remote.stats()}
+
+
+def create_runner(backend: str = CODE_RUNNER_BACKEND) -> CodeRunner:
+    """Build the configured backend, falling back to OneCompiler if the local sandbox is unusable."""
+    if backend in ('local', 'auto'):
+        try:
+            local = LocalSandboxRunner()
+        except Exception as exc:
+            logger.error('Local code runner unavailable, using OneCompiler: %s', exc)
+            return OneCompilerRunner()
+        if not local.available:
+            # Never run student code without the jail
+            logger.error('bwrap jail unavailable (bwrap missing or no user namespaces); '
+                         'refusing local code execution, using OneCompiler')
+            return OneCompilerRunner()
+        if backend == 'local':
+            return local
+        return AutoRunner(local, OneCompilerRunner())
+    return OneCompilerRunner()
@@ -1,21 +1,112 @@
 """
 Compiler Service for Technical Test Module
-Integrates with OneCompiler API via RapidAPI
+Runs code through OneCompiler (RapidAPI) or a local sandbox
 Supports: Python, C, C++, Java, HTML
+
+Execution is delegated to a pluggable runner (services/code_runner.py):
+the OneCompiler API by default, or a local sandbox (CODE_RUNNER_BACKEND).
+Test cases of a submission run concurrently (bounded per submission) and
+successful runs are cached by (language, code hash, stdin hash), so
+resubmissions and repeated "Run" clicks are not executed again.
 """
 
-import requests
 import os
-from typing import Dict, List, Any, Optional
+import hashlib
+import logging
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Any, Optional, Tuple
 import json
 
+from services.code_runner import CodeRunner, create_runner
+
+logger = logging.getLogger(__name__)
+
+# Worker threads shared by all submissions in this process
+COMPILER_MAX_WORKERS = int(os.getenv('COMPILER_MAX_WORKERS', '16'))
+# Test cases of one submission in flight at once
+COMPILER_MAX_PARALLEL_CASES = int(os.getenv('COMPILER_MAX_PARALLEL_CASES', '4'))
+COMPILER_RESULT_CACHE_SIZE = int(os.getenv('COMPILER_RESULT_CACHE_SIZE', '4096'))
+COMPILER_RESULT_CACHE_TTL = int(os.getenv('COMPILER_RESULT_CACHE_TTL', '3600'))
+# Exit statuses of a run that was killed or timed out (plus any negative, signal-terminated code)
+_KILLED_EXIT_CODES = {124} | {128 + sig for sig in (signal.SIGKILL, signal.SIGTERM, signal.SIGXCPU)}
+# run_inputs: end of the input queue (an input may legitimately be None or '')
+_NO_MORE_INPUTS = object()
+
+
+def _is_cacheable(execution: Dict[str, Any]) -> bool:
+    """Successful runs whose outcome does not depend on machine load."""
+    if not execution.get('success'):
+        return False
+    exit_code = execution.get('exit_code') or 0
+    return not (isinstance(exit_code, int) and (exit_code < 0 or exit_code in _KILLED_EXIT_CODES))
+
+
+class _ResultCache:
+    """LRU + TTL cache of successful executions keyed by (language, code hash, stdin hash)."""
+
+    def __init__(self, max_size: int, ttl: int):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: 'OrderedDict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(language: str, code: str, stdin: str) -> Tuple[str, str, str]:
+        return (
+            language,
+            hashlib.sha256(code.encode('utf-8')).hexdigest(),
+            hashlib.sha256((stdin or '').encode('utf-8')).hexdigest(),
+        )
+
+    def get(self, key) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def set(self, key, result: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            }
+
+
 class CompilerService:
-    """Service to compile and execute code using OneCompiler API"""
+    """Service to compile and execute code through the configured runner backend"""
     
-    def __init__(self):
-        self.api_key = os.getenv('RAPIDAPI_KEY', 'f744734571mshb636ee6aecb15e3p16c0e7jsnd142c0e341e6')
-        self.api_host = os.getenv('RAPIDAPI_HOST', 'onecompiler-apis.p.rapidapi.com')
-        self.api_url = 'https://onecompiler-apis.p.rapidapi.com/api/v1/run'
+    def __init__(self, runner: Optional[CodeRunner] = None):
+        self.runner = runner or create_runner()
+        self.max_parallel_cases = max(1, COMPILER_MAX_PARALLEL_CASES)
+
+        self._executor = ThreadPoolExecutor(max_workers=COMPILER_MAX_WORKERS, thread_name_prefix='compiler')
+        self._cache = _ResultCache(COMPILER_RESULT_CACHE_SIZE, COMPILER_RESULT_CACHE_TTL)
         
         # Language configuration
         self.supported_languages = {
@@ -47,14 +138,15 @@ class CompilerService:
             }
         }
     
-    def compile_and_run(self, language: str, code: str, stdin: str = '') -> Dict[str, Any]:
+    def compile_and_run(self, language: str, code: str, stdin: str = '', use_cache: bool = True) -> Dict[str, Any]:
         """
-        Compile and execute code using OneCompiler API
+        Compile and execute code with the configured runner backend
         
         Args:
             language: Programming language (python, c, cpp, java, html)
             code: Source code to execute
             stdin: Standard input for the program
+            use_cache: Serve identical (language, code, stdin) runs from the result cache
             
         Returns:
             Dict with execution results
@@ -81,59 +173,17 @@ class CompilerService:
             if lang_config.get('syntax_only'):
                 return self._validate_html(code)
             
-            # Prepare API request
-            headers = {
-                'x-rapidapi-key': self.api_key,
-                'x-rapidapi-host': self.api_host,
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                'language': language,
-                'stdin': stdin,
-                'files': [
-                    {
-                        'name': f'main.{lang_config["extension"]}',
-                        'content': code
-                    }
-                ]
-            }
-            
-            # Make API request
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            cache_key = _ResultCache.key(language, code, stdin)
+            if use_cache:
+                cached = self._cache.get(cache_key)
+                if cached is not None:
+                    return cached
             
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    'success': True,
-                    'stdout': result.get('stdout', ''),
-                    'stderr': result.get('stderr', ''),
-                    'exit_code': result.get('exitCode', 0),
-                    'execution_time': result.get('executionTime', 0),
-                    'memory_used': result.get('memory', 0)
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'API Error: {response.status_code}',
-                    'details': response.text
-                }
+            execution = self.runner.run(language, code, stdin)
+            if _is_cacheable(execution):
+                self._cache.set(cache_key, execution)
+            return execution
                 
-        except requests.exceptions.Timeout:
-            return {
-                'success': False,
-                'error': 'Execution timeout. Code took too long to run.'
-            }
-        except requests.exceptions.RequestException as e:
-            return {
-                'success': False,
-                'error': f'Network error: {str(e)}'
-            }
         except Exception as e:
             return {
                 'success': False,
@@ -164,7 +214,47 @@ class CompilerService:
         # Join back with newlines
         return '\n'.join(lines)
     
-    def validate_against_test_cases(self, language: str, code: str, test_cases: List[Dict]) -> Dict[str, Any]:
+    def run_inputs(self, language: str, code: str, inputs: List[str], parallel: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Execute ``code`` once per distinct stdin in ``inputs``.
+        
+        At most ``max_parallel_cases`` runs of this call are in flight at once
+        on the shared executor, so one large submission cannot occupy every
+        worker. Returns stdin -> execution result.
+        """
+        unique_inputs = list(dict.fromkeys(inputs))
+        if not parallel or len(unique_inputs) <= 1:
+            return {stdin: self.compile_and_run(language, code, stdin) for stdin in unique_inputs}
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = {}
+        queue = iter(unique_inputs)
+        
+        def submit_next() -> bool:
+            stdin = next(queue, _NO_MORE_INPUTS)
+            if stdin is _NO_MORE_INPUTS:
+                return False
+            pending[self._executor.submit(self.compile_and_run, language, code, stdin)] = stdin
+            return True
+        
+        for _ in range(self.max_parallel_cases):
+            if not submit_next():
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stdin = pending.pop(future)
+                try:
+                    results[stdin] = future.result()
+                except Exception as e:
+                    results[stdin] = {
+                        'success': False,
+                        'error': f'Compilation failed: {str(e)}'
+                    }
+                submit_next()
+        return results
+    
+    def validate_against_test_cases(self, language: str, code: str, test_cases: List[Dict], parallel: bool = True) -> Dict[str, Any]:
         """
         Run code against multiple test cases and validate outputs
         Handles multi-line inputs and outputs properly
@@ -173,6 +263,7 @@ class CompilerService:
             language: Programming language
             code: Source code
             test_cases: List of test cases with input and expected_output
+            parallel: Run test cases concurrently (results keep test case order)
             
         Returns:
             Dict with test results and score
@@ -184,16 +275,20 @@ class CompilerService:
             passed_count = 0
             failed_count = 0
             
+            # Each distinct input is executed once, several at a time
+            executions = self.run_inputs(
+                language, code, [test_case.get('input') or '' for test_case in test_cases], parallel=parallel
+            )
+            
             for idx, test_case in enumerate(test_cases):
-                test_input = test_case.get('input', '')
+                test_input = test_case.get('input') or ''
                 expected_output = self._normalize_output(test_case.get('expected_output', ''))
                 points = test_case.get('points', 1)
                 is_sample = test_case.get('is_sample', False)
                 
                 max_score += points
                 
-                # Run code with this test case input
-                execution_result = self.compile_and_run(language, code, test_input)
+                execution_result = executions[test_input]
                 
                 if execution_result['success']:
                     actual_output = self._normalize_output(execution_result.get('stdout', ''))
@@ -317,7 +412,35 @@ class CompilerService:
         if language in self.supported_languages:
             return self.supported_languages[language]['default_code']
         return None
+    
+    def clear_cache(self):
+        """Drop cached execution results"""
+        self._cache.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Result cache and runner statistics for this process"""
+        return {
+            'result_cache': self._cache.stats(),
+            'runner': self.runner.stats(),
+            'max_parallel_cases': self.max_parallel_cases,
+            'max_workers': COMPILER_MAX_WORKERS
+        }
 
 
 # Singleton instance
 compiler_service = CompilerService()
+
+
+def run_code_with_test_cases(code: str, language: str, test_cases: List[Dict]) -> Dict[str, Any]:
+    """
+    Server-side grading helper used by the practice submit flow: runs every
+    test case and returns their results under ``test_case_results``.
+    """
+    validation = compiler_service.validate_against_test_cases(language, code, test_cases)
+    if not validation.get('success'):
+        raise RuntimeError(validation.get('error', 'Test validation failed'))
+    return {
+        'test_case_results': validation['test_results'],
+        'total_score': validation['total_score'],
+        'max_score': validation['max_score']
+    }
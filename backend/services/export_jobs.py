@@ -0,0 +1,238 @@
+"""
+Background export jobs.
+
+Large exports run in the background instead of inside the request. The
+artifact is written to ``EXPORT_DIR`` and the job's state is kept in the
+``export_jobs`` collection, so any worker on the host can report status or
+serve the download. Progress is pushed to the requesting user's Socket.IO
+room as ``export_progress`` events:
+
+    {'job_id', 'status', 'processed', 'total', 'percentage', 'message'}
+
+A job is a ``writer(fileobj, report)`` callable; it writes the artifact and
+calls ``report(processed)`` as rows are produced.
+
+With the durable job queue enabled (``JOB_QUEUE_ENABLED`` and embedded
+consumers in the web workers), exports of a kind registered with
+``export_builder`` run as ``export`` jobs: the builder recreates the writer
+from the job's ``params``, so an export whose worker was recycled is picked
+up again instead of staying ``running``. Only the web workers register the
+handler (``job_worker.py`` does not import this module) because the artifact
+must land on the disk the download is served from. Otherwise, or when the
+enqueue fails, the job runs on a daemon thread.
+
+    @export_builder('results')
+    def results_writer(params): ...   # returns writer(fileobj, report)
+"""
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, IO, Optional
+
+from mongo import mongo_db
+from utils.job_queue import JOB_QUEUE_EMBEDDED_WORKERS, JOB_QUEUE_ENABLED, job_handler, job_queue
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'versant_exports'))
+# Finished artifacts are removed after this many hours
+EXPORT_RETENTION_HOURS = int(os.getenv('EXPORT_RETENTION_HOURS', '24'))
+# Minimum seconds between progress events for one job
+PROGRESS_INTERVAL = 1.0
+# Runs of one export job on the queue (a rerun only happens when its worker died)
+EXPORT_MAX_ATTEMPTS = 3
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+Writer = Callable[[IO[bytes], Callable[[int], None]], int]
+
+_builders: Dict[str, Callable[[dict], Writer]] = {}
+
+
+def export_builder(kind: str):
+    """Register the decorated ``build(params) -> writer`` for export jobs of ``kind``."""
+    def decorator(func):
+        _builders[kind] = func
+        return func
+    return decorator
+
+
+def _jobs():
+    return mongo_db.db['export_jobs']
+
+
+def _emit(user_id: str, payload: dict):
+    try:
+        from socketio_instance import socketio
+        socketio.emit('export_progress', payload, room=str(user_id))
+    except Exception as exc:
+        logger.debug('Could not emit export progress: %s', exc)
+
+
+def _progress_payload(job_id: str, status: str, processed: int, total: Optional[int], message: str) -> dict:
+    percentage = 0
+    if status == STATUS_COMPLETED:
+        percentage = 100
+    elif total:
+        percentage = min(99, int(processed * 100 / total))
+    return {
+        'job_id': job_id,
+        'status': status,
+        'processed': processed,
+        'total': total,
+        'percentage': percentage,
+        'message': message,
+    }
+
+
+def _run(job_id: str, user_id: str, path: str, total: Optional[int], writer: Writer):
+    state = {'last_emit': 0.0}
+
+    def report(processed: int):
+        now = time.monotonic()
+        if now - state['last_emit'] < PROGRESS_INTERVAL:
+            return
+        state['last_emit'] = now
+        _jobs().update_one({'_id': job_id}, {'$set': {'processed': processed}})
+        _emit(user_id, _progress_payload(job_id, STATUS_RUNNING, processed, total, f'Exported {processed} rows...'))
+
+    _jobs().update_one({'_id': job_id}, {'$set': {'status': STATUS_RUNNING, 'started_at': datetime.utcnow()}})
+    _emit(user_id, _progress_payload(job_id, STATUS_RUNNING, 0, total, 'Export started...'))
+    try:
+        with open(path, 'wb') as fileobj:
+            processed = writer(fileobj, report)
+        _jobs().update_one({'_id': job_id}, {'$set': {
+            'status': STATUS_COMPLETED,
+            'processed': processed,
+            'size': os.path.getsize(path),
+            'completed_at': datetime.utcnow(),
+        }})
+        _emit(user_id, _progress_payload(job_id, STATUS_COMPLETED, processed, total, 'Export ready for download'))
+    except Exception as exc:
+        logger.error('Export job %s failed: %s', job_id, exc, exc_info=True)
+        if os.path.exists(path):
+            os.remove(path)
+        _jobs().update_one({'_id': job_id}, {'$set': {
+            'status': STATUS_FAILED,
+            'error': str(exc),
+            'completed_at': datetime.utcnow(),
+        }})
+        _emit(user_id, _progress_payload(job_id, STATUS_FAILED, 0, total, f'Export failed: {exc}'))
+
+
+def cleanup_expired_exports():
+    """Delete artifacts and job records older than the retention window."""
+    cutoff = datetime.utcnow() - timedelta(hours=EXPORT_RETENTION_HOURS)
+    for job in _jobs().find({'created_at': {'$lt': cutoff}}, {'path': 1}):
+        path = job.get('path')
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as exc:
+                logger.warning('Could not remove expired export %s: %s', path, exc)
+    _jobs().delete_many({'created_at': {'$lt': cutoff}})
+
+
+def start_export_job(
+    user_id: str,
+    kind: str,
+    filename: str,
+    mimetype: str,
+    writer: Writer,
+    total: Optional[int] = None,
+    params: Optional[dict] = None,
+) -> dict:
+    """Register an export job and queue it (see module docstring) or start it on a thread. Returns the job document."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    try:
+        cleanup_expired_exports()
+    except Exception as exc:
+        logger.warning('Export cleanup failed: %s', exc)
+
+    job_id = uuid.uuid4().hex
+    extension = os.path.splitext(filename)[1]
+    job = {
+        '_id': job_id,
+        'user_id': str(user_id),
+        'kind': kind,
+        'params': params or {},
+        'filename': filename,
+        'mimetype': mimetype,
+        'path': os.path.join(EXPORT_DIR, f'{job_id}{extension}'),
+        'status': STATUS_QUEUED,
+        'processed': 0,
+        'total': total,
+        'created_at': datetime.utcnow(),
+    }
+    _jobs().insert_one(job)
+
+    if JOB_QUEUE_ENABLED and JOB_QUEUE_EMBEDDED_WORKERS > 0 and kind in _builders:
+        try:
+            job_queue.enqueue('export', {'job_id': job_id}, idempotency_key=f'export:{job_id}',
+                              max_attempts=EXPORT_MAX_ATTEMPTS, meta={'kind': kind, 'user_id': str(user_id)})
+            return job
+        except Exception as exc:
+            logger.warning('Could not queue export job %s, running it on a thread: %s', job_id, exc)
+
+    thread = threading.Thread(
+        target=_run,
+        args=(job_id, str(user_id), job['path'], total, writer),
+        name=f'export-{job_id[:8]}',
+        daemon=True,
+    )
+    thread.start()
+    return job
+
+
+@job_handler('export')
+def run_export_job(payload: dict):
+    """Job queue handler: rebuild the job's writer from its params and run it."""
+    job = _jobs().find_one({'_id': payload['job_id']})
+    if job is None:
+        logger.warning('Export job %s no longer exists', payload['job_id'])
+        return None
+    if job.get('status') in (STATUS_COMPLETED, STATUS_FAILED):
+        return job['status']
+    builder = _builders.get(job['kind'])
+    if builder is None:
+        raise RuntimeError(f"no export builder registered for {job['kind']}")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+
+    def writer(fileobj, report):
+        # Built inside _run so that a failing build marks the export failed
+        return builder(job.get('params') or {})(fileobj, report)
+
+    _run(job['_id'], job['user_id'], job['path'], job.get('total'), writer)
+    return _jobs().find_one({'_id': job['_id']}, {'status': 1}).get('status')
+
+
+def get_export_job(job_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+    """Job document by id, restricted to ``user_id`` when given."""
+    query = {'_id': job_id}
+    if user_id is not None:
+        query['user_id'] = str(user_id)
+    return _jobs().find_one(query)
+
+
+def serialize_job(job: dict) -> dict:
+    return {
+        'job_id': job['_id'],
+        'kind': job.get('kind'),
+        'status': job.get('status'),
+        'filename': job.get('filename'),
+        'processed': job.get('processed', 0),
+        'total': job.get('total'),
+        'size': job.get('size'),
+        'error': job.get('error'),
+        'created_at': job['created_at'].isoformat() if job.get('created_at') else None,
+        'completed_at': job['completed_at'].isoformat() if job.get('completed_at') else None,
+    }
@@ -0,0 +1,286 @@
+"""
+Grading engine for test submissions.
+
+A test's questions are compiled once into an ``AnswerKey`` (question_id ->
+correct option text, option letters, max score and question type). Keys are
+cached per test version, so the thousands of students submitting the same
+online test share one compiled key instead of re-deriving the correct answer
+from ``optionA..optionD`` for every submission.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OPTION_LETTERS = ('A', 'B', 'C', 'D')
+COMPILER_TYPES = ('compiler', 'technical')
+
+# Compiled keys kept per worker process (LRU)
+MAX_CACHED_KEYS = 512
+
+
+def normalize_answer(value: Any) -> str:
+    """Canonical form used to compare a submitted answer with the correct option text."""
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+@dataclass(frozen=True)
+class KeyEntry:
+    """Compiled grading data for a single question."""
+    index: int
+    question_id: str
+    question_type: str
+    question: str
+    correct_letter: str
+    correct_text: str
+    options: Dict[str, str]
+    max_score: float
+    # normalized option text -> original option letter
+    letter_by_text: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def is_mcq(self) -> bool:
+        return self.question_type not in COMPILER_TYPES
+
+    def is_correct(self, student_answer: Any) -> bool:
+        correct = normalize_answer(self.correct_text)
+        return bool(correct) and normalize_answer(student_answer) == correct
+
+    def letter_for(self, student_answer: Any) -> str:
+        """Map a submitted option text back to its original option letter ('' if none)."""
+        return self.letter_by_text.get(normalize_answer(student_answer), '')
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    test_id: str
+    version: Tuple
+    entries: Tuple[KeyEntry, ...]
+    by_id: Dict[str, KeyEntry]
+
+    def get(self, question_id: Any) -> Optional[KeyEntry]:
+        return self.by_id.get(str(question_id))
+
+    def entry_for(self, question: dict, index: int) -> KeyEntry:
+        """
+        Entry for an embedded question, looked up by ``_id``. Questions without
+        an ``_id`` are keyed by position, which is not stable once questions are
+        shuffled, so those are compiled on the spot.
+        """
+        if '_id' in question:
+            entry = self.by_id.get(str(question['_id']))
+            if entry is not None:
+                return entry
+        return compile_question(question, index)
+
+    def is_correct(self, question_id: Any, student_answer: Any) -> bool:
+        entry = self.get(question_id)
+        return entry.is_correct(student_answer) if entry else False
+
+
+def answer_key_version(test: dict) -> Tuple:
+    """
+    Version token for a test document. Any edit to a test's questions sets
+    ``updated_at``; the question count guards documents that predate that field.
+    """
+    updated_at = test.get('updated_at')
+    return (str(updated_at) if updated_at else '', len(test.get('questions') or []))
+
+
+def compile_question(question: dict, index: int) -> KeyEntry:
+    """Compile one embedded test question into its KeyEntry."""
+    question_type = question.get('question_type', 'mcq')
+    options = {
+        letter: question[f'option{letter}']
+        for letter in OPTION_LETTERS
+        if question.get(f'option{letter}') is not None
+    }
+    correct_letter = question.get('answer', '') or ''
+    if question_type in COMPILER_TYPES:
+        question_text = question.get('questionTitle') or question.get('question', '')
+    else:
+        question_text = question.get('question', '')
+
+    letter_by_text: Dict[str, str] = {}
+    for letter, text in options.items():
+        # First option wins on duplicate text, matching the old if/elif order
+        letter_by_text.setdefault(normalize_answer(text), letter)
+
+    return KeyEntry(
+        index=index,
+        question_id=str(question.get('_id', index)),
+        question_type=question_type,
+        question=question_text,
+        correct_letter=correct_letter,
+        correct_text=options.get(correct_letter, '') or '',
+        options=options,
+        max_score=1.0,
+        letter_by_text=letter_by_text,
+    )
+
+
+def compile_answer_key(test: dict) -> AnswerKey:
+    """Compile a test document's questions into an AnswerKey."""
+    entries = tuple(compile_question(q, i) for i, q in enumerate(test.get('questions') or []))
+    return AnswerKey(
+        test_id=str(test.get('_id', '')),
+        version=answer_key_version(test),
+        entries=entries,
+        by_id={e.question_id: e for e in entries},
+    )
+
+
+class _AnswerKeyCache:
+    """Thread-safe LRU of compiled answer keys keyed by test id."""
+
+    def __init__(self, max_size: int = MAX_CACHED_KEYS):
+        self._max_size = max_size
+        self._keys: 'OrderedDict[str, AnswerKey]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, test: dict) -> AnswerKey:
+        test_id = str(test.get('_id', ''))
+        version = answer_key_version(test)
+        with self._lock:
+            key = self._keys.get(test_id)
+            if key is not None and key.version == version:
+                self._keys.move_to_end(test_id)
+                self.hits += 1
+                return key
+            self.misses += 1
+
+        key = compile_answer_key(test)
+        with self._lock:
+            self._keys[test_id] = key
+            self._keys.move_to_end(test_id)
+            while len(self._keys) > self._max_size:
+                self._keys.popitem(last=False)
+        return key
+
+    def invalidate(self, test_id: Any = None):
+        with self._lock:
+            if test_id is None:
+                self._keys.clear()
+            else:
+                self._keys.pop(str(test_id), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'cached_tests': len(self._keys),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+_answer_keys = _AnswerKeyCache()
+
+
+def get_answer_key(test: dict) -> AnswerKey:
+    """Return the compiled answer key for ``test``, compiling it on first use per version."""
+    return _answer_keys.get(test)
+
+
+def invalidate_answer_key(test_id: Any = None):
+    """Drop the cached key for a test (or every key) after it is edited or deleted."""
+    _answer_keys.invalidate(test_id)
+
+
+def answer_key_cache_stats() -> dict:
+    return _answer_keys.stats()
+
+
+def _grade_compiler(entry: KeyEntry, student_answer: Any) -> dict:
+    """Compiler/technical question graded from results pre-calculated by the frontend."""
+    if isinstance(student_answer, dict) and student_answer.get('results'):
+        result_data = student_answer['results']
+        question_score = result_data.get('total_score', 0)
+        question_max_score = result_data.get('max_score', 1)
+        question_percentage = (question_score / question_max_score * 100) if question_max_score > 0 else 0
+        return {
+            'question_index': entry.index,
+            'question_id': entry.question_id,
+            'question': entry.question,
+            'question_type': 'compiler',
+            'student_answer': student_answer.get('code', ''),
+            'language': student_answer.get('language', ''),
+            'is_correct': question_percentage == 100,
+            'score': question_score,
+            'max_score': question_max_score,
+            'percentage': question_percentage,
+            'test_results': result_data.get('test_results', []),
+        }
+    is_dict = isinstance(student_answer, dict)
+    return {
+        'question_index': entry.index,
+        'question_id': entry.question_id,
+        'question': entry.question,
+        'question_type': 'compiler',
+        'student_answer': student_answer.get('code', '') if is_dict else '',
+        'language': student_answer.get('language', '') if is_dict else '',
+        'is_correct': False,
+        'score': 0,
+        'max_score': 0,
+        'percentage': 0,
+    }
+
+
+def grade_answers(answer_key: AnswerKey, answers: Dict[str, Any]) -> dict:
+    """
+    Grade a submission (question_id -> answer) against a compiled key in one pass.
+
+    Returns ``score``, ``total_max_score``, ``correct_answers`` and
+    ``detailed_results`` in the shape stored on ``student_test_attempts``.
+    """
+    answers = answers or {}
+    detailed_results: List[dict] = []
+    score = 0
+    total_max_score = 0
+    correct_answers = 0
+
+    for entry in answer_key.entries:
+        student_answer = answers.get(entry.question_id, '')
+
+        if not entry.is_mcq and isinstance(student_answer, dict):
+            result = _grade_compiler(entry, student_answer)
+            if student_answer.get('results'):
+                total_max_score += result['max_score']
+            score += result['score']
+        else:
+            is_correct = entry.is_correct(student_answer)
+            points = 1 if is_correct else 0
+            score += points
+            total_max_score += 1
+            result = {
+                'question_index': entry.index,
+                'question_id': entry.question_id,
+                'question': entry.question,
+                'question_type': 'mcq',
+                'student_answer': student_answer,
+                'correct_answer_letter': entry.correct_letter,
+                'correct_answer_text': entry.correct_text,
+                'is_correct': is_correct,
+                'score': points,
+            }
+
+        if result['is_correct']:
+            correct_answers += 1
+        detailed_results.append(result)
+
+    return {
+        'score': score,
+        'total_max_score': total_max_score,
+        'correct_answers': correct_answers,
+        'detailed_results': detailed_results,
+    }
@@ -0,0 +1,389 @@
+"""
+Off-thread bcrypt verification with login admission control.
+
+bcrypt is deliberately CPU-bound; run on the request thread it stalls an
+eventlet/gevent worker for every login. ``PasswordVerifier`` runs
+``checkpw`` / ``hashpw`` on a bounded process pool (one process per core by
+default) so logins use every core and the worker stays responsive, and it
+shapes the load at exam start:
+
+* global admission - at most ``LOGIN_MAX_INFLIGHT`` verifications queued or
+  running per worker process; a login that cannot be admitted within
+  ``LOGIN_QUEUE_TIMEOUT`` seconds gets ``LoginOverloaded`` (HTTP 503 with
+  Retry-After) instead of piling up;
+* per identifier and client - more than ``LOGIN_IDENTIFIER_ATTEMPTS`` failed
+  logins for one username from one client address within
+  ``LOGIN_IDENTIFIER_WINDOW`` seconds raise ``LoginThrottled`` (HTTP 429)
+  before any bcrypt work is done. Usernames are roll numbers, so the window
+  is not keyed on the username alone: that would let anyone lock a student
+  out. ``client_ip`` takes the address appended by the last
+  ``LOGIN_PROXY_HOPS`` proxies (X-Forwarded-For entries further left are
+  client-controlled);
+* metrics - admission wait, pool queue time and hash time per verification
+  (``stats()``, served at /performance/login/stats).
+
+Hashes whose cost factor is below the target are rehashed in the background
+after a successful login. The target is ``BCRYPT_ROUNDS`` when set, otherwise
+the highest cost that hashes within ``BCRYPT_TARGET_MS`` on this host,
+measured once in the pool.
+
+``BCRYPT_EXECUTOR`` selects ``process``, ``thread`` or ``inline``. Unset, it is
+``thread`` when eventlet has monkey-patched threading (the Procfile's
+gunicorn workers) and ``process`` otherwise: a process pool's feeder thread
+and pipes do not mix with green threads. Under eventlet, ``thread`` runs on
+eventlet's native thread pool (``tpool``); bcrypt releases the GIL, so
+hashes still use several cores while the hub keeps serving requests.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import bcrypt
+
+from utils.metrics_aggregation import register_provider
+
+logger = logging.getLogger(__name__)
+
+# Resolved on first use (see module docstring); gunicorn patches after import
+BCRYPT_EXECUTOR = os.getenv('BCRYPT_EXECUTOR', '').lower() or None
+BCRYPT_POOL_WORKERS = int(os.getenv('BCRYPT_POOL_WORKERS', str(os.cpu_count() or 2)))
+LOGIN_MAX_INFLIGHT = int(os.getenv('LOGIN_MAX_INFLIGHT', str(BCRYPT_POOL_WORKERS * 8)))
+LOGIN_QUEUE_TIMEOUT = float(os.getenv('LOGIN_QUEUE_TIMEOUT', '5'))
+LOGIN_VERIFY_TIMEOUT = float(os.getenv('LOGIN_VERIFY_TIMEOUT', '15'))
+LOGIN_IDENTIFIER_ATTEMPTS = int(os.getenv('LOGIN_IDENTIFIER_ATTEMPTS', '10'))
+LOGIN_IDENTIFIER_WINDOW = float(os.getenv('LOGIN_IDENTIFIER_WINDOW', '300'))
+LOGIN_IDENTIFIER_MAX_TRACKED = 50000
+LOGIN_PROXY_HOPS = int(os.getenv('LOGIN_PROXY_HOPS', '1'))
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '0')) or None
+BCRYPT_TARGET_MS = float(os.getenv('BCRYPT_TARGET_MS', '250'))
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 14
+
+
+class LoginThrottled(Exception):
+    """Too many failed attempts for one identifier."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'Too many login attempts, retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+class LoginOverloaded(Exception):
+    """The verification queue is full."""
+
+    def __init__(self, retry_after: int = 2):
+        super().__init__('Login service is busy')
+        self.retry_after = retry_after
+
+
+# Module-level so they can be pickled into pool processes
+
+def _checkpw(password: bytes, hashed: bytes) -> Tuple[bool, float]:
+    started = time.perf_counter()
+    try:
+        ok = bcrypt.checkpw(password, hashed)
+    except (ValueError, TypeError):
+        ok = False
+    return ok, time.perf_counter() - started
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _time_hash(rounds: int) -> float:
+    started = time.perf_counter()
+    bcrypt.hashpw(b'calibration', bcrypt.gensalt(rounds=rounds))
+    return time.perf_counter() - started
+
+
+def _eventlet_patched() -> bool:
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+
+class _TpoolExecutor(Executor):
+    """Runs calls on eventlet's native OS threads; the calling green thread waits without blocking the hub."""
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        import eventlet
+        from eventlet import tpool
+
+        future: Future = Future()
+
+        def run():
+            try:
+                future.set_result(tpool.execute(fn, *args, **kwargs))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+        eventlet.spawn_n(run)
+        return future
+
+
+def client_ip(request) -> str:
+    """Address of the client as seen by the last ``LOGIN_PROXY_HOPS`` proxies."""
+    forwarded = [addr.strip() for addr in request.headers.get('X-Forwarded-For', '').split(',') if addr.strip()]
+    if LOGIN_PROXY_HOPS > 0 and len(forwarded) >= LOGIN_PROXY_HOPS:
+        return forwarded[-LOGIN_PROXY_HOPS]
+    return request.remote_addr or ''
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    """Cost factor of a ``$2b$12$...`` hash."""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class _FailureWindow:
+    """Sliding window of failed attempts per identifier (bounded LRU)."""
+
+    def __init__(self, limit: int, window: float, max_tracked: int):
+        self.limit = limit
+        self.window = window
+        self.max_tracked = max_tracked
+        self._failures: 'OrderedDict[str, Deque[float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def retry_after(self, identifier: str) -> int:
+        """Seconds until ``identifier`` may try again (0 = allowed)."""
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(identifier)
+            if not failures:
+                return 0
+            while failures and failures[0] <= now - self.window:
+                failures.popleft()
+            if len(failures) < self.limit:
+                return 0
+            return max(1, math.ceil(failures[0] + self.window - now))
+
+    def fail(self, identifier: str):
+        with self._lock:
+            failures = self._failures.pop(identifier, None) or deque(maxlen=self.limit)
+            failures.append(time.monotonic())
+            self._failures[identifier] = failures
+            while len(self._failures) > self.max_tracked:
+                self._failures.popitem(last=False)
+
+    def reset(self, identifier: str):
+        with self._lock:
+            self._failures.pop(identifier, None)
+
+
+class PasswordVerifier:
+    def __init__(
+        self,
+        executor_kind: Optional[str] = BCRYPT_EXECUTOR,
+        workers: int = BCRYPT_POOL_WORKERS,
+        max_inflight: int = LOGIN_MAX_INFLIGHT,
+    ):
+        self.executor_kind = executor_kind
+        self.workers = max(1, workers)
+        self.max_inflight = max(1, max_inflight)
+        self._admission = threading.BoundedSemaphore(self.max_inflight)
+        self._identifiers = _FailureWindow(LOGIN_IDENTIFIER_ATTEMPTS, LOGIN_IDENTIFIER_WINDOW, LOGIN_IDENTIFIER_MAX_TRACKED)
+        self._executor: Optional[Executor] = None
+        self._executor_pid: Optional[int] = None
+        self._target_rounds: Optional[int] = BCRYPT_ROUNDS
+        self._calibrating = False
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            'verified': 0, 'failed': 0, 'rejected_overload': 0, 'rejected_throttled': 0,
+            'rehashed': 0, 'inflight': 0, 'peak_inflight': 0,
+            'admission_wait_total': 0.0, 'admission_wait_max': 0.0,
+            'pool_wait_total': 0.0, 'pool_wait_max': 0.0,
+            'hash_time_total': 0.0, 'hash_time_max': 0.0,
+        }
+
+    # -- executor ----------------------------------------------------------
+
+    def _pool(self) -> Optional[Executor]:
+        # Pools do not survive fork: gunicorn workers each build their own
+        if self.executor_kind is None:
+            self.executor_kind = 'thread' if _eventlet_patched() else 'process'
+        if self.executor_kind == 'inline':
+            return None
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._lock:
+                if self._executor is None or self._executor_pid != pid:
+                    if self.executor_kind == 'thread' and _eventlet_patched():
+                        self._executor = _TpoolExecutor()
+                    elif self.executor_kind == 'thread':
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+                    else:
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._executor_pid = pid
+        return self._executor
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        pool = self._pool()
+        if pool is None:
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+        try:
+            return pool.submit(fn, *args)
+        except RuntimeError:
+            # Broken pool (e.g. a worker was OOM-killed): rebuild once
+            with self._lock:
+                self._executor = None
+            return self._pool().submit(fn, *args)
+
+    def _record(self, name: str, seconds: float):
+        self._stats[f'{name}_total'] += seconds
+        self._stats[f'{name}_max'] = max(self._stats[f'{name}_max'], seconds)
+
+    # -- admission ---------------------------------------------------------
+
+    @staticmethod
+    def _window_key(identifier: str, client: Optional[str]) -> str:
+        return f'{identifier.lower()}|{client or ""}'
+
+    def check_identifier(self, identifier: str, client: Optional[str] = None):
+        """Raise LoginThrottled when ``identifier`` has too many recent failures from ``client``."""
+        retry_after = self._identifiers.retry_after(self._window_key(identifier, client))
+        if retry_after:
+            with self._lock:
+                self._stats['rejected_throttled'] += 1
+            raise LoginThrottled(retry_after)
+
+    def record_result(self, identifier: str, success: bool, client: Optional[str] = None):
+        key = self._window_key(identifier, client)
+        if success:
+            self._identifiers.reset(key)
+        else:
+            self._identifiers.fail(key)
+
+    # -- hashing -----------------------------------------------------------
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """bcrypt.checkpw on the pool, subject to global admission control."""
+        enqueued = time.monotonic()
+        if not self._admission.acquire(timeout=LOGIN_QUEUE_TIMEOUT):
+            with self._lock:
+                self._stats['rejected_overload'] += 1
+            logger.warning('Login admission queue full (%d in flight)', self.max_inflight)
+            raise LoginOverloaded()
+        admitted = time.monotonic()
+        with self._lock:
+            self._stats['inflight'] += 1
+            self._stats['peak_inflight'] = max(self._stats['peak_inflight'], self._stats['inflight'])
+        try:
+            future = self._submit(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+            ok, hash_seconds = future.result(timeout=LOGIN_VERIFY_TIMEOUT)
+            finished = time.monotonic()
+        finally:
+            self._admission.release()
+            with self._lock:
+                self._stats['inflight'] -= 1
+        with self._lock:
+            self._stats['verified' if ok else 'failed'] += 1
+            self._record('admission_wait', admitted - enqueued)
+            self._record('pool_wait', max(0.0, finished - admitted - hash_seconds))
+            self._record('hash_time', hash_seconds)
+        return ok
+
+    def hash_password(self, password: str, rounds: Optional[int] = None) -> str:
+        """bcrypt hash computed on the pool (cost = target rounds unless given)."""
+        rounds = rounds or self._target_rounds or BCRYPT_MIN_ROUNDS + 2
+        return self._submit(_hashpw, password.encode('utf-8'), rounds).result(timeout=LOGIN_VERIFY_TIMEOUT).decode('utf-8')
+
+    def hash_many(self, passwords: List[str], rounds: Optional[int] = None) -> List[str]:
+        """
+        Hash a batch of passwords on the pool, in order.
+
+        At most two tasks per pool worker are queued at a time, so logins
+        submitted meanwhile are not stuck behind the whole batch.
+        """
+        rounds = rounds or self._target_rounds or BCRYPT_MIN_ROUNDS + 2
+        results: List[Optional[str]] = [None] * len(passwords)
+        pending: Dict[Future, int] = {}
+
+        def collect(futures):
+            for future in futures:
+                results[pending.pop(future)] = future.result(timeout=LOGIN_VERIFY_TIMEOUT).decode('utf-8')
+
+        for index, password in enumerate(passwords):
+            pending[self._submit(_hashpw, password.encode('utf-8'), rounds)] = index
+            if len(pending) >= self.workers * 2:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(list(pending))
+        return results
+
+    def target_rounds(self) -> Optional[int]:
+        """Configured/calibrated cost; None while the one-off calibration runs."""
+        if self._target_rounds is None and not self._calibrating:
+            with self._lock:
+                if self._target_rounds is None and not self._calibrating:
+                    self._calibrating = True
+                    self._submit(_time_hash, BCRYPT_MIN_ROUNDS).add_done_callback(self._calibrated)
+        return self._target_rounds
+
+    def _calibrated(self, future: Future):
+        try:
+            seconds = future.result()
+        except Exception as exc:
+            logger.warning('bcrypt calibration failed: %s', exc)
+            self._target_rounds = BCRYPT_MIN_ROUNDS + 2
+            return
+        # Each extra round doubles the work
+        extra = int(math.floor(math.log2(max(BCRYPT_TARGET_MS / 1000.0 / max(seconds, 1e-6), 1.0))))
+        self._target_rounds = min(BCRYPT_MAX_ROUNDS, BCRYPT_MIN_ROUNDS + extra)
+        logger.info('bcrypt cost %d at %.1f ms -> target cost %d', BCRYPT_MIN_ROUNDS, seconds * 1000, self._target_rounds)
+
+    def rehash_if_needed(self, password: str, hashed: str, on_rehashed: Callable[[str], Any]):
+        """After a successful login, upgrade a below-target hash in the background."""
+        target = self.target_rounds()
+        cost = hash_cost(hashed)
+        if target is None or cost is None or cost >= target:
+            return
+
+        def done(future: Future):
+            try:
+                on_rehashed(future.result().decode('utf-8'))
+                with self._lock:
+                    self._stats['rehashed'] += 1
+            except Exception as exc:
+                logger.warning('Password rehash failed: %s', exc)
+
+        self._submit(_hashpw, password.encode('utf-8'), target).add_done_callback(done)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        completed = stats['verified'] + stats['failed']
+        summary = {
+            'executor': self.executor_kind or 'auto',
+            'workers': self.workers,
+            'max_inflight': self.max_inflight,
+            'target_rounds': self._target_rounds,
+        }
+        for key in ('verified', 'failed', 'rejected_overload', 'rejected_throttled', 'rehashed', 'inflight', 'peak_inflight'):
+            summary[key] = int(stats[key])
+        for name in ('admission_wait', 'pool_wait', 'hash_time'):
+            summary[f'{name}_avg_ms'] = round(stats[f'{name}_total'] / completed * 1000, 2) if completed else 0.0
+            summary[f'{name}_max_ms'] = round(stats[f'{name}_max'] * 1000, 2)
+        return summary
+
+
+password_verifier = PasswordVerifier()
+register_provider('login', password_verifier.stats)
@@ -0,0 +1,368 @@
+"""
+Per-student progress rollups (``student_progress_rollups`` collection).
+
+One document per student (``_id`` = str(user id)) holds running counters
+for every completed attempt, so progress endpoints read one document
+instead of aggregating the student's attempt history on every request:
+
+    {
+        '_id': '<user id>',
+        'totals':  {'practice': STATS, 'online': STATS, ...},
+        'modules': {'GRAMMAR': {'practice': STATS, 'online': STATS,
+                                'levels':        {'<level_id>':    {'practice': STATS}},
+                                'subcategories': {'<subcategory>': {'practice': STATS}}}},
+        'tests':   {'<test_id>': {test_name, module_id, subcategory, level_id, test_type,
+                                  **STATS, 'recent_attempts': [...]}},
+        'recent':  {'practice': [...], 'online': [...]},
+    }
+
+STATS = attempts, scored_attempts, score_sum, best_score, last_score,
+last_attempt, total_questions, correct_answers (scores are 0-100).
+
+``record_attempt`` folds a completed attempt in with a single upsert
+($inc / $max / $set / capped $push); the attempt is flagged
+``rollup_applied`` first so a retried call cannot count it twice.
+``rebuild_student`` recomputes a document from history (also done lazily
+the first time a student without a rollup is read) and ``backfill``
+rebuilds every student (scripts/backfill_progress_rollups.py).
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+from mongo import mongo_db
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_COLLECTION = 'student_progress_rollups'
+RECENT_ACTIVITY_LIMIT = int(os.getenv('PROGRESS_ROLLUP_RECENT_ACTIVITY', '10'))
+TEST_ATTEMPTS_LIMIT = int(os.getenv('PROGRESS_ROLLUP_TEST_ATTEMPTS', '20'))
+
+_TEST_PROJECTION = {'name': 1, 'module_id': 1, 'subcategory': 1, 'level_id': 1}
+
+
+def _collection():
+    return mongo_db.db[ROLLUPS_COLLECTION]
+
+
+def _to_object_id(value: Any) -> Optional[ObjectId]:
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(str(value))
+    except Exception:
+        return None
+
+
+def _key(value: Any) -> str:
+    """Module / level / test ids become field names: no dots or leading '$'."""
+    return str(value).replace('.', '_').replace('$', '_') or 'UNKNOWN'
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        # Extended-JSON numbers written by some legacy submit paths
+        for field in ('$numberDouble', '$numberInt', '$numberLong'):
+            if field in value:
+                return _number(value[field])
+        return None
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def attempt_score(attempt: dict) -> float:
+    """Percentage (0-100) of an attempt, same precedence as the old progress aggregations."""
+    score_percentage = _number(attempt.get('score_percentage'))
+    if score_percentage:
+        return score_percentage
+    percentage = _number(attempt.get('percentage'))
+    if percentage is not None:
+        return percentage
+    average = _number(attempt.get('average_score'))
+    if average is not None:
+        return average * 100 if average <= 1 else average
+    return 0.0
+
+
+def rollup_key(attempt: dict) -> Optional[str]:
+    """Rollups are keyed by the canonical student_oid (the student's user id)."""
+    owner = attempt.get('student_oid')
+    return str(owner) if owner else None
+
+
+def _attempt_update(attempt: dict, test: Optional[dict]) -> dict:
+    test = test or {}
+    module_id = attempt.get('module_id') or test.get('module_id') or 'UNKNOWN'
+    subcategory = attempt.get('subcategory') or test.get('subcategory')
+    level_id = attempt.get('level_id') or test.get('level_id')
+    test_type = _key(attempt.get('test_type') or 'unknown')
+    test_id = attempt.get('test_id')
+    submitted_at = attempt.get('submitted_at') or attempt.get('end_time') or attempt.get('start_time')
+    if not isinstance(submitted_at, datetime):
+        submitted_at = None
+    score = attempt_score(attempt)
+    total_questions = int(_number(attempt.get('total_questions')) or 0)
+    correct_answers = int(_number(attempt.get('correct_answers')) or 0)
+
+    module = f'modules.{_key(module_id)}'
+    prefixes = [f'totals.{test_type}', f'{module}.{test_type}']
+    if level_id:
+        prefixes.append(f'{module}.levels.{_key(level_id)}.{test_type}')
+    if subcategory:
+        prefixes.append(f'{module}.subcategories.{_key(subcategory)}.{test_type}')
+    if test_id:
+        prefixes.append(f'tests.{_key(test_id)}')
+
+    inc: Dict[str, Any] = {}
+    maximum: Dict[str, Any] = {}
+    values: Dict[str, Any] = {'updated_at': datetime.utcnow()}
+    for prefix in prefixes:
+        inc[f'{prefix}.attempts'] = 1
+        inc[f'{prefix}.scored_attempts'] = 1 if score > 0 else 0
+        inc[f'{prefix}.score_sum'] = score
+        inc[f'{prefix}.total_questions'] = total_questions
+        inc[f'{prefix}.correct_answers'] = correct_answers
+        maximum[f'{prefix}.best_score'] = score
+        values[f'{prefix}.last_score'] = score
+        if submitted_at:
+            maximum[f'{prefix}.last_attempt'] = submitted_at
+
+    entry = {
+        'attempt_id': str(attempt.get('_id')),
+        'test_id': str(test_id) if test_id else None,
+        'test_name': attempt.get('test_name') or test.get('name') or 'Unknown Test',
+        'module_id': module_id,
+        'score': score,
+        'submitted_at': submitted_at,
+        'time_taken': attempt.get('time_taken'),
+        'correct_answers': correct_answers,
+        'total_questions': total_questions,
+    }
+    push = {f'recent.{test_type}': {'$each': [entry], '$sort': {'submitted_at': -1}, '$slice': RECENT_ACTIVITY_LIMIT}}
+    if test_id:
+        test_path = f'tests.{_key(test_id)}'
+        values.update({
+            f'{test_path}.test_id': str(test_id),
+            f'{test_path}.test_name': entry['test_name'],
+            f'{test_path}.module_id': module_id,
+            f'{test_path}.subcategory': subcategory,
+            f'{test_path}.level_id': level_id,
+            f'{test_path}.test_type': test_type,
+        })
+        push[f'{test_path}.recent_attempts'] = {
+            '$each': [entry], '$sort': {'submitted_at': -1}, '$slice': TEST_ATTEMPTS_LIMIT,
+        }
+    return {'$inc': inc, '$max': maximum, '$set': values, '$push': push}
+
+
+def _apply_update(doc: dict, update: dict):
+    """In-memory twin of the upsert in ``record_attempt``, used for rebuilds."""
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            *parents, leaf = path.split('.')
+            node = doc
+            for part in parents:
+                node = node.setdefault(part, {})
+            if operator == '$inc':
+                node[leaf] = node.get(leaf, 0) + value
+            elif operator == '$max':
+                if node.get(leaf) is None or value > node[leaf]:
+                    node[leaf] = value
+            elif operator == '$set':
+                node[leaf] = value
+            elif operator == '$push':
+                items = node.get(leaf, []) + value['$each']
+                items.sort(key=lambda item: item.get('submitted_at') or datetime.min, reverse=True)
+                node[leaf] = items[:value['$slice']]
+
+
+def _load_test(test_id: Any) -> Optional[dict]:
+    oid = _to_object_id(test_id)
+    return mongo_db.tests.find_one({'_id': oid}, _TEST_PROJECTION) if oid else None
+
+
+def record_attempt(attempt: Any, test: Optional[dict] = None) -> bool:
+    """
+    Fold one completed attempt (document or _id) into its student's rollup.
+    Never raises: a missed update is repaired by ``rebuild_student``.
+    """
+    try:
+        if not isinstance(attempt, dict):
+            attempt = mongo_db.student_test_attempts.find_one({'_id': _to_object_id(attempt)})
+        if not attempt or attempt.get('status') != 'completed':
+            return False
+        key = rollup_key(attempt)
+        if not key:
+            return False
+
+        claimed = mongo_db.student_test_attempts.update_one(
+            {'_id': attempt['_id'], 'rollup_applied': {'$ne': True}},
+            {'$set': {'rollup_applied': True}},
+        )
+        if not claimed.modified_count:
+            return False
+
+        if test is None and attempt.get('test_id'):
+            test = _load_test(attempt['test_id'])
+        result = _collection().update_one({'_id': key}, _attempt_update(attempt, test), upsert=True)
+        if result.upserted_id is not None:
+            # First rollup for this student: fold in any history from before rollups existed
+            rebuild_student(key)
+        return True
+    except Exception as exc:
+        logger.warning('Failed to update progress rollup for attempt %s: %s', attempt, exc)
+        return False
+
+
+def rebuild_student(user_id: Any) -> dict:
+    """Recompute a student's rollup from their completed attempts and store it."""
+    key = str(user_id)
+    oid = _to_object_id(key)
+    attempts = list(mongo_db.student_test_attempts.find(
+        {'student_oid': oid, 'status': 'completed'},
+        {'answers': 0, 'detailed_results': 0, 'results': 0},
+    ).sort('submitted_at', 1)) if oid is not None else []
+
+    test_ids = {_to_object_id(a.get('test_id')) for a in attempts if a.get('test_id')}
+    test_ids.discard(None)
+    tests = {
+        str(test['_id']): test
+        for test in mongo_db.tests.find({'_id': {'$in': list(test_ids)}}, _TEST_PROJECTION)
+    } if test_ids else {}
+
+    doc: Dict[str, Any] = {'_id': key, 'totals': {}, 'modules': {}, 'tests': {}, 'recent': {}}
+    for attempt in attempts:
+        _apply_update(doc, _attempt_update(attempt, tests.get(str(attempt.get('test_id')))))
+    doc['updated_at'] = doc['rebuilt_at'] = datetime.utcnow()
+
+    _collection().replace_one({'_id': key}, doc, upsert=True)
+    if attempts:
+        mongo_db.student_test_attempts.update_many(
+            {'_id': {'$in': [a['_id'] for a in attempts]}},
+            {'$set': {'rollup_applied': True}},
+        )
+    return doc
+
+
+def get_rollup(user_id: Any) -> dict:
+    """The student's rollup document, built from history on first access."""
+    doc = _collection().find_one({'_id': str(user_id)})
+    if doc is None:
+        doc = rebuild_student(user_id)
+    return doc
+
+
+def backfill(on_progress: Optional[Callable[[int], None]] = None) -> int:
+    """Rebuild the rollup of every student with completed attempts; returns the count."""
+    keys = mongo_db.student_test_attempts.aggregate([
+        {'$match': {'status': 'completed', 'student_oid': {'$ne': None}}},
+        {'$group': {'_id': '$student_oid'}},
+    ], allowDiskUse=True)
+    done = 0
+    for row in keys:
+        if row['_id'] is None:
+            continue
+        try:
+            rebuild_student(row['_id'])
+        except Exception as exc:
+            logger.error('Failed to rebuild progress rollup for %s: %s', row['_id'], exc)
+            continue
+        done += 1
+        if on_progress:
+            on_progress(done)
+    return done
+
+
+# ---------------------------------------------------------------------------
+# Read helpers
+# ---------------------------------------------------------------------------
+
+def _iso(value: Any) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else None
+
+
+def average(stats: dict) -> float:
+    """Mean over every attempt (the old ``$avg`` in the progress aggregations)."""
+    return stats['score_sum'] / stats['attempts'] if stats.get('attempts') else 0
+
+
+def scored_average(stats: dict) -> float:
+    """Mean over attempts with a non-zero score (the old insights average)."""
+    return stats['score_sum'] / stats['scored_attempts'] if stats.get('scored_attempts') else 0
+
+
+def module_stats(rollup: dict, test_type: str) -> Dict[str, dict]:
+    """{module_id: STATS} for one test type."""
+    return {
+        module_id: module[test_type]
+        for module_id, module in rollup.get('modules', {}).items()
+        if test_type in module
+    }
+
+
+def tests_for(rollup: dict, test_type: str, module_id: Optional[str] = None) -> List[dict]:
+    """Per-test entries of one test type, newest attempt first."""
+    tests = [
+        test for test in rollup.get('tests', {}).values()
+        if test.get('test_type') == test_type and (module_id is None or test.get('module_id') == module_id)
+    ]
+    tests.sort(key=lambda test: test.get('last_attempt') or datetime.min, reverse=True)
+    return tests
+
+
+def recent_activity(rollup: dict, test_type: str) -> List[dict]:
+    return list(rollup.get('recent', {}).get(test_type, []))
+
+
+def best_subcategory_scores(rollup: dict, module_id: str) -> Dict[str, float]:
+    """Highest score per subcategory of a module across all test types."""
+    subcategories = rollup.get('modules', {}).get(module_id, {}).get('subcategories', {})
+    return {
+        subcategory: max((stats.get('best_score') or 0) for stats in by_type.values())
+        for subcategory, by_type in subcategories.items()
+        if by_type
+    }
+
+
+def attempt_summary(rollup: dict, module_id: str, test_type: str) -> dict:
+    """Per-module summary in the shape of the admin insights ``practice`` / ``online`` blocks."""
+    stats = rollup.get('modules', {}).get(module_id, {}).get(test_type, {})
+    tests = tests_for(rollup, test_type, module_id)
+    return {
+        'total_attempts': stats.get('attempts', 0),
+        'distinct_tests': len(tests),
+        'average_score': scored_average(stats),
+        'highest_score': stats.get('best_score', 0),
+        'last_attempt': _iso(stats.get('last_attempt')),
+        'tests': [
+            {
+                'test_id': test.get('test_id'),
+                'test_name': test.get('test_name'),
+                'attempts': test.get('attempts', 0),
+                'best_score': test.get('best_score', 0),
+                'last_attempt': _iso(test.get('last_attempt')),
+            }
+            for test in tests
+        ],
+    }
+
+
+def total_attempts(rollup: dict, test_types: Optional[Iterable[str]] = None) -> int:
+    totals = rollup.get('totals', {})
+    return sum(
+        stats.get('attempts', 0) for test_type, stats in totals.items()
+        if test_types is None or test_type in test_types
+    )
@@ -6,13 +6,23 @@ Maps RDS schema to AI-VERSANT API shapes:
   courses       -> courses (per college)
   students.batch + college -> one batch per year (all courses & branches inside)
   students      -> student list (view-only)
+
+Colleges, courses, branches, batch breakdowns and counts change rarely, so
+they are served through a read-through TTL cache. Call
+``rds_org.invalidate_cache()`` after a sync to force fresh reads.
 """
 from __future__ import annotations
 
+import copy
+import functools
 import logging
+import threading
+import time
+from collections import defaultdict
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 
+from config.mysql_rds import MySQLRDSConfig
 from utils.mysql_rds_manager import mysql_rds
 
 logger = logging.getLogger(__name__)
@@ -101,9 +111,138 @@ def _serialize_dt(value: Any) -> Any:
     return value
 
 
+class _OrgCache:
+    """Thread-safe TTL cache keyed by (namespace, key) with per-namespace hit/miss counters."""
+
+    def __init__(self):
+        self._data: dict[tuple, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._hits: dict[str, int] = defaultdict(int)
+        self._misses: dict[str, int] = defaultdict(int)
+
+    def get(self, namespace: str, key: Any) -> tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is not None:
+                if entry[0] > now:
+                    self._hits[namespace] += 1
+                    return True, entry[1]
+                del self._data[(namespace, key)]
+            self._misses[namespace] += 1
+        return False, None
+
+    def set(self, namespace: str, key: Any, value: Any, ttl: int):
+        with self._lock:
+            self._data[(namespace, key)] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, namespace: Optional[str] = None) -> int:
+        with self._lock:
+            if namespace is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+            keys = [k for k in self._data if k[0] == namespace]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes: dict[str, int] = defaultdict(int)
+            for namespace, _ in self._data:
+                sizes[namespace] += 1
+            namespaces = set(self._hits) | set(self._misses) | set(sizes)
+            per_ns = {}
+            for ns in sorted(namespaces):
+                hits, misses = self._hits[ns], self._misses[ns]
+                per_ns[ns] = {
+                    'hits': hits,
+                    'misses': misses,
+                    'entries': sizes[ns],
+                    'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                }
+            total_hits = sum(self._hits.values())
+            total_misses = sum(self._misses.values())
+        return {
+            'entries': sum(sizes.values()),
+            'hits': total_hits,
+            'misses': total_misses,
+            'hit_rate': round(total_hits / (total_hits + total_misses), 3) if total_hits + total_misses else 0.0,
+            'namespaces': per_ns,
+        }
+
+
+_org_cache = _OrgCache()
+
+
+def _cached(namespace: str, ttl_setting: str):
+    """Cache a RDSOrgService method's result per argument tuple for ``MySQLRDSConfig.<ttl_setting>`` seconds."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            ttl = getattr(MySQLRDSConfig, ttl_setting)
+            if ttl <= 0:
+                return func(self, *args, **kwargs)
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            hit, value = _org_cache.get(namespace, key)
+            if not hit:
+                value = func(self, *args, **kwargs)
+                _org_cache.set(namespace, key, value, ttl)
+            # Callers are free to mutate what they get back
+            return copy.deepcopy(value)
+        return wrapper
+    return decorator
+
+
 class RDSOrgService:
     """Read-only queries against colleges, courses, and students tables."""
 
+    def invalidate_cache(self, namespace: Optional[str] = None) -> int:
+        """Drop cached org lookups (all namespaces by default). Returns entries removed."""
+        removed = _org_cache.invalidate(namespace)
+        logger.info('Invalidated %s cached RDS org entries (namespace=%s)', removed, namespace or 'all')
+        return removed
+
+    def cache_stats(self) -> dict:
+        return _org_cache.stats()
+
+    def _fetch_by_ids(
+        self,
+        namespace: str,
+        ids: Iterable[int],
+        sql: str,
+        row_to_dict,
+    ) -> dict[int, Optional[dict]]:
+        """Serve ids from the cache and load all misses with a single WHERE id IN (...) query."""
+        result: dict[int, Optional[dict]] = {}
+        missing: list[int] = []
+        ttl = MySQLRDSConfig.ORG_CACHE_TTL
+        for raw_id in dict.fromkeys(ids):
+            if raw_id is None:
+                continue
+            key = int(raw_id)
+            hit, value = _org_cache.get(namespace, key) if ttl > 0 else (False, None)
+            if hit:
+                result[key] = copy.deepcopy(value)
+            else:
+                missing.append(key)
+
+        if missing:
+            placeholders = ', '.join(['%s'] * len(missing))
+            with mysql_rds.cursor() as cur:
+                cur.execute(sql.format(placeholders=placeholders), missing)
+                rows = cur.fetchall()
+            loaded = {int(r['id']): row_to_dict(r) for r in rows}
+            for key in missing:
+                value = loaded.get(key)
+                if ttl > 0:
+                    # Unknown ids are cached too so bad references don't hammer RDS
+                    _org_cache.set(namespace, key, value, ttl)
+                result[key] = copy.deepcopy(value)
+        return result
+
+    @_cached('colleges', 'ORG_CACHE_TTL')
     def list_colleges(self, active_only: bool = True) -> list[dict]:
         sql = """
             SELECT id, name, code, is_active, created_at, updated_at
@@ -128,15 +267,8 @@ class RDSOrgService:
             for r in rows
         ]
 
-    def get_college_by_id(self, college_id: int) -> Optional[dict]:
-        with mysql_rds.cursor() as cur:
-            cur.execute(
-                'SELECT id, name, code, is_active, created_at FROM colleges WHERE id = %s',
-                (college_id,),
-            )
-            r = cur.fetchone()
-        if not r:
-            return None
+    @staticmethod
+    def _college_row_to_dict(r: dict) -> dict:
         return {
             'id': campus_id(r['id']),
             'name': r['name'],
@@ -144,6 +276,19 @@ class RDSOrgService:
             'source': 'rds',
         }
 
+    def get_colleges_by_ids(self, college_ids: Iterable[int]) -> dict[int, Optional[dict]]:
+        """Bulk lookup: college id -> college dict (None when not found)."""
+        return self._fetch_by_ids(
+            'college_by_id',
+            college_ids,
+            'SELECT id, name, code, is_active, created_at FROM colleges WHERE id IN ({placeholders})',
+            self._college_row_to_dict,
+        )
+
+    def get_college_by_id(self, college_id: int) -> Optional[dict]:
+        return self.get_colleges_by_ids([college_id]).get(int(college_id))
+
+    @_cached('courses', 'ORG_CACHE_TTL')
     def list_courses(self, college_id: Optional[int] = None, active_only: bool = True) -> list[dict]:
         sql = """
             SELECT co.id, co.college_id, co.name, co.code, co.level,
@@ -178,20 +323,8 @@ class RDSOrgService:
             for r in rows
         ]
 
-    def get_course_by_id(self, course_id_num: int) -> Optional[dict]:
-        with mysql_rds.cursor() as cur:
-            cur.execute(
-                """
-                SELECT co.id, co.college_id, co.name, co.code, c.name AS college_name
-                FROM courses co
-                JOIN colleges c ON c.id = co.college_id
-                WHERE co.id = %s
-                """,
-                (course_id_num,),
-            )
-            r = cur.fetchone()
-        if not r:
-            return None
+    @staticmethod
+    def _course_row_to_dict(r: dict) -> dict:
         return {
             'id': course_id(r['id']),
             'name': r['name'],
@@ -201,6 +334,23 @@ class RDSOrgService:
             'source': 'rds',
         }
 
+    def get_courses_by_ids(self, course_ids: Iterable[int]) -> dict[int, Optional[dict]]:
+        """Bulk lookup: course id -> course dict (None when not found)."""
+        return self._fetch_by_ids(
+            'course_by_id',
+            course_ids,
+            """
+            SELECT co.id, co.college_id, co.name, co.code, c.name AS college_name
+            FROM courses co
+            JOIN colleges c ON c.id = co.college_id
+            WHERE co.id IN ({placeholders})
+            """,
+            self._course_row_to_dict,
+        )
+
+    def get_course_by_id(self, course_id_num: int) -> Optional[dict]:
+        return self.get_courses_by_ids([course_id_num]).get(int(course_id_num))
+
     def _college_name_for_id(self, college_id: int) -> Optional[str]:
         college = self.get_college_by_id(college_id)
         return college['name'] if college else None
@@ -209,6 +359,7 @@ class RDSOrgService:
         course = self.get_course_by_id(course_id_num)
         return course['name'] if course else None
 
+    @_cached('batch_breakdown', 'BATCH_CACHE_TTL')
     def _fetch_batch_breakdown_rows(
         self,
         college_id: Optional[int] = None,
@@ -377,11 +528,13 @@ class RDSOrgService:
             'source': 'rds',
         }
 
+    @_cached('counts', 'COUNT_CACHE_TTL')
     def count_all_students(self) -> int:
         with mysql_rds.cursor() as cur:
             cur.execute('SELECT COUNT(*) AS c FROM students')
             return int(cur.fetchone()['c'])
 
+    @_cached('counts', 'COUNT_CACHE_TTL')
     def count_students_for_college(self, college_id: int) -> int:
         name = self._college_name_for_id(college_id)
         if not name:
@@ -390,6 +543,7 @@ class RDSOrgService:
             cur.execute('SELECT COUNT(*) AS c FROM students WHERE college = %s', (name,))
             return int(cur.fetchone()['c'])
 
+    @_cached('counts', 'COUNT_CACHE_TTL')
     def count_students_for_course(self, course_id_num: int, college_id: Optional[int] = None) -> int:
         course_name = self._course_name_for_id(course_id_num)
         if not course_name:
@@ -405,6 +559,7 @@ class RDSOrgService:
             cur.execute(sql, params)
             return int(cur.fetchone()['c'])
 
+    @_cached('counts', 'COUNT_CACHE_TTL')
     def count_courses_for_college(self, college_id: int) -> int:
         with mysql_rds.cursor() as cur:
             cur.execute(
@@ -567,6 +722,7 @@ class RDSOrgService:
             row = cur.fetchone()
         return self._student_row_to_dict(row) if row else None
 
+    @_cached('branches', 'ORG_CACHE_TTL')
     def list_branches_for_course(self, course_id_num: int) -> list[dict]:
         with mysql_rds.cursor() as cur:
             cur.execute(
@@ -583,6 +739,7 @@ class RDSOrgService:
             for r in rows
         ]
 
+    @_cached('branches', 'BATCH_CACHE_TTL')
     def list_branches_for_college(
         self,
         college_id: int,
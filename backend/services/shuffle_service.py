@@ -0,0 +1,146 @@
+"""
+Deterministic question/option shuffling.
+
+Every (test, student) pair gets its own ``random.Random`` seeded from a stable
+digest, so the order a student sees when loading a test is reproduced exactly
+when their answers are graded - on any gunicorn worker, regardless of
+PYTHONHASHSEED - and the process-global RNG is never reseeded.
+
+Plans are stored as compact integer arrays (question order plus one option
+permutation per question) and cached, so grading can walk the original
+questions in display order without rebuilding shuffled copies.
+"""
+from __future__ import annotations
+
+import hashlib
+import random
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+OPTION_LETTERS = ('A', 'B', 'C', 'D')
+
+# Plans kept per worker process (LRU); each plan is a few dozen bytes
+MAX_CACHED_PLANS = 20000
+
+
+def stable_seed(*parts: Any) -> int:
+    """64-bit seed derived from ``parts``; identical in every process."""
+    digest = hashlib.blake2b('\x1f'.join(str(p) for p in parts).encode('utf-8'), digest_size=8)
+    return int.from_bytes(digest.digest(), 'big')
+
+
+def rng_for(*parts: Any) -> random.Random:
+    """Private RNG seeded from ``parts``. Pass no parts for a non-deterministic RNG."""
+    if not parts:
+        return random.Random()
+    return random.Random(stable_seed(*parts))
+
+
+def _present_option_letters(question: dict) -> Tuple[str, ...]:
+    return tuple(letter for letter in OPTION_LETTERS if question.get(f'option{letter}') is not None)
+
+
+def shuffle_options(options: Dict[str, Any], rng: random.Random) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Shuffle an option-letter -> text dict. Returns the relabelled options
+    (A, B, ... in the new order) and the old letter -> new letter mapping.
+    """
+    items = list(options.items())
+    rng.shuffle(items)
+    new_options = {}
+    answer_map = {}
+    for new_idx, (old_key, value) in enumerate(items):
+        new_key = chr(ord('A') + new_idx)
+        new_options[new_key] = value
+        answer_map[old_key] = new_key
+    return new_options, answer_map
+
+
+@dataclass(frozen=True)
+class ShufflePlan:
+    """Display order for one student's view of one test."""
+    # question_order[display_index] = index into the test's original questions
+    question_order: array
+    # option_orders[original_index] = positions into that question's present option letters
+    option_orders: Tuple[bytes, ...]
+
+    def __len__(self) -> int:
+        return len(self.question_order)
+
+    def iter_questions(self, questions: Sequence[dict]) -> Iterator[Tuple[int, int, dict]]:
+        """Yield (display_index, original_index, question) without copying questions."""
+        for display_index, original_index in enumerate(self.question_order):
+            yield display_index, original_index, questions[original_index]
+
+    def mcq_options(self, question: dict, original_index: int) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Shuffled options and old -> new letter map for an MCQ, as the student saw them."""
+        letters = _present_option_letters(question)
+        order = self.option_orders[original_index]
+        if len(order) != len(letters):
+            # Question edited since the plan was made; fall back to the stored order
+            order = bytes(range(len(letters)))
+        new_options = {}
+        answer_map = {}
+        for new_idx, pos in enumerate(order):
+            old_key = letters[pos]
+            new_key = chr(ord('A') + new_idx)
+            new_options[new_key] = question[f'option{old_key}']
+            answer_map[old_key] = new_key
+        return new_options, answer_map
+
+
+def _plan_signature(questions: Sequence[dict]) -> Tuple:
+    return tuple(len(_present_option_letters(q)) if q.get('question_type') == 'mcq' else 0 for q in questions)
+
+
+def build_plan(test_id: Any, student_id: Any, questions: Sequence[dict]) -> ShufflePlan:
+    """Compute the plan for (test, student) from a private, stably seeded RNG."""
+    rng = rng_for(test_id, student_id)
+    order = list(range(len(questions)))
+    rng.shuffle(order)
+    option_orders: List[bytes] = [b''] * len(questions)
+    # Options are shuffled in display order so the RNG stream is consumed identically every time
+    for original_index in order:
+        question = questions[original_index]
+        if question.get('question_type') != 'mcq':
+            continue
+        positions = list(range(len(_present_option_letters(question))))
+        rng.shuffle(positions)
+        option_orders[original_index] = bytes(positions)
+    return ShufflePlan(question_order=array('H', order), option_orders=tuple(option_orders))
+
+
+class _PlanCache:
+    def __init__(self, max_size: int = MAX_CACHED_PLANS):
+        self._max_size = max_size
+        self._plans: 'OrderedDict[Tuple, ShufflePlan]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, test_id: Any, student_id: Any, questions: Sequence[dict]) -> ShufflePlan:
+        key = (str(test_id), str(student_id), _plan_signature(questions))
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+        plan = build_plan(test_id, student_id, questions)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self._max_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+
+_plans = _PlanCache()
+
+
+def get_shuffle_plan(test_id: Any, student_id: Optional[Any], questions: Sequence[dict]) -> ShufflePlan:
+    """Cached shuffle plan for a student's view of a test's questions."""
+    return _plans.get(test_id, student_id or '', questions)
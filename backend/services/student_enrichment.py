@@ -0,0 +1,195 @@
+"""
+Batched student / campus / course / batch enrichment for result listings and exports.
+
+Instead of a ``students.find_one`` plus ``campuses`` / ``courses`` /
+``batches.find_one`` per attempt, ids are collected and resolved with one
+``$in`` query per collection and joined in memory. RDS org ids (``rds_c_*``,
+``rds_co_*``, ``rds_b_*``) resolve through the cached ``rds_org`` lookups.
+
+    enricher = StudentEnricher()
+    for attempt, ctx in enricher.iter_enriched(cursor):
+        ctx.student, ctx.campus_name, ...
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+
+from mongo import mongo_db
+from services.org_data_source import is_rds_org_id
+from services.rds_org_service import parse_campus_id, parse_course_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 500
+
+
+@dataclass
+class StudentContext:
+    """Everything a result row needs about the student who produced it."""
+    student: Optional[dict] = None
+    user: Optional[dict] = None
+    campus_name: Optional[str] = None
+    course_name: Optional[str] = None
+    batch_name: Optional[str] = None
+
+
+def _to_object_id(value: Any) -> Optional[ObjectId]:
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(str(value))
+    except Exception:
+        return None
+
+
+class StudentEnricher:
+    """
+    Resolves attempt/result rows to their student profile and org names.
+
+    Name lookups are remembered for the enricher's lifetime, so in streaming
+    mode each page only queries ids that earlier pages have not seen.
+    """
+
+    def __init__(
+        self,
+        student_projection: Optional[dict] = None,
+        include_users: bool = False,
+        match_student_id: bool = True,
+    ):
+        self.student_projection = student_projection
+        self.include_users = include_users
+        # Some attempts store students._id instead of the user id
+        self.match_student_id = match_student_id
+        self._names: Dict[str, Dict[str, Optional[str]]] = {'campus': {}, 'course': {}, 'batch': {}}
+        self._rds_batch_names: Optional[Dict[str, str]] = None
+
+    def _load_students(self, oids: List[ObjectId]) -> Dict[str, dict]:
+        by_key: Dict[str, dict] = {}
+        if not oids:
+            return by_key
+        for student in mongo_db.students.find({'user_id': {'$in': oids}}, self.student_projection):
+            by_key[str(student.get('user_id'))] = student
+        if self.match_student_id:
+            missing = [oid for oid in oids if str(oid) not in by_key]
+            if missing:
+                for student in mongo_db.students.find({'_id': {'$in': missing}}, self.student_projection):
+                    by_key[str(student['_id'])] = student
+        return by_key
+
+    def _load_users(self, oids: List[ObjectId]) -> Dict[str, dict]:
+        if not oids:
+            return {}
+        return {
+            str(user['_id']): user
+            for user in mongo_db.users.find({'_id': {'$in': oids}}, {'password_hash': 0, 'password': 0})
+        }
+
+    def _load_rds_names(self, kind: str, ids: List[str]) -> Dict[str, Optional[str]]:
+        from services.rds_org_service import rds_org
+
+        names: Dict[str, Optional[str]] = {}
+        try:
+            if kind == 'campus':
+                nums = {i: parse_campus_id(i) for i in ids}
+                found = rds_org.get_colleges_by_ids(n for n in nums.values() if n is not None)
+                for i, n in nums.items():
+                    college = found.get(n) if n is not None else None
+                    names[i] = college['name'] if college else None
+            elif kind == 'course':
+                nums = {i: parse_course_id(i) for i in ids}
+                found = rds_org.get_courses_by_ids(n for n in nums.values() if n is not None)
+                for i, n in nums.items():
+                    course = found.get(n) if n is not None else None
+                    names[i] = course['name'] if course else None
+            else:
+                if self._rds_batch_names is None:
+                    self._rds_batch_names = {b['id']: b['name'] for b in rds_org.list_batches()}
+                for i in ids:
+                    names[i] = self._rds_batch_names.get(i)
+        except Exception as exc:
+            logger.warning('Failed to resolve RDS %s names: %s', kind, exc)
+        return names
+
+    def _resolve_names(self, kind: str, values: Iterable[Any]):
+        """Fill ``self._names[kind]`` for any ids not resolved yet."""
+        known = self._names[kind]
+        pending = {str(v) for v in values if v is not None and str(v) not in known}
+        if not pending:
+            return
+        rds_ids = [v for v in pending if is_rds_org_id(v)]
+        mongo_ids = [oid for oid in (_to_object_id(v) for v in pending if not is_rds_org_id(v)) if oid]
+
+        collection = {'campus': mongo_db.campuses, 'course': mongo_db.courses, 'batch': mongo_db.batches}[kind]
+        if mongo_ids:
+            for doc in collection.find({'_id': {'$in': mongo_ids}}, {'name': 1}):
+                known[str(doc['_id'])] = doc.get('name')
+        if rds_ids:
+            known.update(self._load_rds_names(kind, rds_ids))
+        for v in pending:
+            known.setdefault(v, None)
+
+    def resolve(self, student_ids: Iterable[Any]) -> Dict[str, StudentContext]:
+        """Map each str(student id) to its StudentContext with one query per collection."""
+        oids = []
+        seen = set()
+        for value in student_ids:
+            oid = _to_object_id(value)
+            if oid is not None and oid not in seen:
+                seen.add(oid)
+                oids.append(oid)
+
+        students = self._load_students(oids)
+        users = self._load_users(oids) if self.include_users else {}
+        self._resolve_org_names(students.values())
+
+        contexts: Dict[str, StudentContext] = {}
+        for oid in oids:
+            key = str(oid)
+            contexts[key] = self._context(students.get(key), users.get(key))
+        return contexts
+
+    def _resolve_org_names(self, students: Iterable[dict]):
+        students = list(students)
+        self._resolve_names('campus', (s.get('campus_id') for s in students))
+        self._resolve_names('course', (s.get('course_id') for s in students))
+        self._resolve_names('batch', (s.get('batch_id') for s in students))
+
+    def _context(self, student: Optional[dict], user: Optional[dict] = None) -> StudentContext:
+        ctx = StudentContext(student=student, user=user)
+        if student:
+            ctx.campus_name = self._names['campus'].get(str(student.get('campus_id')))
+            ctx.course_name = self._names['course'].get(str(student.get('course_id')))
+            ctx.batch_name = self._names['batch'].get(str(student.get('batch_id')))
+        return ctx
+
+    def contexts_for_students(self, students: Iterable[Optional[dict]]) -> List[StudentContext]:
+        """StudentContexts for student documents the caller already loaded (None stays empty)."""
+        students = list(students)
+        self._resolve_org_names(s for s in students if s)
+        return [self._context(s) for s in students]
+
+    def enrich(self, rows: List[dict], key: str = 'student_id') -> List[Tuple[dict, StudentContext]]:
+        """Pair every row with the StudentContext for ``row[key]``."""
+        contexts = self.resolve(row.get(key) for row in rows)
+        empty = StudentContext()
+        return [(row, contexts.get(str(row.get(key)), empty)) for row in rows]
+
+    def iter_enriched(
+        self,
+        rows: Iterable[dict],
+        key: str = 'student_id',
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[Tuple[dict, StudentContext]]:
+        """Lazily enrich a cursor (or any iterable) one page at a time."""
+        page: List[dict] = []
+        for row in rows:
+            page.append(row)
+            if len(page) >= page_size:
+                yield from self.enrich(page, key)
+                page = []
+        if page:
+            yield from self.enrich(page, key)
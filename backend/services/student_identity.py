@@ -0,0 +1,156 @@
+"""
+Canonical student identity on attempt / result documents.
+
+Attempts and results were written with the student in ``student_id`` or
+``user_id``, as an ObjectId or a string, and online attempts store
+``students._id`` rather than the user id. Every such document now also
+carries ``student_oid``: the student's ``users._id`` as an ObjectId. Read
+paths match on that single key, backed by a compound index on
+(student_oid, test_type, status, submitted_at).
+
+    attempt_doc['student_oid'] = student_oid(current_user_id)     # write path
+    collection.find({'student_oid': student_oid(user_id), ...})   # read path
+
+Existing documents are migrated by scripts/migrate_student_oid.py.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from mongo import mongo_db
+
+logger = logging.getLogger(__name__)
+
+STUDENT_OID_FIELD = 'student_oid'
+IDENTITY_COLLECTIONS = ('student_test_attempts', 'test_results')
+STUDENT_OID_INDEX = [
+    (STUDENT_OID_FIELD, ASCENDING),
+    ('test_type', ASCENDING),
+    ('status', ASCENDING),
+    ('submitted_at', DESCENDING),
+]
+MIGRATION_BATCH_SIZE = 1000
+
+
+def student_oid(user_id: Any) -> Optional[ObjectId]:
+    """The canonical key for a user id given as ObjectId or string."""
+    if isinstance(user_id, ObjectId):
+        return user_id
+    try:
+        return ObjectId(str(user_id))
+    except Exception:
+        return None
+
+
+def resolve_student_oids(docs: Iterable[dict]) -> Dict[Any, Optional[ObjectId]]:
+    """
+    Map each document's ``_id`` to its canonical student_oid.
+
+    ``user_id`` wins when present. Otherwise ``student_id`` may be a
+    students._id (mapped through students.user_id), a user id, or a roll
+    number / email on very old records.
+    """
+    docs = list(docs)
+    candidates: Dict[Any, Any] = {}
+    for doc in docs:
+        if doc.get(STUDENT_OID_FIELD):
+            continue
+        candidates[doc['_id']] = doc.get('user_id') or doc.get('student_id')
+
+    oids = {value for value in (student_oid(v) for v in candidates.values() if v) if value is not None}
+    by_student_doc: Dict[ObjectId, ObjectId] = {}
+    if oids:
+        for student in mongo_db.students.find({'_id': {'$in': list(oids)}, 'user_id': {'$ne': None}}, {'user_id': 1}):
+            by_student_doc[student['_id']] = student_oid(student['user_id'])
+
+    labels = [v for v in candidates.values() if isinstance(v, str) and student_oid(v) is None]
+    by_label: Dict[str, ObjectId] = {}
+    if labels:
+        for student in mongo_db.students.find(
+            {'$or': [{'roll_number': {'$in': labels}}, {'email': {'$in': labels}}]},
+            {'user_id': 1, 'roll_number': 1, 'email': 1},
+        ):
+            for label in (student.get('roll_number'), student.get('email')):
+                if label:
+                    by_label[label] = student_oid(student.get('user_id'))
+
+    resolved: Dict[Any, Optional[ObjectId]] = {}
+    for doc in docs:
+        if doc.get(STUDENT_OID_FIELD):
+            resolved[doc['_id']] = doc[STUDENT_OID_FIELD]
+            continue
+        if doc.get('user_id'):
+            resolved[doc['_id']] = student_oid(doc['user_id'])
+            continue
+        raw = doc.get('student_id')
+        oid = student_oid(raw) if raw else None
+        if oid is not None:
+            resolved[doc['_id']] = by_student_doc.get(oid, oid)
+        else:
+            resolved[doc['_id']] = by_label.get(raw) if isinstance(raw, str) else None
+    return resolved
+
+
+def stamp_student_oid(doc: dict, user_id: Any = None) -> dict:
+    """Set ``student_oid`` on a document about to be written; returns the document."""
+    oid = student_oid(user_id) if user_id is not None else None
+    if oid is None:
+        doc.setdefault('_id', ObjectId())
+        oid = resolve_student_oids([doc]).get(doc['_id'])
+    if oid is not None:
+        doc[STUDENT_OID_FIELD] = oid
+    return doc
+
+
+def ensure_indexes():
+    for name in IDENTITY_COLLECTIONS:
+        mongo_db.db[name].create_index(STUDENT_OID_INDEX)
+
+
+def migrate_collection(
+    name: str,
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    on_batch: Optional[Callable[[str, int, int], None]] = None,
+) -> Dict[str, int]:
+    """Backfill ``student_oid`` on every document of a collection that lacks it."""
+    collection = mongo_db.db[name]
+    stats = {'updated': 0, 'unresolved': 0}
+    cursor = collection.find(
+        {STUDENT_OID_FIELD: {'$exists': False}},
+        {'student_id': 1, 'user_id': 1},
+        batch_size=batch_size,
+    )
+    batch: List[dict] = []
+
+    def flush():
+        resolved = resolve_student_oids(batch)
+        ops = [
+            UpdateOne({'_id': _id, STUDENT_OID_FIELD: {'$exists': False}}, {'$set': {STUDENT_OID_FIELD: oid}})
+            for _id, oid in resolved.items() if oid is not None
+        ]
+        if ops:
+            stats['updated'] += collection.bulk_write(ops, ordered=False).modified_count
+        stats['unresolved'] += sum(1 for oid in resolved.values() if oid is None)
+        if on_batch:
+            on_batch(name, stats['updated'], stats['unresolved'])
+
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    if stats['unresolved']:
+        logger.warning('%s: %d documents have no resolvable student', name, stats['unresolved'])
+    return stats
+
+
+def migrate(batch_size: int = MIGRATION_BATCH_SIZE, on_batch=None) -> Dict[str, Dict[str, int]]:
+    """Create the index and backfill ``student_oid`` on attempts and results."""
+    ensure_indexes()
+    return {name: migrate_collection(name, batch_size, on_batch) for name in IDENTITY_COLLECTIONS}
@@ -0,0 +1,292 @@
+"""
+Bulk student import.
+
+Registers the rows of an uploaded student sheet in chunks instead of one
+row at a time:
+
+* the batch's courses are loaded once into a name map (exact, then
+  case-insensitive) for ``Group`` columns;
+* duplicates are checked per chunk with ``$in`` queries on the indexed
+  ``students.roll_number``, ``users.username`` and ``users.mobile_number``
+  fields, plus against earlier rows of the same file;
+* passwords of the rows that survive validation are hashed on the bcrypt
+  process pool (``password_verifier.hash_many``);
+* users, students and notification preferences are written with
+  ``insert_many(ordered=False)``; a user whose student profile cannot be
+  written is removed again.
+
+Initial passwords are hashed at ``STUDENT_IMPORT_BCRYPT_ROUNDS`` (cheaper
+than the login target); ``auth`` rehashes them at the target cost on the
+student's first successful login.
+
+    result = import_students(rows, batch, course_ids, is_v2_format, progress=emit)
+    result.detailed_results            # one entry per row, same shape as before
+    result.students_for_notifications  # registered students with credentials
+
+``progress(processed, total, last_student)`` is called after every chunk.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import pytz
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from models_notification_preferences import NotificationPreferences
+from mongo import mongo_db
+from services.password_verifier import password_verifier
+
+logger = logging.getLogger(__name__)
+
+STUDENT_IMPORT_CHUNK_SIZE = int(os.getenv('STUDENT_IMPORT_CHUNK_SIZE', '500'))
+STUDENT_IMPORT_BCRYPT_ROUNDS = int(os.getenv('STUDENT_IMPORT_BCRYPT_ROUNDS', '10'))
+
+ProgressCallback = Callable[[int, int, Optional[dict]], None]
+
+
+@dataclass
+class ImportResult:
+    detailed_results: List[dict] = field(default_factory=list)
+    students_for_notifications: List[dict] = field(default_factory=list)
+
+    @property
+    def registered(self) -> int:
+        return len(self.students_for_notifications)
+
+
+def initial_password(student_name: str, roll_number: str) -> str:
+    """First four letters of the first name plus the last four roll-number characters."""
+    return f"{student_name.split()[0][:4].lower()}{roll_number[-4:]}"
+
+
+def _cell(row: dict, column: str) -> str:
+    value = row.get(column)
+    return str(value).strip() if value else ''
+
+
+def _empty_result() -> dict:
+    return {
+        'student_name': '',
+        'roll_number': '',
+        'email': '',
+        'mobile_number': '',
+        'database_registered': False,
+        'email_sent': False,
+        'sms_sent': False,
+        'errors': [],
+        'success': False
+    }
+
+
+class CourseResolver:
+    """Maps a ``Group`` cell to one of the batch's selected courses, from one query."""
+
+    def __init__(self, course_ids: Iterable[str]):
+        courses = list(mongo_db.courses.find({'_id': {'$in': [ObjectId(cid) for cid in course_ids]}}, {'name': 1}))
+        self.names = [course['name'] for course in courses]
+        self.exact = {course['name']: course['_id'] for course in courses}
+        self.folded: Dict[str, ObjectId] = {}
+        for course in courses:
+            self.folded.setdefault(course['name'].lower(), course['_id'])
+
+    def resolve(self, group_name: str) -> Optional[ObjectId]:
+        return self.exact.get(group_name) or self.folded.get(group_name.lower())
+
+
+def existing_values(collection, field_name: str, values: Iterable[str]) -> Set[str]:
+    """Which of ``values`` already exist in ``collection.field_name`` (one indexed $in query)."""
+    values = [value for value in set(values) if value]
+    if not values:
+        return set()
+    return {doc[field_name] for doc in collection.find({field_name: {'$in': values}}, {field_name: 1, '_id': 0})}
+
+
+def _failed_indexes(error: BulkWriteError) -> Dict[int, str]:
+    return {item['index']: item.get('errmsg', 'write failed') for item in error.details.get('writeErrors', [])}
+
+
+def _insert_many(collection, docs: List[dict]) -> Dict[int, str]:
+    """insert_many(ordered=False); returns ``{position: error}`` of the documents that failed."""
+    if not docs:
+        return {}
+    try:
+        collection.insert_many(docs, ordered=False)
+        return {}
+    except BulkWriteError as error:
+        return _failed_indexes(error)
+
+
+class StudentImporter:
+    def __init__(self, batch: dict, course_ids: List[str], is_v2_format: bool,
+                 chunk_size: int = STUDENT_IMPORT_CHUNK_SIZE,
+                 progress: Optional[ProgressCallback] = None):
+        self.batch_id = batch['_id']
+        self.campus_id = batch['campus_ids'][0]
+        self.course_ids = course_ids
+        self.is_v2_format = is_v2_format
+        self.chunk_size = max(1, chunk_size)
+        self.progress = progress
+        self.courses = CourseResolver(course_ids) if is_v2_format else None
+        # Roll numbers / mobiles claimed by earlier rows of this file
+        self.seen_rolls: Set[str] = set()
+        self.seen_mobiles: Set[str] = set()
+
+    def run(self, rows: List[dict]) -> ImportResult:
+        result = ImportResult(detailed_results=[_empty_result() for _ in rows])
+        total = len(rows)
+        for start in range(0, total, self.chunk_size):
+            chunk = list(range(start, min(start + self.chunk_size, total)))
+            last = self._import_chunk(rows, chunk, result)
+            if self.progress:
+                self.progress(chunk[-1] + 1, total, last)
+        return result
+
+    def _parse(self, row: dict, student_result: dict) -> Optional[dict]:
+        student = {
+            'student_name': _cell(row, 'Student Name'),
+            'roll_number': _cell(row, 'Roll Number'),
+            'email': _cell(row, 'Email').lower(),
+            'mobile_number': _cell(row, 'Mobile Number'),
+        }
+        if self.is_v2_format:
+            group_name = _cell(row, 'Group')
+            course_id = self.courses.resolve(group_name)
+            if course_id is None:
+                student_result['errors'].append(
+                    f"Course/Group '{group_name}' not found in this batch. Available courses: {', '.join(self.courses.names)}"
+                )
+                return None
+        else:
+            course_id = ObjectId(self.course_ids[0])  # v1 files use the first selected course
+        student_result.update(student)
+        if not student['student_name'] or not student['roll_number']:
+            student_result['errors'].append('Missing required fields.')
+            return None
+        student['course_id'] = course_id
+        return student
+
+    def _import_chunk(self, rows: List[dict], chunk: List[int], result: ImportResult) -> Optional[dict]:
+        results = result.detailed_results
+        candidates = []
+        for index in chunk:
+            student = self._parse(rows[index], results[index])
+            if student is not None:
+                candidates.append((index, student))
+
+        rolls = [student['roll_number'] for _, student in candidates]
+        taken_rolls = existing_values(mongo_db.students, 'roll_number', rolls) | existing_values(mongo_db.users, 'username', rolls)
+        taken_mobiles = existing_values(
+            mongo_db.users, 'mobile_number', [student['mobile_number'] for _, student in candidates]
+        )
+
+        accepted = []
+        for index, student in candidates:
+            errors = []
+            roll, mobile = student['roll_number'], student['mobile_number']
+            if roll in taken_rolls or roll in self.seen_rolls:
+                errors.append('Roll number already exists.')
+            if mobile and (mobile in taken_mobiles or mobile in self.seen_mobiles):
+                errors.append('Mobile number already exists.')
+            if errors:
+                results[index]['errors'] = errors
+                continue
+            self.seen_rolls.add(roll)
+            if mobile:
+                self.seen_mobiles.add(mobile)
+            accepted.append((index, student))
+        if not accepted:
+            return None
+
+        passwords = [initial_password(student['student_name'], student['roll_number']) for _, student in accepted]
+        try:
+            hashes = password_verifier.hash_many(passwords, rounds=STUDENT_IMPORT_BCRYPT_ROUNDS)
+        except Exception as e:
+            logger.error(f"Password hashing failed for {len(accepted)} students: {e}")
+            for index, _ in accepted:
+                results[index]['errors'].append(f'Database error: {e}')
+            return None
+
+        now = datetime.now(pytz.utc)
+        user_docs, student_docs = [], []
+        for (index, student), password_hash in zip(accepted, hashes):
+            user_id = ObjectId()
+            email = student['email'] or None
+            user_docs.append({
+                '_id': user_id,
+                'username': student['roll_number'],
+                'email': email,
+                'password_hash': password_hash,
+                'role': 'student',
+                'name': student['student_name'],
+                'mobile_number': student['mobile_number'],
+                'campus_id': self.campus_id,
+                'course_id': student['course_id'],
+                'batch_id': self.batch_id,
+                'is_active': True,
+                'created_at': now,
+                'mfa_enabled': False
+            })
+            student_docs.append({
+                'user_id': user_id,
+                'name': student['student_name'],
+                'roll_number': student['roll_number'],
+                'email': email,
+                'mobile_number': student['mobile_number'],
+                'campus_id': self.campus_id,
+                'course_id': student['course_id'],
+                'batch_id': self.batch_id,
+                'created_at': now
+            })
+
+        failed_users = _insert_many(mongo_db.users, user_docs)
+        written = [position for position in range(len(accepted)) if position not in failed_users]
+        failed_students = _insert_many(mongo_db.students, [student_docs[position] for position in written])
+        failed_students = {written[position]: error for position, error in failed_students.items()}
+        if failed_students:
+            # Roll back the accounts whose profile could not be written
+            mongo_db.users.delete_many({'_id': {'$in': [user_docs[position]['_id'] for position in failed_students]}})
+
+        registered = []
+        for position, ((index, student), password) in enumerate(zip(accepted, passwords)):
+            student_result = results[index]
+            if position in failed_users:
+                student_result['errors'].append(f'Failed to create user account: {failed_users[position]}')
+                continue
+            if position in failed_students:
+                student_result['errors'].append(f'Failed to create student profile: {failed_students[position]}')
+                continue
+            student_result['database_registered'] = True
+            student_result['username'] = student['roll_number']
+            student_result['password'] = password
+            registered.append(user_docs[position]['_id'])
+            result.students_for_notifications.append({
+                'name': student['student_name'],
+                'username': student['roll_number'],
+                'password': password,
+                'email': student['email'] or None,
+                'mobile_number': student['mobile_number'] or None,
+                'roll_number': student['roll_number'],
+                'user_id': str(user_docs[position]['_id'])
+            })
+
+        try:
+            _insert_many(
+                mongo_db.db.notification_preferences,
+                [NotificationPreferences.default_preferences(user_id) for user_id in registered],
+            )
+        except Exception as e:
+            # As for single registrations, missing preferences never fail the import
+            logger.warning(f"⚠️ Failed to create default notification preferences for {len(registered)} students: {e}")
+
+        return result.students_for_notifications[-1] if registered else None
+
+
+def import_students(rows: List[dict], batch: dict, course_ids: List[str], is_v2_format: bool,
+                    progress: Optional[ProgressCallback] = None) -> ImportResult:
+    """Register the rows of a student sheet in ``batch`` (see module docstring)."""
+    return StudentImporter(batch, course_ids, is_v2_format, progress=progress).run(rows)
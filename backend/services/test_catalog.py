@@ -0,0 +1,211 @@
+"""
+Practice-test catalog resolved per audience.
+
+Students of the same batch-course instance / campus / course / batch see the
+same practice tests, so the visible list is computed once per audience key
+and kept in the shared cache under the ``tests`` tag (dropped by every
+test or question write on the test-management endpoints). Tests that list a
+student explicitly in ``assigned_student_ids`` are looked up per student
+and merged on top.
+
+    tests = visible_practice_tests(student, current_user_id, module='GRAMMAR')
+
+Only the fields the listing needs are loaded; question payloads stay in
+Mongo. Each $or branch of the catalog query is served by one of the
+(test_type, <audience array>, module_id) indexes created in init_database.py.
+"""
+from __future__ import annotations
+
+import os
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from mongo import mongo_db
+from services.student_identity import student_oid
+from utils.shared_cache import shared_cache
+
+TEST_CATALOG_TTL = float(os.getenv('TEST_CATALOG_TTL', '120'))
+CACHE_NAMESPACE = 'test_catalog'
+CACHE_TAGS = ('tests',)
+
+AUDIENCE_FIELDS = (
+    'batch_course_instance_ids',
+    'campus_ids',
+    'course_ids',
+    'batch_ids',
+    'assigned_student_ids',
+)
+CATALOG_PROJECTION = {
+    field: 1 for field in (
+        'name', 'type', 'test_type', 'duration', 'total_marks', 'instructions',
+        'start_date', 'end_date', 'module_id', 'level', 'level_id',
+        'test_category', 'subcategory', 'status', 'is_active',
+    )
+}
+ACTIVE_CLAUSE = {
+    '$or': [
+        {'status': 'active'},
+        {'is_active': True},
+        {'status': {'$exists': False}, 'is_active': {'$exists': False}},
+    ]
+}
+# Tests with no audience restriction at all are visible to every student
+GLOBAL_AUDIENCE = {'$and': [{field: {'$exists': False}} for field in AUDIENCE_FIELDS]}
+
+
+def audience_key(student: dict) -> Tuple[str, str, str, str]:
+    """Cache key of the tests a student sees through their org placement."""
+    # repr keeps ObjectId and string ids apart: they match different tests
+    return tuple(
+        repr(student.get(field))
+        for field in ('batch_course_instance_id', 'campus_id', 'course_id', 'batch_id')
+    )
+
+
+def _audience_query(student: dict) -> dict:
+    audience_or: List[dict] = [GLOBAL_AUDIENCE]
+    for student_field, test_field in (
+        ('batch_course_instance_id', 'batch_course_instance_ids'),
+        ('campus_id', 'campus_ids'),
+        ('course_id', 'course_ids'),
+        ('batch_id', 'batch_ids'),
+    ):
+        value = student.get(student_field)
+        if value:
+            audience_or.append({test_field: value})
+    return {'$and': [{'test_type': 'practice'}, ACTIVE_CLAUSE, {'$or': audience_or}]}
+
+
+def audience_catalog(student: dict) -> List[dict]:
+    """Active practice tests visible to the student's audience (cached)."""
+    return shared_cache.get_or_set(
+        CACHE_NAMESPACE,
+        'audience:' + '|'.join(audience_key(student)),
+        lambda: list(mongo_db.tests.find(_audience_query(student), CATALOG_PROJECTION)),
+        ttl=TEST_CATALOG_TTL,
+        tags=CACHE_TAGS,
+    )
+
+
+def assigned_tests(student: dict, user_id: Any) -> List[dict]:
+    """Active practice tests that list this student explicitly (students._id or users._id)."""
+    ids = [student['_id']] if student.get('_id') else []
+    try:
+        ids.append(ObjectId(user_id))
+    except Exception:
+        pass
+    if not ids:
+        return []
+    query = {
+        '$and': [
+            {'test_type': 'practice'},
+            {'assigned_student_ids': {'$in': ids}},
+            ACTIVE_CLAUSE,
+        ]
+    }
+    return list(mongo_db.tests.find(query, CATALOG_PROJECTION))
+
+
+def _matches(test: dict, module: Optional[str], category: Optional[str], subcategory: Optional[str]) -> bool:
+    if module and test.get('module_id') != module:
+        return False
+    if category and test.get('test_category') != category:
+        return False
+    if subcategory and test.get('subcategory') != subcategory:
+        return False
+    return True
+
+
+def visible_practice_tests(
+    student: dict,
+    user_id: Any,
+    module: Optional[str] = None,
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+) -> List[dict]:
+    """Audience catalog plus explicit assignments, filtered and de-duplicated."""
+    seen = set()
+    tests = []
+    for test in chain(audience_catalog(student), assigned_tests(student, user_id)):
+        if test['_id'] in seen or not _matches(test, module, category, subcategory):
+            continue
+        seen.add(test['_id'])
+        tests.append(test)
+    return tests
+
+
+def listening_tests(level: Optional[str]) -> List[dict]:
+    """
+    Active LISTENING practice tests for ``level`` (cached).
+
+    Listening tests are not restricted by audience. ``beginner`` (the
+    default) returns every level; an unknown level falls back to all tests.
+    """
+    def load():
+        query = {
+            'test_type': 'practice',
+            'module_id': 'LISTENING',
+            **ACTIVE_CLAUSE,
+        }
+        if level and level != 'beginner':
+            tests = list(mongo_db.tests.find({**query, 'level': level}, CATALOG_PROJECTION))
+            if tests:
+                return tests
+        return list(mongo_db.tests.find(query, CATALOG_PROJECTION))
+
+    return shared_cache.get_or_set(CACHE_NAMESPACE, f'listening:{level}', load, ttl=TEST_CATALOG_TTL, tags=CACHE_TAGS)
+
+
+def practice_test_count(module: str, subcategory: str) -> int:
+    """Number of practice tests in a module subcategory (cached)."""
+    return shared_cache.get_or_set(
+        CACHE_NAMESPACE,
+        f'count:{module}:{subcategory}',
+        lambda: mongo_db.tests.count_documents({
+            'module_id': module,
+            'subcategory': subcategory,
+            'test_type': 'practice',
+        }),
+        ttl=TEST_CATALOG_TTL,
+        tags=CACHE_TAGS,
+    )
+
+
+def student_attempt_summaries(user_id: Any, test_ids: List[ObjectId], instance_id: Any = None) -> Dict[ObjectId, dict]:
+    """
+    Per-test attempt summary for one student in two queries.
+
+    Returns ``{test_id: {'attempt_id', 'completed_count', 'highest_score'}}``;
+    ``attempt_id`` is the first attempt in the student's batch-course instance
+    (any instance when ``instance_id`` is None).
+    """
+    oid = student_oid(user_id)
+    summaries: Dict[ObjectId, dict] = {
+        test_id: {'attempt_id': None, 'completed_count': 0, 'highest_score': 0}
+        for test_id in test_ids
+    }
+    if oid is None or not test_ids:
+        return summaries
+    query = {'student_oid': oid, 'test_id': {'$in': test_ids}}
+    projection = {'test_id': 1, 'score_percentage': 1, 'average_score': 1, 'batch_course_instance_id': 1}
+    for collection, is_attempt in ((mongo_db.test_results, False), (mongo_db.student_test_attempts, True)):
+        for doc in collection.find(query, projection):
+            summary = summaries.get(doc.get('test_id'))
+            if summary is None:
+                continue
+            summary['completed_count'] += 1
+            score = doc.get('score_percentage', 0) or 0
+            if score == 0:
+                average = doc.get('average_score', 0) or 0
+                if average > 0:
+                    score = average * 100  # 0-1 scale
+            summary['highest_score'] = max(summary['highest_score'], score)
+            if (
+                is_attempt
+                and summary['attempt_id'] is None
+                and (not instance_id or doc.get('batch_course_instance_id') == instance_id)
+            ):
+                summary['attempt_id'] = doc['_id']
+    return summaries
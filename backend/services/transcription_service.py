@@ -0,0 +1,420 @@
+"""
+Speech transcription pipeline for audio answers.
+
+* Recognizer backends are pluggable (``TRANSCRIPTION_BACKEND``):
+  ``google`` (speech_recognition + Google Web Speech, the default) or
+  ``stub`` (offline; reads ``<audio>.txt`` next to the file or
+  ``TRANSCRIPTION_STUB_TEXT``) for tests and local development.
+* ``transcribe_file`` converts a recording to 16 kHz mono WAV in the temp
+  directory and transcribes it, retrying transient recognizer failures.
+* ``transcription_queue`` runs an attempt's audio questions in parallel on a
+  worker pool. When the last question finishes, the transcripts are scored
+  in one batch, the attempt document is updated and the student is told via
+  a ``transcription_complete`` Socket.IO event.
+* A pending attempt holds a lease (``transcription_lease_until``) that the
+  worker renews per question. Each web process runs a reaper thread
+  (``ensure_reaper``) that re-submits attempts whose lease expired, e.g.
+  because the worker that owned them restarted.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_BACKEND = os.getenv('TRANSCRIPTION_BACKEND', 'google').lower()
+TRANSCRIPTION_WORKERS = int(os.getenv('TRANSCRIPTION_WORKERS', '4'))
+TRANSCRIPTION_MAX_RETRIES = int(os.getenv('TRANSCRIPTION_MAX_RETRIES', '3'))
+# Seconds before the first retry; doubles on each further attempt
+TRANSCRIPTION_RETRY_BACKOFF = float(os.getenv('TRANSCRIPTION_RETRY_BACKOFF', '1.5'))
+# Submit endpoints return before transcription by default (clients can opt out with async_transcription=false)
+TRANSCRIPTION_ASYNC = os.getenv('TRANSCRIPTION_ASYNC', 'true').lower() == 'true'
+# Similarity (0-100) at which an online listening answer counts as correct
+LISTENING_PASS_SIMILARITY = 70
+# Minutes a pending attempt may go without progress before it is re-submitted
+TRANSCRIPTION_LEASE_MINUTES = int(os.getenv('TRANSCRIPTION_LEASE_MINUTES', '10'))
+# Seconds between two scans for expired leases (0 disables the reaper)
+TRANSCRIPTION_REAP_INTERVAL = int(os.getenv('TRANSCRIPTION_REAP_INTERVAL', '60'))
+
+STATUS_PENDING = 'pending'
+STATUS_COMPLETED = 'completed'
+# Superseded by a resubmission after the lease expired; the reaper skips it
+STATUS_ABANDONED = 'abandoned'
+
+
+def lease_until(now: Optional[datetime] = None) -> datetime:
+    """End of a transcription lease taken at ``now``."""
+    return (now or datetime.now(timezone.utc)) + timedelta(minutes=TRANSCRIPTION_LEASE_MINUTES)
+
+
+def expired_lease_query(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Match pending attempts nobody is transcribing any more."""
+    now = now or datetime.now(timezone.utc)
+    return {
+        'transcription_status': STATUS_PENDING,
+        '$or': [
+            {'transcription_lease_until': {'$lt': now}},
+            # Attempts saved before leases existed
+            {'transcription_lease_until': {'$exists': False},
+             'submitted_at': {'$lt': now - timedelta(minutes=TRANSCRIPTION_LEASE_MINUTES)}},
+        ],
+    }
+
+
+class TranscriptionError(Exception):
+    """Recognition failed and retrying will not help."""
+
+
+class RetryableTranscriptionError(TranscriptionError):
+    """Recognition failed for a transient reason (network, quota)."""
+
+
+class RecognizerBackend:
+    name = 'base'
+
+    def transcribe(self, wav_path: str, source_path: Optional[str] = None) -> str:
+        raise NotImplementedError
+
+
+class GoogleRecognizer(RecognizerBackend):
+    """Google Web Speech API through speech_recognition."""
+
+    name = 'google'
+
+    def transcribe(self, wav_path: str, source_path: Optional[str] = None) -> str:
+        try:
+            import speech_recognition as sr
+        except ImportError:
+            raise TranscriptionError('speech_recognition not installed; pip install SpeechRecognition')
+
+        recognizer = sr.Recognizer()
+        with sr.AudioFile(wav_path) as source:
+            # Do not use a full 0.5s noise sample on very short clips (browser recordings are often 2–4s)
+            duration_sec = getattr(source, 'DURATION', None) or 2.0
+            recognizer.adjust_for_ambient_noise(source, duration=min(0.5, max(0.1, duration_sec * 0.25)))
+            audio = recognizer.record(source)
+        try:
+            return recognizer.recognize_google(audio) or ''
+        except sr.UnknownValueError:
+            logger.warning('transcribe: Google Speech could not understand audio (empty or unclear)')
+            return ''
+        except sr.RequestError as e:
+            raise RetryableTranscriptionError(f'Google Speech API request failed: {e}')
+
+
+class StubRecognizer(RecognizerBackend):
+    """Offline recognizer: returns the text in ``<source>.txt`` or ``TRANSCRIPTION_STUB_TEXT``."""
+
+    name = 'stub'
+
+    def transcribe(self, wav_path: str, source_path: Optional[str] = None) -> str:
+        for path in filter(None, (source_path, wav_path)):
+            sidecar = os.path.splitext(path)[0] + '.txt'
+            if os.path.exists(sidecar):
+                with open(sidecar, encoding='utf-8') as handle:
+                    return handle.read().strip()
+        return os.getenv('TRANSCRIPTION_STUB_TEXT', '')
+
+
+_BACKENDS = {'google': GoogleRecognizer, 'stub': StubRecognizer}
+
+
+def get_recognizer(name: Optional[str] = None) -> RecognizerBackend:
+    backend = _BACKENDS.get((name or TRANSCRIPTION_BACKEND).lower())
+    if backend is None:
+        logger.warning('Unknown TRANSCRIPTION_BACKEND %r, using google', name or TRANSCRIPTION_BACKEND)
+        backend = GoogleRecognizer
+    return backend()
+
+
+def prepare_wav(audio_path: str) -> str:
+    """Convert a recording to 16 kHz mono WAV in the temp directory; returns the new path."""
+    from pydub import AudioSegment
+
+    segment = AudioSegment.from_file(audio_path).set_frame_rate(16000).set_channels(1)
+    wav_path = os.path.join(tempfile.gettempdir(), f'transcribe_{uuid.uuid4().hex}.wav')
+    segment.export(wav_path, format='wav')
+    return wav_path
+
+
+def _remove(path: Optional[str]):
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning('transcribe: temp file cleanup failed: %s', e)
+
+
+def transcribe_file(
+    audio_path: str,
+    recognizer: Optional[RecognizerBackend] = None,
+    max_retries: int = TRANSCRIPTION_MAX_RETRIES,
+) -> str:
+    """
+    Transcribe one recording. Transient recognizer errors are retried with
+    exponential backoff; other failures raise TranscriptionError.
+    """
+    recognizer = recognizer or get_recognizer()
+    wav_path = None
+    try:
+        try:
+            wav_path = prepare_wav(audio_path)
+        except Exception as e:
+            # Fall back to the original file (already WAV, or pydub/ffmpeg missing)
+            logger.warning('transcribe: conversion of %s failed, using original: %s', audio_path, e)
+
+        attempt = 0
+        while True:
+            try:
+                return recognizer.transcribe(wav_path or audio_path, source_path=audio_path)
+            except RetryableTranscriptionError as e:
+                attempt += 1
+                if attempt > max_retries:
+                    raise
+                delay = TRANSCRIPTION_RETRY_BACKOFF * (2 ** (attempt - 1))
+                logger.warning('transcribe: %s; retry %s/%s in %.1fs', e, attempt, max_retries, delay)
+                time.sleep(delay)
+            except TranscriptionError:
+                raise
+            except Exception as e:
+                raise TranscriptionError(str(e))
+    finally:
+        _remove(wav_path)
+
+
+@dataclass
+class TranscriptionTask:
+    """One audio answer of an attempt waiting to be transcribed."""
+    result_index: int          # position in the attempt's detailed_results
+    reference_text: str
+    audio_key: Optional[str] = None     # S3 key of the recording
+    local_path: Optional[str] = None    # recording already on this host, removed when done
+    transcript: str = ''
+    error: Optional[str] = None
+
+
+@dataclass
+class _AttemptJob:
+    attempt_id: Any
+    user_id: str
+    tasks: List[TranscriptionTask]
+    remaining: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def _download(audio_key: str) -> str:
+    from config.aws_config import S3_BUCKET_NAME, get_s3_client_safe
+
+    s3 = get_s3_client_safe()
+    if s3 is None:
+        raise TranscriptionError('S3 client not available')
+    extension = os.path.splitext(audio_key)[1] or '.webm'
+    path = os.path.join(tempfile.gettempdir(), f'student_audio_{uuid.uuid4().hex}{extension}')
+    s3.download_file(S3_BUCKET_NAME, audio_key, path)
+    return path
+
+
+def finalize_online_listening_attempt(attempt_id: Any, tasks: List[TranscriptionTask]) -> Optional[dict]:
+    """
+    Write transcripts and similarity scores into the attempt and recompute
+    its totals (same rules as the synchronous online listening submit).
+    """
+    from mongo import mongo_db
+    from services.progress_rollups import record_attempt
+    from utils.transcript_scoring import score_transcripts
+
+    attempt = mongo_db.student_test_attempts.find_one({'_id': attempt_id})
+    if not attempt:
+        logger.error('Transcription finished for missing attempt %s', attempt_id)
+        return None
+    if attempt.get('transcription_status') == STATUS_ABANDONED:
+        logger.info('Transcription finished for abandoned attempt %s; the student resubmitted', attempt_id)
+        return None
+
+    results = attempt.get('detailed_results') or []
+    scores = score_transcripts((task.reference_text, task.transcript) for task in tasks)
+    for task, transcript_score in zip(tasks, scores):
+        if task.result_index >= len(results):
+            continue
+        is_correct = transcript_score.score >= LISTENING_PASS_SIMILARITY
+        results[task.result_index].update({
+            'student_answer': task.transcript,
+            'student_text': task.transcript,
+            'similarity_score': transcript_score.score,
+            'word_error_rate': transcript_score.wer,
+            'is_correct': is_correct,
+            'score': 1 if is_correct else 0,
+            'transcription_status': STATUS_COMPLETED,
+            'transcription_error': task.error,
+        })
+
+    similarity_scores = [r.get('similarity_score', 0) for r in results if 'similarity_score' in r]
+    percentage = sum(similarity_scores) / len(similarity_scores) if similarity_scores else 0
+    correct_answers = sum(1 for r in results if r.get('similarity_score', 0) >= LISTENING_PASS_SIMILARITY)
+    update = {
+        'results': results,
+        'detailed_results': results,
+        'answers': {f'question_{i}': r.get('student_answer', '') for i, r in enumerate(results)},
+        'correct_answers': correct_answers,
+        'total_marks': len(results),
+        'score': correct_answers,
+        'percentage': percentage,
+        'status': 'completed',
+        'transcription_status': STATUS_COMPLETED,
+        'transcribed_at': datetime.now(timezone.utc),
+    }
+    mongo_db.student_test_attempts.update_one({'_id': attempt_id}, {'$set': update})
+    record_attempt({**attempt, **update})
+    return update
+
+
+class TranscriptionQueue:
+    """Worker pool that transcribes attempts' audio answers in parallel."""
+
+    def __init__(self, max_workers: int = TRANSCRIPTION_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='transcribe')
+        self._recognizer = get_recognizer()
+        self._stats = {'submitted': 0, 'transcribed': 0, 'failed': 0, 'attempts_completed': 0, 'requeued': 0}
+        self._lock = threading.Lock()
+        self._reaper_pid = None
+
+    def submit_attempt(self, attempt_id: Any, user_id: Any, tasks: List[TranscriptionTask]):
+        """Queue every task of an attempt; the attempt is finalized when the last one finishes."""
+        job = _AttemptJob(attempt_id=attempt_id, user_id=str(user_id), tasks=tasks, remaining=len(tasks))
+        with self._lock:
+            self._stats['submitted'] += len(tasks)
+        if not tasks:
+            self._executor.submit(self._finish, job)
+            return
+        for task in tasks:
+            self._executor.submit(self._run_task, job, task)
+
+    def _renew_lease(self, job: _AttemptJob):
+        try:
+            from mongo import mongo_db
+            mongo_db.student_test_attempts.update_one(
+                {'_id': job.attempt_id, 'transcription_status': STATUS_PENDING},
+                {'$set': {'transcription_lease_until': lease_until()}},
+            )
+        except Exception as e:
+            logger.warning('Could not renew transcription lease of attempt %s: %s', job.attempt_id, e)
+
+    def _run_task(self, job: _AttemptJob, task: TranscriptionTask):
+        path = task.local_path
+        downloaded = None
+        self._renew_lease(job)
+        try:
+            if not path or not os.path.exists(path):
+                path = downloaded = _download(task.audio_key)
+            if os.path.getsize(path) == 0:
+                raise TranscriptionError('audio file is empty')
+            task.transcript = transcribe_file(path, self._recognizer)
+            with self._lock:
+                self._stats['transcribed'] += 1
+        except Exception as e:
+            logger.error('Transcription failed for attempt %s question %s: %s', job.attempt_id, task.result_index, e)
+            task.transcript = ''
+            task.error = str(e)
+            with self._lock:
+                self._stats['failed'] += 1
+        finally:
+            _remove(downloaded)
+            _remove(task.local_path)
+
+        with job.lock:
+            job.remaining -= 1
+            last = job.remaining == 0
+        if last:
+            self._finish(job)
+
+    def _finish(self, job: _AttemptJob):
+        try:
+            update = finalize_online_listening_attempt(job.attempt_id, job.tasks)
+        except Exception as e:
+            logger.error('Finalizing transcription for attempt %s failed: %s', job.attempt_id, e, exc_info=True)
+            update = None
+        with self._lock:
+            self._stats['attempts_completed'] += 1
+        try:
+            from socketio_instance import socketio
+            socketio.emit('transcription_complete', {
+                'attempt_id': str(job.attempt_id),
+                'success': update is not None,
+                'percentage': update['percentage'] if update else None,
+                'correct_answers': update['correct_answers'] if update else None,
+                'total_marks': update['total_marks'] if update else None,
+            }, room=job.user_id)
+        except Exception as e:
+            logger.debug('Could not emit transcription_complete: %s', e)
+
+    def requeue_stale(self, limit: int = 100) -> int:
+        """
+        Re-submit attempts whose transcription lease expired (e.g. the worker
+        that owned them restarted). Each attempt is claimed by renewing its
+        lease, so concurrent reapers never submit it twice. Recordings are
+        fetched again from S3.
+        """
+        from pymongo import ReturnDocument
+        from mongo import mongo_db
+
+        count = 0
+        while count < limit:
+            now = datetime.now(timezone.utc)
+            attempt = mongo_db.student_test_attempts.find_one_and_update(
+                expired_lease_query(now),
+                {'$set': {'transcription_lease_until': lease_until(now)}},
+                projection={'detailed_results': 1, 'user_id': 1, 'student_id': 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if attempt is None:
+                break
+            tasks = [
+                TranscriptionTask(
+                    result_index=index,
+                    reference_text=result.get('correct_answer') or result.get('original_text') or '',
+                    audio_key=result.get('student_audio_key'),
+                )
+                for index, result in enumerate(attempt.get('detailed_results') or [])
+                if result.get('transcription_status') == STATUS_PENDING and result.get('student_audio_key')
+            ]
+            logger.info('Re-submitting transcription of attempt %s (%d answers)', attempt['_id'], len(tasks))
+            self.submit_attempt(attempt['_id'], attempt.get('user_id') or attempt.get('student_id'), tasks)
+            count += 1
+        if count:
+            with self._lock:
+                self._stats['requeued'] += count
+        return count
+
+    def _reap_forever(self):
+        while True:
+            try:
+                self.requeue_stale()
+            except Exception as e:
+                logger.error('Transcription reaper failed: %s', e)
+            time.sleep(TRANSCRIPTION_REAP_INTERVAL)
+
+    def ensure_reaper(self):
+        """Start this process's reaper thread, once per process (after the gunicorn fork)."""
+        if self._reaper_pid == os.getpid() or TRANSCRIPTION_REAP_INTERVAL <= 0:
+            return
+        with self._lock:
+            if self._reaper_pid == os.getpid():
+                return
+            self._reaper_pid = os.getpid()
+        threading.Thread(target=self._reap_forever, name='transcribe-reaper', daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'backend': self._recognizer.name, **self._stats}
+
+
+transcription_queue = TranscriptionQueue()
@@ -1,5 +1,6 @@
 from flask_socketio import SocketIO
 import os
+from utils.metrics_aggregation import register_provider
  
 # This instance will be initialized with the Flask app in main_with_socketio.py
 # Enhanced SocketIO CORS configuration to match Flask CORS settings
@@ -27,4 +28,29 @@ else:
         always_connect=True,
         ping_timeout=60,
         ping_interval=25
-    ) 
\ No newline at end of file
+    )
+
+
+class ConnectionCounter:
+    """Socket.IO connections of this worker, updated by the connect/disconnect handlers"""
+
+    def __init__(self):
+        self.connects = 0
+        self.disconnects = 0
+
+    def connected(self):
+        self.connects += 1
+
+    def disconnected(self):
+        self.disconnects += 1
+
+    def stats(self):
+        return {
+            'connected': self.connects - self.disconnects,
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+        }
+
+
+socketio_connections = ConnectionCounter()
+register_provider('socketio', socketio_connections.stats)
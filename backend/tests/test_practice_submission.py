@@ -0,0 +1,133 @@
+"""
+End-to-end check of POST /test-management/submit-practice-test for MCQ tests.
+
+Runs the real blueprint in a Flask app with a real JWT; only the Mongo
+collections the route touches are replaced by in-memory ones. Answers are
+submitted in the shuffled order the student was shown (answer_<display
+index>, option text), as the frontend does.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('flask')
+pytest.importorskip('flask_jwt_extended')
+pytest.importorskip('boto3')
+pytest.importorskip('pandas')
+
+from bson import ObjectId  # noqa: E402
+from flask import Flask  # noqa: E402
+from flask_jwt_extended import JWTManager, create_access_token  # noqa: E402
+
+import routes.test_management as test_management  # noqa: E402
+from services.shuffle_service import get_shuffle_plan  # noqa: E402
+
+
+class _Cursor(list):
+    def limit(self, count):
+        return _Cursor(self[:count])
+
+
+class _Collection:
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+
+    def _matches(self, doc, query):
+        return all(doc.get(key) == value for key, value in (query or {}).items())
+
+    def find_one(self, query=None, *args, **kwargs):
+        return next((doc for doc in self.docs if self._matches(doc, query)), None)
+
+    def find(self, query=None, *args, **kwargs):
+        return _Cursor(doc for doc in self.docs if self._matches(doc, query))
+
+    def insert_one(self, doc):
+        doc.setdefault('_id', ObjectId())
+        self.docs.append(doc)
+
+
+class _Database:
+    def __init__(self, **collections):
+        for name, collection in collections.items():
+            setattr(self, name, collection)
+
+
+def _mcq(question, options, answer):
+    return {
+        '_id': ObjectId(),
+        'question_type': 'mcq',
+        'question': question,
+        **{f'option{letter}': text for letter, text in zip('ABCD', options)},
+        'answer': answer,
+    }
+
+
+@pytest.fixture
+def practice_test(monkeypatch):
+    user_id = ObjectId()
+    test = {
+        '_id': ObjectId(),
+        'name': 'Grammar Practice',
+        'test_type': 'practice',
+        'module_id': 'GRAMMAR',
+        'questions': [
+            _mcq('She ___ to school.', ['go', 'goes', 'going', 'gone'], 'B'),
+            _mcq('They ___ happy.', ['is', 'am', 'are', 'be'], 'C'),
+            _mcq('I ___ a book yesterday.', ['read', 'reads', 'reading', 'will read'], 'A'),
+        ],
+    }
+    db = _Database(
+        tests=_Collection([test]),
+        students=_Collection([{'_id': ObjectId(), 'user_id': user_id, 'name': 'Student'}]),
+        student_test_attempts=_Collection(),
+        test_results=_Collection(),
+    )
+    monkeypatch.setattr(test_management, 'mongo_db', db)
+    monkeypatch.setattr(test_management, 'stamp_student_oid', lambda doc, user_id=None: doc)
+    monkeypatch.setattr(test_management, 'record_attempt', lambda attempt, test: None)
+
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY='test-secret-key-for-practice-submission', TESTING=True)
+    JWTManager(app)
+    app.register_blueprint(test_management.test_management_bp, url_prefix='/test-management')
+    with app.app_context():
+        token = create_access_token(identity=str(user_id))
+    return app, db, test, str(user_id), token
+
+
+def test_mcq_practice_submission_is_graded(practice_test):
+    app, db, test, user_id, token = practice_test
+    plan = get_shuffle_plan(test['_id'], user_id, test['questions'])
+
+    # Correct option text for every shown question except the last one
+    form = {'test_id': str(test['_id'])}
+    shown = list(plan.iter_questions(test['questions']))
+    for display_index, _, question in shown:
+        correct = question[f"option{question['answer']}"]
+        wrong = next(question[f'option{letter}'] for letter in 'ABCD' if question[f'option{letter}'] != correct)
+        form[f'answer_{display_index}'] = correct if display_index < len(shown) - 1 else wrong
+
+    response = app.test_client().post(
+        '/test-management/submit-practice-test',
+        data=form,
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()['data']
+    assert body['correct_answers'] == 2
+    assert body['total_questions'] == 3
+    assert [result['is_correct'] for result in body['results']] == [True, True, False]
+
+    for result, (_, original_index, question) in zip(body['results'], shown):
+        shown_options, answer_map = plan.mcq_options(question, original_index)
+        assert result['options'] == shown_options
+        assert result['correct_answer_letter'] == answer_map[question['answer']]
+        assert result['correct_answer_text'] == question[f"option{question['answer']}"]
+
+    attempt = db.student_test_attempts.docs[0]
+    assert attempt['correct_answers'] == 2 and attempt['status'] == 'completed'
+    assert len(db.test_results.docs) == 1
@@ -17,6 +17,8 @@ from pymongo.errors import ConnectionFailure
 import queue
 import weakref
 
+from utils.background_executor import DEFAULT_TASK_TYPE, PRIORITY_NORMAL, background_executor
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,15 +30,14 @@ class AsyncProcessor:
         self.max_workers = max_workers
         self.thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
         self.task_queue = queue.Queue()
-        self.background_queue = queue.Queue()  # Separate queue for background tasks
         self.running_tasks = {}
-        self.background_tasks = {}  # Track background tasks
+        # Background tasks (emails, SMS, batches) run on the background executor's own pool
+        self.background = background_executor
         self.task_counter = 0
         self._lock = threading.Lock()
         
         # Start background task processor
         self._start_background_processor()
-        self._start_background_task_processor()
     
     def _start_background_processor(self):
         """Start background thread to process queued tasks"""
@@ -61,29 +62,6 @@ class AsyncProcessor:
         processor_thread = threading.Thread(target=processor, daemon=True)
         processor_thread.start()
     
-    def _start_background_task_processor(self):
-        """Start background thread to process background tasks (emails, SMS, etc.)"""
-        def processor():
-            while True:
-                try:
-                    task_id, func, args, kwargs = self.background_queue.get(timeout=1)
-                    try:
-                        result = func(*args, **kwargs)
-                        logger.info(f"Background task {task_id} completed successfully")
-                    except Exception as e:
-                        logger.error(f"Background task {task_id} failed: {e}")
-                    finally:
-                        with self._lock:
-                            if task_id in self.background_tasks:
-                                del self.background_tasks[task_id]
-                except queue.Empty:
-                    continue
-                except Exception as e:
-                    logger.error(f"Error in background task processor: {e}")
-        
-        processor_thread = threading.Thread(target=processor, daemon=True)
-        processor_thread.start()
-    
     def submit_task(self, func: Callable, *args, **kwargs) -> str:
         """Submit a task for async execution"""
         with self._lock:
@@ -111,19 +89,13 @@ class AsyncProcessor:
         """Submit task for immediate execution in thread pool"""
         return self.thread_pool.submit(func, *args, **kwargs)
     
-    def submit_background_task(self, func: Callable, *args, **kwargs) -> str:
+    def submit_background_task(self, func: Callable, *args, task_type: str = DEFAULT_TASK_TYPE,
+                               priority: int = PRIORITY_NORMAL, **kwargs) -> str:
         """Submit a background task (emails, SMS, file processing) that doesn't need immediate response"""
+        task_id = self.background.submit(func, *args, task_type=task_type, priority=priority, **kwargs)
         with self._lock:
             self.task_counter += 1
-            task_id = f"bg_task_{self.task_counter}_{int(time.time())}"
-            self.background_tasks[task_id] = {
-                'func': func.__name__,
-                'submitted_at': time.time(),
-                'status': 'queued'
-            }
-        
-        self.background_queue.put((task_id, func, args, kwargs))
-        logger.info(f"Background task {task_id} queued: {func.__name__}")
+        logger.info(f"Background task {task_id} queued: {getattr(func, '__name__', task_type)} ({task_type}, priority {priority})")
         return task_id
 
 # Global async processor instance - optimized for 200-500 concurrent users
@@ -330,32 +302,17 @@ class ResponseCache:
 # Global response cache
 response_cache = ResponseCache(max_size=2000, default_ttl=300)
 
-def cached_response(ttl: int = 300, key_func: Optional[Callable] = None):
-    """Decorator to cache route responses"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Generate cache key
-            if key_func:
-                cache_key = key_func(*args, **kwargs)
-            else:
-                cache_key = f"{func.__name__}:{hash(str(args) + str(kwargs))}"
-            
-            # Try to get cached response
-            cached_result = response_cache.get(cache_key)
-            if cached_result is not None:
-                logger.info(f"🎯 Cache hit for {func.__name__}")
-                return cached_result
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            response_cache.set(cache_key, result, ttl)
-            logger.info(f"💾 Cached response for {func.__name__}")
-            
-            return result
-        
-        return wrapper
-    return decorator
+def cached_response(ttl: int = 300, key_func: Optional[Callable] = None, per_user: bool = True):
+    """
+    Decorator to cache route responses in the shared cache.
+
+    Keys include the JWT identity unless ``per_user`` is False; requests
+    without an identity are not cached. Apply it outside ``async_route`` so
+    the lookup happens in the request context.
+    """
+    from utils.shared_cache import cached_view
+
+    return cached_view('responses', ttl=ttl, per_user=per_user, key_func=key_func)
 
 def performance_monitor(threshold: float = 1.0):
     """Decorator to monitor performance and log slow operations"""
@@ -382,15 +339,17 @@ def performance_monitor(threshold: float = 1.0):
     return decorator
 
 def cached_async_result(ttl: int = 300):
-    """Decorator to cache async function results with TTL"""
+    """Decorator to cache function results with TTL in the shared cache"""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
+            from utils.shared_cache import shared_cache
+
             # Create cache key from function name and arguments
-            cache_key = f"{func.__name__}:{hash(str(args) + str(kwargs))}"
+            cache_key = f"{func.__module__}.{func.__qualname__}:{args!r}:{sorted(kwargs.items())!r}"
             
             # Check cache first
-            cached_result = response_cache.get(cache_key)
+            cached_result = shared_cache.get('async_results', cache_key)
             if cached_result is not None:
                 logger.debug(f"🎯 Cache hit for {func.__name__}")
                 return cached_result
@@ -398,36 +357,45 @@ def cached_async_result(ttl: int = 300):
             # Execute function and cache result
             try:
                 result = func(*args, **kwargs)
-                response_cache.set(cache_key, result, ttl)
-                logger.debug(f"💾 Cached result for {func.__name__}")
-                return result
             except Exception as e:
                 logger.error(f"❌ Error in cached function {func.__name__}: {e}")
                 raise
+            try:
+                shared_cache.set('async_results', cache_key, result, ttl)
+                logger.debug(f"💾 Cached result for {func.__name__}")
+            except Exception as e:
+                logger.warning(f"⚠️ Result of {func.__name__} not cacheable: {e}")
+            return result
         
         return wrapper
     return decorator
 
 # Background task utilities
-def submit_background_task(func: Callable, *args, **kwargs) -> str:
-    """Submit a background task for processing (emails, SMS, file processing)"""
-    return async_processor.submit_background_task(func, *args, **kwargs)
+def submit_background_task(func: Callable, *args, task_type: str = DEFAULT_TASK_TYPE,
+                           priority: int = PRIORITY_NORMAL, **kwargs) -> str:
+    """
+    Submit a background task for processing (emails, SMS, file processing)
+
+    ``task_type`` selects the concurrency limit and ``priority`` the order
+    (see ``utils.background_executor``); both are consumed here and not
+    passed to ``func``. Raises ``BackgroundQueueFull`` when the queue stays full.
+    """
+    return async_processor.submit_background_task(func, *args, task_type=task_type, priority=priority, **kwargs)
 
 def get_background_task_status(task_id: str) -> dict:
     """Get status of a background task"""
-    with async_processor._lock:
-        return async_processor.background_tasks.get(task_id, {'status': 'not_found'})
+    return background_executor.task_status(task_id)
 
 def get_all_background_tasks() -> dict:
-    """Get all background tasks status"""
-    with async_processor._lock:
-        return dict(async_processor.background_tasks)
+    """Get all queued and running background tasks"""
+    return background_executor.task_details()
 
 # Initialize async system
 def init_async_system():
     """Initialize the async processing system"""
     logger.info("🚀 Initializing async processing system...")
     logger.info(f"   Max workers: {async_processor.max_workers}")
+    logger.info(f"   Background workers: {background_executor.workers} (queue limit {background_executor.queue_limit})")
     logger.info(f"   DB pool size: {db_pool.max_connections}")
     logger.info(f"   Cache size: {response_cache.max_size}")
     logger.info("✅ Async processing system initialized")
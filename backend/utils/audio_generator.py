@@ -146,58 +146,25 @@ def get_audio_generation_status():
     }
 
 def calculate_similarity(original_text, student_audio_text):
-    """Calculate similarity score between original and student audio text"""
+    """
+    Calculate similarity score (0-100) between original and student audio text.
+    Delegates to utils.transcript_scoring (word-level WER + character edit distance).
+    """
     try:
-        from difflib import SequenceMatcher
-        
-        print(f"Calculating similarity between:")
-        print(f"  Original: '{original_text}'")
-        print(f"  Student: '{student_audio_text}'")
-        
-        # Handle empty texts
-        if not original_text or not student_audio_text:
-            print("One or both texts are empty, returning 0.0")
-            return 0.0
-        
-        # Convert to lowercase for better comparison
-        original_lower = original_text.lower().strip()
-        student_lower = student_audio_text.lower().strip()
-        
-        print(f"  Original (lower): '{original_lower}'")
-        print(f"  Student (lower): '{student_lower}'")
-        
-        # Calculate similarity using SequenceMatcher
-        similarity = SequenceMatcher(None, original_lower, student_lower).ratio()
-        print(f"  SequenceMatcher similarity: {similarity}")
-        
-        # Calculate word-level accuracy
-        original_words = set(original_lower.split())
-        student_words = set(student_lower.split())
-        
-        print(f"  Original words: {original_words}")
-        print(f"  Student words: {student_words}")
-        
-        if not original_words:
-            print("No original words found, returning 0.0")
-            return 0.0
-        
-        word_accuracy = len(original_words.intersection(student_words)) / len(original_words)
-        print(f"  Word accuracy: {word_accuracy}")
-        
-        # Combine similarity and word accuracy
-        final_score = (similarity * 0.7) + (word_accuracy * 0.3)
-        print(f"  Final score: {final_score}")
-        
-        return round(final_score * 100, 2)
+        from utils.transcript_scoring import similarity_percent
+        return similarity_percent(original_text, student_audio_text)
     except Exception as e:
-        print(f"Error calculating similarity: {str(e)}")
+        logger.error(f"Error calculating similarity: {str(e)}")
         return 0.0
 
 # Alias for backward compatibility
 calculate_similarity_score = calculate_similarity
 
 def transcribe_audio(audio_file_path):
-    """Transcribe audio file to text using speech recognition"""
+    """
+    Transcribe audio file to text with the configured recognizer backend
+    (services.transcription_service). Returns "" when nothing could be recognised.
+    """
     try:
         ffmpeg_bin = shutil.which('ffmpeg')
         if not ffmpeg_bin:
@@ -210,78 +177,15 @@ def transcribe_audio(audio_file_path):
         else:
             logger.debug('transcribe_audio: using ffmpeg at %s', ffmpeg_bin)
 
-        # Try to import speech_recognition, but make it optional
-        try:
-            import speech_recognition as sr
-        except ImportError:
-            logger.warning('speech_recognition not installed; pip install SpeechRecognition')
-            return ""
-
-        # Check if pydub is available for format conversion
-        if not PYDUB_AVAILABLE:
-            logger.warning('pydub not installed; pip install pydub')
-            return ""
+        from services.transcription_service import TranscriptionError, transcribe_file
 
-        recognizer = sr.Recognizer()
-
-        # Convert audio to WAV format if needed
-        temp_wav_path = None
         try:
-            logger.info('transcribe_audio: loading %s', audio_file_path)
-            audio_segment = AudioSegment.from_file(audio_file_path)
-            logger.info(
-                'transcribe_audio: loaded %sms, %sHz, %s ch',
-                len(audio_segment),
-                audio_segment.frame_rate,
-                audio_segment.channels,
-            )
-
-            # Convert to WAV format with proper parameters
-            temp_wav_path = f"temp_converted_{uuid.uuid4()}.wav"
-
-            # Set proper audio parameters for speech recognition
-            audio_segment = audio_segment.set_frame_rate(16000).set_channels(1)
-            audio_segment.export(temp_wav_path, format="wav")
-
-            logger.info('transcribe_audio: wav %s bytes', os.path.getsize(temp_wav_path))
-
-            duration_sec = len(audio_segment) / 1000.0
-            # Do not use a full 0.5s noise sample on very short clips (browser recordings are often 2–4s)
-            noise_cal_sec = min(0.5, max(0.1, duration_sec * 0.25))
-
-            # Use the converted WAV file for transcription
-            with sr.AudioFile(temp_wav_path) as source:
-                recognizer.adjust_for_ambient_noise(source, duration=noise_cal_sec)
-                audio = recognizer.record(source)
-                text = recognizer.recognize_google(audio)
-                logger.info('transcribe_audio: google ok, len=%s', len(text or ''))
-                return text
-
-        except sr.UnknownValueError:
-            logger.warning('transcribe_audio: Google Speech could not understand audio (empty or unclear)')
-            return ""
-        except sr.RequestError as e:
-            logger.error('transcribe_audio: Google Speech API request failed: %s', e)
+            text = transcribe_file(audio_file_path)
+            logger.info('transcribe_audio: ok, len=%s', len(text or ''))
+            return text
+        except TranscriptionError as e:
+            logger.warning('transcribe_audio: %s', e)
             return ""
-        except Exception as conversion_error:
-            logger.warning('transcribe_audio: convert path failed: %s', conversion_error, exc_info=True)
-            # Fallback: try direct transcription if conversion fails
-            try:
-                with sr.AudioFile(audio_file_path) as source:
-                    recognizer.adjust_for_ambient_noise(source, duration=0.2)
-                    audio = recognizer.record(source)
-                    text = recognizer.recognize_google(audio)
-                    return text
-            except Exception as fallback_error:
-                logger.warning('transcribe_audio: fallback failed: %s', fallback_error, exc_info=True)
-                return ""
-        finally:
-            # Clean up temporary file
-            if temp_wav_path and os.path.exists(temp_wav_path):
-                try:
-                    os.remove(temp_wav_path)
-                except Exception as cleanup_error:
-                    logger.warning('transcribe_audio: temp wav cleanup failed: %s', cleanup_error)
 
     except Exception as e:
         logger.exception('transcribe_audio: unexpected error: %s', e)
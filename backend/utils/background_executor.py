@@ -0,0 +1,239 @@
+"""
+Background task executor.
+
+Emails, SMS and notification sub-batches used to go through one queue
+drained by a single thread, so they ran one after another. They now run on
+a pool of ``BACKGROUND_WORKERS`` threads:
+
+* every task has a type (``sms_notification``, ``email_notification``,
+  ``batch_processing``...) and at most ``BACKGROUND_TYPE_LIMITS[type]``
+  tasks of a type run at once, so a large batch cannot take every worker
+  (types without a limit may use them all);
+* among the types with a free slot, the task with the lowest priority
+  value runs first (``PRIORITY_HIGH`` credentials before ``PRIORITY_LOW``
+  reminders), FIFO within a priority;
+* at most ``BACKGROUND_QUEUE_LIMIT`` tasks wait; ``submit`` then blocks for
+  up to ``BACKGROUND_SUBMIT_TIMEOUT`` seconds and raises
+  ``BackgroundQueueFull``.
+
+    task_id = background_executor.submit(send, phone, task_type='sms_notification',
+                                          priority=PRIORITY_HIGH)
+
+Workers start in the process that submits first (after the gunicorn fork).
+Queue wait and run time per type are published as the ``background_tasks``
+metrics provider.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional
+
+from utils.metrics_aggregation import register_provider
+from utils.request_metrics import TimingRecorder
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+DEFAULT_TASK_TYPE = 'default'
+
+
+def _parse_limits(value: str) -> Dict[str, int]:
+    limits = {}
+    for item in value.split(','):
+        if ':' in item:
+            task_type, limit = item.split(':', 1)
+            limits[task_type.strip()] = max(1, int(limit))
+    return limits
+
+
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '8'))
+BACKGROUND_QUEUE_LIMIT = int(os.getenv('BACKGROUND_QUEUE_LIMIT', '5000'))
+BACKGROUND_SUBMIT_TIMEOUT = float(os.getenv('BACKGROUND_SUBMIT_TIMEOUT', '5'))
+BACKGROUND_TYPE_LIMITS = _parse_limits(
+    os.getenv('BACKGROUND_TYPE_LIMITS', 'sms_notification:4,email_notification:4,batch_processing:2')
+)
+
+
+class BackgroundQueueFull(queue.Full):
+    """The background queue stayed full for the whole submit timeout."""
+
+
+class _Task:
+    __slots__ = ('task_id', 'func', 'args', 'kwargs', 'task_type', 'priority', 'description', 'submitted_at')
+
+    def __init__(self, task_id, func, args, kwargs, task_type, priority, description):
+        self.task_id = task_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.task_type = task_type
+        self.priority = priority
+        self.description = description
+        self.submitted_at = time.time()
+
+
+class BackgroundExecutor:
+    """Worker pool with per-type concurrency limits, priorities and a bounded queue."""
+
+    def __init__(self, workers: int = BACKGROUND_WORKERS, queue_limit: int = BACKGROUND_QUEUE_LIMIT,
+                 type_limits: Optional[Dict[str, int]] = None, submit_timeout: float = BACKGROUND_SUBMIT_TIMEOUT):
+        self.workers = max(1, workers)
+        self.queue_limit = max(1, queue_limit)
+        self.type_limits = dict(BACKGROUND_TYPE_LIMITS if type_limits is None else type_limits)
+        self.submit_timeout = submit_timeout
+        self._cond = threading.Condition()
+        # task_type -> heap of (priority, sequence, task)
+        self._pending: Dict[str, list] = {}
+        self._queued = 0
+        self._running: Dict[str, int] = defaultdict(int)
+        self._sequence = itertools.count(1)
+        self._worker_pid = None
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+        )
+        # task_id -> details of queued and running tasks
+        self.tasks: Dict[str, dict] = {}
+        self.wait_timings = TimingRecorder()
+        self.run_timings = TimingRecorder()
+
+    def limit_for(self, task_type: str) -> int:
+        return min(self.type_limits.get(task_type, self.workers), self.workers)
+
+    def _ensure_workers(self):
+        # Called with the condition held
+        if self._worker_pid == os.getpid():
+            return
+        self._worker_pid = os.getpid()
+        for index in range(self.workers):
+            threading.Thread(target=self._work, name=f'background-{index}', daemon=True).start()
+        logger.info(f"🚀 Background executor started {self.workers} workers (limits: {self.type_limits})")
+
+    def submit(self, func: Callable, *args, task_type: str = DEFAULT_TASK_TYPE, priority: int = PRIORITY_NORMAL,
+               description: Optional[str] = None, timeout: Optional[float] = None, **kwargs) -> str:
+        """
+        Queue ``func(*args, **kwargs)`` and return its task id.
+
+        Blocks while the queue is full, for at most ``timeout`` seconds
+        (``submit_timeout`` by default), then raises ``BackgroundQueueFull``.
+        """
+        timeout = self.submit_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._ensure_workers()
+            while self._queued >= self.queue_limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters[task_type]['rejected'] += 1
+                    raise BackgroundQueueFull(f'Background queue full ({self._queued} tasks waiting)')
+                self._cond.wait(remaining)
+
+            sequence = next(self._sequence)
+            task_id = f"bg_task_{sequence}_{int(time.time())}"
+            task = _Task(task_id, func, args, kwargs, task_type, priority,
+                         description or getattr(func, '__name__', task_type))
+            heapq.heappush(self._pending.setdefault(task_type, []), (priority, sequence, task))
+            self._queued += 1
+            self._counters[task_type]['submitted'] += 1
+            self.tasks[task_id] = {
+                'func': task.description,
+                'task_type': task_type,
+                'priority': priority,
+                'submitted_at': task.submitted_at,
+                'status': 'queued'
+            }
+            self._cond.notify_all()
+        logger.debug(f"Background task {task_id} queued: {task.description}")
+        return task_id
+
+    def _next_task(self) -> Optional[_Task]:
+        # Called with the condition held: best head among the types with a free slot
+        best_type, best_key = None, None
+        for task_type, heap in self._pending.items():
+            if heap and self._running[task_type] < self.limit_for(task_type):
+                key = heap[0][:2]
+                if best_key is None or key < best_key:
+                    best_type, best_key = task_type, key
+        if best_type is None:
+            return None
+        return heapq.heappop(self._pending[best_type])[2]
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._cond.wait()
+                    task = self._next_task()
+                self._queued -= 1
+                self._running[task.task_type] += 1
+                started = time.time()
+                details = self.tasks.get(task.task_id)
+                if details is not None:
+                    details['status'] = 'running'
+                    details['started_at'] = started
+                # A queue slot is free for blocked submitters
+                self._cond.notify_all()
+
+            self.wait_timings.record((task.task_type,), max(0.0, started - task.submitted_at))
+            failed = False
+            try:
+                task.func(*task.args, **task.kwargs)
+            except Exception as e:
+                failed = True
+                logger.error(f"Background task {task.task_id} ({task.description}) failed: {e}")
+            finally:
+                self.run_timings.record((task.task_type,), time.time() - started, failed)
+                with self._cond:
+                    self._running[task.task_type] -= 1
+                    self._counters[task.task_type]['failed' if failed else 'completed'] += 1
+                    self.tasks.pop(task.task_id, None)
+                    # A type slot is free for waiting workers
+                    self._cond.notify_all()
+
+    def queued(self) -> int:
+        return self._queued
+
+    def task_status(self, task_id: str) -> dict:
+        with self._cond:
+            return dict(self.tasks.get(task_id) or {'status': 'not_found'})
+
+    def task_details(self) -> Dict[str, dict]:
+        with self._cond:
+            return {task_id: dict(details) for task_id, details in self.tasks.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, running tasks and counters per type, for this worker."""
+        with self._cond:
+            types = set(self._counters) | set(self._pending)
+            return {
+                'workers': self.workers,
+                'queue_limit': self.queue_limit,
+                'queued': self._queued,
+                'running': sum(self._running.values()),
+                'types': {
+                    task_type: {
+                        'queued': len(self._pending.get(task_type, ())),
+                        'running': self._running.get(task_type, 0),
+                        'limit': self.limit_for(task_type),
+                        **self._counters[task_type],
+                    }
+                    for task_type in sorted(types)
+                },
+            }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats(), 'wait': self.wait_timings.snapshot(), 'run': self.run_timings.snapshot()}
+
+
+background_executor = BackgroundExecutor()
+register_provider('background_tasks', background_executor.snapshot)
@@ -12,15 +12,23 @@ import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from mongo import mongo_db
-from utils.notification_queue import queue_sms, queue_email
+from utils.notification_queue import queue_sms
+from utils.email_service import EMAIL_BATCH_SIZE, send_template_batch
 from utils.async_processor import submit_background_task
+from utils.background_executor import PRIORITY_HIGH, PRIORITY_NORMAL
+from utils.job_queue import JOB_QUEUE_ENABLED, JOB_RETAIN_SECONDS, ensure_embedded_worker, job_handler, job_queue
 from utils.smart_worker_manager import run_background_task_with_tracking
 from utils.date_formatter import format_date_to_ist
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# One document per email the provider accepted or push delivered,
+# keyed "{batch_id}:{index}:{position}:email" / "...:push"
+EMAIL_SENDS_COLLECTION = 'notification_email_sends'
+
 class BatchProcessor:
     """Manages robust batch processing of student notifications"""
     
@@ -31,6 +39,7 @@ class BatchProcessor:
         self.running = False
         self.max_retries = 3
         self.retry_delay = 30  # seconds
+        self._email_sends_indexed = False
         
     def start_processor(self):
         """Start the batch processor thread"""
@@ -101,6 +110,14 @@ class BatchProcessor:
                          interval_minutes: int, test_data: Dict = None) -> Dict:
         """Create a new batch job for processing"""
         
+        if JOB_QUEUE_ENABLED:
+            try:
+                return self._create_durable_batch_job(
+                    batch_id, students, notification_type, batch_size, interval_minutes, test_data
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Job queue unavailable, keeping batch {batch_id} in process memory: {e}")
+        
         with self.batch_lock:
             # Divide students into sub-batches
             sub_batches = self._divide_into_sub_batches(students, batch_size)
@@ -124,7 +141,8 @@ class BatchProcessor:
                     'email_queued': 0,
                     'sms_failed': 0,
                     'email_failed': 0,
-                    'total_processed': 0
+                    'total_processed': 0,
+                    'email_failures': []
                 }
             }
             
@@ -139,6 +157,96 @@ class BatchProcessor:
                 'estimated_completion': self._calculate_estimated_completion(len(sub_batches), interval_minutes)
             }
     
+    def _create_durable_batch_job(self, batch_id: str, students: List[Dict], notification_type: str,
+                                  batch_size: int, interval_minutes: int, test_data: Dict = None) -> Dict:
+        """Store every sub-batch as a job of the durable queue, spaced ``interval_minutes`` apart"""
+        sub_batches = self._divide_into_sub_batches(students, batch_size)
+        priority = PRIORITY_NORMAL if notification_type == 'test_notification' else PRIORITY_HIGH
+        for index, sub_batch in enumerate(sub_batches):
+            job_queue.enqueue(
+                'notification.sub_batch',
+                {
+                    'batch_id': batch_id,
+                    'sub_batch_index': index,
+                    'students': sub_batch,
+                    'notification_type': notification_type,
+                    'test_data': test_data
+                },
+                priority=priority,
+                delay=index * interval_minutes * 60,
+                idempotency_key=f"{batch_id}:{index}",
+                group=batch_id,
+                max_attempts=self.max_retries,
+                meta={
+                    'notification_type': notification_type,
+                    'students': len(sub_batch),
+                    'sub_batch_index': index,
+                    'total_sub_batches': len(sub_batches)
+                }
+            )
+        ensure_embedded_worker()
+        logger.info(f"📦 Queued {notification_type} batch job {batch_id} with {len(sub_batches)} durable sub-batches")
+        
+        return {
+            'success': True,
+            'batch_id': batch_id,
+            'total_students': len(students),
+            'sub_batches': len(sub_batches),
+            'estimated_completion': self._calculate_estimated_completion(len(sub_batches), interval_minutes)
+        }
+    
+    def _durable_batch_status(self, batch_id: str) -> Optional[Dict]:
+        """Status of a batch built from its sub-batch jobs, the same from every worker"""
+        jobs = job_queue.group_jobs(batch_id)
+        if not jobs:
+            return None
+        
+        statuses = [job['status'] for job in jobs]
+        if 'dead' in statuses:
+            status = 'failed'
+        elif all(job_status == 'succeeded' for job_status in statuses):
+            status = 'completed'
+        elif 'running' in statuses:
+            status = 'processing'
+        else:
+            status = 'pending'
+        
+        results = {'sms_queued': 0, 'email_queued': 0, 'sms_failed': 0, 'email_failed': 0, 'total_processed': 0}
+        email_failures = []
+        for job in jobs:
+            job_result = job.get('result') or {}
+            for key in results:
+                results[key] += job_result.get(key, 0)
+            email_failures.extend(r for r in job_result.get('email_results', []) if not r['success'])
+        results['email_failures'] = email_failures
+        completed = statuses.count('succeeded')
+        started = [job['started_at'] for job in jobs if job.get('started_at')]
+        
+        return {
+            'batch_id': batch_id,
+            'status': status,
+            'total_students': sum(job.get('meta', {}).get('students', 0) for job in jobs),
+            'current_sub_batch': completed,
+            'total_sub_batches': len(jobs),
+            'progress_percentage': int((completed / len(jobs)) * 100),
+            'results': results,
+            'created_at': jobs[0]['created_at'].isoformat(),
+            'last_processed': max(started).isoformat() if started else None,
+            'retry_count': sum(max(job['attempts'] - 1, 0) for job in jobs),
+            'job_ids': [str(job['_id']) for job in jobs]
+        }
+    
+    def _run_sub_batch_job(self, payload: Dict) -> Dict:
+        """Durable job handler: one sub-batch, with smart worker tracking"""
+        students = payload['students']
+        return run_background_task_with_tracking(
+            self._send_sub_batch,
+            'batch_processing',
+            f"Batch {payload['batch_id']} sub-batch {payload['sub_batch_index'] + 1} ({len(students)} students)",
+            len(students) * 2,  # 2 seconds per student estimate
+            **payload
+        )
+    
     def _divide_into_sub_batches(self, students: List[Dict], batch_size: int) -> List[List[Dict]]:
         """Divide students into sub-batches of specified size"""
         sub_batches = []
@@ -218,9 +326,11 @@ class BatchProcessor:
                 
                 logger.info(f"🔄 Processing batch {batch_id}, sub-batch {current_sub_batch + 1}/{batch_info['total_sub_batches']}")
             
-            # Process students in background
+            # Process students in background (credentials ahead of test announcements)
             submit_background_task(
                 self._process_students_sub_batch,
+                task_type='batch_processing',
+                priority=PRIORITY_NORMAL if batch_info['notification_type'] == 'test_notification' else PRIORITY_HIGH,
                 batch_id=batch_id,
                 sub_batch_index=current_sub_batch,
                 students=students,
@@ -234,71 +344,185 @@ class BatchProcessor:
                 if batch_id in self.active_batches:
                     self.active_batches[batch_id]['status'] = 'failed'
     
+    def _send_sub_batch(self, batch_id: str, sub_batch_index: int, students: List[Dict],
+                        notification_type: str, test_data: Dict = None) -> Dict:
+        """Send the notifications of one sub-batch; every send is keyed so that a re-run skips it"""
+        try:
+            logger.info(f"🔄 Processing {len(students)} students in batch {batch_id}, sub-batch {sub_batch_index + 1}")
+            
+            sms_queued = 0
+            email_queued = 0
+            push_sent = 0
+            sms_failed = 0
+            email_failed = 0
+            push_failed = 0
+            # Emails of the whole sub-batch go out together (one provider call per template)
+            email_batch = []
+            
+            for position, student in enumerate(students):
+                try:
+                    # Extract student data
+                    name = student.get('name', 'Student')
+                    email = student.get('email')
+                    phone = student.get('mobile_number') or student.get('mobile') or student.get('phone_number')
+                    username = student.get('username')
+                    password = student.get('password')
+                    
+                    # Get user_id for push notifications
+                    user_id = student.get('user_id')
+                    
+                    # A re-run sub-batch (retry, expired lease) must not queue the same send twice
+                    key_prefix = f"{batch_id}:{sub_batch_index}:{position}"
+                    
+                    if notification_type == 'credentials':
+                        # Process student credentials (email, SMS, and push)
+                        self._process_credentials_notification(
+                            name, email, phone, username, password, user_id,
+                            sms_queued, email_queued, push_sent, sms_failed, email_failed, push_failed,
+                            key_prefix=key_prefix, email_batch=email_batch
+                        )
+                    elif notification_type == 'email_only':
+                        # Process email-only notifications (and push if user_id available)
+                        self._process_email_only_notification(
+                            name, email, username, password, user_id,
+                            email_queued, push_sent, email_failed, push_failed,
+                            key_prefix=key_prefix, email_batch=email_batch
+                        )
+                    elif notification_type == 'test_notification':
+                        # Process test notification (email, SMS, and push)
+                        self._process_test_notification(
+                            name, email, phone, test_data, user_id,
+                            sms_queued, email_queued, push_sent, sms_failed, email_failed, push_failed,
+                            key_prefix=key_prefix, email_batch=email_batch
+                        )
+                            
+                except Exception as e:
+                    logger.error(f"❌ Error processing student {student.get('name', 'Unknown')}: {e}")
+                    sms_failed += 1
+                    email_failed += 1
+                    push_failed += 1
+            
+            email_results = self._send_email_batch(email_batch)
+            if email_results and all(not r['success'] and r['retryable'] for r in email_results):
+                # Nothing was delivered: let the job queue retry the sub-batch (SMS and pushes are deduplicated)
+                raise RuntimeError(f"Email provider unavailable: {email_results[0]['error']}")
+            email_queued = sum(1 for r in email_results if r['success'])
+            email_failed = len(email_results) - email_queued
+            
+            return {
+                'sms_queued': sms_queued,
+                'email_queued': email_queued,
+                'push_sent': push_sent,
+                'sms_failed': sms_failed,
+                'email_failed': email_failed,
+                'push_failed': push_failed,
+                'total_processed': len(students),
+                'email_results': email_results
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ Error processing sub-batch {sub_batch_index + 1} for batch {batch_id}: {e}")
+            raise
+    
+    def _email_sends(self):
+        collection = mongo_db.db[EMAIL_SENDS_COLLECTION]
+        if not self._email_sends_indexed:
+            self._email_sends_indexed = True
+            try:
+                collection.create_index('sent_at', expireAfterSeconds=JOB_RETAIN_SECONDS)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not create email send marker index: {e}")
+        return collection
+    
+    def _sent_emails(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        """Message ids of the keyed emails an earlier run of the sub-batch already sent"""
+        if not keys:
+            return {}
+        try:
+            return {doc['_id']: doc.get('message_id')
+                    for doc in self._email_sends().find({'_id': {'$in': keys}}, {'message_id': 1})}
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read email send markers, sending all {len(keys)}: {e}")
+            return {}
+    
+    def _mark_emails_sent(self, chunk: List[Dict], results: List[Dict]):
+        """Record the accepted emails before the sub-batch is acknowledged, so a re-run skips them"""
+        now = datetime.utcnow()
+        docs = [{'_id': message['key'], 'email': result['email'], 'message_id': result.get('message_id'), 'sent_at': now}
+                for message, result in zip(chunk, results) if message.get('key') and result['success']]
+        if not docs:
+            return
+        try:
+            self._email_sends().insert_many(docs, ordered=False)
+        except BulkWriteError:
+            pass  # Already marked by an earlier run
+        except Exception as e:
+            logger.error(f"❌ Could not record {len(docs)} sent emails; a retry would send them again: {e}")
+    
+    def _send_push_once(self, user_id: str, notification_data: Dict, key: str = None) -> Dict:
+        """Send a push notification unless an earlier run of the sub-batch already delivered it"""
+        from services.enhanced_notification_service import enhancedNotificationService
+        
+        if key:
+            try:
+                if self._email_sends().find_one({'_id': key}, {'_id': 1}):
+                    return {'push_sent': True, 'already_sent': True}
+            except Exception as e:
+                logger.warning(f"⚠️ Could not read push send marker {key}, sending: {e}")
+        result = enhancedNotificationService.send_notification_to_user(user_id, notification_data)
+        if key and result.get('push_sent'):
+            try:
+                self._email_sends().insert_one({'_id': key, 'user_id': str(user_id), 'sent_at': datetime.utcnow()})
+            except DuplicateKeyError:
+                pass  # Already marked by an earlier run
+            except Exception as e:
+                logger.error(f"❌ Could not record push to user {user_id}; a retry would send it again: {e}")
+        return result
+    
+    def _send_email_batch(self, email_batch: List[Dict]) -> List[Dict]:
+        """
+        Send the collected emails grouped by template and subject; one result per recipient.
+        
+        Emails with a ``key`` are sent at most once: recipients recorded as sent
+        by an earlier run are skipped, and every provider call is recorded
+        before the next one starts.
+        """
+        sent = self._sent_emails([message['key'] for message in email_batch if message.get('key')])
+        results_by_position: Dict[int, Dict] = {}
+        groups: Dict[Tuple[str, str], List[Tuple[int, Dict]]] = {}
+        for position, message in enumerate(email_batch):
+            if message.get('key') in sent:
+                results_by_position[position] = {
+                    'email': message['email'], 'success': True, 'message_id': sent[message['key']],
+                    'error': None, 'retryable': False, 'already_sent': True
+                }
+                continue
+            groups.setdefault((message['template'], message['subject']), []).append((position, message))
+        if sent:
+            logger.info(f"📧 Skipping {len(sent)} emails sent by an earlier run of this sub-batch")
+        
+        for (template_name, subject), entries in groups.items():
+            for start in range(0, len(entries), EMAIL_BATCH_SIZE):
+                chunk = [message for _, message in entries[start:start + EMAIL_BATCH_SIZE]]
+                try:
+                    chunk_results = send_template_batch(template_name, subject, chunk)
+                except Exception as e:
+                    logger.error(f"❌ Batched email {template_name} failed for {len(chunk)} recipients: {e}")
+                    chunk_results = [
+                        {'email': r['email'], 'success': False, 'message_id': None, 'error': str(e), 'retryable': True}
+                        for r in chunk
+                    ]
+                self._mark_emails_sent(chunk, chunk_results)
+                for (position, _), result in zip(entries[start:start + EMAIL_BATCH_SIZE], chunk_results):
+                    results_by_position[position] = result
+        return [results_by_position[position] for position in sorted(results_by_position)]
+    
     def _process_students_sub_batch(self, batch_id: str, sub_batch_index: int, 
                                    students: List[Dict], notification_type: str, test_data: Dict = None):
         """Process a sub-batch of students with smart worker tracking"""
         
         def process_sub_batch():
-            try:
-                logger.info(f"🔄 Processing {len(students)} students in batch {batch_id}, sub-batch {sub_batch_index + 1}")
-                
-                sms_queued = 0
-                email_queued = 0
-                push_sent = 0
-                sms_failed = 0
-                email_failed = 0
-                push_failed = 0
-                
-                for student in students:
-                    try:
-                        # Extract student data
-                        name = student.get('name', 'Student')
-                        email = student.get('email')
-                        phone = student.get('mobile_number') or student.get('mobile') or student.get('phone_number')
-                        username = student.get('username')
-                        password = student.get('password')
-                        
-                        # Get user_id for push notifications
-                        user_id = student.get('user_id')
-                        
-                        if notification_type == 'credentials':
-                            # Process student credentials (email, SMS, and push)
-                            self._process_credentials_notification(
-                                name, email, phone, username, password, user_id,
-                                sms_queued, email_queued, push_sent, sms_failed, email_failed, push_failed
-                            )
-                        elif notification_type == 'email_only':
-                            # Process email-only notifications (and push if user_id available)
-                            self._process_email_only_notification(
-                                name, email, username, password, user_id,
-                                email_queued, push_sent, email_failed, push_failed
-                            )
-                        elif notification_type == 'test_notification':
-                            # Process test notification (email, SMS, and push)
-                            self._process_test_notification(
-                                name, email, phone, test_data, user_id,
-                                sms_queued, email_queued, push_sent, sms_failed, email_failed, push_failed
-                            )
-                                
-                    except Exception as e:
-                        logger.error(f"❌ Error processing student {student.get('name', 'Unknown')}: {e}")
-                        sms_failed += 1
-                        email_failed += 1
-                        push_failed += 1
-                
-                return {
-                    'sms_queued': sms_queued,
-                    'email_queued': email_queued,
-                    'push_sent': push_sent,
-                    'sms_failed': sms_failed,
-                    'email_failed': email_failed,
-                    'push_failed': push_failed,
-                    'total_processed': len(students)
-                }
-                
-            except Exception as e:
-                logger.error(f"❌ Error processing sub-batch {sub_batch_index + 1} for batch {batch_id}: {e}")
-                raise
+            return self._send_sub_batch(batch_id, sub_batch_index, students, notification_type, test_data)
         
         # Run with smart worker tracking
         try:
@@ -318,6 +542,9 @@ class BatchProcessor:
                     batch_info['results']['sms_failed'] += result['sms_failed']
                     batch_info['results']['email_failed'] += result['email_failed']
                     batch_info['results']['total_processed'] += result['total_processed']
+                    batch_info['results']['email_failures'].extend(
+                        r for r in result['email_results'] if not r['success']
+                    )
                     batch_info['current_sub_batch'] += 1
                     batch_info['status'] = 'pending'  # Ready for next sub-batch
                     
@@ -329,13 +556,20 @@ class BatchProcessor:
             logger.error(f"❌ Failed to process sub-batch {sub_batch_index + 1} for batch {batch_id}: {e}")
             with self.batch_lock:
                 if batch_id in self.active_batches:
-                    self.active_batches[batch_id]['status'] = 'failed'
+                    # Retried by the processor loop (emails already sent are skipped);
+                    # _process_next_sub_batch fails the batch after max_retries
+                    batch_info = self.active_batches[batch_id]
+                    batch_info['retry_count'] += 1
+                    batch_info['status'] = 'pending'
+                    logger.warning(f"🔄 Sub-batch {sub_batch_index + 1} of batch {batch_id} will be retried "
+                                   f"({batch_info['retry_count']}/{self.max_retries})")
     
     def _process_credentials_notification(self, name: str, email: str, phone: str, 
                                          username: str, password: str, user_id: str,
                                          sms_queued: int, email_queued: int, push_sent: int,
-                                         sms_failed: int, email_failed: int, push_failed: int):
-        """Process student credentials notification (email, SMS, and push)"""
+                                         sms_failed: int, email_failed: int, push_failed: int,
+                                         key_prefix: str = None, email_batch: List[Dict] = None):
+        """Process student credentials notification (SMS and push; the email joins ``email_batch``)"""
         # Queue SMS if phone exists
         if phone:
             sms_task_id = queue_sms(
@@ -344,38 +578,34 @@ class BatchProcessor:
                 notification_type='student_credentials',
                 student_name=name,
                 username=username,
-                password=password
+                password=password,
+                idempotency_key=f"{key_prefix}:sms" if key_prefix else None
             )
             if sms_task_id:
                 sms_queued += 1
             else:
                 sms_failed += 1
         
-        # Queue email if email exists
+        # Add email to the sub-batch's batched send if email exists
         if email:
-            email_task_id = queue_email(
-                email=email,
-                subject="Welcome to Campus Recruitment & Training - Your Student Credentials",
-                content="",  # Will be generated from template
-                template_name='student_credentials.html',
-                template_params={
+            email_batch.append({
+                'key': f"{key_prefix}:email" if key_prefix else None,
+                'email': email,
+                'name': name,
+                'subject': "Welcome to Campus Recruitment & Training - Your Student Credentials",
+                'template': 'student_credentials.html',
+                'params': {
                     'name': name,
                     'username': username,
                     'email': email,
                     'password': password,
                     'login_url': "https://crt.pydahsoft.in/login"
                 }
-            )
-            if email_task_id:
-                email_queued += 1
-            else:
-                email_failed += 1
+            })
         
         # Send push notification if user_id exists
         if user_id:
             try:
-                from services.enhanced_notification_service import enhancedNotificationService
-                
                 notification_data = {
                     'title': 'Welcome to VERSANT! 🎉',
                     'message': f'Your student account has been created. Username: {username}. Login to get started!',
@@ -388,7 +618,7 @@ class BatchProcessor:
                     }
                 }
                 
-                result = enhancedNotificationService.send_notification_to_user(user_id, notification_data)
+                result = self._send_push_once(user_id, notification_data, f"{key_prefix}:push" if key_prefix else None)
                 if result.get('push_sent'):
                     push_sent += 1
                     logger.info(f"✅ Push notification sent to user {user_id} for credentials")
@@ -403,33 +633,29 @@ class BatchProcessor:
     def _process_email_only_notification(self, name: str, email: str, 
                                        username: str, password: str, user_id: str,
                                        email_queued: int, push_sent: int, 
-                                       email_failed: int, push_failed: int):
-        """Process email-only notification (email and push)"""
-        # Queue email if email exists
+                                       email_failed: int, push_failed: int,
+                                       key_prefix: str = None, email_batch: List[Dict] = None):
+        """Process email-only notification (push; the email joins ``email_batch``)"""
+        # Add email to the sub-batch's batched send if email exists
         if email:
-            email_task_id = queue_email(
-                email=email,
-                subject="Welcome to Study Edge - Your Student Credentials",
-                content="",  # Will be generated from template
-                template_name='student_credentials.html',
-                template_params={
+            email_batch.append({
+                'key': f"{key_prefix}:email" if key_prefix else None,
+                'email': email,
+                'name': name,
+                'subject': "Welcome to Study Edge - Your Student Credentials",
+                'template': 'student_credentials.html',
+                'params': {
                     'name': name,
                     'username': username,
                     'email': email,
                     'password': password,
                     'login_url': "https://crt.pydahsoft.in/login"
                 }
-            )
-            if email_task_id:
-                email_queued += 1
-            else:
-                email_failed += 1
+            })
         
         # Send push notification if user_id exists
         if user_id:
             try:
-                from services.enhanced_notification_service import enhancedNotificationService
-                
                 notification_data = {
                     'title': 'Welcome to VERSANT! 🎉',
                     'message': f'Your student account has been created. Username: {username}. Login to get started!',
@@ -442,7 +668,7 @@ class BatchProcessor:
                     }
                 }
                 
-                result = enhancedNotificationService.send_notification_to_user(user_id, notification_data)
+                result = self._send_push_once(user_id, notification_data, f"{key_prefix}:push" if key_prefix else None)
                 if result.get('push_sent'):
                     push_sent += 1
                     logger.info(f"✅ Push notification sent to user {user_id} for credentials")
@@ -456,8 +682,9 @@ class BatchProcessor:
     
     def _process_test_notification(self, name: str, email: str, phone: str, 
                                  test_data: Dict, user_id: str, sms_queued: int, email_queued: int, push_sent: int,
-                                 sms_failed: int, email_failed: int, push_failed: int):
-        """Process test notification (email, SMS, and push)"""
+                                 sms_failed: int, email_failed: int, push_failed: int,
+                                 key_prefix: str = None, email_batch: List[Dict] = None):
+        """Process test notification (SMS and push; the email joins ``email_batch``)"""
         test_id = test_data['test_id']  # Custom test_id for SMS
         object_id = test_data['object_id']  # MongoDB _id for emails
         test_name = test_data['test_name']
@@ -472,21 +699,23 @@ class BatchProcessor:
                 phone=phone,
                 message=sms_message,
                 notification_type='test_notification',
-                student_name=name
+                student_name=name,
+                idempotency_key=f"{key_prefix}:sms" if key_prefix else None
             )
             if sms_task_id:
                 sms_queued += 1
             else:
                 sms_failed += 1
         
-        # Queue email if email exists (use MongoDB _id for URL)
+        # Add email to the sub-batch's batched send if email exists (use MongoDB _id for URL)
         if email:
-            email_task_id = queue_email(
-                email=email,
-                subject=f"New Test Scheduled: {test_name}",
-                content="",  # Will be generated from template
-                template_name='test_notification.html',
-                template_params={
+            email_batch.append({
+                'key': f"{key_prefix}:email" if key_prefix else None,
+                'email': email,
+                'name': name,
+                'subject': f"New Test Scheduled: {test_name}",
+                'template': 'test_notification.html',
+                'params': {
                     'name': name,
                     'test_name': test_name,
                     'test_id': test_id,  # Custom test_id for display
@@ -494,17 +723,11 @@ class BatchProcessor:
                     'start_date': format_date_to_ist(start_date, 'readable'),  # Format to IST
                     'test_url': f"https://crt.pydahsoft.in/student/exam/{object_id}"  # Use _id for URL
                 }
-            )
-            if email_task_id:
-                email_queued += 1
-            else:
-                email_failed += 1
+            })
         
         # Send push notification if user_id exists
         if user_id:
             try:
-                from services.enhanced_notification_service import enhancedNotificationService
-                
                 # Format start_date to IST readable format
                 formatted_start_date = format_date_to_ist(start_date, 'readable')
                 
@@ -521,7 +744,7 @@ class BatchProcessor:
                     }
                 }
                 
-                result = enhancedNotificationService.send_notification_to_user(user_id, notification_data)
+                result = self._send_push_once(user_id, notification_data, f"{key_prefix}:push" if key_prefix else None)
                 if result.get('push_sent'):
                     push_sent += 1
                     logger.info(f"✅ Push notification sent to user {user_id} for test: {test_name}")
@@ -554,7 +777,7 @@ class BatchProcessor:
         with self.batch_lock:
             batch_info = self.active_batches.get(batch_id)
             if not batch_info:
-                return None
+                return self._durable_batch_status(batch_id) if JOB_QUEUE_ENABLED else None
             
             return {
                 'batch_id': batch_id,
@@ -572,16 +795,24 @@ class BatchProcessor:
     def get_all_batches_status(self) -> Dict:
         """Get status of all active batches"""
         with self.batch_lock:
-            return {
-                'active_batches': len(self.active_batches),
-                'batches': [
-                    self.get_batch_status(batch_id) 
-                    for batch_id in self.active_batches.keys()
-                ]
-            }
+            batch_ids = list(self.active_batches.keys())
+        batches = [self.get_batch_status(batch_id) for batch_id in batch_ids]
+        if JOB_QUEUE_ENABLED:
+            try:
+                batches.extend(
+                    self._durable_batch_status(batch_id)
+                    for batch_id in job_queue.active_groups('notification.sub_batch')
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Could not read durable batches: {e}")
+        return {
+            'active_batches': len(batches),
+            'batches': batches
+        }
 
 # Global batch processor instance
 batch_processor = BatchProcessor()
+job_handler('notification.sub_batch')(batch_processor._run_sub_batch_job)
 
 def start_batch_processor():
     """Start the global batch processor"""
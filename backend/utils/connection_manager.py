@@ -5,11 +5,16 @@ Prevents socket buffer exhaustion on Windows
 import threading
 import time
 from config.database_simple import DatabaseConfig
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 import logging
+from utils.mongo_profiler import mongo_profiler
 
 logger = logging.getLogger(__name__)
 
+# Global listeners only apply to clients created afterwards, so register
+# before the first client is built
+monitoring.register(mongo_profiler)
+
 class ConnectionManager:
     """Singleton connection manager to prevent socket exhaustion"""
     _instance = None
@@ -1,6 +1,37 @@
+"""
+Email sending and template rendering.
+
+Templates under ``templates/emails`` address their values Brevo-style
+(``{{ params.name }}``) and are compiled once per process by a cached Jinja
+environment (``EMAIL_TEMPLATE_AUTO_RELOAD=true`` re-reads changed files).
+
+``send_template_batch`` sends one template to many recipients. With Brevo
+the unrendered template goes out once per call and every recipient is a
+``messageVersions`` entry carrying its own params, ``EMAIL_BATCH_SIZE``
+recipients per call; a rejected call is split to isolate the bad
+recipient. It returns one result per recipient:
+
+    results = send_template_batch('student_credentials.html', subject, [
+        {'email': 'a@example.com', 'name': 'A', 'params': {...}}, ...
+    ])
+    # [{'email': 'a@example.com', 'success': True, 'message_id': '<...>', 'error': None, 'retryable': False}, ...]
+
+``EMAIL_BACKEND`` selects the transport: ``brevo`` (default), ``smtp``
+(e.g. a local MailHog / aiosmtpd on ``EMAIL_SMTP_HOST:EMAIL_SMTP_PORT``)
+or ``file`` (one ``.eml`` per message in ``EMAIL_FILE_SINK_DIR``), the
+last two for tests and local development.
+"""
 import os
 import logging
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+import re
+import smtplib
+import tempfile
+import threading
+import time
+from email.message import EmailMessage
+from typing import Dict, List
+
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound, select_autoescape
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +47,15 @@ except ImportError:
     logger.warning("⚠️ Warning: brevo_python module not found. Email functionality will be disabled.")
     BREVO_AVAILABLE = False
 
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), '..', 'templates', 'emails')
+EMAIL_TEMPLATE_AUTO_RELOAD = os.getenv('EMAIL_TEMPLATE_AUTO_RELOAD', 'false').lower() == 'true'
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'brevo').lower()
+# Brevo accepts up to 1000 messageVersions per call
+EMAIL_BATCH_SIZE = max(1, min(int(os.getenv('EMAIL_BATCH_SIZE', '1000')), 1000))
+EMAIL_SMTP_HOST = os.getenv('EMAIL_SMTP_HOST', 'localhost')
+EMAIL_SMTP_PORT = int(os.getenv('EMAIL_SMTP_PORT', '1025'))
+EMAIL_FILE_SINK_DIR = os.getenv('EMAIL_FILE_SINK_DIR', os.path.join(tempfile.gettempdir(), 'versant-emails'))
+
 def configure_brevo():
     """Configure Brevo email service"""
     if not BREVO_AVAILABLE:
@@ -38,34 +78,56 @@ def configure_brevo():
         logger.error(f"❌ Error configuring Brevo: {e}")
         return None
 
+_template_env = None
+_template_sources: Dict[str, str] = {}
+_template_lock = threading.Lock()
+
+def get_template_environment():
+    """Process-wide Jinja environment with every email template compiled once"""
+    global _template_env
+    if _template_env is None:
+        with _template_lock:
+            if _template_env is None:
+                env = Environment(
+                    loader=FileSystemLoader(TEMPLATE_DIR),
+                    autoescape=select_autoescape(['html']),
+                    auto_reload=EMAIL_TEMPLATE_AUTO_RELOAD,
+                    cache_size=-1
+                )
+                if os.path.isdir(TEMPLATE_DIR):
+                    for name in env.list_templates(extensions=['html']):
+                        try:
+                            env.get_template(name)
+                        except Exception as e:
+                            logger.error(f"❌ Error compiling email template {name}: {e}")
+                else:
+                    logger.warning(f"⚠️ Template directory not found: {TEMPLATE_DIR}")
+                _template_env = env
+    return _template_env
+
+def template_source(template_name):
+    """Unrendered template text, for providers that substitute params themselves"""
+    source = _template_sources.get(template_name)
+    if source is None or EMAIL_TEMPLATE_AUTO_RELOAD:
+        env = get_template_environment()
+        source = env.loader.get_source(env, template_name)[0]
+        _template_sources[template_name] = source
+    return source
+
 def render_template(template_name, params=None, **context):
     """Render email template"""
     try:
         # Merge params and context
         if params:
             context.update(params)
-            
-        template_dir = os.path.join(os.path.dirname(__file__), '..', 'templates', 'emails')
+        # Templates read their values as {{ params.<name> }}
+        context.setdefault('params', dict(context))
         
-        # Check if template directory exists
-        if not os.path.exists(template_dir):
-            logger.warning(f"⚠️ Template directory not found: {template_dir}")
-            # Create a fallback template
-            return create_fallback_template(template_name, context)
-        
-        env = Environment(
-            loader=FileSystemLoader(template_dir),
-            autoescape=select_autoescape(['html'])
-        )
-        
-        # Check if template file exists
-        template_path = os.path.join(template_dir, template_name)
-        if not os.path.exists(template_path):
-            logger.warning(f"⚠️ Template file not found: {template_path}")
-            return create_fallback_template(template_name, context)
-            
-        template = env.get_template(template_name)
+        template = get_template_environment().get_template(template_name)
         return template.render(**context)
+    except TemplateNotFound:
+        logger.warning(f"⚠️ Template file not found: {template_name}")
+        return create_fallback_template(template_name, context)
     except Exception as e:
         logger.error(f"❌ Error rendering template {template_name}: {e}")
         return create_fallback_template(template_name, context)
@@ -143,51 +205,223 @@ def create_generic_fallback(context):
     </html>
     """
 
-def send_email(to_email, to_name, subject, html_content):
-    """Send email using Brevo service"""
-    if not BREVO_AVAILABLE:
-        logger.warning(f"⚠️ Email service disabled. Would send to {to_email}: {subject}")
-        return False
+def _result(email, success, message_id=None, error=None, retryable=False):
+    return {'email': email, 'success': success, 'message_id': message_id, 'error': error, 'retryable': retryable}
+
+def _sender():
+    sender_email = os.getenv('SENDER_EMAIL')
+    if not sender_email:
+        logger.error("❌ SENDER_EMAIL environment variable not set. Cannot send email.")
+        logger.info("💡 Please set SENDER_EMAIL in your environment variables")
+        return None
+    return {"name": os.getenv('SENDER_NAME', 'VERSANT System'), "email": sender_email}
+
+class BrevoEmailBackend:
+    """Brevo transactional API; one client per process, batches as messageVersions"""
     
-    try:
-        configuration = configure_brevo()
-        if not configuration:
+    name = 'brevo'
+    
+    def __init__(self):
+        self._api = None
+        self._lock = threading.Lock()
+    
+    def _client(self):
+        if self._api is None:
+            with self._lock:
+                if self._api is None:
+                    configuration = configure_brevo()
+                    if configuration:
+                        self._api = brevo_python.TransactionalEmailsApi(brevo_python.ApiClient(configuration))
+        return self._api
+    
+    def _unavailable(self, recipients, subject):
+        if not BREVO_AVAILABLE:
+            logger.warning(f"⚠️ Email service disabled. Would send {subject} to {len(recipients)} recipient(s)")
+            return 'email service disabled'
+        if self._client() is None:
             logger.error("❌ Brevo configuration failed")
-            return False
-            
-        api_instance = brevo_python.TransactionalEmailsApi(brevo_python.ApiClient(configuration))
+            return 'Brevo configuration failed'
+        return None
+    
+    def send(self, to_email, to_name, subject, html_content):
+        error = self._unavailable([to_email], subject)
+        sender = _sender() if error is None else None
+        if error or not sender:
+            return _result(to_email, False, error=error or 'SENDER_EMAIL not set')
+        try:
+            send_smtp_email = brevo_python.SendSmtpEmail(
+                to=[{"email": to_email, "name": to_name}],
+                subject=subject,
+                html_content=html_content,
+                sender=sender
+            )
+            api_response = self._client().send_transac_email(send_smtp_email)
+            logger.info(f"✅ Email sent successfully to {to_email}. Response: {api_response.to_dict()}")
+            return _result(to_email, True, message_id=getattr(api_response, 'message_id', None))
+        except ApiException as e:
+            logger.error(f"❌ Brevo API error sending email to {to_email}: {e}")
+            logger.error(f"   Status: {e.status}, Reason: {e.reason}")
+            return _result(to_email, False, error=f'{e.status} {e.reason}', retryable=e.status == 429 or e.status >= 500)
+        except Exception as e:
+            logger.error(f"❌ Error sending email to {to_email}: {e}")
+            return _result(to_email, False, error=str(e), retryable=True)
+    
+    def send_template_batch(self, template_name, subject, recipients):
+        error = self._unavailable(recipients, subject)
+        sender = _sender() if error is None else None
+        if error or not sender:
+            return [_result(r['email'], False, error=error or 'SENDER_EMAIL not set') for r in recipients]
+        try:
+            html_content = template_source(template_name)
+        except TemplateNotFound:
+            # No Brevo-side template: send the rendered fallback per recipient
+            logger.warning(f"⚠️ Template file not found: {template_name}")
+            return [
+                self.send(r['email'], r.get('name'), r.get('subject') or subject,
+                          render_template(template_name, r.get('params')))
+                for r in recipients
+            ]
         
-        sender_email = os.getenv('SENDER_EMAIL')
-        if not sender_email:
-            logger.error("❌ SENDER_EMAIL environment variable not set. Cannot send email.")
-            logger.info("💡 Please set SENDER_EMAIL in your environment variables")
-            return False
-            
-        sender_name = os.getenv('SENDER_NAME', 'VERSANT System')
+        results = []
+        for start in range(0, len(recipients), EMAIL_BATCH_SIZE):
+            results.extend(self._send_versions(sender, subject, html_content, recipients[start:start + EMAIL_BATCH_SIZE]))
+        sent = sum(1 for result in results if result['success'])
+        logger.info(f"📧 Batch {template_name}: {sent}/{len(recipients)} accepted by Brevo")
+        return results
+    
+    def _send_versions(self, sender, subject, html_content, chunk):
+        versions = []
+        for recipient in chunk:
+            version = {
+                'to': [{'email': recipient['email'], 'name': recipient.get('name') or recipient['email']}],
+                'params': recipient.get('params') or {}
+            }
+            if recipient.get('subject'):
+                version['subject'] = recipient['subject']
+            versions.append(version)
+        try:
+            api_response = self._client().send_transac_email(brevo_python.SendSmtpEmail(
+                sender=sender,
+                subject=subject,
+                html_content=html_content,
+                message_versions=versions
+            ))
+            message_ids = getattr(api_response, 'message_ids', None) or []
+            return [
+                _result(recipient['email'], True, message_id=message_ids[index] if index < len(message_ids) else None)
+                for index, recipient in enumerate(chunk)
+            ]
+        except ApiException as e:
+            if 400 <= e.status < 500 and e.status != 429 and len(chunk) > 1:
+                # One bad address rejects the whole call: split until it is isolated
+                middle = len(chunk) // 2
+                return (self._send_versions(sender, subject, html_content, chunk[:middle]) +
+                        self._send_versions(sender, subject, html_content, chunk[middle:]))
+            logger.error(f"❌ Brevo API error sending {len(chunk)} email(s): {e.status} {e.reason}")
+            retryable = e.status == 429 or e.status >= 500
+            return [_result(r['email'], False, error=f'{e.status} {e.reason}', retryable=retryable) for r in chunk]
+        except Exception as e:
+            logger.error(f"❌ Error sending {len(chunk)} email(s): {e}")
+            return [_result(r['email'], False, error=str(e), retryable=True) for r in chunk]
 
-        send_smtp_email = brevo_python.SendSmtpEmail(
-            to=[{"email": to_email, "name": to_name}],
-            subject=subject,
-            html_content=html_content,
-            sender={"name": sender_name, "email": sender_email}
-        )
+class _LocalEmailBackend:
+    """Renders every message here and hands it to ``_deliver``; for tests and development"""
+    
+    name = 'local'
+    
+    def _message(self, to_email, to_name, subject, html_content):
+        sender = {"name": os.getenv('SENDER_NAME', 'VERSANT System'), "email": os.getenv('SENDER_EMAIL', 'noreply@localhost')}
+        message = EmailMessage()
+        message['From'] = f"{sender['name']} <{sender['email']}>"
+        message['To'] = f"{to_name} <{to_email}>" if to_name else to_email
+        message['Subject'] = subject
+        message.set_content(html_content, subtype='html')
+        return message
+    
+    def send(self, to_email, to_name, subject, html_content):
+        return self.send_messages([(to_email, to_name, subject, html_content)])[0]
+    
+    def send_template_batch(self, template_name, subject, recipients):
+        return self.send_messages([
+            (r['email'], r.get('name'), r.get('subject') or subject, render_template(template_name, r.get('params')))
+            for r in recipients
+        ])
+    
+    def send_messages(self, messages):
+        raise NotImplementedError
 
-        api_response = api_instance.send_transac_email(send_smtp_email)
-        logger.info(f"✅ Email sent successfully to {to_email}. Response: {api_response.to_dict()}")
-        return True
-        
-    except ApiException as e:
-        logger.error(f"❌ Brevo API error sending email to {to_email}: {e}")
-        logger.error(f"   Status: {e.status}, Reason: {e.reason}")
-        return False
-    except Exception as e:
-        logger.error(f"❌ Error sending email to {to_email}: {e}")
-        return False
+class SMTPEmailBackend(_LocalEmailBackend):
+    """Plain SMTP, one connection per batch"""
+    
+    name = 'smtp'
+    
+    def send_messages(self, messages):
+        try:
+            connection = smtplib.SMTP(EMAIL_SMTP_HOST, EMAIL_SMTP_PORT, timeout=30)
+        except Exception as e:
+            logger.error(f"❌ SMTP connection to {EMAIL_SMTP_HOST}:{EMAIL_SMTP_PORT} failed: {e}")
+            return [_result(message[0], False, error=str(e), retryable=True) for message in messages]
+        results = []
+        with connection:
+            for to_email, to_name, subject, html_content in messages:
+                try:
+                    connection.send_message(self._message(to_email, to_name, subject, html_content))
+                    results.append(_result(to_email, True))
+                except Exception as e:
+                    results.append(_result(to_email, False, error=str(e)))
+        return results
+
+class FileEmailBackend(_LocalEmailBackend):
+    """Writes each message to ``EMAIL_FILE_SINK_DIR`` as an .eml file"""
+    
+    name = 'file'
+    
+    def send_messages(self, messages):
+        os.makedirs(EMAIL_FILE_SINK_DIR, exist_ok=True)
+        results = []
+        for to_email, to_name, subject, html_content in messages:
+            path = os.path.join(EMAIL_FILE_SINK_DIR, f"{time.time_ns()}-{re.sub(r'[^A-Za-z0-9@._-]', '_', to_email)}.eml")
+            try:
+                with open(path, 'wb') as handle:
+                    handle.write(bytes(self._message(to_email, to_name, subject, html_content)))
+                results.append(_result(to_email, True, message_id=path))
+            except Exception as e:
+                results.append(_result(to_email, False, error=str(e)))
+        return results
+
+EMAIL_BACKENDS = {'brevo': BrevoEmailBackend, 'smtp': SMTPEmailBackend, 'file': FileEmailBackend}
+_email_backend = None
+
+def get_email_backend():
+    """The process-wide backend selected by EMAIL_BACKEND"""
+    global _email_backend
+    if _email_backend is None:
+        if EMAIL_BACKEND not in EMAIL_BACKENDS:
+            logger.warning(f"⚠️ Unknown EMAIL_BACKEND '{EMAIL_BACKEND}', using brevo")
+        _email_backend = EMAIL_BACKENDS.get(EMAIL_BACKEND, BrevoEmailBackend)()
+    return _email_backend
+
+def send_email(to_email, to_name, subject, html_content):
+    """Send email using the configured backend (Brevo by default)"""
+    return get_email_backend().send(to_email, to_name, subject, html_content)['success']
+
+def send_template_batch(template_name: str, subject: str, recipients: List[Dict]) -> List[Dict]:
+    """
+    Send ``template_name`` to every recipient (``email``, ``name``, ``params``,
+    optional ``subject``) in as few provider calls as possible; one result per recipient.
+    """
+    if not recipients:
+        return []
+    return get_email_backend().send_template_batch(template_name, subject, recipients)
 
 def check_email_configuration():
     """Check if email service is properly configured"""
     issues = []
     
+    if EMAIL_BACKEND in ('smtp', 'file'):
+        logger.info(f"✅ Email service uses the local {EMAIL_BACKEND} backend")
+        return True
+    
     if not BREVO_AVAILABLE:
         issues.append("Brevo Python SDK not installed")
     
@@ -265,6 +499,7 @@ def send_test_notification_email(student_email, student_name, test_name, test_ty
 def get_email_status():
     """Get the current status of email service"""
     return {
+        'backend': EMAIL_BACKEND,
         'brevo_available': BREVO_AVAILABLE,
         'brevo_api_key_set': bool(os.getenv('BREVO_API_KEY')),
         'sender_email_set': bool(os.getenv('SENDER_EMAIL')),
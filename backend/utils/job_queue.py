@@ -0,0 +1,412 @@
+"""
+Durable job queue in MongoDB.
+
+Background work that must survive a worker recycle or a deploy (credential
+emails and SMS, notification sub-batches) is stored as documents in the
+``background_jobs`` collection instead of process memory:
+
+* ``enqueue(name, payload)`` inserts a ``queued`` job; with an
+  ``idempotency_key`` enqueueing the same key again returns the existing
+  job instead of creating a second one;
+* workers claim the best ready job (lowest ``priority``, then ``run_at``)
+  with one ``find_one_and_update`` that sets a lease of
+  ``JOB_VISIBILITY_TIMEOUT`` seconds, renewed while the handler runs. A
+  job whose lease expires (its worker died) becomes claimable again;
+* a failed job is retried after an exponential backoff
+  (``JOB_RETRY_BASE_SECONDS`` doubling, capped at ``JOB_RETRY_MAX_SECONDS``)
+  until ``max_attempts``; it is then moved to the ``dead`` status with its
+  last error and payload kept for inspection and ``retry_job``. Dead jobs
+  are deleted after ``JOB_DEAD_RETAIN_SECONDS`` (payloads can hold initial
+  passwords, see below).
+
+Handlers are plain functions registered by name and called with the
+payload; their return value is stored as the job result:
+
+    @job_handler('notification.sms')
+    def send_sms_job(payload): ...
+
+    job_id = job_queue.enqueue('notification.sms', {...}, priority=PRIORITY_HIGH,
+                               idempotency_key=f'{batch_id}:sms:{username}')
+
+Web workers consume with ``JOB_QUEUE_EMBEDDED_WORKERS`` threads each
+(started by ``ensure_embedded_worker``); set it to 0 and run ``job_worker.py``
+to process jobs in separate processes. Succeeded jobs drop their payload
+(it can hold initial passwords) and expire after ``JOB_RETAIN_SECONDS``.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from utils.background_executor import PRIORITY_NORMAL
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_COLLECTION = os.getenv('JOB_QUEUE_COLLECTION', 'background_jobs')
+JOB_QUEUE_ENABLED = os.getenv('JOB_QUEUE_ENABLED', 'true').lower() == 'true'
+JOB_QUEUE_EMBEDDED_WORKERS = int(os.getenv('JOB_QUEUE_EMBEDDED_WORKERS', '2'))
+JOB_VISIBILITY_TIMEOUT = float(os.getenv('JOB_VISIBILITY_TIMEOUT', '300'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '2'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE_SECONDS = float(os.getenv('JOB_RETRY_BASE_SECONDS', '30'))
+JOB_RETRY_MAX_SECONDS = float(os.getenv('JOB_RETRY_MAX_SECONDS', '1800'))
+JOB_RETAIN_SECONDS = int(os.getenv('JOB_RETAIN_SECONDS', str(7 * 86400)))
+JOB_DEAD_RETAIN_SECONDS = int(os.getenv('JOB_DEAD_RETAIN_SECONDS', str(3 * 86400)))
+
+_handlers: Dict[str, Callable[[dict], Any]] = {}
+
+
+def job_handler(name: str):
+    """Register the decorated function as the handler of jobs called ``name``."""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def registered_handlers() -> List[str]:
+    return sorted(_handlers)
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff before attempt ``attempts + 1``: doubling from the base, capped, with 10% jitter."""
+    delay = min(JOB_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.9, 1.1)
+
+
+def _public(job: Optional[dict]) -> Optional[dict]:
+    """A job document as returned by the status API (ids as strings, no payload)."""
+    if job is None:
+        return None
+    job = dict(job)
+    job.pop('payload', None)
+    job['id'] = str(job.pop('_id'))
+    for key, value in job.items():
+        if isinstance(value, datetime):
+            job[key] = value.isoformat()
+    return job
+
+
+class JobQueue:
+    """Enqueue, claim and settle jobs stored in one Mongo collection."""
+
+    def __init__(self, collection=None, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        self._collection = collection
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._indexes_ready = False
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from mongo import mongo_db
+            self._collection = mongo_db.db[JOB_QUEUE_COLLECTION]
+        if not self._indexes_ready:
+            self._indexes_ready = True
+            self.ensure_indexes(self._collection)
+        return self._collection
+
+    @staticmethod
+    def ensure_indexes(collection):
+        try:
+            collection.create_index([('status', ASCENDING), ('priority', ASCENDING), ('run_at', ASCENDING)])
+            collection.create_index([('status', ASCENDING), ('lease_until', ASCENDING)])
+            collection.create_index([('group', ASCENDING), ('created_at', ASCENDING)])
+            collection.create_index(
+                'idempotency_key', unique=True,
+                partialFilterExpression={'idempotency_key': {'$type': 'string'}},
+            )
+            collection.create_index(
+                'finished_at', expireAfterSeconds=JOB_RETAIN_SECONDS,
+                partialFilterExpression={'status': 'succeeded'},
+            )
+            # Set on dead jobs only
+            collection.create_index('expires_at', expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not create job queue indexes: {e}")
+
+    def enqueue(self, name: str, payload: Optional[dict] = None, priority: int = PRIORITY_NORMAL,
+                delay: float = 0, idempotency_key: Optional[str] = None, group: Optional[str] = None,
+                max_attempts: Optional[int] = None, meta: Optional[dict] = None) -> str:
+        """
+        Store a job and return its id.
+
+        ``group`` tags related jobs (the sub-batches of one notification
+        batch) for ``group_jobs``; ``meta`` is kept after the payload is
+        dropped, for status reports; ``delay`` postpones the first run.
+        """
+        now = _now()
+        job = {
+            'name': name,
+            'payload': payload or {},
+            'priority': priority,
+            'status': 'queued',
+            'attempts': 0,
+            'max_attempts': max_attempts or self.max_attempts,
+            'run_at': now + timedelta(seconds=delay),
+            'lease_until': None,
+            'worker': None,
+            'group': group,
+            'meta': meta or {},
+            'last_error': None,
+            'result': None,
+            'created_at': now,
+            'updated_at': now,
+            'finished_at': None,
+        }
+        if idempotency_key is None:
+            return str(self.collection.insert_one(job).inserted_id)
+
+        job['idempotency_key'] = idempotency_key
+        try:
+            existing = self.collection.find_one_and_update(
+                {'idempotency_key': idempotency_key},
+                {'$setOnInsert': job},
+                upsert=True,
+                projection={'_id': 1},
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Lost the upsert race to another enqueue of the same key
+            existing = self.collection.find_one({'idempotency_key': idempotency_key}, {'_id': 1})
+        return str(existing['_id'])
+
+    def claim(self, worker: str, names: Optional[Iterable[str]] = None) -> Optional[dict]:
+        """Lease the best ready job (queued and due, or running with an expired lease)."""
+        now = _now()
+        query: Dict[str, Any] = {'$or': [
+            {'status': 'queued', 'run_at': {'$lte': now}},
+            {'status': 'running', 'lease_until': {'$lt': now}},
+        ]}
+        if names is not None:
+            query['name'] = {'$in': list(names)}
+        return self.collection.find_one_and_update(
+            query,
+            {
+                '$set': {
+                    'status': 'running',
+                    'worker': worker,
+                    'lease_until': now + timedelta(seconds=self.visibility_timeout),
+                    'started_at': now,
+                    'updated_at': now,
+                },
+                '$inc': {'attempts': 1},
+            },
+            sort=[('priority', ASCENDING), ('run_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    def _lease_filter(job: dict) -> dict:
+        # Only the worker holding the current lease may settle the job
+        return {'_id': job['_id'], 'status': 'running', 'worker': job['worker'], 'attempts': job['attempts']}
+
+    def extend_lease(self, job: dict) -> bool:
+        now = _now()
+        result = self.collection.update_one(
+            self._lease_filter(job),
+            {'$set': {'lease_until': now + timedelta(seconds=self.visibility_timeout), 'updated_at': now}},
+        )
+        return result.modified_count == 1
+
+    def complete(self, job: dict, result: Any = None) -> bool:
+        now = _now()
+        outcome = self.collection.update_one(
+            self._lease_filter(job),
+            {
+                '$set': {'status': 'succeeded', 'result': result, 'lease_until': None,
+                         'finished_at': now, 'updated_at': now},
+                '$unset': {'payload': ''},
+            },
+        )
+        return outcome.modified_count == 1
+
+    def fail(self, job: dict, error: str) -> str:
+        """Schedule a retry, or dead-letter the job once its attempts are used up; returns the new status."""
+        now = _now()
+        if job['attempts'] >= job.get('max_attempts', self.max_attempts):
+            update = {'status': 'dead', 'finished_at': now,
+                      'expires_at': now + timedelta(seconds=JOB_DEAD_RETAIN_SECONDS)}
+        else:
+            update = {'status': 'queued', 'run_at': now + timedelta(seconds=retry_delay(job['attempts']))}
+        update.update({'last_error': error[:2000], 'lease_until': None, 'updated_at': now})
+        self.collection.update_one(self._lease_filter(job), {'$set': update})
+        return update['status']
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        try:
+            object_id = ObjectId(job_id)
+        except Exception:
+            return None
+        return _public(self.collection.find_one({'_id': object_id}, {'payload': 0}))
+
+    def group_jobs(self, group: str) -> List[dict]:
+        return list(self.collection.find({'group': group}, {'payload': 0}).sort('created_at', ASCENDING))
+
+    def active_groups(self, name: str) -> List[str]:
+        return self.collection.distinct('group', {'name': name, 'status': {'$in': ['queued', 'running']}})
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Number of jobs per handler name and status."""
+        counts: Dict[str, Dict[str, int]] = {}
+        for row in self.collection.aggregate([
+            {'$group': {'_id': {'name': '$name', 'status': '$status'}, 'count': {'$sum': 1}}},
+        ]):
+            counts.setdefault(row['_id']['name'], {})[row['_id']['status']] = row['count']
+        return counts
+
+    def dead_jobs(self, limit: int = 50) -> List[dict]:
+        return [_public(job) for job in self.collection.find({'status': 'dead'}, {'payload': 0})
+                .sort('finished_at', -1).limit(limit)]
+
+    def retry_job(self, job_id: str) -> bool:
+        """Give a dead job a fresh set of attempts."""
+        now = _now()
+        result = self.collection.update_one(
+            {'_id': ObjectId(job_id), 'status': 'dead'},
+            {'$set': {'status': 'queued', 'attempts': 0, 'run_at': now, 'finished_at': None, 'updated_at': now},
+             '$unset': {'expires_at': ''}},
+        )
+        return result.modified_count == 1
+
+
+class JobWorker:
+    """Claims and runs jobs on ``concurrency`` threads until stopped."""
+
+    def __init__(self, queue: JobQueue, concurrency: int = 1, names: Optional[Iterable[str]] = None,
+                 poll_interval: float = JOB_POLL_INTERVAL):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.names = list(names) if names is not None else None
+        self.poll_interval = poll_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.stats = {'processed': 0, 'succeeded': 0, 'retried': 0, 'dead': 0, 'lost_leases': 0}
+
+    def run_once(self) -> bool:
+        """Claim and run one job; False when none was ready."""
+        # Only claim jobs this process can run
+        names = self.names if self.names is not None else registered_handlers()
+        if not names:
+            return False
+        job = self.queue.claim(self.worker_id, names)
+        if job is None:
+            return False
+        self._run(job)
+        return True
+
+    def _run(self, job: dict):
+        handler = _handlers.get(job['name'])
+        if job['attempts'] > job.get('max_attempts', self.queue.max_attempts):
+            # Claimed again after its last lease expired: the worker died mid-run
+            self._settle_failure(job, 'lease expired on the last attempt')
+            return
+        if handler is None:
+            self._settle_failure(job, f"no handler registered for {job['name']}")
+            return
+
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, stop_heartbeat), daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(job.get('payload') or {})
+        except Exception as e:
+            stop_heartbeat.set()
+            logger.error(f"❌ Job {job['_id']} ({job['name']}) attempt {job['attempts']} failed: {e}")
+            self._settle_failure(job, str(e))
+            return
+        stop_heartbeat.set()
+        self.stats['processed'] += 1
+        if self.queue.complete(job, result if isinstance(result, (dict, list, str, int, float, bool)) else None):
+            self.stats['succeeded'] += 1
+        else:
+            self.stats['lost_leases'] += 1
+            logger.warning(f"⚠️ Job {job['_id']} finished after its lease moved to another worker")
+
+    def _settle_failure(self, job: dict, error: str):
+        self.stats['processed'] += 1
+        status = self.queue.fail(job, error)
+        self.stats['dead' if status == 'dead' else 'retried'] += 1
+        if status == 'dead':
+            logger.error(f"☠️ Job {job['_id']} ({job['name']}) dead-lettered after {job['attempts']} attempts: {error}")
+
+    def _heartbeat(self, job: dict, stop: threading.Event):
+        while not stop.wait(self.queue.visibility_timeout / 3):
+            try:
+                if not self.queue.extend_lease(job):
+                    return
+            except Exception as e:
+                logger.warning(f"⚠️ Lease renewal failed for job {job['_id']}: {e}")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if not self.run_once():
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                logger.error(f"❌ Job worker error: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"🚀 Job worker {self.worker_id} started with {self.concurrency} threads")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop claiming; running jobs finish (or their leases expire) within ``timeout``."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        finally:
+            self.stop(timeout=self.queue.visibility_timeout)
+
+
+job_queue = JobQueue()
+
+_embedded_worker: Optional[JobWorker] = None
+_embedded_pid = None
+_embedded_lock = threading.Lock()
+
+
+def ensure_embedded_worker():
+    """Start this process's job consumer threads, once per process (after the gunicorn fork)."""
+    global _embedded_worker, _embedded_pid
+    if _embedded_pid == os.getpid() or not JOB_QUEUE_ENABLED or JOB_QUEUE_EMBEDDED_WORKERS <= 0:
+        return
+    with _embedded_lock:
+        if _embedded_pid == os.getpid():
+            return
+        _embedded_pid = os.getpid()
+        _embedded_worker = JobWorker(job_queue, concurrency=JOB_QUEUE_EMBEDDED_WORKERS)
+        _embedded_worker.start()
+
+
+def embedded_worker_stats() -> Optional[dict]:
+    if _embedded_worker is None or _embedded_pid != os.getpid():
+        return None
+    return {'worker_id': _embedded_worker.worker_id, 'concurrency': _embedded_worker.concurrency,
+            **_embedded_worker.stats}
@@ -479,8 +479,15 @@ class LogAnalyticsEngine:
 # Global analytics engine instance
 analytics_engine = LogAnalyticsEngine()
 
+# Request metrics come from utils.request_metrics; re-parsing the log files
+# every 30 seconds is only needed for logs written by other processes
+LOG_ANALYTICS_ENABLED = os.getenv('LOG_ANALYTICS_ENABLED', 'false').lower() == 'true'
+
 def start_log_analytics():
-    """Start the log analytics system"""
+    """Start the log analytics system (when LOG_ANALYTICS_ENABLED is set)"""
+    if not LOG_ANALYTICS_ENABLED:
+        logger.info("📊 Log analytics disabled; request metrics are recorded in-process")
+        return
     analytics_engine.start_monitoring()
 
 def stop_log_analytics():
@@ -0,0 +1,281 @@
+"""
+Cross-worker metrics aggregation.
+
+Every gunicorn worker keeps its metrics in process memory, so a dashboard
+request only saw the worker that served it. Each worker now publishes a
+snapshot of its registered providers every ``METRICS_PUBLISH_INTERVAL``
+seconds to a store shared by all workers on the host:
+
+* Redis (hash ``<prefix>:snapshots``) when ``METRICS_REDIS_URL`` or
+  ``REDIS_URL`` is set, which also covers several hosts;
+* otherwise a SQLite file under ``/dev/shm`` (``METRICS_STORE_PATH``).
+
+Readers get one snapshot per worker and merge them:
+
+    register_provider('requests', metrics_recorder.snapshot)
+    snapshots = metrics_aggregator.collect('requests')   # this worker's is fresh
+    view = MetricsView(s['data']['requests'] for s in snapshots)
+
+A worker counts as live while its snapshot is younger than
+``METRICS_STALE_AFTER``. Snapshots of exited workers (recycled by
+``max_requests``) are kept for ``METRICS_RETAIN_SECONDS`` so that their
+requests stay in the day's totals; ``collect(live_only=True)`` skips them.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+METRICS_PUBLISH_INTERVAL = float(os.getenv('METRICS_PUBLISH_INTERVAL', '5'))
+METRICS_STALE_AFTER = float(os.getenv('METRICS_STALE_AFTER', str(METRICS_PUBLISH_INTERVAL * 3)))
+METRICS_RETAIN_SECONDS = float(os.getenv('METRICS_RETAIN_SECONDS', '86400'))
+METRICS_MAX_RETIRED = int(os.getenv('METRICS_MAX_RETIRED', '50'))
+METRICS_REDIS_URL = os.getenv('METRICS_REDIS_URL') or os.getenv('REDIS_URL')
+METRICS_KEY_PREFIX = os.getenv('METRICS_KEY_PREFIX', 'metrics')
+METRICS_AGGREGATION_ENABLED = os.getenv('METRICS_AGGREGATION_ENABLED', 'true').lower() == 'true'
+
+
+def _default_store_path() -> str:
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'versant_metrics.sqlite')
+
+
+METRICS_STORE_PATH = os.getenv('METRICS_STORE_PATH') or _default_store_path()
+
+_providers: Dict[str, Callable[[], Any]] = {}
+
+
+def register_provider(name: str, provider: Callable[[], Any]):
+    """Include ``provider()`` (JSON-serializable) in this worker's snapshot."""
+    _providers[name] = provider
+
+
+class SQLiteSnapshotStore:
+    """One row per worker in a SQLite file shared by the workers of this host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._initialized = False
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process; sqlite connections do not survive fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            if not self._initialized:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS snapshots ('
+                    'worker TEXT PRIMARY KEY, updated_at REAL NOT NULL, payload TEXT NOT NULL)'
+                )
+                self._initialized = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def publish(self, worker: str, updated_at: float, payload: str):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO snapshots (worker, updated_at, payload) VALUES (?, ?, ?)',
+            (worker, updated_at, payload),
+        )
+
+    def load(self) -> List[tuple]:
+        return self._connection().execute('SELECT worker, updated_at, payload FROM snapshots').fetchall()
+
+    def delete(self, workers: List[str]):
+        if workers:
+            self._connection().executemany('DELETE FROM snapshots WHERE worker = ?', [(w,) for w in workers])
+
+
+class RedisSnapshotStore:
+    """One hash field per worker; readers see every host publishing to the same Redis."""
+
+    def __init__(self, url: str, prefix: str):
+        import redis
+
+        self.client = redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+        self.key = f'{prefix}:snapshots'
+
+    def publish(self, worker: str, updated_at: float, payload: str):
+        self.client.hset(self.key, worker, json.dumps({'updated_at': updated_at, 'payload': payload}))
+
+    def load(self) -> List[tuple]:
+        rows = []
+        for worker, value in self.client.hgetall(self.key).items():
+            entry = json.loads(value)
+            rows.append((worker.decode() if isinstance(worker, bytes) else worker, entry['updated_at'], entry['payload']))
+        return rows
+
+    def delete(self, workers: List[str]):
+        if workers:
+            self.client.hdel(self.key, *workers)
+
+
+def _create_store():
+    if METRICS_REDIS_URL:
+        try:
+            store = RedisSnapshotStore(METRICS_REDIS_URL, METRICS_KEY_PREFIX)
+            store.client.ping()
+            return store
+        except Exception as e:
+            logger.warning(f'Metrics Redis store unavailable ({e}); using {METRICS_STORE_PATH}')
+    return SQLiteSnapshotStore(METRICS_STORE_PATH)
+
+
+class MetricsAggregator:
+    """Publishes this worker's snapshot and merges everybody's on read."""
+
+    def __init__(self, interval: float = METRICS_PUBLISH_INTERVAL):
+        self.interval = interval
+        self.enabled = METRICS_AGGREGATION_ENABLED
+        self.hostname = socket.gethostname()
+        self.started_at = time.time()
+        self._store = None
+        self._store_lock = threading.Lock()
+        self._publisher_pid: Optional[int] = None
+        self.publish_errors = 0
+
+    @property
+    def worker_id(self) -> str:
+        # started_at keeps a recycled worker that reuses a pid apart from its predecessor
+        return f'{self.hostname}:{os.getpid()}:{int(self.started_at)}'
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    self._store = _create_store()
+        return self._store
+
+    def local_snapshot(self) -> dict:
+        data = {}
+        for name, provider in list(_providers.items()):
+            try:
+                data[name] = provider()
+            except Exception as e:
+                logger.debug(f'Metrics provider {name} failed: {e}')
+        return {
+            'worker': self.worker_id,
+            'host': self.hostname,
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'updated_at': time.time(),
+            'data': data,
+        }
+
+    def publish(self, snapshot: Optional[dict] = None) -> dict:
+        snapshot = snapshot or self.local_snapshot()
+        if self.enabled:
+            try:
+                self.store.publish(snapshot['worker'], snapshot['updated_at'], json.dumps(snapshot, default=str))
+            except Exception as e:
+                self.publish_errors += 1
+                logger.warning(f'Publishing metrics snapshot failed: {e}')
+        return snapshot
+
+    def ensure_publisher(self):
+        """Start the publisher thread once per worker process (cheap to call per request)."""
+        if self._publisher_pid == os.getpid() or not self.enabled:
+            return
+        with self._store_lock:
+            if self._publisher_pid == os.getpid():
+                return
+            # First request of this worker process (possibly forked after the import)
+            self.started_at = time.time()
+            self._store = None
+            self._publisher_pid = os.getpid()
+        threading.Thread(target=self._publish_loop, name='metrics-publisher', daemon=True).start()
+
+    def _publish_loop(self):
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                logger.warning(f'Metrics publisher error: {e}')
+            time.sleep(self.interval)
+
+    def collect(self, provider: Optional[str] = None, live_only: bool = False) -> List[dict]:
+        """
+        Snapshots of every worker, this one freshly taken, oldest first.
+
+        With ``provider`` set, snapshots lacking it are skipped. Falls back to
+        this worker alone when the store cannot be read.
+        """
+        local = self.publish()
+        snapshots = {local['worker']: local}
+        if self.enabled:
+            try:
+                snapshots.update(self._load_others(local['worker']))
+            except Exception as e:
+                logger.warning(f'Reading metrics snapshots failed: {e}')
+        now = time.time()
+        result = []
+        for snapshot in sorted(snapshots.values(), key=lambda s: s['started_at']):
+            snapshot['live'] = now - snapshot['updated_at'] <= METRICS_STALE_AFTER
+            if live_only and not snapshot['live']:
+                continue
+            if provider is not None and provider not in snapshot['data']:
+                continue
+            result.append(snapshot)
+        return result
+
+    def _load_others(self, own_worker: str) -> Dict[str, dict]:
+        now = time.time()
+        others: Dict[str, dict] = {}
+        expired = []
+        for worker, updated_at, payload in self.store.load():
+            if worker == own_worker:
+                continue
+            if now - updated_at > METRICS_RETAIN_SECONDS:
+                expired.append(worker)
+                continue
+            others[worker] = json.loads(payload)
+        retired = sorted(
+            (s for s in others.values() if now - s['updated_at'] > METRICS_STALE_AFTER),
+            key=lambda s: s['updated_at'],
+        )
+        for snapshot in retired[:max(0, len(retired) - METRICS_MAX_RETIRED)]:
+            expired.append(snapshot['worker'])
+            del others[snapshot['worker']]
+        if expired:
+            self.store.delete(expired)
+        return others
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'store': type(self._store).__name__ if self._store is not None else None,
+            'worker': self.worker_id,
+            'providers': sorted(_providers),
+            'publish_interval': self.interval,
+            'publish_errors': self.publish_errors,
+        }
+
+
+metrics_aggregator = MetricsAggregator()
+
+
+def sum_numeric(values: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Field-wise sum of flat dicts; nested dicts are summed recursively, other values dropped."""
+    total: Dict[str, Any] = {}
+    for value in values:
+        for key, item in (value or {}).items():
+            if isinstance(item, bool):
+                continue
+            if isinstance(item, (int, float)):
+                total[key] = total.get(key, 0) + item
+            elif isinstance(item, dict):
+                total[key] = sum_numeric([total.get(key, {}), item])
+    return total
@@ -0,0 +1,442 @@
+"""
+Mongo command profiler.
+
+A pymongo ``CommandListener`` registered globally by
+``utils/connection_manager`` before any client is created, so every command
+the app issues is seen with the driver's own ``duration_micros``:
+
+* per database / command / collection durations go to a ``TimingRecorder``
+  (published as ``mongo_commands`` and exported on ``/metrics``);
+* per *query shape* (the filter / sort / pipeline with every value replaced
+  by ``?``) the profiler keeps counts, failures and a latency histogram;
+* commands slower than ``MONGO_PROFILER_SLOW_MS`` are captured with their
+  shape, never their values;
+* every ``MONGO_PROFILER_EXPLAIN_INTERVAL`` seconds the shapes with the most
+  total time are explained (``queryPlanner`` verbosity, nothing executes)
+  with the last command seen for the shape, and plans with a ``COLLSCAN``
+  are flagged.
+
+The listener only stores references to the command parts it needs and
+queues them; shapes are computed when the queue is drained (on read and by
+the metrics publisher), never on the request path.
+
+Nothing here needs a server: ``observe()`` takes the same data as the
+listener, and explain goes through ``explain_runner(database, command)``,
+so recorded workloads and canned explain output can be replayed offline
+(see ``scripts/profile_mongo_fixture.py``).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from utils.metrics_aggregation import register_provider
+from utils.request_metrics import METRICS_PENDING_LIMIT, LatencyHistogram, TimingRecorder
+
+logger = logging.getLogger(__name__)
+
+MONGO_PROFILER_ENABLED = os.getenv('MONGO_PROFILER_ENABLED', 'true').lower() == 'true'
+MONGO_PROFILER_SLOW_MS = float(os.getenv('MONGO_PROFILER_SLOW_MS', '100'))
+MONGO_PROFILER_SLOW_LIMIT = int(os.getenv('MONGO_PROFILER_SLOW_LIMIT', '200'))
+MONGO_PROFILER_MAX_SHAPES = int(os.getenv('MONGO_PROFILER_MAX_SHAPES', '1000'))
+MONGO_PROFILER_PUBLISH_TOP = int(os.getenv('MONGO_PROFILER_PUBLISH_TOP', '100'))
+MONGO_PROFILER_EXPLAIN_INTERVAL = float(os.getenv('MONGO_PROFILER_EXPLAIN_INTERVAL', '300'))
+MONGO_PROFILER_EXPLAIN_TOP = int(os.getenv('MONGO_PROFILER_EXPLAIN_TOP', '5'))
+MONGO_PROFILER_EXPLAIN_TTL = float(os.getenv('MONGO_PROFILER_EXPLAIN_TTL', '3600'))
+
+# Handshakes, heartbeats and our own explains would only add noise
+IGNORED_COMMANDS = frozenset({
+    'hello', 'ismaster', 'isMaster', 'ping', 'buildinfo', 'buildInfo',
+    'saslStart', 'saslContinue', 'getnonce', 'authenticate', 'endSessions',
+    'explain',
+})
+# Commands whose filter can be explained as a find with the same filter
+FILTER_COMMANDS = frozenset({'find', 'count', 'distinct', 'findAndModify', 'update', 'delete'})
+OTHER_SHAPE = '<other>'
+
+
+def command_collection(command_name: str, command: dict) -> str:
+    """Collection a command targets ('' for database-level commands)."""
+    if command_name == 'getMore':
+        target = command.get('collection')
+    else:
+        target = command.get(command_name)
+    return target if isinstance(target, str) else ''
+
+
+def command_source(command_name: str, command: dict) -> Optional[dict]:
+    """The parts of a command that determine its plan (references, not copies)."""
+    if command_name == 'find':
+        return {'filter': command.get('filter') or {}, 'sort': command.get('sort')}
+    if command_name == 'aggregate':
+        return {'pipeline': command.get('pipeline') or []}
+    if command_name == 'count':
+        return {'filter': command.get('query') or {}}
+    if command_name == 'distinct':
+        return {'filter': command.get('query') or {}, 'key': command.get('key')}
+    if command_name == 'findAndModify':
+        return {'filter': command.get('query') or {}, 'sort': command.get('sort')}
+    if command_name in ('update', 'delete'):
+        statements = command.get('updates' if command_name == 'update' else 'deletes') or []
+        first = statements[0] if statements else {}
+        return {'filter': first.get('q') or {}} if isinstance(first, dict) else None
+    return None
+
+
+def value_shape(value: Any) -> Any:
+    """Replace every literal with '?' and keep field names and operators."""
+    if isinstance(value, dict):
+        return {key: value_shape(value[key]) for key in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [value_shape(item) for item in value]
+        return '?'
+    return '?'
+
+
+def _stage_shape(stage: Any) -> Any:
+    if not isinstance(stage, dict) or len(stage) != 1:
+        return '?'
+    name, body = next(iter(stage.items()))
+    if name == '$match':
+        return {name: value_shape(body)}
+    if name == '$sort':
+        return {name: body}
+    if name in ('$lookup', '$graphLookup', '$unionWith', '$out', '$merge'):
+        target = body.get('from') or body.get('coll') or body.get('into') if isinstance(body, dict) else body
+        return {name: target if isinstance(target, str) else '?'}
+    return name
+
+
+def query_shape(source: Optional[dict]) -> str:
+    """Canonical JSON of a command source with values stripped."""
+    if source is None:
+        return ''
+    if 'pipeline' in source:
+        shape: Any = [_stage_shape(stage) for stage in source['pipeline']]
+    else:
+        shape = {'filter': value_shape(source.get('filter') or {})}
+        if source.get('sort'):
+            shape['sort'] = source['sort']
+        if source.get('key'):
+            shape['key'] = source['key']
+    return json.dumps(shape, separators=(',', ':'), default=str)
+
+
+def shape_id(database: str, command: str, collection: str, shape: str) -> str:
+    digest = hashlib.sha1(f'{database}|{command}|{collection}|{shape}'.encode('utf-8')).hexdigest()
+    return digest[:12]
+
+
+def _winning_plans(document: Any):
+    if isinstance(document, dict):
+        if 'winningPlan' in document:
+            yield document['winningPlan']
+        for value in document.values():
+            yield from _winning_plans(value)
+    elif isinstance(document, list):
+        for item in document:
+            yield from _winning_plans(item)
+
+
+def _plan_stages(plan: Any, stages: List[str], indexes: List[str]):
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        if plan.get('indexName'):
+            indexes.append(plan['indexName'])
+        for key in ('queryPlan', 'inputStage', 'inputStages', 'shards', 'outerStage', 'innerStage'):
+            if key in plan:
+                _plan_stages(plan[key], stages, indexes)
+    elif isinstance(plan, list):
+        for item in plan:
+            _plan_stages(item, stages, indexes)
+
+
+def analyze_plan(explain: dict) -> dict:
+    """Stages and indexes of the winning plan(s) of an explain document."""
+    stages: List[str] = []
+    indexes: List[str] = []
+    for plan in _winning_plans(explain):
+        _plan_stages(plan, stages, indexes)
+    return {
+        'stages': stages,
+        'indexes': sorted(set(indexes)),
+        'collscan': 'COLLSCAN' in stages,
+    }
+
+
+def explain_command(command: str, collection: str, source: dict) -> Optional[dict]:
+    """Explainable command for a sampled source (filters are explained as a find)."""
+    if command == 'aggregate':
+        return {'aggregate': collection, 'pipeline': source['pipeline'], 'cursor': {}}
+    if command in FILTER_COMMANDS:
+        explained = {'find': collection, 'filter': source.get('filter') or {}}
+        if source.get('sort'):
+            explained['sort'] = source['sort']
+        return explained
+    return None
+
+
+def default_explain_runner(database: str, command: dict) -> dict:
+    from utils.connection_manager import get_mongo_client
+
+    return get_mongo_client()[database].command('explain', command, verbosity='queryPlanner')
+
+
+class _ShapeStats:
+    __slots__ = ('database', 'command', 'collection', 'shape', 'count', 'failures',
+                 'total_time', 'max_time', 'buckets', 'sample', 'last_seen', 'explain')
+
+    def __init__(self, database: str, command: str, collection: str, shape: str):
+        self.database = database
+        self.command = command
+        self.collection = collection
+        self.shape = shape
+        self.count = 0
+        self.failures = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets: Dict[int, int] = {}
+        # Last command seen, kept in process memory only for explain
+        self.sample: Optional[dict] = None
+        self.last_seen = 0.0
+        self.explain: Optional[dict] = None
+
+    def as_dict(self) -> dict:
+        return {
+            'shape_id': shape_id(self.database, self.command, self.collection, self.shape),
+            'database': self.database,
+            'command': self.command,
+            'collection': self.collection,
+            'shape': self.shape,
+            'count': self.count,
+            'failures': self.failures,
+            'total_time': self.total_time,
+            'max_time': self.max_time,
+            'histogram': dict(self.buckets),
+            'last_seen': self.last_seen,
+            'explain': self.explain,
+        }
+
+
+class MongoCommandProfiler(monitoring.CommandListener):
+    """Command listener feeding the per-command timings and the per-shape profile."""
+
+    def __init__(self, timings: TimingRecorder,
+                 explain_runner: Callable[[str, dict], dict] = default_explain_runner,
+                 slow_ms: float = MONGO_PROFILER_SLOW_MS,
+                 enabled: bool = MONGO_PROFILER_ENABLED):
+        self.timings = timings
+        self.explain_runner = explain_runner
+        self.slow_seconds = slow_ms / 1000.0
+        self.enabled = enabled
+        # (connection_id, request_id) -> (labels, source), set on start and popped on completion
+        self._inflight: Dict[tuple, Tuple[Tuple[str, str, str], Optional[dict]]] = {}
+        self._pending = deque(maxlen=METRICS_PENDING_LIMIT)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.shapes: Dict[tuple, _ShapeStats] = {}
+        self.slow = deque(maxlen=MONGO_PROFILER_SLOW_LIMIT)
+        self.explain_errors = 0
+        self._explainer_pid: Optional[int] = None
+
+    # -- listener (driver threads, keep cheap) --------------------------------
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        command = event.command
+        self._inflight[(event.connection_id, event.request_id)] = (
+            (event.database_name, event.command_name, command_collection(event.command_name, command)),
+            command_source(event.command_name, command) if self.enabled else None,
+        )
+
+    def succeeded(self, event):
+        entry = self._inflight.pop((event.connection_id, event.request_id), None)
+        if entry is not None:
+            self._record(entry[0], entry[1], event.duration_micros / 1_000_000, False)
+
+    def failed(self, event):
+        entry = self._inflight.pop((event.connection_id, event.request_id), None)
+        if entry is not None:
+            self._record(entry[0], entry[1], event.duration_micros / 1_000_000, True)
+
+    def _record(self, labels: Tuple[str, str, str], source: Optional[dict], seconds: float, failed: bool):
+        self.timings.record(labels, seconds, failed)
+        if not self.enabled:
+            return
+        pending = self._pending
+        if len(pending) == pending.maxlen:
+            self.dropped += 1
+        pending.append((time.time(), labels, source, seconds, failed))
+        if MONGO_PROFILER_EXPLAIN_INTERVAL > 0 and self._explainer_pid != os.getpid():
+            self._start_explainer()
+
+    def observe(self, database: str, command_name: str, command: dict, seconds: float, failed: bool = False):
+        """Record a command without the driver (offline replay, fixtures)."""
+        self._record(
+            (database, command_name, command_collection(command_name, command)),
+            command_source(command_name, command),
+            seconds,
+            failed,
+        )
+
+    # -- aggregation -----------------------------------------------------------
+
+    def flush(self):
+        pending = self._pending
+        with self.lock:
+            while True:
+                try:
+                    timestamp, labels, source, seconds, failed = pending.popleft()
+                except IndexError:
+                    break
+                self._apply(timestamp, labels, source, seconds, failed)
+
+    def _apply(self, timestamp: float, labels: Tuple[str, str, str], source: Optional[dict],
+               seconds: float, failed: bool):
+        database, command, collection = labels
+        shape = query_shape(source)
+        key = (database, command, collection, shape)
+        stats = self.shapes.get(key)
+        if stats is None:
+            if len(self.shapes) >= MONGO_PROFILER_MAX_SHAPES:
+                shape = OTHER_SHAPE
+                key = (database, command, collection, shape)
+                stats = self.shapes.get(key)
+            if stats is None:
+                stats = self.shapes[key] = _ShapeStats(database, command, collection, shape)
+        stats.count += 1
+        stats.failures += failed
+        stats.total_time += seconds
+        stats.max_time = max(stats.max_time, seconds)
+        index = LatencyHistogram.index_of(seconds)
+        stats.buckets[index] = stats.buckets.get(index, 0) + 1
+        stats.last_seen = timestamp
+        if source is not None and shape != OTHER_SHAPE:
+            stats.sample = source
+        if seconds >= self.slow_seconds:
+            self.slow.append({
+                'timestamp': timestamp,
+                'database': database,
+                'command': command,
+                'collection': collection,
+                'shape': shape,
+                'shape_id': shape_id(database, command, collection, shape),
+                'duration_ms': round(seconds * 1000, 3),
+                'failed': failed,
+            })
+
+    def snapshot(self, top: int = MONGO_PROFILER_PUBLISH_TOP) -> dict:
+        """The ``top`` shapes by total time plus slow commands, JSON-friendly and mergeable."""
+        self.flush()
+        with self.lock:
+            shapes = sorted(self.shapes.values(), key=lambda s: s.total_time, reverse=True)[:top]
+            return {
+                'enabled': self.enabled,
+                'slow_ms': self.slow_seconds * 1000,
+                'dropped': self.dropped,
+                'tracked_shapes': len(self.shapes),
+                'explain_errors': self.explain_errors,
+                'shapes': [stats.as_dict() for stats in shapes],
+                'slow': list(self.slow),
+            }
+
+    # -- explain sampling --------------------------------------------------------
+
+    def _start_explainer(self):
+        with self.lock:
+            if self._explainer_pid == os.getpid():
+                return
+            self._explainer_pid = os.getpid()
+        threading.Thread(target=self._explain_loop, name='mongo-explain-sampler', daemon=True).start()
+
+    def _explain_loop(self):
+        while True:
+            time.sleep(MONGO_PROFILER_EXPLAIN_INTERVAL)
+            try:
+                self.sample_explains()
+            except Exception as e:
+                logger.warning(f'Mongo explain sampling failed: {e}')
+
+    def sample_explains(self, top: int = MONGO_PROFILER_EXPLAIN_TOP, force: bool = False) -> List[dict]:
+        """Explain the ``top`` costliest shapes whose plan is unknown or older than the TTL (any plan with ``force``)."""
+        self.flush()
+        now = time.time()
+        with self.lock:
+            candidates = [
+                stats for stats in sorted(self.shapes.values(), key=lambda s: s.total_time, reverse=True)
+                if stats.sample is not None
+                and explain_command(stats.command, stats.collection, stats.sample) is not None
+                and (force or stats.explain is None or now - stats.explain['explained_at'] > MONGO_PROFILER_EXPLAIN_TTL)
+            ][:top]
+            jobs = [(stats, explain_command(stats.command, stats.collection, stats.sample)) for stats in candidates]
+        results = []
+        for stats, command in jobs:
+            try:
+                plan = analyze_plan(self.explain_runner(stats.database, command))
+            except Exception as e:
+                self.explain_errors += 1
+                plan = {'error': str(e)}
+            plan['explained_at'] = now
+            stats.explain = plan
+            if plan.get('collscan'):
+                logger.warning(
+                    f'🐢 COLLSCAN on {stats.database}.{stats.collection} ({stats.command}) '
+                    f'shape {stats.shape} - {stats.count} calls, {stats.total_time:.2f}s total'
+                )
+            results.append(stats.as_dict())
+        return results
+
+    def reset(self):
+        with self.lock:
+            self._pending.clear()
+            self.shapes.clear()
+            self.slow.clear()
+            self.dropped = 0
+
+
+def merge_profiles(snapshots: List[dict]) -> Dict[str, Any]:
+    """Merge per-worker profiler snapshots into shapes (keyed by shape id) and slow commands."""
+    shapes: Dict[str, dict] = {}
+    slow: List[dict] = []
+    for snapshot in snapshots:
+        for entry in snapshot.get('shapes', []):
+            key = entry['shape_id']
+            merged = shapes.get(key)
+            histogram = LatencyHistogram.from_sparse(entry['histogram'])
+            if merged is None:
+                shapes[key] = {**entry, 'histogram': histogram}
+                continue
+            merged['count'] += entry['count']
+            merged['failures'] += entry['failures']
+            merged['total_time'] += entry['total_time']
+            merged['max_time'] = max(merged['max_time'], entry['max_time'])
+            merged['last_seen'] = max(merged['last_seen'], entry['last_seen'])
+            merged['histogram'].merge(histogram)
+            if entry.get('explain') and (
+                not merged.get('explain') or entry['explain']['explained_at'] > merged['explain']['explained_at']
+            ):
+                merged['explain'] = entry['explain']
+        slow.extend(snapshot.get('slow', []))
+    for entry in shapes.values():
+        histogram = entry.pop('histogram')
+        entry.update(histogram.percentiles())
+        entry['avg_time'] = entry['total_time'] / entry['count'] if entry['count'] else 0.0
+    slow.sort(key=lambda e: e['timestamp'], reverse=True)
+    return {'shapes': shapes, 'slow': slow}
+
+
+mongo_command_timings = TimingRecorder()
+mongo_profiler = MongoCommandProfiler(mongo_command_timings)
+register_provider('mongo_commands', mongo_command_timings.snapshot)
+register_provider('mongo_profile', mongo_profiler.snapshot)
@@ -1,13 +1,16 @@
-"""Read-only MySQL RDS connection manager."""
+"""Read-only MySQL RDS connection pool."""
 import logging
 import re
 import threading
 import time
+from contextlib import contextmanager
 
 import pymysql
 from pymysql.cursors import DictCursor
 
 from config.mysql_rds import MySQLRDSConfig
+from utils.metrics_aggregation import register_provider
+from utils.request_metrics import TimingRecorder
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +18,17 @@ _WRITE_PATTERN = re.compile(
     r'^\s*(INSERT|UPDATE|DELETE|REPLACE|DROP|CREATE|ALTER|TRUNCATE|GRANT|REVOKE|CALL)\b',
     re.IGNORECASE,
 )
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)', re.IGNORECASE)
+
+# Query durations per (statement, table), published as ``rds_queries``
+rds_query_timings = TimingRecorder()
+
+
+def _query_labels(query) -> tuple:
+    text = query if isinstance(query, str) else ''
+    words = text.split(None, 1)
+    table = _TABLE_PATTERN.search(text)
+    return (words[0].upper() if words else '', table.group(1) if table else '')
 
 
 class ReadOnlyCursor(DictCursor):
@@ -25,17 +39,53 @@ class ReadOnlyCursor(DictCursor):
             raise PermissionError(
                 'RDS organization database is read-only. Write operations are not permitted.'
             )
-        return super().execute(query, args)
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, args)
+            failed = False
+            return result
+        finally:
+            rds_query_timings.record(_query_labels(query), time.perf_counter() - start, failed)
 
     def executemany(self, query, args):
         if MySQLRDSConfig.READ_ONLY and _WRITE_PATTERN.match(query or ''):
             raise PermissionError(
                 'RDS organization database is read-only. Write operations are not permitted.'
             )
+        # pymysql runs each statement (or multi-row INSERT chunk) through execute(), which times it
         return super().executemany(query, args)
 
 
+class _PooledConnection:
+    """A pymysql connection plus the bookkeeping the pool needs."""
+
+    __slots__ = ('raw', 'created_at', 'last_used')
+
+    def __init__(self, raw):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used = now
+
+    def close(self):
+        try:
+            self.raw.close()
+        except Exception:
+            pass
+
+
 class MySQLRDSManager:
+    """
+    Bounded pool of read-only RDS connections.
+
+    Each thread borrows its own connection for the duration of a ``with``
+    block, so concurrent requests never share a socket. Connections are
+    pinged on borrow when they have been idle, recycled after
+    ``POOL_MAX_LIFETIME`` seconds and reaped after ``POOL_MAX_IDLE`` seconds
+    without use.
+    """
+
     _instance = None
     _lock = threading.Lock()
 
@@ -50,36 +100,164 @@ class MySQLRDSManager:
     def __init__(self):
         if self._initialized:
             return
-        self._connection = None
-        self._last_used = 0.0
-        self._conn_lock = threading.Lock()
+        self._idle: list[_PooledConnection] = []
+        self._in_use = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            'borrows': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'closed': 0,
+            'health_check_failures': 0,
+            'recycled': 0,
+            'reaped': 0,
+        }
         self._initialized = True
 
-    def _connect(self):
+    @property
+    def max_size(self) -> int:
+        return max(1, MySQLRDSConfig.POOL_SIZE)
+
+    def _connect(self) -> _PooledConnection:
         kwargs = MySQLRDSConfig.connection_kwargs()
         kwargs['cursorclass'] = ReadOnlyCursor
-        self._connection = pymysql.connect(**kwargs)
+        # Reads only: autocommit so a pooled connection never holds a stale snapshot
+        kwargs['autocommit'] = True
+        conn = _PooledConnection(pymysql.connect(**kwargs))
+        with self._cond:
+            self._stats['created'] += 1
         logger.info('Connected to AWS RDS MySQL (organization data, read-only=%s)', MySQLRDSConfig.READ_ONLY)
+        return conn
 
-    def get_connection(self):
+    def _discard(self, conn: _PooledConnection, reason: str = 'closed'):
+        conn.close()
+        with self._cond:
+            self._stats['closed'] += 1
+            if reason != 'closed':
+                self._stats[reason] += 1
+
+    def _reap_idle_locked(self, now: float) -> list[_PooledConnection]:
+        """Pop idle connections past max idle/lifetime. Caller holds ``_cond``."""
+        expired = []
+        keep = []
+        for conn in self._idle:
+            if now - conn.last_used > MySQLRDSConfig.POOL_MAX_IDLE:
+                expired.append((conn, 'reaped'))
+            elif now - conn.created_at > MySQLRDSConfig.POOL_MAX_LIFETIME:
+                expired.append((conn, 'recycled'))
+            else:
+                keep.append(conn)
+        self._idle = keep
+        return expired
+
+    def _is_healthy(self, conn: _PooledConnection, now: float) -> bool:
+        if now - conn.last_used < MySQLRDSConfig.POOL_PING_INTERVAL:
+            return True
+        try:
+            conn.raw.ping(reconnect=False)
+            return True
+        except Exception as exc:
+            logger.warning('Discarding unhealthy RDS connection: %s', exc)
+            with self._cond:
+                self._stats['health_check_failures'] += 1
+            return False
+
+    def acquire(self, timeout: float | None = None) -> _PooledConnection:
+        """Borrow a connection, waiting up to ``timeout`` seconds for a free slot."""
         if not MySQLRDSConfig.is_configured():
             raise RuntimeError('MySQL RDS is not configured. Set DB_HOST, DB_USER, DB_NAME in environment.')
 
-        with self._conn_lock:
-            now = time.time()
-            if self._connection is None or (now - self._last_used > 300):
-                if self._connection:
-                    try:
-                        self._connection.close()
-                    except Exception:
-                        pass
-                self._connect()
-            self._last_used = now
-            return self._connection
+        timeout = MySQLRDSConfig.POOL_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+        wait_start = time.monotonic()
+
+        with self._cond:
+            expired = self._reap_idle_locked(time.monotonic())
+            conn = None
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise TimeoutError(
+                        f'Timed out after {timeout}s waiting for an RDS connection '
+                        f'(pool size {self.max_size})'
+                    )
+                waited = True
+                self._cond.wait(remaining)
+            if self._idle:
+                conn = self._idle.pop()  # LIFO keeps hot connections hot
+            self._in_use += 1
+            self._stats['borrows'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += time.monotonic() - wait_start
+
+        for stale, reason in expired:
+            self._discard(stale, reason)
 
+        try:
+            if conn is not None and not self._is_healthy(conn, time.monotonic()):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+            conn.last_used = time.monotonic()
+            return conn
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: _PooledConnection, discard: bool = False):
+        """Return a borrowed connection; broken connections are closed instead."""
+        now = time.monotonic()
+        recycle = discard or not conn.raw.open or now - conn.created_at > MySQLRDSConfig.POOL_MAX_LIFETIME
+        if recycle:
+            self._discard(conn, 'closed' if discard else 'recycled')
+        with self._cond:
+            self._in_use -= 1
+            if not recycle:
+                conn.last_used = now
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        failed = False
+        try:
+            yield conn.raw
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            failed = True
+            raise
+        finally:
+            self.release(conn, discard=failed)
+
+    @contextmanager
     def cursor(self):
-        conn = self.get_connection()
-        return conn.cursor()
+        """Borrow a connection and yield a cursor on it; both are returned on exit."""
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                yield cur
+
+    def pool_stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'size': self._in_use + len(self._idle),
+            })
+        stats['avg_wait_ms'] = (
+            round(stats['wait_time_total'] / stats['waits'] * 1000, 2) if stats['waits'] else 0.0
+        )
+        stats['wait_time_total'] = round(stats['wait_time_total'], 3)
+        return stats
 
     def health_check(self) -> dict:
         if not MySQLRDSConfig.is_configured():
@@ -93,18 +271,18 @@ class MySQLRDSManager:
                 'host': MySQLRDSConfig.HOST,
                 'database': MySQLRDSConfig.DATABASE,
                 'read_only': MySQLRDSConfig.READ_ONLY,
+                'pool': self.pool_stats(),
             }
         except Exception as exc:
-            return {'status': 'unhealthy', 'message': str(exc)}
+            return {'status': 'unhealthy', 'message': str(exc), 'pool': self.pool_stats()}
 
     def close(self):
-        with self._conn_lock:
-            if self._connection:
-                try:
-                    self._connection.close()
-                except Exception:
-                    pass
-                self._connection = None
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
 
 
 mysql_rds = MySQLRDSManager()
+register_provider('rds_queries', rds_query_timings.snapshot)
+register_provider('rds_pool', mysql_rds.pool_stats)
@@ -1,21 +1,39 @@
 #!/usr/bin/env python3
 """
 Notification Queue System - Background SMS and Email Processing
-Uses existing async processor for non-blocking notifications
+Notifications are stored as durable jobs (utils.job_queue) so that a worker
+recycle or deploy does not drop them; the in-process background executor
+is the fallback when the job queue is disabled or unreachable.
 """
 
 import logging
 import time
+from functools import partial
 from typing import Dict, List, Optional, Any
 from utils.async_processor import submit_background_task
+from utils.background_executor import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+from utils.job_queue import JOB_QUEUE_ENABLED, ensure_embedded_worker, job_handler, job_queue
 from utils.smart_worker_manager import run_background_task_with_tracking
 from utils.email_service import send_email, render_template
 from utils.sms_service import send_student_credentials_sms, send_custom_sms
+from utils.sms_dispatcher import delivery_tracker
 from utils.resilient_services import create_resilient_services
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Credentials go out before announcements, announcements before reminders
+SMS_PRIORITIES = {
+    'student_credentials': PRIORITY_HIGH,
+    'test_notification': PRIORITY_NORMAL,
+    'test_reminder': PRIORITY_LOW,
+}
+EMAIL_TEMPLATE_PRIORITIES = {
+    'student_credentials.html': PRIORITY_HIGH,
+    'test_notification.html': PRIORITY_NORMAL,
+    'test_reminder.html': PRIORITY_LOW,
+}
+
 class NotificationQueue:
     """Background notification queue using existing async system"""
     
@@ -33,15 +51,35 @@ class NotificationQueue:
             'email_failed': 0
         }
     
+    def _submit_tracked(self, func, job_name: str, task_type: str, description: str, estimated_duration: int,
+                        priority: int, idempotency_key: str = None, **kwargs) -> str:
+        """Queue ``func`` as a durable job, else on the background executor; it runs with smart worker tracking"""
+        if JOB_QUEUE_ENABLED:
+            try:
+                job_id = job_queue.enqueue(job_name, kwargs, priority=priority, idempotency_key=idempotency_key)
+                ensure_embedded_worker()
+                return job_id
+            except Exception as e:
+                logger.warning(f"⚠️ Job queue unavailable, running {task_type} in process: {e}")
+        return submit_background_task(
+            partial(run_background_task_with_tracking, func, task_type, description, estimated_duration, **kwargs),
+            task_type=task_type,
+            priority=priority
+        )
+    
     def queue_sms_notification(self, phone: str, message: str, notification_type: str = 'custom', 
-                             student_name: str = None, username: str = None, password: str = None) -> str:
+                             student_name: str = None, username: str = None, password: str = None,
+                             priority: int = None, idempotency_key: str = None) -> str:
         """Queue SMS notification for background processing with smart worker tracking"""
         try:
-            task_id = run_background_task_with_tracking(
+            task_id = self._submit_tracked(
                 self._process_sms_notification,
+                job_name='notification.sms',
                 task_type='sms_notification',
                 description=f'SMS to {phone} ({notification_type})',
                 estimated_duration=5,  # 5 seconds for SMS
+                priority=SMS_PRIORITIES.get(notification_type, PRIORITY_NORMAL) if priority is None else priority,
+                idempotency_key=idempotency_key,
                 phone=phone,
                 message=message,
                 notification_type=notification_type,
@@ -61,14 +99,18 @@ class NotificationQueue:
             return None
     
     def queue_email_notification(self, email: str, subject: str, content: str, 
-                                template_name: str = None, template_params: Dict = None) -> str:
+                                template_name: str = None, template_params: Dict = None,
+                                priority: int = None, idempotency_key: str = None) -> str:
         """Queue email notification for background processing with smart worker tracking"""
         try:
-            task_id = run_background_task_with_tracking(
+            task_id = self._submit_tracked(
                 self._process_email_notification,
+                job_name='notification.email',
                 task_type='email_notification',
                 description=f'Email to {email} ({subject})',
                 estimated_duration=10,  # 10 seconds for email
+                priority=EMAIL_TEMPLATE_PRIORITIES.get(template_name, PRIORITY_NORMAL) if priority is None else priority,
+                idempotency_key=idempotency_key,
                 email=email,
                 subject=subject,
                 content=content,
@@ -176,7 +218,7 @@ class NotificationQueue:
     
     def _process_sms_notification(self, phone: str, message: str, notification_type: str = 'custom',
                                  student_name: str = None, username: str = None, password: str = None):
-        """Process SMS notification in background"""
+        """Process SMS notification in background; returns whether it was sent"""
         try:
             logger.info(f"📱 Processing SMS for {phone} (Type: {notification_type})")
             
@@ -196,7 +238,9 @@ class NotificationQueue:
             if result.get('success', False):
                 self.queue_stats['total_processed'] += 1
                 self.queue_stats['sms_processed'] += 1
+                delivery_tracker.record_result(phone, notification_type, result)
                 logger.info(f"✅ SMS sent successfully to {phone}")
+                return True
             else:
                 self.queue_stats['total_failed'] += 1
                 self.queue_stats['sms_failed'] += 1
@@ -206,10 +250,11 @@ class NotificationQueue:
             self.queue_stats['total_failed'] += 1
             self.queue_stats['sms_failed'] += 1
             logger.error(f"❌ SMS processing error for {phone}: {e}")
+        return False
     
     def _process_email_notification(self, email: str, subject: str, content: str,
                                    template_name: str = None, template_params: Dict = None):
-        """Process email notification in background"""
+        """Process email notification in background; returns whether it was sent"""
         try:
             logger.info(f"📧 Processing email for {email}")
             
@@ -232,6 +277,7 @@ class NotificationQueue:
                 self.queue_stats['total_processed'] += 1
                 self.queue_stats['email_processed'] += 1
                 logger.info(f"✅ Email sent successfully to {email}")
+                return True
             else:
                 self.queue_stats['total_failed'] += 1
                 self.queue_stats['email_failed'] += 1
@@ -241,6 +287,7 @@ class NotificationQueue:
             self.queue_stats['total_failed'] += 1
             self.queue_stats['email_failed'] += 1
             logger.error(f"❌ Email processing error for {email}: {e}")
+        return False
     
     def get_queue_stats(self) -> Dict:
         """Get current queue statistics"""
@@ -268,6 +315,27 @@ class NotificationQueue:
 # Global notification queue instance
 notification_queue = NotificationQueue()
 
+# Durable job handlers: a send that fails raises so the job queue retries it
+@job_handler('notification.sms')
+def _sms_job(payload: Dict) -> Dict:
+    sent = run_background_task_with_tracking(
+        notification_queue._process_sms_notification, 'sms_notification',
+        f"SMS to {payload.get('phone')} ({payload.get('notification_type')})", 5, **payload
+    )
+    if not sent:
+        raise RuntimeError(f"SMS to {payload.get('phone')} was not sent")
+    return {'sent': True}
+
+@job_handler('notification.email')
+def _email_job(payload: Dict) -> Dict:
+    sent = run_background_task_with_tracking(
+        notification_queue._process_email_notification, 'email_notification',
+        f"Email to {payload.get('email')} ({payload.get('subject')})", 10, **payload
+    )
+    if not sent:
+        raise RuntimeError(f"Email to {payload.get('email')} was not sent")
+    return {'sent': True}
+
 # Convenience functions for easy import
 def queue_sms(phone: str, message: str, notification_type: str = 'custom', **kwargs) -> str:
     """Queue SMS notification"""
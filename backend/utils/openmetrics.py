@@ -0,0 +1,266 @@
+"""
+OpenMetrics exposition of the cross-worker metrics snapshots.
+
+``render_openmetrics()`` merges the snapshot of every gunicorn worker
+(see ``utils.metrics_aggregation``) and writes them in the OpenMetrics text
+format, so one scrape of ``/metrics`` covers the whole deployment:
+
+* ``<ns>_http_request_duration_seconds`` per blueprint / endpoint / route,
+  from the request recorder installed by ``create_app``;
+* ``<ns>_mongo_command_duration_seconds`` per database / command /
+  collection, from the pymongo command listener;
+* ``<ns>_rds_query_duration_seconds`` per statement / table;
+* ``<ns>_background_task_duration_seconds`` and queue wait per task type;
+* gauges for bcrypt admission, Socket.IO connections, background queues,
+  cache and the process of each live worker.
+
+Histograms are derived from the log-linear latency histograms, so bucket
+boundaries can change without touching the recorders. Counters include
+the snapshots of recycled workers while they are retained
+(``METRICS_RETAIN_SECONDS``), so their totals drop (a counter reset for
+Prometheus) when an old snapshot expires.
+"""
+from __future__ import annotations
+
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.metrics_aggregation import metrics_aggregator
+from utils.request_metrics import LatencyHistogram, MetricsView, merge_timings
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', 'versant')
+LATENCY_BUCKETS = tuple(
+    float(bound) for bound in os.getenv(
+        'METRICS_LATENCY_BUCKETS',
+        '0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30',
+    ).split(',')
+)
+# Requests that matched no route are keyed by path; fold them into one series
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(int(value))
+
+
+class OpenMetricsWriter:
+    """Accumulates metric families and renders them in exposition order."""
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE):
+        self.namespace = namespace
+        self.lines: List[str] = []
+
+    def _family(self, name: str, kind: str, help_text: str, unit: Optional[str] = None) -> str:
+        full = f'{self.namespace}_{name}'
+        self.lines.append(f'# TYPE {full} {kind}')
+        if unit:
+            self.lines.append(f'# UNIT {full} {unit}')
+        self.lines.append(f'# HELP {full} {help_text}')
+        return full
+
+    def gauge(self, name: str, help_text: str, samples: Iterable[Tuple[Dict, float]]):
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            return
+        full = self._family(name, 'gauge', help_text)
+        for labels, value in samples:
+            self.lines.append(f'{full}{_labels(labels)} {_number(value)}')
+
+    def counter(self, name: str, help_text: str, samples: Iterable[Tuple[Dict, float]]):
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            return
+        full = self._family(name, 'counter', help_text)
+        for labels, value in samples:
+            self.lines.append(f'{full}_total{_labels(labels)} {_number(value)}')
+
+    def histogram(self, name: str, help_text: str,
+                  samples: Iterable[Tuple[Dict, LatencyHistogram, float]],
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        samples = list(samples)
+        if not samples:
+            return
+        full = self._family(name, 'histogram', help_text, unit='seconds')
+        for labels, histogram, total_time in samples:
+            for bound, count in zip(buckets, histogram.cumulative_counts(buckets)):
+                self.lines.append(f'{full}_bucket{_labels({**labels, "le": bound})} {count}')
+            self.lines.append(f'{full}_bucket{_labels({**labels, "le": "+Inf"})} {histogram.total}')
+            self.lines.append(f'{full}_count{_labels(labels)} {histogram.total}')
+            self.lines.append(f'{full}_sum{_labels(labels)} {_number(float(total_time))}')
+
+    def render(self) -> str:
+        return '\n'.join(self.lines + ['# EOF']) + '\n'
+
+
+def _endpoint_labels(endpoint: str, routes: Dict[str, str]) -> Dict[str, str]:
+    return {'blueprint': endpoint.rpartition('.')[0], 'endpoint': endpoint, 'route': routes.get(endpoint, '')}
+
+
+def _write_requests(writer: OpenMetricsWriter, view: MetricsView, routes: Dict[str, str]):
+    histograms: Dict[str, LatencyHistogram] = {}
+    totals: Dict[str, list] = {}
+    for endpoint, histogram in view.histograms.items():
+        key = UNMATCHED_ENDPOINT if endpoint.startswith('/') else endpoint
+        if key in histograms:
+            histograms[key].merge(histogram)
+            for index, value in enumerate(view.totals[endpoint]):
+                totals[key][index] += value
+        else:
+            merged = LatencyHistogram()
+            merged.merge(histogram)
+            histograms[key] = merged
+            totals[key] = list(view.totals[endpoint])
+
+    writer.histogram(
+        'http_request_duration_seconds', 'Request latency per route.',
+        ((_endpoint_labels(key, routes), histograms[key], totals[key][2]) for key in sorted(histograms)),
+    )
+    writer.counter(
+        'http_request_errors', 'Requests answered with a 4xx/5xx status or an error.',
+        ((_endpoint_labels(key, routes), totals[key][1]) for key in sorted(totals)),
+    )
+    writer.counter(
+        'http_response_bytes', 'Response bytes sent per route.',
+        ((_endpoint_labels(key, routes), totals[key][3]) for key in sorted(totals)),
+    )
+    writer.counter(
+        'http_responses', 'Responses per status code.',
+        (({'code': code}, count) for code, count in sorted(view.response_codes.items())),
+    )
+    writer.counter('http_requests_dropped', 'Requests not recorded because the queue was full.', [({}, view.dropped)])
+
+
+def _write_timings(writer: OpenMetricsWriter, name: str, help_text: str, failures_help: str,
+                   label_names: Tuple[str, ...], snapshots):
+    merged = merge_timings(snapshots)
+    ordered = sorted(merged.items())
+    writer.histogram(
+        f'{name}_duration_seconds', help_text,
+        ((dict(zip(label_names, labels)), histogram, total_time) for labels, (_, _, total_time, histogram) in ordered),
+    )
+    writer.counter(
+        f'{name}_failures', failures_help,
+        ((dict(zip(label_names, labels)), failures) for labels, (_, failures, _, _) in ordered),
+    )
+
+
+def _live_values(live: List[dict], provider: str, key: str):
+    return [({'worker': s['worker']}, s['data'].get(provider, {}).get(key)) for s in live]
+
+
+def _sum_live(live: List[dict], provider: str, key: str):
+    values = [s['data'].get(provider, {}).get(key) for s in live]
+    values = [value for value in values if isinstance(value, (int, float))]
+    return sum(values) if values else None
+
+
+def render_openmetrics(routes: Optional[Dict[str, str]] = None) -> str:
+    """
+    Merge every worker's snapshot into one OpenMetrics document.
+
+    ``routes`` maps endpoint names to URL rules (``{rule.endpoint: rule.rule}``)
+    and labels the request histograms with their route.
+    """
+    snapshots = metrics_aggregator.collect()
+    live = [s for s in snapshots if s['live']]
+    writer = OpenMetricsWriter()
+
+    writer.gauge('workers', 'Worker processes publishing metrics.', [({'state': 'live'}, len(live)),
+                                                                   ({'state': 'retired'}, len(snapshots) - len(live))])
+
+    _write_requests(writer, MetricsView(s['data']['requests'] for s in snapshots if 'requests' in s['data']), routes or {})
+    _write_timings(
+        writer, 'mongo_command', 'MongoDB command latency measured by the driver.', 'Failed MongoDB commands.',
+        ('database', 'command', 'collection'),
+        (s['data']['mongo_commands'] for s in snapshots if 'mongo_commands' in s['data']),
+    )
+    _write_timings(
+        writer, 'rds_query', 'RDS MySQL query latency.', 'Failed RDS MySQL queries.',
+        ('statement', 'table'),
+        (s['data']['rds_queries'] for s in snapshots if 'rds_queries' in s['data']),
+    )
+    writer.gauge('mongo_collscan_shapes', 'Sampled query shapes whose winning plan is a collection scan.', [
+        ({'worker': s['worker']}, sum(1 for shape in s['data']['mongo_profile'].get('shapes', [])
+                                      if (shape.get('explain') or {}).get('collscan')))
+        for s in live if 'mongo_profile' in s['data']
+    ])
+
+    # bcrypt admission (login)
+    writer.gauge('bcrypt_inflight', 'Password checks admitted and not finished.', _live_values(live, 'login', 'inflight'))
+    writer.gauge('bcrypt_max_inflight', 'Admission limit of password checks.', _live_values(live, 'login', 'max_inflight'))
+    writer.counter('bcrypt_rejected', 'Password checks refused by admission control.', [
+        ({'reason': 'overload'}, _sum_live(live, 'login', 'rejected_overload')),
+        ({'reason': 'throttled'}, _sum_live(live, 'login', 'rejected_throttled')),
+    ])
+
+    # Socket.IO
+    writer.gauge('socketio_connections', 'Open Socket.IO connections.', _live_values(live, 'socketio', 'connected'))
+    writer.counter('socketio_connects', 'Socket.IO connections accepted.', [({}, _sum_live(live, 'socketio', 'connects'))])
+
+    # Background work
+    background = [(s['worker'], s['data']['background_tasks']) for s in live if 'background_tasks' in s['data']]
+    writer.gauge('background_queue_depth', 'Tasks waiting in the background queue per type.', [
+        ({'worker': worker, 'type': task_type}, counters.get('queued'))
+        for worker, data in background for task_type, counters in data.get('types', {}).items()
+    ])
+    writer.gauge('background_tasks_running', 'Background tasks running per type.', [
+        ({'worker': worker, 'type': task_type}, counters.get('running'))
+        for worker, data in background for task_type, counters in data.get('types', {}).items()
+    ])
+    waits = merge_timings(s['data']['background_tasks'].get('wait', {}) for s in snapshots if 'background_tasks' in s['data'])
+    writer.histogram('background_task_wait_seconds', 'Time background tasks waited in the queue.', (
+        ({'type': labels[0]}, histogram, total_time) for labels, (_, _, total_time, histogram) in sorted(waits.items())
+    ))
+    _write_timings(
+        writer, 'background_task', 'Background task run time.', 'Background tasks that raised.',
+        ('type',),
+        (s['data']['background_tasks'].get('run', {}) for s in snapshots if 'background_tasks' in s['data']),
+    )
+    writer.gauge('background_tasks_active', 'Tracked background tasks per type.', [
+        ({'worker': s['worker'], 'type': task_type}, count)
+        for s in live
+        for task_type, count in (s['data'].get('worker_tasks', {}).get('active_tasks_by_type') or {}).items()
+    ])
+
+    # SMS gateway
+    writer.gauge('sms_requests_inflight', 'SMS gateway requests in flight.', _live_values(live, 'sms', 'inflight'))
+    writer.counter('sms_rate_limited_seconds', 'Time SMS requests waited for the rate limiter.',
+                   [({}, _sum_live(live, 'sms', 'rate_limited_seconds'))])
+    _write_timings(
+        writer, 'sms_request', 'SMS gateway request latency.', 'SMS gateway requests that failed.',
+        ('operation',),
+        (s['data']['sms'].get('requests_timing', {}) for s in snapshots if 'sms' in s['data']),
+    )
+
+    # Pools and cache
+    writer.gauge('mongo_pool_active_connections', 'Connections borrowed from the app-side pool.', _live_values(live, 'database_pool', 'active_connections'))
+    writer.gauge('rds_pool_in_use', 'RDS connections borrowed.', _live_values(live, 'rds_pool', 'in_use'))
+    writer.gauge('rds_pool_idle', 'RDS connections idle in the pool.', _live_values(live, 'rds_pool', 'idle'))
+    cache = [s['data'].get('cache', {}).get('overall', {}) for s in snapshots]
+    writer.counter('cache_lookups', 'Shared cache lookups by outcome.', [
+        ({'result': 'memory_hit'}, sum(c.get('hits', 0) for c in cache)),
+        ({'result': 'redis_hit'}, sum(c.get('redis_hits', 0) for c in cache)),
+        ({'result': 'miss'}, sum(c.get('misses', 0) for c in cache)),
+    ])
+
+    # Processes
+    writer.gauge('process_resident_memory_bytes', 'Resident memory of each worker.', _live_values(live, 'process', 'memory_rss'))
+    writer.gauge('process_threads', 'Threads of each worker.', _live_values(live, 'process', 'thread_count'))
+
+    return writer.render()
@@ -0,0 +1,205 @@
+"""
+Request-scoped principal (user + student profile + permissions) for JWT routes.
+
+Most handlers start with ``users.find_one`` for the JWT identity and many
+follow with ``students.find_one({'user_id': ...})``. The principal loads
+both once per request (kept on ``flask.g``) and keeps them in a short-TTL
+process cache so the next requests of the same user skip the round-trips:
+
+    user = cached_user(current_user_id)          # users doc
+    student = cached_student(current_user_id)    # students doc (or None)
+    principal = current_principal()              # both + permissions
+
+Only the authenticated user is cached; other ids always go to Mongo.
+Writers call ``invalidate_principal(user_id)`` after changing a user's
+profile, role, permissions or student record. Other workers pick the change
+up when the TTL (``PRINCIPAL_CACHE_TTL`` seconds) expires.
+
+With ``PRINCIPAL_TRUST_JWT_ROLE`` enabled, ``current_role()`` reads the
+``role`` claim embedded at login instead of loading the user.
+"""
+from __future__ import annotations
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from flask import g, has_request_context
+from flask_jwt_extended import get_jwt, get_jwt_identity
+
+from mongo import mongo_db
+
+PRINCIPAL_CACHE_TTL = float(os.getenv('PRINCIPAL_CACHE_TTL', '30'))
+PRINCIPAL_CACHE_SIZE = int(os.getenv('PRINCIPAL_CACHE_SIZE', '5000'))
+PRINCIPAL_TRUST_JWT_ROLE = os.getenv('PRINCIPAL_TRUST_JWT_ROLE', 'false').lower() == 'true'
+
+_MISSING = object()
+
+
+@dataclass
+class Principal:
+    user_id: str
+    user: Optional[dict]
+    _student: Any = field(default=_MISSING, repr=False)
+
+    @property
+    def role(self) -> Optional[str]:
+        return self.user.get('role') if self.user else None
+
+    @property
+    def student(self) -> Optional[dict]:
+        """The students doc, loaded on first access (admins never pay for it)."""
+        if self._student is _MISSING:
+            self._student = _cache.get_student(self.user_id)
+        return self._student
+
+    @property
+    def permissions(self) -> dict:
+        from routes.access_control import DEFAULT_PERMISSIONS
+
+        if not self.user:
+            return {}
+        return self.user.get('permissions', DEFAULT_PERMISSIONS.get(self.role, {}))
+
+
+class _PrincipalCache:
+    """LRU of user / student docs per user id with a short TTL."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidate(); a load that overlapped one is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, user_id: str, kind: str, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry['expires'] > now and kind in entry:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return copy.deepcopy(entry[kind])
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        with self._lock:
+            if generation != self._generation:
+                # Invalidated while loading: the doc may predate the write
+                return copy.deepcopy(value)
+            entry = self._entries.get(user_id)
+            if entry is None or entry['expires'] <= now:
+                entry = {'expires': now + self.ttl}
+            entry[kind] = value
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return copy.deepcopy(value)
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        return self._lookup(user_id, 'user', lambda: mongo_db.users.find_one({'_id': ObjectId(user_id)}))
+
+    def get_student(self, user_id: str) -> Optional[dict]:
+        return self._lookup(user_id, 'student', lambda: mongo_db.students.find_one({'user_id': ObjectId(user_id)}))
+
+    def invalidate(self, user_id: Optional[str] = None):
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'ttl': self.ttl}
+
+
+_cache = _PrincipalCache(PRINCIPAL_CACHE_TTL, PRINCIPAL_CACHE_SIZE)
+
+
+def current_principal() -> Optional[Principal]:
+    """The authenticated principal of this request (None outside a JWT request)."""
+    if not has_request_context():
+        return None
+    principal = g.get('principal')
+    if principal is None:
+        user_id = get_jwt_identity()
+        if not user_id:
+            return None
+        user_id = str(user_id)
+        try:
+            user = _cache.get_user(user_id)
+        except Exception:
+            # Malformed identity: behave like a missing user
+            user = None
+        principal = Principal(user_id=user_id, user=user)
+        g.principal = principal
+    return principal
+
+
+def _principal_for(user_id: Any) -> Optional[Principal]:
+    try:
+        principal = current_principal()
+    except Exception:
+        return None
+    if principal is not None and principal.user_id == str(user_id):
+        return principal
+    return None
+
+
+def cached_user(user_id: Any) -> Optional[dict]:
+    """users doc for ``user_id``; cached when it is the authenticated user."""
+    principal = _principal_for(user_id)
+    if principal is not None:
+        return principal.user
+    return mongo_db.find_user_by_id(user_id)
+
+
+def cached_student(user_id: Any) -> Optional[dict]:
+    """students doc whose user_id is ``user_id``; cached when it is the authenticated user."""
+    principal = _principal_for(user_id)
+    if principal is not None:
+        return principal.student
+    return mongo_db.students.find_one({'user_id': ObjectId(user_id)})
+
+
+def current_role() -> Optional[str]:
+    """Role of the authenticated user, from the JWT claim when trusted."""
+    if PRINCIPAL_TRUST_JWT_ROLE:
+        try:
+            role = get_jwt().get('role')
+        except Exception:
+            role = None
+        if role:
+            return role
+    principal = current_principal()
+    return principal.role if principal else None
+
+
+def role_claims(user: dict) -> dict:
+    """Extra JWT claims for ``create_access_token(additional_claims=...)``."""
+    return {'role': user.get('role')} if user and user.get('role') else {}
+
+
+def invalidate_principal(user_id: Any = None):
+    """Drop cached docs for a user (or everyone) after a profile/permission change."""
+    _cache.invalidate(str(user_id) if user_id is not None else None)
+    if has_request_context():
+        principal = g.get('principal')
+        if principal is not None and (user_id is None or principal.user_id == str(user_id)):
+            g.pop('principal', None)
+
+
+def principal_cache_stats() -> dict:
+    return _cache.stats()
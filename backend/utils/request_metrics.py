@@ -0,0 +1,449 @@
+"""
+Low-overhead request metrics recorder.
+
+The request thread only appends a tuple to a ``deque`` (atomic under the
+GIL, no lock, no time formatting). A background flusher drains it every
+``METRICS_FLUSH_INTERVAL`` seconds into:
+
+* per-endpoint counters and HDR-style latency histograms,
+* a ring of per-minute buckets (requests / errors / bytes) covering a day,
+* per-endpoint 10-minute buckets (count / errors / time) covering a day,
+* a bounded ring of recent errors.
+
+Readers call ``flush()`` first, so they always see every recorded request.
+
+Latency histograms are log-linear (64 linear sub-buckets per power of two
+of microseconds): percentiles are within ~1.6% of the true value, and two
+histograms merge by adding their counts, so per-worker histograms can be
+combined into exact server-wide bucket counts. ``snapshot()`` exports the
+state of one process and ``MetricsView`` merges any number of snapshots:
+
+    metrics_recorder.record('student.get_student_tests', 'GET', 200, 0.042, 5120)
+    view = MetricsView([metrics_recorder.snapshot(), *other_worker_snapshots])
+    view.endpoint_percentiles()['student.get_student_tests']  # {'p50': ..., 'p95': ..., 'p99': ...}
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from array import array
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional
+
+from utils.metrics_aggregation import register_provider
+
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '1'))
+METRICS_PENDING_LIMIT = int(os.getenv('METRICS_PENDING_LIMIT', '100000'))
+METRICS_ERROR_LIMIT = int(os.getenv('METRICS_ERROR_LIMIT', '1000'))
+# A day of buckets plus slack for the partial first hour
+MINUTE_SLOTS = 25 * 60
+WINDOW_SECONDS = 600
+WINDOW_SLOTS = 25 * 3600 // WINDOW_SECONDS
+SNAPSHOT_ERROR_LIMIT = 50
+
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyHistogram:
+    """Mergeable log-linear histogram of durations, stored in microseconds."""
+
+    SUB_BUCKET_BITS = 6
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS          # linear buckets per power of two
+    EXACT_LIMIT = SUB_BUCKETS * 2               # values below are counted exactly
+    MAX_VALUE_US = (1 << 36) - 1                # ~19 hours
+    BUCKET_COUNT = (36 - SUB_BUCKET_BITS + 1) * SUB_BUCKETS + SUB_BUCKETS
+
+    __slots__ = ('counts', 'total', 'max_us')
+
+    def __init__(self, counts: Optional[array] = None):
+        self.counts = counts if counts is not None else array('Q', bytes(8 * self.BUCKET_COUNT))
+        self.total = sum(self.counts) if counts is not None else 0
+        self.max_us = self._highest_nonzero()
+
+    @classmethod
+    def _index(cls, value_us: int) -> int:
+        if value_us < cls.EXACT_LIMIT:
+            return value_us
+        shift = value_us.bit_length() - cls.SUB_BUCKET_BITS - 1
+        return (shift + 1) * cls.SUB_BUCKETS + (value_us >> shift) - cls.SUB_BUCKETS
+
+    @classmethod
+    def _bucket_range(cls, index: int):
+        if index < cls.EXACT_LIMIT:
+            return index, index
+        shift = index // cls.SUB_BUCKETS - 1
+        sub = index % cls.SUB_BUCKETS + cls.SUB_BUCKETS
+        return sub << shift, ((sub + 1) << shift) - 1
+
+    def _highest_nonzero(self) -> int:
+        for index in range(len(self.counts) - 1, -1, -1):
+            if self.counts[index]:
+                return self._bucket_range(index)[1]
+        return 0
+
+    @classmethod
+    def index_of(cls, seconds: float) -> int:
+        """Bucket of a duration, for callers that keep sparse counts (see ``from_sparse``)."""
+        return cls._index(min(max(int(seconds * 1_000_000), 0), cls.MAX_VALUE_US))
+
+    def record(self, seconds: float):
+        value_us = min(max(int(seconds * 1_000_000), 0), self.MAX_VALUE_US)
+        self.counts[self._index(value_us)] += 1
+        self.total += 1
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def merge(self, other: 'LatencyHistogram'):
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.total += other.total
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, pct: float) -> float:
+        """Duration in seconds at or below which ``pct`` percent of samples fall."""
+        if not self.total:
+            return 0.0
+        rank = max(1, int(self.total * pct / 100.0 + 0.999999))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            if seen >= rank:
+                low, high = self._bucket_range(index)
+                return min((low + high) / 2.0, self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def percentiles(self, pcts: Iterable[float] = PERCENTILES) -> Dict[str, float]:
+        return {f'p{int(p)}': round(self.percentile(p), 6) for p in pcts}
+
+    def cumulative_counts(self, bounds: Iterable[float]) -> List[int]:
+        """Samples at or below each bound (seconds), for fixed-bucket exposition."""
+        limits = [int(bound * 1_000_000) for bound in bounds]
+        result = [0] * len(limits)
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            high = self._bucket_range(index)[1]
+            for position, limit in enumerate(limits):
+                if high <= limit:
+                    result[position] += count
+        return result
+
+    def to_sparse(self) -> Dict[int, int]:
+        return {index: count for index, count in enumerate(self.counts) if count}
+
+    @classmethod
+    def from_sparse(cls, sparse: Dict) -> 'LatencyHistogram':
+        histogram = cls()
+        for index, count in sparse.items():
+            histogram.counts[int(index)] += count
+        histogram.total = sum(histogram.counts)
+        histogram.max_us = histogram._highest_nonzero()
+        return histogram
+
+
+class _EndpointStats:
+    __slots__ = ('count', 'errors', 'total_time', 'bytes_sent', 'histogram', 'windows')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.bytes_sent = 0
+        self.histogram = LatencyHistogram()
+        # 10-minute window index -> [count, errors, total_time]
+        self.windows: Dict[int, list] = {}
+
+    def window(self, index: int) -> list:
+        bucket = self.windows.get(index)
+        if bucket is None:
+            bucket = self.windows[index] = [0, 0, 0.0]
+            for old in [i for i in self.windows if i <= index - WINDOW_SLOTS]:
+                del self.windows[old]
+        return bucket
+
+
+class RequestMetricsRecorder:
+    """Lock-free request path, batched aggregation on a flusher thread."""
+
+    def __init__(self, flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.started_at = time.time()
+        self._pending = deque(maxlen=METRICS_PENDING_LIMIT)
+        self.dropped = 0
+        # Taken by the flusher and by readers only, never by the request path
+        self.lock = threading.Lock()
+        self.endpoints: Dict[str, _EndpointStats] = {}
+        self.overall = LatencyHistogram()
+        self.response_codes: Dict[int, int] = defaultdict(int)
+        self.errors = deque(maxlen=METRICS_ERROR_LIMIT)
+        # slot -> [minute, requests, errors, bytes_sent]
+        self.minutes: List[Optional[list]] = [None] * MINUTE_SLOTS
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+
+    def record(self, endpoint: str, method: str, response_code: int, response_time: float,
+               bytes_sent: int = 0, error_msg: Optional[str] = None):
+        """Queue one request; safe to call from any thread or greenlet."""
+        pending = self._pending
+        if len(pending) == pending.maxlen:
+            self.dropped += 1  # approximate under contention, informational only
+        pending.append((time.time(), endpoint, method, response_code, response_time, bytes_sent, error_msg))
+        if self._flusher_pid != os.getpid():
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self.lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._flush_loop, name='request-metrics-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Request metrics flush error: {e}")
+
+    def flush(self) -> int:
+        """Drain queued requests into the aggregates; returns how many were applied."""
+        pending = self._pending
+        applied = 0
+        with self.lock:
+            while True:
+                try:
+                    item = pending.popleft()
+                except IndexError:
+                    break
+                self._apply(item)
+                applied += 1
+        return applied
+
+    def _apply(self, item):
+        timestamp, endpoint, method, response_code, response_time, bytes_sent, error_msg = item
+        is_error = response_code >= 400 or bool(error_msg)
+
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = _EndpointStats()
+        stats.count += 1
+        stats.total_time += response_time
+        stats.bytes_sent += bytes_sent
+        stats.histogram.record(response_time)
+        window = stats.window(int(timestamp // WINDOW_SECONDS))
+        window[0] += 1
+        window[2] += response_time
+        self.overall.record(response_time)
+        self.response_codes[response_code] += 1
+
+        minute = int(timestamp // 60)
+        slot = self.minutes[minute % MINUTE_SLOTS]
+        if slot is None or slot[0] != minute:
+            slot = self.minutes[minute % MINUTE_SLOTS] = [minute, 0, 0, 0]
+        slot[1] += 1
+        slot[3] += bytes_sent
+
+        if is_error:
+            stats.errors += 1
+            window[1] += 1
+            slot[2] += 1
+            if error_msg:
+                self.errors.append({
+                    'timestamp': timestamp,
+                    'endpoint': endpoint,
+                    'method': method,
+                    'error_msg': error_msg,
+                    'response_code': response_code,
+                })
+
+    def snapshot(self) -> dict:
+        """Mergeable, JSON-friendly state of this process."""
+        self.flush()
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'started_at': self.started_at,
+                'dropped': self.dropped,
+                'response_codes': {str(code): count for code, count in self.response_codes.items()},
+                'overall': self.overall.to_sparse(),
+                'endpoints': {
+                    name: {
+                        'count': stats.count,
+                        'errors': stats.errors,
+                        'total_time': stats.total_time,
+                        'bytes_sent': stats.bytes_sent,
+                        'histogram': stats.histogram.to_sparse(),
+                        'windows': {str(index): bucket for index, bucket in stats.windows.items()},
+                    }
+                    for name, stats in self.endpoints.items()
+                },
+                'minutes': [slot for slot in self.minutes if slot is not None],
+                'errors': list(self.errors)[-SNAPSHOT_ERROR_LIMIT:],
+            }
+
+
+class MetricsView:
+    """Read-side merge of recorder snapshots (one per worker process)."""
+
+    def __init__(self, snapshots: Iterable[dict] = ()):
+        self.workers = 0
+        self.dropped = 0
+        self.minutes: Dict[int, list] = defaultdict(lambda: [0, 0, 0])
+        self.response_codes: Dict[int, int] = defaultdict(int)
+        self.overall = LatencyHistogram()
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        # endpoint -> [count, errors, total_time, bytes_sent] since each worker started
+        self.totals: Dict[str, list] = defaultdict(lambda: [0, 0, 0.0, 0])
+        self.windows: Dict[str, Dict[int, list]] = defaultdict(lambda: defaultdict(lambda: [0, 0, 0.0]))
+        self.errors: List[dict] = []
+        for snapshot in snapshots:
+            self.add(snapshot)
+
+    def add(self, snapshot: dict):
+        self.workers += 1
+        self.dropped += snapshot.get('dropped', 0)
+        for code, count in snapshot.get('response_codes', {}).items():
+            self.response_codes[int(code)] += count
+        self.overall.merge(LatencyHistogram.from_sparse(snapshot.get('overall', {})))
+        for minute, requests, errors, bytes_sent in snapshot.get('minutes', []):
+            bucket = self.minutes[minute]
+            bucket[0] += requests
+            bucket[1] += errors
+            bucket[2] += bytes_sent
+        for name, stats in snapshot.get('endpoints', {}).items():
+            histogram = LatencyHistogram.from_sparse(stats.get('histogram', {}))
+            if name in self.histograms:
+                self.histograms[name].merge(histogram)
+            else:
+                self.histograms[name] = histogram
+            totals = self.totals[name]
+            totals[0] += stats.get('count', 0)
+            totals[1] += stats.get('errors', 0)
+            totals[2] += stats.get('total_time', 0.0)
+            totals[3] += stats.get('bytes_sent', 0)
+            windows = self.windows[name]
+            for index, (count, errors, total_time) in stats.get('windows', {}).items():
+                bucket = windows[int(index)]
+                bucket[0] += count
+                bucket[1] += errors
+                bucket[2] += total_time
+        self.errors.extend(snapshot.get('errors', []))
+        self.errors.sort(key=lambda e: e['timestamp'])
+
+    def minute_totals(self, start: float, end: float) -> Dict[str, int]:
+        """Requests / errors / bytes recorded in [start, end)."""
+        totals = {'requests': 0, 'errors': 0, 'bytes_sent': 0}
+        for minute in range(int(start // 60), math.ceil(end / 60)):
+            bucket = self.minutes.get(minute)
+            if bucket is not None:
+                totals['requests'] += bucket[0]
+                totals['errors'] += bucket[1]
+                totals['bytes_sent'] += bucket[2]
+        return totals
+
+    def endpoint_window(self, start: float, end: float) -> Dict[str, dict]:
+        """Per-endpoint count / errors / total_time over the 10-minute windows overlapping [start, end)."""
+        first, last = int(start // WINDOW_SECONDS), math.ceil(end / WINDOW_SECONDS)
+        result = {}
+        for name, windows in self.windows.items():
+            count = errors = 0
+            total_time = 0.0
+            for index, bucket in windows.items():
+                if first <= index < last:
+                    count += bucket[0]
+                    errors += bucket[1]
+                    total_time += bucket[2]
+            if count:
+                result[name] = {'count': count, 'errors': errors, 'total_time': total_time}
+        return result
+
+    def endpoint_percentiles(self) -> Dict[str, Dict[str, float]]:
+        return {name: histogram.percentiles() for name, histogram in self.histograms.items()}
+
+    def recent_errors(self, since: float, limit: int = 10) -> List[dict]:
+        return [error for error in self.errors if error['timestamp'] >= since][-limit:]
+
+
+class TimingRecorder:
+    """
+    Labelled duration histograms for calls made while serving requests
+    (Mongo commands, RDS queries). Recording is a ``deque`` append like
+    ``RequestMetricsRecorder``; the queue is drained on ``snapshot()``,
+    which the metrics publisher calls every few seconds.
+    """
+
+    def __init__(self):
+        self._pending = deque(maxlen=METRICS_PENDING_LIMIT)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        # labels -> [count, failures, total_time, histogram]
+        self.series: Dict[tuple, list] = {}
+
+    def record(self, labels: tuple, seconds: float, failed: bool = False):
+        pending = self._pending
+        if len(pending) == pending.maxlen:
+            self.dropped += 1
+        pending.append((labels, seconds, failed))
+
+    def flush(self):
+        pending = self._pending
+        with self.lock:
+            while True:
+                try:
+                    labels, seconds, failed = pending.popleft()
+                except IndexError:
+                    break
+                series = self.series.get(labels)
+                if series is None:
+                    series = self.series[labels] = [0, 0, 0.0, LatencyHistogram()]
+                series[0] += 1
+                series[1] += failed
+                series[2] += seconds
+                series[3].record(seconds)
+
+    def snapshot(self) -> dict:
+        self.flush()
+        with self.lock:
+            return {
+                'dropped': self.dropped,
+                'series': [
+                    {
+                        'labels': list(labels),
+                        'count': count,
+                        'failures': failures,
+                        'total_time': total_time,
+                        'histogram': histogram.to_sparse(),
+                    }
+                    for labels, (count, failures, total_time, histogram) in self.series.items()
+                ],
+            }
+
+
+def merge_timings(snapshots: Iterable[dict]) -> Dict[tuple, list]:
+    """Merge ``TimingRecorder`` snapshots into ``{labels: [count, failures, total_time, histogram]}``."""
+    merged: Dict[tuple, list] = {}
+    for snapshot in snapshots:
+        for series in snapshot.get('series', []):
+            labels = tuple(series['labels'])
+            histogram = LatencyHistogram.from_sparse(series['histogram'])
+            entry = merged.get(labels)
+            if entry is None:
+                merged[labels] = [series['count'], series['failures'], series['total_time'], histogram]
+            else:
+                entry[0] += series['count']
+                entry[1] += series['failures']
+                entry[2] += series['total_time']
+                entry[3].merge(histogram)
+    return merged
+
+
+metrics_recorder = RequestMetricsRecorder()
+register_provider('requests', metrics_recorder.snapshot)
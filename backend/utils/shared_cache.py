@@ -0,0 +1,520 @@
+"""
+Shared multi-tier cache for read-mostly endpoints.
+
+One facade replaces the ad-hoc caches scattered through the code base:
+
+* a process-local LRU tier (O(1) get/set on an ``OrderedDict``), bounded by
+  entry count and by the size of the stored blobs;
+* an optional Redis tier shared by every gunicorn worker, enabled with
+  ``CACHE_REDIS_URL`` (or ``REDIS_URL``). ``fakeredis://`` selects an
+  in-process ``fakeredis`` server, for tests and local runs without Redis.
+
+Keys are namespaced (``<namespace>:<key>``) and entries can carry tags;
+``invalidate_tags('tests')`` drops every entry stored with that tag in both
+tiers. Values are stored pickled, so callers always get a private copy and
+ObjectId / datetime values survive the Redis round-trip.
+
+    modules = shared_cache.get_or_set('modules', 'versant', load_modules, ttl=60, tags=('question_bank',))
+
+    @bp.route('/campuses')
+    @jwt_required()
+    @cached_view('campuses', ttl=300, tags=('org',))
+    def get_campuses(): ...
+
+    @bp.route('/tests/<test_id>', methods=['DELETE'])
+    @jwt_required()
+    @invalidates('tests')                # after this view succeeds
+    def delete_test(test_id): ...
+
+    invalidate_on_write(bp, 'org')      # successful POST/PUT/PATCH/DELETE on bp
+
+When Redis is configured, local entries live at most ``CACHE_LOCAL_TTL``
+seconds so that invalidations from other workers are picked up quickly.
+Without Redis each worker has its own memory tier and an invalidation only
+reaches the worker that served the write; the others converge within the
+entry TTL.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from utils.metrics_aggregation import register_provider
+
+logger = logging.getLogger(__name__)
+
+CACHE_DEFAULT_TTL = float(os.getenv('CACHE_DEFAULT_TTL', '300'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '20000'))
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+CACHE_LOCAL_TTL = float(os.getenv('CACHE_LOCAL_TTL', '5'))
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL') or os.getenv('REDIS_URL')
+CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'cache')
+CACHE_REDIS_RETRY = float(os.getenv('CACHE_REDIS_RETRY', '30'))
+# Redis tag sets outlive their entries; they are trimmed on invalidation
+CACHE_TAG_TTL = int(os.getenv('CACHE_TAG_TTL', '86400'))
+
+MAX_KEY_LENGTH = 200
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+_MISS = object()
+
+
+def _full_key(namespace: str, key: Any) -> str:
+    key = str(key)
+    if len(key) > MAX_KEY_LENGTH:
+        key = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return f'{namespace}:{key}'
+
+
+class _NamespaceStats:
+    __slots__ = ('hits', 'redis_hits', 'misses', 'sets')
+
+    def __init__(self):
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.sets = 0
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            'hits': self.hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'sets': self.sets,
+            'hit_rate': round((self.hits + self.redis_hits) / lookups * 100, 2) if lookups else 0.0,
+        }
+
+
+class _MemoryTier:
+    """LRU of pickled blobs bounded by entry count and total blob size."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Tuple[float, bytes, Tuple[str, ...]]]' = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, blob: bytes, ttl: float, tags: Tuple[str, ...]):
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, blob, tags)
+            self._bytes += len(blob)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_tag(self, tag: str) -> int:
+        with self._lock:
+            keys = self._tags.pop(tag, set())
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        with self._lock:
+            if namespace is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self._tags.clear()
+                self._bytes = 0
+                return count
+            keys = [k for k in self._entries if k.startswith(namespace + ':')]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[1])
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'tags': len(self._tags),
+                'evictions': self.evictions,
+            }
+
+
+class _RedisTier:
+    """Shared tier; failures disable it for ``CACHE_REDIS_RETRY`` seconds."""
+
+    def __init__(self, url: Optional[str], prefix: str):
+        self.url = url
+        self.prefix = prefix
+        self.client = None
+        self.errors = 0
+        self._disabled_until = 0.0
+        if url:
+            self._connect()
+
+    def _connect(self):
+        try:
+            if self.url.startswith('fakeredis://'):
+                import fakeredis
+                self.client = fakeredis.FakeRedis()
+            else:
+                import redis
+                self.client = redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            self.client.ping()
+            logger.info('Shared cache Redis tier connected')
+        except ImportError as e:
+            logger.warning(f'Shared cache Redis tier unavailable ({e}); using memory tier only')
+            self.client = None
+        except Exception as e:
+            self._failed(e)
+
+    @property
+    def available(self) -> bool:
+        return self.client is not None and time.monotonic() >= self._disabled_until
+
+    def _failed(self, error: Exception):
+        self.errors += 1
+        self._disabled_until = time.monotonic() + CACHE_REDIS_RETRY
+        logger.warning(f'Shared cache Redis error: {error}; retrying in {CACHE_REDIS_RETRY:.0f}s')
+
+    def _key(self, key: str) -> str:
+        return f'{self.prefix}:{key}'
+
+    def _tag_key(self, tag: str) -> str:
+        return f'{self.prefix}:tag:{tag}'
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.available:
+            return None
+        try:
+            return self.client.get(self._key(key))
+        except Exception as e:
+            self._failed(e)
+            return None
+
+    def set(self, key: str, blob: bytes, ttl: float, tags: Tuple[str, ...]):
+        if not self.available:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.setex(self._key(key), max(1, int(ttl)), blob)
+            for tag in tags:
+                pipe.sadd(self._tag_key(tag), key)
+                pipe.expire(self._tag_key(tag), CACHE_TAG_TTL)
+            pipe.execute()
+        except Exception as e:
+            self._failed(e)
+
+    def delete(self, key: str):
+        if not self.available:
+            return
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            self._failed(e)
+
+    def invalidate_tag(self, tag: str) -> int:
+        if not self.available:
+            return 0
+        try:
+            members = self.client.smembers(self._tag_key(tag))
+            keys = [self._key(m.decode() if isinstance(m, bytes) else m) for m in members]
+            removed = self.client.delete(*keys) if keys else 0
+            self.client.delete(self._tag_key(tag))
+            return removed
+        except Exception as e:
+            self._failed(e)
+            return 0
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        if not self.available:
+            return 0
+        pattern = self._key(f'{namespace}:*') if namespace else f'{self.prefix}:*'
+        try:
+            removed = 0
+            batch = []
+            for key in self.client.scan_iter(match=pattern, count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    removed += self.client.delete(*batch)
+                    batch = []
+            if batch:
+                removed += self.client.delete(*batch)
+            return removed
+        except Exception as e:
+            self._failed(e)
+            return 0
+
+    def stats(self) -> dict:
+        return {
+            'configured': bool(self.url),
+            'available': self.available,
+            'errors': self.errors,
+        }
+
+
+class SharedCache:
+    """Namespaced two-tier cache with tag invalidation and per-namespace hit rates."""
+
+    def __init__(
+        self,
+        default_ttl: float = CACHE_DEFAULT_TTL,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        redis_url: Optional[str] = CACHE_REDIS_URL,
+        local_ttl: float = CACHE_LOCAL_TTL,
+        prefix: str = CACHE_KEY_PREFIX,
+    ):
+        self.default_ttl = default_ttl
+        self.local_ttl = local_ttl
+        self.memory = _MemoryTier(max_entries, max_bytes)
+        self.redis = _RedisTier(redis_url, prefix)
+        self._stats: Dict[str, _NamespaceStats] = {}
+        self._stats_lock = threading.Lock()
+        self.invalidations = 0
+
+    def _ns_stats(self, namespace: str) -> _NamespaceStats:
+        stats = self._stats.get(namespace)
+        if stats is None:
+            with self._stats_lock:
+                stats = self._stats.setdefault(namespace, _NamespaceStats())
+        return stats
+
+    def _local_ttl(self, ttl: float) -> float:
+        return min(ttl, self.local_ttl) if self.redis.available else ttl
+
+    def get(self, namespace: str, key: Any, default: Any = None) -> Any:
+        full_key = _full_key(namespace, key)
+        stats = self._ns_stats(namespace)
+        blob = self.memory.get(full_key)
+        if blob is not None:
+            stats.hits += 1
+            return pickle.loads(blob)
+        blob = self.redis.get(full_key)
+        if blob is not None:
+            stats.redis_hits += 1
+            # Tags stay authoritative in Redis; the local copy is short-lived
+            self.memory.set(full_key, blob, self.local_ttl, ())
+            return pickle.loads(blob)
+        stats.misses += 1
+        return default
+
+    def set(self, namespace: str, key: Any, value: Any, ttl: Optional[float] = None, tags: Iterable[str] = ()):
+        ttl = self.default_ttl if ttl is None else ttl
+        tags = tuple(tags)
+        full_key = _full_key(namespace, key)
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._ns_stats(namespace).sets += 1
+        self.memory.set(full_key, blob, self._local_ttl(ttl), tags)
+        self.redis.set(full_key, blob, ttl, tags)
+
+    def get_or_set(
+        self,
+        namespace: str,
+        key: Any,
+        loader: Callable[[], Any],
+        ttl: Optional[float] = None,
+        tags: Iterable[str] = (),
+    ) -> Any:
+        value = self.get(namespace, key, _MISS)
+        if value is _MISS:
+            value = loader()
+            self.set(namespace, key, value, ttl, tags)
+        return value
+
+    def delete(self, namespace: str, key: Any):
+        full_key = _full_key(namespace, key)
+        self.memory.delete(full_key)
+        self.redis.delete(full_key)
+
+    def invalidate_tags(self, *tags: str) -> int:
+        removed = 0
+        for tag in tags:
+            removed += self.memory.invalidate_tag(tag)
+            removed += self.redis.invalidate_tag(tag)
+        self.invalidations += 1
+        return removed
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        return self.memory.clear(namespace) + self.redis.clear(namespace)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            namespaces = {name: stats.as_dict() for name, stats in self._stats.items()}
+        totals = _NamespaceStats()
+        for stats in self._stats.values():
+            totals.hits += stats.hits
+            totals.redis_hits += stats.redis_hits
+            totals.misses += stats.misses
+            totals.sets += stats.sets
+        return {
+            'pid': os.getpid(),
+            'default_ttl': self.default_ttl,
+            'overall': totals.as_dict(),
+            'namespaces': namespaces,
+            'memory': self.memory.stats(),
+            'redis': self.redis.stats(),
+            'invalidations': self.invalidations,
+        }
+
+
+shared_cache = SharedCache()
+register_provider('cache', shared_cache.stats)
+
+
+def _request_identity() -> Optional[str]:
+    try:
+        from flask_jwt_extended import get_jwt_identity
+        identity = get_jwt_identity()
+    except Exception:
+        return None
+    return str(identity) if identity else None
+
+
+def freeze_response(rv) -> Optional[dict]:
+    """Turn a view return value into a picklable dict (None unless it is a 200)."""
+    from flask import current_app
+
+    response = current_app.make_response(rv)
+    if response.status_code != 200 or response.direct_passthrough:
+        return None
+    return {'body': response.get_data(), 'mimetype': response.mimetype}
+
+
+def thaw_response(frozen: dict):
+    from flask import current_app
+
+    response = current_app.response_class(frozen['body'], status=200, mimetype=frozen['mimetype'])
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+
+def cached_view(
+    namespace: str,
+    ttl: Optional[float] = None,
+    tags: Iterable[str] = (),
+    per_user: bool = False,
+    key_func: Optional[Callable[..., str]] = None,
+):
+    """
+    Cache the body of a successful GET view.
+
+    The key is the request path with its query string (plus the JWT identity
+    when ``per_user``); ``key_func(*args, **kwargs)`` overrides it. Place the
+    decorator below the auth decorators so that access checks still run on
+    every request.
+    """
+    tags = tuple(tags)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            from flask import has_request_context, request
+
+            if not has_request_context() or request.method != 'GET':
+                return func(*args, **kwargs)
+            if key_func is not None:
+                key = key_func(*args, **kwargs)
+            else:
+                key = request.full_path
+                if per_user:
+                    identity = _request_identity()
+                    if identity is None:
+                        return func(*args, **kwargs)
+                    key = f'{identity}:{key}'
+            frozen = shared_cache.get(namespace, key)
+            if frozen is not None:
+                return thaw_response(frozen)
+            rv = func(*args, **kwargs)
+            frozen = freeze_response(rv)
+            if frozen is not None:
+                shared_cache.set(namespace, key, frozen, ttl, tags)
+            return rv
+
+        return wrapper
+    return decorator
+
+
+def invalidates(*tags: str):
+    """
+    Invalidate ``tags`` after the decorated view returns a non-error response.
+
+    For blueprints that mix reads, student submissions and admin writes,
+    where a blueprint-wide ``invalidate_on_write`` would drop the cache on
+    every submission.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            from flask import current_app
+
+            rv = func(*args, **kwargs)
+            if current_app.make_response(rv).status_code < 400:
+                try:
+                    shared_cache.invalidate_tags(*tags)
+                except Exception as e:
+                    logger.warning(f'Cache invalidation for {tags} failed: {e}')
+            return rv
+
+        return wrapper
+    return decorator
+
+
+def invalidate_on_write(blueprint, *tags: str):
+    """Invalidate ``tags`` after every successful write request served by ``blueprint``."""
+
+    @blueprint.after_request
+    def _invalidate_cached_reads(response):
+        from flask import request
+
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            try:
+                shared_cache.invalidate_tags(*tags)
+            except Exception as e:
+                logger.warning(f'Cache invalidation for {tags} failed: {e}')
+        return response
+
+    return _invalidate_cached_reads
+
+
+def invalidate_tags(*tags: str) -> int:
+    return shared_cache.invalidate_tags(*tags)
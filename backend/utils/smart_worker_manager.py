@@ -13,6 +13,8 @@ from collections import defaultdict
 from typing import Dict, Set, Optional, Any
 from datetime import datetime, timedelta
 
+from utils.metrics_aggregation import register_provider
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -226,6 +228,7 @@ class SmartWorkerManager:
 
 # Global instance
 smart_worker_manager = SmartWorkerManager()
+register_provider('worker_tasks', smart_worker_manager.get_stats)
 
 def register_background_task(task_type: str, description: str = "", 
                            estimated_duration: int = 60) -> str:
@@ -0,0 +1,318 @@
+"""
+Bulk SMS dispatch.
+
+Sends many SMS through the pooled, rate-limited gateway client of
+``utils.sms_service`` instead of one blocking call per student:
+
+* messages with the same text (test scheduled / reminder notices) are
+  aggregated into multi-number submissions of up to
+  ``SMS_MULTI_NUMBER_LIMIT`` comma-separated numbers; if the gateway
+  rejects such a submission because of a number its numbers are sent one
+  by one, so one bad number only fails itself. Any other rejection (rate
+  limit, balance, parameters) fails the whole submission without a resend,
+  which would multiply the load on a throttled gateway; a timed-out
+  submission is not resent either, it may have been accepted;
+* personalised messages (credentials) are sent one request each;
+* requests run on ``SMS_DISPATCH_WORKERS`` threads, the gateway client
+  still caps what is in flight and the request rate.
+
+    results = sms_dispatcher.send_many([
+        SMSMessage(phone, test_scheduled_message(name, start, test_id), 'test_scheduled',
+                   reference={'student_id': student_id}),
+        ...
+    ], progress=on_result)
+
+Every accepted message is recorded in the ``sms_messages`` collection with
+its gateway message id; ``delivery_tracker.refresh`` asks the gateway for
+the delivery state of the messages still pending.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import pytz
+import requests
+from pymongo import ASCENDING, DESCENDING
+
+from utils.sms_service import (
+    BULKSMS_API_KEY, BULKSMS_SENDER_ID, SMS_AVAILABLE,
+    check_delivery_status, extract_message_ids, is_valid_sms_response, send_sms_post,
+)
+
+logger = logging.getLogger(__name__)
+
+SMS_MULTI_NUMBER_LIMIT = int(os.getenv('SMS_MULTI_NUMBER_LIMIT', '100'))
+SMS_DISPATCH_WORKERS = int(os.getenv('SMS_DISPATCH_WORKERS', '4'))
+SMS_MESSAGES_COLLECTION = 'sms_messages'
+SMS_TRACKING_ENABLED = os.getenv('SMS_TRACKING_ENABLED', 'true').lower() == 'true'
+SMS_DELIVERY_RETAIN_DAYS = int(os.getenv('SMS_DELIVERY_RETAIN_DAYS', '30'))
+
+DELIVERY_PENDING = 'pending'
+DELIVERY_DELIVERED = 'delivered'
+DELIVERY_FAILED = 'failed'
+
+_FAILED_STATES = ('undeliv', 'fail', 'reject', 'expire', 'invalid', 'dnd', 'blacklist')
+# Gateway replies that refuse the request as a whole, checked before _NUMBER_REJECTIONS
+_THROTTLED_REPLIES = ('rate', 'limit', 'throttl', 'too many', 'busy', 'try again', 'balance', 'credit')
+_NUMBER_REJECTIONS = ('number', 'mobile', 'dnd', 'blacklist')
+
+ResultCallback = Callable[[int, 'SMSMessage', Dict], None]
+
+
+class SMSRejected(ValueError):
+    """The gateway answered with an error text instead of message ids."""
+
+    def __init__(self, reply: str):
+        super().__init__(f"Gateway rejected the message: {reply[:200]}")
+        self.per_number = is_number_rejection(reply)
+
+
+def is_number_rejection(reply: str) -> bool:
+    """True when a gateway error names a recipient (bad, DND or blacklisted number), not the request."""
+    text = (reply or '').lower()
+    if any(marker in text for marker in _THROTTLED_REPLIES):
+        return False
+    return any(marker in text for marker in _NUMBER_REJECTIONS)
+
+
+@dataclass
+class SMSMessage:
+    phone: str
+    text: str
+    sms_type: str = 'custom'
+    is_unicode: bool = False
+    # Stored with the delivery record, e.g. {'student_id': ..., 'test_id': ...}
+    reference: Optional[dict] = None
+
+
+def delivery_state(status_text: str) -> str:
+    """Normalise a gateway delivery report to pending / delivered / failed."""
+    text = (status_text or '').strip().lower()
+    if any(state in text for state in _FAILED_STATES):
+        return DELIVERY_FAILED
+    if 'deliv' in text:
+        return DELIVERY_DELIVERED
+    return DELIVERY_PENDING
+
+
+def _result(message: SMSMessage, success: bool, message_id: Optional[str] = None,
+            error: Optional[str] = None, aggregated: bool = False) -> Dict:
+    # Same keys as the single-message senders of utils.sms_service
+    result = {
+        'success': success,
+        'phone': message.phone,
+        'type': message.sms_type,
+        'language': 'Unicode' if message.is_unicode else 'English',
+        'aggregated': aggregated,
+    }
+    if success:
+        result['messageId'] = message_id
+    else:
+        result['error'] = error
+    return result
+
+
+class DeliveryTracker:
+    """Gateway message ids of sent SMS and their delivery state, in Mongo."""
+
+    def __init__(self):
+        self._collection = None
+        self._indexes_ready = False
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from mongo import mongo_db
+            self._collection = mongo_db.db[SMS_MESSAGES_COLLECTION]
+        if not self._indexes_ready:
+            self._indexes_ready = True
+            self.ensure_indexes(self._collection)
+        return self._collection
+
+    @staticmethod
+    def ensure_indexes(collection):
+        try:
+            collection.create_index('message_id')
+            collection.create_index([('status', ASCENDING), ('submitted_at', ASCENDING)])
+            collection.create_index('submitted_at', expireAfterSeconds=SMS_DELIVERY_RETAIN_DAYS * 86400)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not create SMS tracking indexes: {e}")
+
+    def record(self, messages: List[SMSMessage], results: List[Dict]):
+        """Store the accepted messages; tracking failures never fail a send."""
+        if not SMS_TRACKING_ENABLED:
+            return
+        now = datetime.now(pytz.utc)
+        docs = [{
+            'message_id': result['messageId'],
+            'phone': message.phone,
+            'sms_type': message.sms_type,
+            'aggregated': result.get('aggregated', False),
+            'reference': message.reference,
+            'status': DELIVERY_PENDING,
+            'submitted_at': now,
+        } for message, result in zip(messages, results) if result.get('success') and result.get('messageId')]
+        if not docs:
+            return
+        try:
+            self.collection.insert_many(docs, ordered=False)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not record {len(docs)} SMS for delivery tracking: {e}")
+
+    def record_result(self, phone: str, sms_type: str, result: Dict, reference: Optional[dict] = None):
+        """Track a message sent by one of the single-message senders."""
+        self.record([SMSMessage(phone, '', sms_type, reference=reference)], [result])
+
+    def refresh_message(self, message_id: str) -> List[dict]:
+        """Ask the gateway for ``message_id`` and update its records (several for a multi-number send)."""
+        status = check_delivery_status(message_id)
+        if not status.get('success'):
+            raise RuntimeError(status.get('error', 'Delivery status unavailable'))
+        raw = (status.get('status') or '').strip()
+        now = datetime.now(pytz.utc)
+        self.collection.update_many(
+            {'message_id': message_id},
+            {'$set': {'status': delivery_state(raw), 'gateway_status': raw[:200], 'checked_at': now}},
+        )
+        return list(self.collection.find({'message_id': message_id}, {'_id': 0}))
+
+    def refresh(self, limit: int = 200, min_age_seconds: int = 60) -> Dict[str, int]:
+        """Refresh up to ``limit`` pending message ids submitted at least ``min_age_seconds`` ago."""
+        cutoff = datetime.now(pytz.utc) - timedelta(seconds=min_age_seconds)
+        message_ids = self.collection.distinct(
+            'message_id', {'status': DELIVERY_PENDING, 'submitted_at': {'$lte': cutoff}}
+        )[:limit]
+        counts = {'checked': 0, 'errors': 0}
+        for message_id in message_ids:
+            try:
+                self.refresh_message(message_id)
+                counts['checked'] += 1
+            except Exception as e:
+                counts['errors'] += 1
+                logger.warning(f"⚠️ Delivery status of SMS {message_id} unavailable: {e}")
+        return counts
+
+    def get(self, message_id: str) -> List[dict]:
+        return list(self.collection.find({'message_id': message_id}, {'_id': 0}))
+
+    def summary(self, since: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+        """Message counts per type and delivery state."""
+        match = {'submitted_at': {'$gte': since}} if since else {}
+        summary: Dict[str, Dict[str, int]] = {}
+        for row in self.collection.aggregate([
+            {'$match': match},
+            {'$group': {'_id': {'type': '$sms_type', 'status': '$status'}, 'count': {'$sum': 1}}},
+            {'$sort': {'_id.type': ASCENDING}},
+        ]):
+            summary.setdefault(row['_id']['type'], {})[row['_id']['status']] = row['count']
+        return summary
+
+    def recent(self, limit: int = 50, status: Optional[str] = None) -> List[dict]:
+        query = {'status': status} if status else {}
+        return list(self.collection.find(query, {'_id': 0}).sort('submitted_at', DESCENDING).limit(limit))
+
+
+class SMSDispatcher:
+    """Sends lists of ``SMSMessage`` with aggregation and bounded concurrency (see module docstring)."""
+
+    def __init__(self, workers: int = SMS_DISPATCH_WORKERS, multi_number_limit: int = SMS_MULTI_NUMBER_LIMIT,
+                 tracker: Optional[DeliveryTracker] = None):
+        self.workers = max(1, workers)
+        self.multi_number_limit = max(1, multi_number_limit)
+        self.tracker = tracker
+
+    def _units(self, messages: List[SMSMessage]) -> List[List[int]]:
+        # Indexes of the messages sent by one request each, identical texts grouped
+        groups: Dict[tuple, List[int]] = {}
+        for index, message in enumerate(messages):
+            groups.setdefault((message.text, message.is_unicode), []).append(index)
+        units = []
+        for indexes in groups.values():
+            for start in range(0, len(indexes), self.multi_number_limit):
+                units.append(indexes[start:start + self.multi_number_limit])
+        return units
+
+    def _submit(self, numbers: List[str], text: str, is_unicode: bool, operation: str) -> List[str]:
+        """One gateway request; returns the message ids or raises."""
+        params = {
+            'apikey': BULKSMS_API_KEY,
+            'sender': BULKSMS_SENDER_ID,
+            'number': ','.join(numbers),
+            'message': text
+        }
+        if is_unicode:
+            params['coding'] = '3'  # Unicode parameter
+        response = send_sms_post(params, is_unicode, operation=operation)
+        if not is_valid_sms_response(response.text):
+            raise SMSRejected(response.text.strip())
+        return extract_message_ids(response.text)
+
+    def _send_unit(self, messages: List[SMSMessage], indexes: List[int]) -> Dict[int, Dict]:
+        first = messages[indexes[0]]
+        if len(indexes) == 1:
+            try:
+                message_ids = self._submit([first.phone], first.text, first.is_unicode, 'send')
+                return {indexes[0]: _result(first, True, message_ids[0] if message_ids else None)}
+            except Exception as e:
+                return {indexes[0]: _result(first, False, error=str(e))}
+
+        numbers = [messages[index].phone for index in indexes]
+        try:
+            message_ids = self._submit(numbers, first.text, first.is_unicode, 'send_multi')
+        except SMSRejected as e:
+            if not e.per_number:
+                logger.warning(f"⚠️ Multi-number SMS to {len(numbers)} numbers refused, not resending: {e}")
+                return {index: _result(messages[index], False, error=str(e), aggregated=True) for index in indexes}
+            logger.warning(f"⚠️ Multi-number SMS to {len(numbers)} numbers rejected, sending one by one: {e}")
+            results = {}
+            for index in indexes:
+                results.update(self._send_unit(messages, [index]))
+            return results
+        except requests.RequestException as e:
+            return {index: _result(messages[index], False, error=str(e), aggregated=True) for index in indexes}
+
+        # One id per number when the gateway returns them, else the submission id for all
+        if len(message_ids) != len(numbers):
+            message_ids = [message_ids[0] if message_ids else None] * len(numbers)
+        return {
+            index: _result(messages[index], True, message_id, aggregated=True)
+            for index, message_id in zip(indexes, message_ids)
+        }
+
+    def send_many(self, messages: List[SMSMessage], progress: Optional[ResultCallback] = None) -> List[Dict]:
+        """
+        Send ``messages`` and return one result per message, in order.
+
+        ``progress(index, message, result)`` is called in the calling thread
+        as results come in.
+        """
+        if not messages:
+            return []
+        if not SMS_AVAILABLE:
+            logger.warning(f"⚠️ SMS service disabled. Would send {len(messages)} SMS")
+            return [_result(message, False, error='SMS service not configured') for message in messages]
+
+        units = self._units(messages)
+        results: List[Optional[Dict]] = [None] * len(messages)
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(units)), thread_name_prefix='sms') as pool:
+            futures = [pool.submit(self._send_unit, messages, unit) for unit in units]
+            for future in as_completed(futures):
+                for index, result in future.result().items():
+                    results[index] = result
+                    if progress:
+                        progress(index, messages[index], result)
+
+        sent = sum(1 for result in results if result['success'])
+        logger.info(f"📱 SMS dispatch: {sent}/{len(messages)} sent in {len(units)} requests")
+        if self.tracker is not None:
+            self.tracker.record(messages, results)
+        return results
+
+
+delivery_tracker = DeliveryTracker()
+sms_dispatcher = SMSDispatcher(tracker=delivery_tracker)
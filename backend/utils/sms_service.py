@@ -1,8 +1,33 @@
+"""
+BulkSMS gateway client.
+
+Every message used to open a new connection (``requests.post`` with a 30 s
+timeout). Requests now share one keep-alive ``requests.Session`` per
+process (``SMS_POOL_SIZE`` pooled connections, connect errors retried) and
+go through two limits before they reach the gateway:
+
+* a token bucket of ``SMS_RATE_PER_SECOND`` API requests per second with
+  bursts of ``SMS_RATE_BURST``, set from the BulkSMS account limits (the
+  budget is per process: divide the account limit by the number of
+  processes that send SMS);
+* at most ``SMS_MAX_CONCURRENCY`` requests in flight.
+
+Bulk sends, multi-number aggregation and delivery tracking live in
+``utils.sms_dispatcher``. Point the ``BULKSMS_*_URL`` settings at
+``scripts/mock_sms_gateway.py`` for load tests.
+"""
 import os
+import re
+import threading
+import time
 import requests
 import logging
 from typing import Dict, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from utils.date_formatter import format_date_to_ist
+from utils.metrics_aggregation import register_provider
+from utils.request_metrics import TimingRecorder
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,8 +40,16 @@ BULKSMS_SENDER_ID = os.getenv('BULKSMS_SENDER_ID', "PYDAHK")
 # API URLs based on BulkSMS documentation
 BULKSMS_ENGLISH_API_URL = os.getenv('BULKSMS_ENGLISH_API_URL', "https://www.bulksmsapps.com/api/apismsv2.aspx")
 BULKSMS_UNICODE_API_URL = os.getenv('BULKSMS_UNICODE_API_URL', "https://www.bulksmsapps.com/api/apibulkv2.aspx")
+BULKSMS_BALANCE_API_URL = os.getenv('BULKSMS_BALANCE_API_URL', "http://www.bulksmsapps.com/api/apicheckbalancev2.aspx")
+BULKSMS_DELIVERY_API_URL = os.getenv('BULKSMS_DELIVERY_API_URL', "http://www.bulksmsapps.com/api/apiDeliveryStatusv2.aspx")
 
-
+# Connection pool and limits (see module docstring)
+SMS_POOL_SIZE = int(os.getenv('SMS_POOL_SIZE', '10'))
+SMS_MAX_CONCURRENCY = int(os.getenv('SMS_MAX_CONCURRENCY', '4'))
+SMS_RATE_PER_SECOND = float(os.getenv('SMS_RATE_PER_SECOND', '10'))
+SMS_RATE_BURST = int(os.getenv('SMS_RATE_BURST', '20'))
+SMS_CONNECT_TIMEOUT = float(os.getenv('SMS_CONNECT_TIMEOUT', '5'))
+SMS_READ_TIMEOUT = float(os.getenv('SMS_READ_TIMEOUT', '30'))
 
 
 # Study Edge Apex specific templates
@@ -27,6 +60,18 @@ TEST_REMINDER_TEMPLATE = "you haven't attempted your scheduled test {#var#} yet.
 # Result notification template
 VERSANT_RESULT_TEMPLATE = "Hello {#var#}, Your test {#var#} result is {#var#}%. Check your results at https://crt.pydahsoft.in/student/results - Pydah College"
 
+def credentials_message(username: str, password: str) -> str:
+    return STUDENT_CREDENTIALS_TEMPLATE.replace('{#var#}', username, 1).replace('{#var#}', password, 1)
+
+def test_scheduled_message(test_name: str, start_time: str, test_id: str) -> str:
+    """``start_time`` as already formatted for display"""
+    return TEST_SCHEDULED_TEMPLATE.replace('{#var#}', test_name, 1) \
+                                  .replace('{#var#}', start_time, 1) \
+                                  .replace('{#var#}', test_id, 1)
+
+def test_reminder_message(test_name: str, test_id: str) -> str:
+    return TEST_REMINDER_TEMPLATE.replace('{#var#}', test_name, 1).replace('{#var#}', test_id, 1)
+
 # Check if SMS service is available
 SMS_AVAILABLE = bool(BULKSMS_API_KEY and BULKSMS_SENDER_ID and BULKSMS_ENGLISH_API_URL)
 
@@ -46,7 +91,6 @@ def is_valid_sms_response(response_data: str) -> bool:
     
     # Check if HTML response contains MessageId
     if any(tag in response_data for tag in ['<!DOCTYPE', '<html', '<body']):
-        import re
         message_id_match = re.search(r'MessageId-(\d+)', response_data)
         if message_id_match:
             return True
@@ -55,8 +99,6 @@ def is_valid_sms_response(response_data: str) -> bool:
 
 def extract_message_id(response_data: str) -> Optional[str]:
     """Extract message ID from response"""
-    import re
-    
     # Try to extract MessageId using regex
     message_id_match = re.search(r'MessageId-(\d+)', response_data)
     if message_id_match:
@@ -71,11 +113,120 @@ def extract_message_id(response_data: str) -> Optional[str]:
     
     return None
 
-def send_sms_post(params: Dict, is_unicode: bool = False) -> requests.Response:
+def extract_message_ids(response_data: str) -> List[str]:
+    """All message IDs of a (multi-number) response, in order"""
+    if not response_data:
+        return []
+    message_ids = re.findall(r'MessageId-(\d+)', response_data)
+    if not message_ids and response_data.strip().isdigit():
+        message_ids = [response_data.strip()]
+    return message_ids
+
+
+class TokenBucket:
+    """``rate`` tokens per second, at most ``burst`` saved up; ``rate <= 0`` disables it."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def acquire(self, tokens: int = 1, timeout: Optional[float] = None) -> bool:
+        """Take ``tokens``, sleeping until they are available; False if ``timeout`` runs out first."""
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+            with self._lock:
+                self.waited_seconds += wait
+
+
+class SMSGateway:
+    """Keep-alive session pool, rate limit and concurrency limit in front of the BulkSMS API."""
+
+    def __init__(self, pool_size: int = SMS_POOL_SIZE, max_concurrency: int = SMS_MAX_CONCURRENCY,
+                 rate: float = SMS_RATE_PER_SECOND, burst: int = SMS_RATE_BURST):
+        self.pool_size = max(1, pool_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.limiter = TokenBucket(rate, burst)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self.requests = 0
+        self.timings = TimingRecorder()
+
+    @property
+    def session(self) -> requests.Session:
+        # One session per process: pooled sockets must not be shared across a fork
+        if self._session_pid != os.getpid():
+            with self._lock:
+                if self._session_pid != os.getpid():
+                    session = requests.Session()
+                    # Only connection failures are retried: the message was not submitted yet
+                    retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.5)
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retries)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({'Accept': 'text/plain'})
+                    self._session = session
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def request(self, method: str, url: str, operation: str, **kwargs) -> requests.Response:
+        """One rate-limited, pooled gateway request; ``operation`` labels its timing."""
+        kwargs.setdefault('timeout', (SMS_CONNECT_TIMEOUT, SMS_READ_TIMEOUT))
+        self.limiter.acquire()
+        with self._slots:
+            with self._lock:
+                self._inflight += 1
+                self.requests += 1
+            started = time.perf_counter()
+            failed = True
+            try:
+                response = self.session.request(method, url, **kwargs)
+                failed = response.status_code >= 400
+                return response
+            finally:
+                self.timings.record((operation,), time.perf_counter() - started, failed)
+                with self._lock:
+                    self._inflight -= 1
+
+    def snapshot(self) -> Dict:
+        return {
+            'inflight': self._inflight,
+            'max_concurrency': self.max_concurrency,
+            'pool_size': self.pool_size,
+            'rate_per_second': self.limiter.rate,
+            'requests': self.requests,
+            'rate_limited_seconds': round(self.limiter.waited_seconds, 3),
+            'requests_timing': self.timings.snapshot(),
+        }
+
+
+sms_gateway = SMSGateway()
+register_provider('sms', sms_gateway.snapshot)
+
+def send_sms_post(params: Dict, is_unicode: bool = False, operation: str = 'send') -> requests.Response:
     """Send SMS using POST method with GET fallback"""
     api_url = BULKSMS_UNICODE_API_URL if is_unicode else BULKSMS_ENGLISH_API_URL
     
-    logger.info(f"Using API URL for {'Unicode' if is_unicode else 'English'} SMS: {api_url}")
+    logger.debug(f"Using API URL for {'Unicode' if is_unicode else 'English'} SMS: {api_url}")
     
     headers = {
         'Accept': 'text/plain',
@@ -84,13 +235,12 @@ def send_sms_post(params: Dict, is_unicode: bool = False) -> requests.Response:
     
     try:
         # Try POST method first
-        response = requests.post(api_url, params=params, headers=headers, timeout=30)
-        return response
-    except Exception as e:
+        return sms_gateway.request('POST', api_url, operation, params=params, headers=headers)
+    except requests.ConnectionError as e:
+        # Only when the POST never reached the gateway: a timed-out POST may
+        # already have been accepted and must not be sent twice
         logger.warning(f"POST method failed, trying GET: {e}")
-        # Fallback to GET method
-        response = requests.get(api_url, params=params, headers=headers, timeout=30)
-        return response
+        return sms_gateway.request('GET', api_url, operation, params=params, headers=headers)
 
 def send_student_credentials_sms(phone: str, student_name: str, username: str, password: str, login_url: str = "crt.pydahsoft.in") -> Dict:
     """Send student credentials SMS"""
@@ -102,8 +252,7 @@ def send_student_credentials_sms(phone: str, student_name: str, username: str, p
         logger.info(f"📱 Sending student credentials SMS to: {phone}")
         
         # Replace template variables: Welcome to {#var#}, Your Credentials\nusername: {#var#}\npassword: {#var#}\nLogin with {#var#} - Pydah {#var#}
-        message = STUDENT_CREDENTIALS_TEMPLATE.replace('{#var#}', username, 1) \
-                                             .replace('{#var#}', password, 1) 
+        message = credentials_message(username, password)
         
         params = {
             'apikey': BULKSMS_API_KEY,
@@ -148,9 +297,7 @@ def send_test_scheduled_sms(phone_number: str, test_name: str, start_time: str,
         formatted_start_time = format_date_to_ist(start_time, 'readable')
         
         # Replace template variables: A new test {#var#} has been scheduled at {#var#} for you. Please make sure to attempt it within 24hours.\nexam link: https://crt.pydahsoft.in/student/exam/{#var#} - Pydah College
-        message = TEST_SCHEDULED_TEMPLATE.replace('{#var#}', test_name, 1) \
-                                       .replace('{#var#}', formatted_start_time, 1) \
-                                       .replace('{#var#}', test_id, 1)
+        message = test_scheduled_message(test_name, formatted_start_time, test_id)
         
         params = {
             'apikey': BULKSMS_API_KEY,
@@ -192,8 +339,7 @@ def send_credentials_sms(phone_number: str, username: str, password: str, login_
         logger.info(f"📱 Sending credentials SMS to: {phone_number}")
         
         # Replace template variables
-        message = STUDENT_CREDENTIALS_TEMPLATE.replace('{#var#}', username, 1) \
-                                             .replace('{#var#}', password, 1)
+        message = credentials_message(username, password)
         
         params = {
             'apikey': BULKSMS_API_KEY,
@@ -235,8 +381,7 @@ def send_test_reminder_sms(phone_number: str, test_name: str, test_id: str) -> D
         logger.info(f"📱 Sending test reminder SMS to: {phone_number}")
         
         # Replace template variables: you haven't attempted your scheduled test {#var#} yet. Please complete it as soon as possible.\nexam link: https://crt.pydahsoft.in/student/exam/{#var#} - Pydah College
-        message = TEST_REMINDER_TEMPLATE.replace('{#var#}', test_name, 1) \
-                                       .replace('{#var#}', test_id, 1)
+        message = test_reminder_message(test_name, test_id)
         
         params = {
             'apikey': BULKSMS_API_KEY,
@@ -361,8 +506,7 @@ def check_sms_balance() -> Dict:
         if not SMS_AVAILABLE:
             return {'success': False, 'error': 'SMS service not configured'}
         
-        url = f"http://www.bulksmsapps.com/api/apicheckbalancev2.aspx?apikey={BULKSMS_API_KEY}"
-        response = requests.get(url, timeout=30)
+        response = sms_gateway.request('GET', BULKSMS_BALANCE_API_URL, 'balance', params={'apikey': BULKSMS_API_KEY})
         
         return {
             'success': True,
@@ -379,8 +523,8 @@ def check_delivery_status(message_id: str) -> Dict:
         if not SMS_AVAILABLE:
             return {'success': False, 'error': 'SMS service not configured'}
         
-        url = f"http://www.bulksmsapps.com/api/apiDeliveryStatusv2.aspx?apikey={BULKSMS_API_KEY}&messageid={message_id}"
-        response = requests.get(url, timeout=30)
+        response = sms_gateway.request('GET', BULKSMS_DELIVERY_API_URL, 'delivery_status',
+                                       params={'apikey': BULKSMS_API_KEY, 'messageid': message_id})
         
         return {
             'success': True,
@@ -399,6 +543,7 @@ def check_sms_configuration() -> Dict:
         'sender_id_configured': bool(BULKSMS_SENDER_ID),
         'english_api_configured': bool(BULKSMS_ENGLISH_API_URL),
         'unicode_api_configured': bool(BULKSMS_UNICODE_API_URL),
-        'dlt_template_configured': bool(BULKSMS_DLT_TEMPLATE_ID),
-        'english_dlt_template_configured': bool(BULKSMS_ENGLISH_DLT_TEMPLATE_ID)
+        'pool_size': sms_gateway.pool_size,
+        'max_concurrency': sms_gateway.max_concurrency,
+        'rate_per_second': sms_gateway.limiter.rate
     }
@@ -0,0 +1,182 @@
+"""
+Streaming CSV / XLSX export helpers.
+
+Exports are produced from row iterators (typically a Mongo cursor run
+through ``StudentEnricher.iter_enriched``) so a worker never holds the whole
+result set:
+
+* CSV is encoded a few hundred rows at a time and streamed to the client
+  through ``stream_with_context``.
+* XLSX is written with openpyxl's write-only workbook into a spooled temp
+  file (memory up to ``EXPORT_SPOOL_MAX_MEMORY``, disk beyond that) and then
+  streamed from there in fixed-size chunks.
+
+    return csv_response(HEADERS, rows(), 'results.csv')
+    return xlsx_response([ExportSheet('Results', HEADERS, rows())], 'results.xlsx')
+"""
+from __future__ import annotations
+
+import csv
+import io
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Sequence, Union
+
+from flask import Response, stream_with_context
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv'
+
+# Rows encoded per CSV chunk sent to the client
+CSV_CHUNK_ROWS = 500
+# Bytes per chunk when streaming a finished XLSX file
+FILE_CHUNK_BYTES = 64 * 1024
+# XLSX exports stay in memory up to this size, then spill to disk
+EXPORT_SPOOL_MAX_MEMORY = int(os.getenv('EXPORT_SPOOL_MAX_MEMORY', str(8 * 1024 * 1024)))
+
+Rows = Union[Iterable[Sequence[Any]], Callable[[], Iterable[Sequence[Any]]]]
+
+
+def _attachment_headers(filename: str, size: Optional[int] = None) -> Dict[str, str]:
+    headers = {
+        'Content-Disposition': f'attachment; filename={filename}',
+        # Keep nginx from buffering the whole stream before forwarding it
+        'X-Accel-Buffering': 'no',
+    }
+    if size is not None:
+        headers['Content-Length'] = str(size)
+    return headers
+
+
+def iter_csv(header: Sequence[str], rows: Iterable[Sequence[Any]], chunk_rows: int = CSV_CHUNK_ROWS) -> Iterator[str]:
+    """Yield CSV text in chunks of ``chunk_rows`` rows, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    tail = buffer.getvalue()
+    if tail:
+        yield tail
+
+
+def csv_response(header: Sequence[str], rows: Iterable[Sequence[Any]], filename: str) -> Response:
+    """Stream ``rows`` as a CSV attachment; the request context stays available to the generator."""
+    return Response(
+        stream_with_context(iter_csv(header, rows)),
+        mimetype=CSV_MIMETYPE,
+        headers=_attachment_headers(filename),
+    )
+
+
+@dataclass
+class ExportSheet:
+    """
+    One worksheet of a write-only XLSX export.
+
+    ``rows`` may be a callable so that a sheet can summarise data gathered
+    while an earlier sheet was being streamed (write-only sheets are written
+    strictly in order).
+    """
+    name: str
+    header: Sequence[str]
+    rows: Rows
+    title: Optional[str] = None
+    column_widths: Dict[str, float] = field(default_factory=dict)
+    footer: Optional[Callable[[], Iterable[Sequence[Any]]]] = None
+
+
+def _header_cells(ws, header: Sequence[str]) -> List[Any]:
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+
+    font = Font(bold=True, color="FFFFFF", size=12)
+    fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    alignment = Alignment(horizontal='center', vertical='center')
+    cells = []
+    for value in header:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = font
+        cell.fill = fill
+        cell.alignment = alignment
+        cells.append(cell)
+    return cells
+
+
+def write_xlsx(sheets: Sequence[ExportSheet], fileobj: IO[bytes], on_row: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Write ``sheets`` to ``fileobj`` with a write-only workbook.
+
+    ``on_row`` is called with the running data row count (all sheets) and
+    can be used for progress reporting. Returns the number of data rows written.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    written = 0
+    for sheet in sheets:
+        ws = wb.create_sheet(title=sheet.name)
+        for column, width in sheet.column_widths.items():
+            ws.column_dimensions[column].width = width
+
+        if sheet.title:
+            title_cell = WriteOnlyCell(ws, value=sheet.title)
+            title_cell.font = Font(bold=True, size=16, color="2F4F4F")
+            ws.append([title_cell])
+            ws.append([])
+        ws.append(_header_cells(ws, sheet.header))
+
+        rows = sheet.rows() if callable(sheet.rows) else sheet.rows
+        for row in rows:
+            ws.append(list(row))
+            written += 1
+            if on_row:
+                on_row(written)
+
+        if sheet.footer:
+            ws.append([])
+            for row in sheet.footer():
+                ws.append(list(row))
+
+    wb.save(fileobj)
+    return written
+
+
+def iter_file(fileobj: IO[bytes], chunk_bytes: int = FILE_CHUNK_BYTES) -> Iterator[bytes]:
+    """Yield a file's contents in chunks and close it when done (or when the client goes away)."""
+    try:
+        while True:
+            chunk = fileobj.read(chunk_bytes)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def xlsx_response(sheets: Sequence[ExportSheet], filename: str) -> Response:
+    """Build the workbook into a spooled temp file and stream it back as an attachment."""
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_MEMORY, suffix='.xlsx')
+    try:
+        write_xlsx(sheets, spool)
+        size = spool.tell()
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    return Response(
+        iter_file(spool),
+        mimetype=XLSX_MIMETYPE,
+        headers=_attachment_headers(filename, size),
+        direct_passthrough=True,
+    )
@@ -10,7 +10,8 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from bson import ObjectId
 from mongo import mongo_db
-from utils.sms_service import send_test_reminder_sms, send_test_scheduled_sms
+from utils.sms_service import test_reminder_message, test_scheduled_message
+from utils.sms_dispatcher import SMSMessage, sms_dispatcher
 from utils.date_formatter import format_date_to_ist
 from services.test_notification_service import test_notification_service
 # Make email service import optional
@@ -33,6 +34,25 @@ class TestReminderSystem:
         self.reminder_intervals = [6, 12, 24]  # Hours after test start
         self.reminder_frequency = 6  # Hours between reminders after 24h
         
+    @staticmethod
+    def _student_mobile(student: Dict) -> Optional[str]:
+        return student.get('mobile_number') or student.get('mobile')
+
+    def _send_sms_to_students(self, students: List[Dict], message: str, sms_type: str, test_id: str) -> List[Dict]:
+        """Send the same SMS to every student with a mobile number (multi-number submissions)"""
+        recipients = [student for student in students if self._student_mobile(student)]
+        sms_results = sms_dispatcher.send_many([
+            SMSMessage(self._student_mobile(student), message, sms_type,
+                       reference={'student_id': str(student['_id']), 'test_id': test_id})
+            for student in recipients
+        ])
+        return [{
+            'student_id': str(student['_id']),
+            'student_name': student.get('name', 'Unknown'),
+            'mobile': self._student_mobile(student),
+            'sms_result': sms_result
+        } for student, sms_result in zip(recipients, sms_results)]
+    
     def get_students_for_test(self, test_id: str) -> List[Dict]:
         """Get all students assigned to a specific test"""
         try:
@@ -65,13 +85,13 @@ class TestReminderSystem:
                 })
                 students.extend(list(course_students))
             
-            # Remove duplicates
+            # Remove duplicates (students without an email must not collapse into one)
             unique_students = []
-            seen_emails = set()
+            seen_ids = set()
             for student in students:
-                if student.get('email') not in seen_emails:
+                if student['_id'] not in seen_ids:
                     unique_students.append(student)
-                    seen_emails.add(student.get('email'))
+                    seen_ids.add(student['_id'])
             
             logger.info(f"Found {len(unique_students)} students for test {test_id}")
             return unique_students
@@ -129,30 +149,10 @@ class TestReminderSystem:
             start_time_str = format_date_to_ist(start_time, 'readable')
             
             # Send SMS to all students
-            results = []
-            for student in students:
-                if student.get('mobile'):
-                    try:
-                        result = send_test_scheduled_sms(
-                            phone_number=student['mobile'],
-                            test_name=test_name,
-                            start_time=start_time_str,
-                            test_id=test_id
-                        )
-                        results.append({
-                            'student_id': str(student['_id']),
-                            'student_name': student.get('name', 'Unknown'),
-                            'mobile': student['mobile'],
-                            'sms_result': result
-                        })
-                    except Exception as e:
-                        logger.error(f"Error sending SMS to {student.get('name')}: {e}")
-                        results.append({
-                            'student_id': str(student['_id']),
-                            'student_name': student.get('name', 'Unknown'),
-                            'mobile': student['mobile'],
-                            'sms_result': {'success': False, 'error': str(e)}
-                        })
+            results = self._send_sms_to_students(
+                students, test_scheduled_message(test_name, start_time_str, test_id), 'test_scheduled', test_id
+            )
+            exam_link = f"https://crt.pydahsoft.in/student/exam/{test_id}"
             
             # Also send email notifications if available
             if EMAIL_AVAILABLE:
@@ -223,29 +223,9 @@ class TestReminderSystem:
             exam_link = f"https://crt.pydahsoft.in/student/exam/{test_id}"
             
             # Send reminder SMS to unattempted students
-            results = []
-            for student in unattempted_students:
-                if student.get('mobile'):
-                    try:
-                        result = send_test_reminder_sms(
-                            phone_number=student['mobile'],
-                            test_name=test_name,
-                            test_id=test_id
-                        )
-                        results.append({
-                            'student_id': str(student['_id']),
-                            'student_name': student.get('name', 'Unknown'),
-                            'mobile': student['mobile'],
-                            'sms_result': result
-                        })
-                    except Exception as e:
-                        logger.error(f"Error sending reminder SMS to {student.get('name')}: {e}")
-                        results.append({
-                            'student_id': str(student['_id']),
-                            'student_name': student.get('name', 'Unknown'),
-                            'mobile': student['mobile'],
-                            'sms_result': {'success': False, 'error': str(e)}
-                        })
+            results = self._send_sms_to_students(
+                unattempted_students, test_reminder_message(test_name, test_id), 'test_reminder', test_id
+            )
             
             successful_sms = sum(1 for r in results if r['sms_result'].get('success', False))
             
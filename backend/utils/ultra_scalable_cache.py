@@ -3,11 +3,13 @@ Ultra-scalable caching system for 1000+ concurrent users
 Supports both in-memory and Redis caching with intelligent fallback
 """
 
+import os
 import time
 import threading
 import json
 import hashlib
 import logging
+from collections import OrderedDict
 from typing import Any, Optional, Dict, List, Callable
 from functools import wraps
 import weakref
@@ -22,9 +24,8 @@ class UltraScalableCache:
         self.max_memory_items = max_memory_items
         self.default_ttl = default_ttl
         
-        # Memory cache
-        self.memory_cache = {}
-        self.access_times = {}
+        # Memory cache (insertion order = recency order, oldest first)
+        self.memory_cache = OrderedDict()
         self.expiry_times = {}
         self.cache_stats = {
             'hits': 0,
@@ -105,26 +106,24 @@ class UltraScalableCache:
             if len(self.memory_cache) <= self.max_memory_items:
                 return
             
-            # Sort by access time and remove oldest
-            items_to_remove = len(self.memory_cache) - self.max_memory_items
-            sorted_items = sorted(self.access_times.items(), key=lambda x: x[1])
-            
-            for i in range(min(items_to_remove, len(sorted_items))):
-                key = sorted_items[i][0]
-                self._remove_from_memory(key)
-            
+            items_to_remove = self._evict_lru()
             if items_to_remove > 0:
                 logger.info(f"🧹 Evicted {items_to_remove} LRU cache items")
-                self.cache_stats['evictions'] += items_to_remove
+    
+    def _evict_lru(self) -> int:
+        """Pop least recently used items until the cache fits (caller holds the lock)"""
+        evicted = 0
+        while len(self.memory_cache) > self.max_memory_items:
+            key, _ = self.memory_cache.popitem(last=False)
+            self.expiry_times.pop(key, None)
+            evicted += 1
+        self.cache_stats['evictions'] += evicted
+        return evicted
     
     def _remove_from_memory(self, key: str):
         """Remove item from memory cache"""
-        if key in self.memory_cache:
-            del self.memory_cache[key]
-        if key in self.access_times:
-            del self.access_times[key]
-        if key in self.expiry_times:
-            del self.expiry_times[key]
+        self.memory_cache.pop(key, None)
+        self.expiry_times.pop(key, None)
     
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """Generate cache key from arguments"""
@@ -159,8 +158,8 @@ class UltraScalableCache:
                     self.cache_stats['misses'] += 1
                     return None
                 
-                # Update access time
-                self.access_times[key] = current_time
+                # Mark as most recently used
+                self.memory_cache.move_to_end(key)
                 self.cache_stats['hits'] += 1
                 return self.memory_cache[key]
         
@@ -187,9 +186,10 @@ class UltraScalableCache:
         with self._lock:
             current_time = time.time()
             self.memory_cache[key] = value
-            self.access_times[key] = current_time
+            self.memory_cache.move_to_end(key)
             self.expiry_times[key] = current_time + ttl
             self.cache_stats['sets'] += 1
+            self._evict_lru()
         
         return success
     
@@ -237,7 +237,6 @@ class UltraScalableCache:
             else:
                 cleared_count += len(self.memory_cache)
                 self.memory_cache.clear()
-                self.access_times.clear()
                 self.expiry_times.clear()
         
         logger.info(f"🧹 Cleared {cleared_count} cache entries")
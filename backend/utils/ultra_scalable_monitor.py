@@ -14,6 +14,8 @@ from collections import deque, defaultdict
 import os
 import gc
 
+from utils.metrics_aggregation import register_provider
+
 logger = logging.getLogger(__name__)
 
 class PerformanceMonitor:
@@ -353,8 +355,23 @@ class PerformanceMonitor:
         
         logger.info("📊 Metrics reset")
 
+    def counters(self) -> Dict[str, Any]:
+        """Additive counters of this process, for cross-worker aggregation"""
+        with self._lock:
+            return {
+                'request_count': self.request_count,
+                'error_count': self.error_count,
+                'db_query_count': self.db_query_count,
+                'db_error_count': self.db_error_count,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'active_connections': self.active_connections,
+                'queue_size': self.queue_size,
+            }
+
 # Global performance monitor instance
 performance_monitor = PerformanceMonitor()
+register_provider('monitor', performance_monitor.counters)
 
 # Decorator for monitoring function performance
 def monitor_performance(func_name: str = None):